@@ -1,7 +1,21 @@
+from importlib import import_module
+from typing import TYPE_CHECKING
 from agent.model import BaseModel, Message, Tool, ToolCall, CompletionResponse
-from agent.ghost import Ghost
-from agent.shell import Shell, InputPort, OutputPort, ContextEnhancer
-from agent.sources.glm import GLMModel
+from agent.context import ContextWindow, ContextPolicy, PromptLayout
+
+if TYPE_CHECKING:
+  from agent.ghost import Ghost
+  from agent.shell import Shell, InputPort, OutputPort, ContextEnhancer
+  from agent.sources.glm import GLMModel
+
+_lazy = {
+  "Ghost": "agent.ghost",
+  "Shell": "agent.shell",
+  "InputPort": "agent.shell",
+  "OutputPort": "agent.shell",
+  "ContextEnhancer": "agent.shell",
+  "GLMModel": "agent.sources.glm",
+}
 
 __all__ = [
   "BaseModel",
@@ -9,6 +23,9 @@ __all__ = [
   "Tool",
   "ToolCall",
   "CompletionResponse",
+  "ContextWindow",
+  "ContextPolicy",
+  "PromptLayout",
   "Ghost",
   "Shell",
   "InputPort",
@@ -16,3 +33,16 @@ __all__ = [
   "ContextEnhancer",
   "GLMModel",
 ]
+
+
+def __getattr__(name: str):
+  module = _lazy.get(name)
+  if module is None:
+    raise AttributeError(f"module 'agent' has no attribute {name!r}")
+  value = getattr(import_module(module), name)
+  globals()[name] = value
+  return value
+
+
+def __dir__() -> list[str]:
+  return sorted({*globals(), *__all__})
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Coroutine, Optional, TypeVar, Union
+
+Pending = Union[Future, asyncio.Task]
+T = TypeVar("T")
+
+
+def run_sync(coroutine: Coroutine[Any, Any, T]) -> T:
+  try:
+    asyncio.get_running_loop()
+  except RuntimeError:
+    return asyncio.run(coroutine)
+  # A loop already runs on this thread, e.g. a sync API called from async code.
+  with ThreadPoolExecutor(max_workers=1) as runner:
+    return runner.submit(asyncio.run, coroutine).result()
+
+
+class BackgroundRunner:
+  def __init__(self, name: Optional[str] = None):
+    self.name = name
+    self._loop: Optional[asyncio.AbstractEventLoop] = None
+    self._thread: Optional[threading.Thread] = None
+    self._tasks: set[asyncio.Task] = set()
+    self._lock = threading.Lock()
+
+  def submit(self, coroutine: Coroutine[Any, Any, Any]) -> Pending:
+    try:
+      task = asyncio.get_running_loop().create_task(coroutine)
+    except RuntimeError:
+      return self.submit_threadsafe(coroutine)
+    self._tasks.add(task)
+    task.add_done_callback(self._tasks.discard)
+    return task
+
+  def submit_threadsafe(self, coroutine: Coroutine[Any, Any, Any]) -> Future:
+    return asyncio.run_coroutine_threadsafe(coroutine, self._background_loop())
+
+  def close(self):
+    with self._lock:
+      if self._loop is None:
+        return
+      self._loop.call_soon_threadsafe(self._loop.stop)
+      self._thread.join()
+      self._loop.close()
+      self._loop = None
+      self._thread = None
+
+  def _background_loop(self) -> asyncio.AbstractEventLoop:
+    with self._lock:
+      if self._loop is None:
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+        self._thread.start()
+      return self._loop
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Optional, Union
+from agent.ghost import Ghost
+from agent.model import BaseModel, CompletionResponse, Message
+from agent.sources.limits import AIMDController, backoff_delay, is_rate_limited, retry_after
+
+
+@dataclass
+class BatchInput:
+  id: str
+  messages: list[Message] = field(default_factory=list)
+
+  @classmethod
+  def from_dict(cls, data: dict, index: int = 0) -> "BatchInput":
+    if "messages" in data:
+      messages = [Message(role=m["role"], content=m["content"]) for m in data["messages"]]
+    else:
+      messages = [Message(role="user", content=data["content"])]
+    return cls(id=str(data.get("id", index)), messages=messages)
+
+
+@dataclass
+class BatchResult:
+  id: str
+  index: int
+  response: Optional[CompletionResponse] = None
+  error: Optional[str] = None
+  latency: float = 0.0
+  attempts: int = 0
+
+  def to_dict(self) -> dict:
+    return {
+      "id": self.id,
+      "index": self.index,
+      "content": self.response.content if self.response else None,
+      "finish_reason": self.response.finish_reason if self.response else None,
+      "error": self.error,
+      "latency": round(self.latency, 4),
+      "attempts": self.attempts,
+    }
+
+
+BatchSource = Union[Iterable[Union[BatchInput, str]], AsyncIterable[Union[BatchInput, str]]]
+
+
+class AdaptiveLimit:
+  def __init__(self, limit: int):
+    self.controller = AIMDController(initial=limit, maximum=limit, cooldown=0.0)
+    self.active = 0
+    self.peak = 0
+    self._condition = asyncio.Condition()
+
+  async def acquire(self):
+    async with self._condition:
+      await self._condition.wait_for(lambda: self.active < self.controller.limit)
+      self.active += 1
+      self.peak = max(self.peak, self.active)
+
+  async def release(self):
+    async with self._condition:
+      self.active -= 1
+      self._condition.notify_all()
+
+  def on_success(self):
+    self.controller.on_success()
+
+  def on_throttle(self):
+    self.controller.on_throttle()
+
+
+class BatchRunner:
+  def __init__(
+    self,
+    model: BaseModel,
+    concurrency: int = 8,
+    timeout: Optional[float] = None,
+    ordered: bool = False,
+    max_retries: int = 5,
+    backoff: float = 1.0,
+    ghost_factory: Optional[Callable[[BaseModel], Ghost]] = None,
+  ):
+    self.model = model
+    self.concurrency = concurrency
+    self.timeout = timeout
+    self.ordered = ordered
+    self.max_retries = max_retries
+    self.backoff = backoff
+    self.ghost_factory = ghost_factory or Ghost
+    self.limit: Optional[AdaptiveLimit] = None
+
+  async def run(self, inputs: BatchSource) -> AsyncIterator[BatchResult]:
+    self.limit = AdaptiveLimit(self.concurrency)
+    results: asyncio.Queue = asyncio.Queue()
+    producer = asyncio.create_task(self._produce(inputs, results))
+    buffered: dict[int, BatchResult] = {}
+    next_index = 0
+    try:
+      while True:
+        result = await results.get()
+        if result is None:
+          break
+        if not self.ordered:
+          yield result
+          continue
+        buffered[result.index] = result
+        while next_index in buffered:
+          yield buffered.pop(next_index)
+          next_index += 1
+      await producer
+    finally:
+      if not producer.done():
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
+  async def run_to_jsonl(self, inputs: BatchSource, path: str) -> int:
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+      async for result in self.run(inputs):
+        f.write(json.dumps(result.to_dict(), ensure_ascii=False) + "\n")
+        f.flush()
+        count += 1
+    return count
+
+  async def _produce(self, inputs: BatchSource, results: asyncio.Queue):
+    tasks: set[asyncio.Task] = set()
+    try:
+      index = 0
+      async for item in _iterate(inputs):
+        if isinstance(item, str):
+          item = BatchInput(id=str(index), messages=[Message(role="user", content=item)])
+        await self.limit.acquire()
+        task = asyncio.create_task(self._run_one(index, item, results))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        index += 1
+      await asyncio.gather(*tasks)
+    finally:
+      for task in tasks:
+        task.cancel()
+      await results.put(None)
+
+  async def _run_one(self, index: int, item: BatchInput, results: asyncio.Queue):
+    result = BatchResult(id=item.id, index=index)
+    start = time.perf_counter()
+    try:
+      result.response = await asyncio.wait_for(self._complete(item, result), self.timeout)
+    except asyncio.TimeoutError:
+      result.error = f"TimeoutError: no response within {self.timeout}s"
+    except Exception as e:
+      result.error = f"{type(e).__name__}: {e}"
+    finally:
+      result.latency = time.perf_counter() - start
+      await self.limit.release()
+    await results.put(result)
+
+  async def _complete(self, item: BatchInput, result: BatchResult) -> CompletionResponse:
+    ghost = self.ghost_factory(self.model)
+    for message in item.messages:
+      ghost.add_message(message)
+    while True:
+      result.attempts += 1
+      try:
+        response = await ghost.process_async()
+      except Exception as e:
+        if not is_rate_limited(e) or result.attempts > self.max_retries:
+          raise
+        self.limit.on_throttle()
+        delay = retry_after(e)
+        if delay is None:
+          delay = backoff_delay(result.attempts - 1, self.backoff)
+        await asyncio.sleep(delay)
+        continue
+      self.limit.on_success()
+      return response
+
+
+async def _iterate(inputs: BatchSource) -> AsyncIterator[Union[BatchInput, str]]:
+  if hasattr(inputs, "__aiter__"):
+    async for item in inputs:
+      yield item
+  else:
+    for item in inputs:
+      yield item
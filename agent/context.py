@@ -0,0 +1,162 @@
+import math
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional, Sequence
+from agent.identity import DEFAULT_CAPACITY, IdentityCache
+from agent.model import Message
+
+MESSAGE_OVERHEAD_TOKENS = 4
+DEFAULT_CONTEXT_TOKENS = 128_000
+DEFAULT_RESERVE_TOKENS = 4_096
+TRUNCATION_MARKER = " [truncated]"
+
+MODEL_CONTEXT_TOKENS = {
+  "glm-5": 200_000,
+  "glm-4.7": 200_000,
+  "glm-4.7-flash": 200_000,
+  "glm-4.6": 200_000,
+  "glm-4.5": 128_000,
+  "glm-4.5-air": 128_000,
+}
+
+
+class Tokenizer(ABC):
+  @abstractmethod
+  def count(self, text: str) -> int:
+    pass
+
+
+class ApproximateTokenizer(Tokenizer):
+  def __init__(self, chars_per_token: float = 4.0):
+    self.chars_per_token = chars_per_token
+
+  def count(self, text: str) -> int:
+    return math.ceil(len(text) / self.chars_per_token)
+
+
+@dataclass
+class ContextPolicy:
+  max_turns: Optional[int] = None
+  pin_system: bool = True
+  pin_first_user: bool = False
+
+
+@dataclass
+class PromptLayout:
+  system_prompt: Optional[str] = None
+  stable_keys: tuple[str, ...] = ()
+
+
+class ContextWindow:
+  def __init__(
+    self,
+    max_tokens: int = DEFAULT_CONTEXT_TOKENS,
+    policy: Optional[ContextPolicy] = None,
+    tokenizer: Optional[Tokenizer] = None,
+    reserve_tokens: int = 0,
+    count_cache_size: int = DEFAULT_CAPACITY,
+  ):
+    self.max_tokens = max_tokens
+    self.policy = policy or ContextPolicy()
+    self.tokenizer = tokenizer or ApproximateTokenizer()
+    self.reserve_tokens = reserve_tokens
+    self._counts: IdentityCache[int] = IdentityCache(count_cache_size)
+    self._first_user: Optional[tuple[int, Message]] = None
+
+  @classmethod
+  def for_model(
+    cls,
+    model_name: str,
+    policy: Optional[ContextPolicy] = None,
+    tokenizer: Optional[Tokenizer] = None,
+    reserve_tokens: int = DEFAULT_RESERVE_TOKENS,
+  ) -> "ContextWindow":
+    max_tokens = MODEL_CONTEXT_TOKENS.get(model_name, DEFAULT_CONTEXT_TOKENS)
+    return cls(max_tokens, policy, tokenizer, reserve_tokens)
+
+  @property
+  def budget(self) -> int:
+    return self.max_tokens - self.reserve_tokens
+
+  def count(self, message: Message) -> int:
+    fields = (message.content,)
+    cached = self._counts.get(message, fields)
+    if cached is not None:
+      return cached
+    tokens = self.tokenizer.count(message.content) + MESSAGE_OVERHEAD_TOKENS
+    return self._counts.put(message, fields, tokens)
+
+  def clear(self):
+    self._counts.clear()
+    self._first_user = None
+
+  def fit(self, history: Sequence[Message], prefix: Sequence[Message] = ()) -> list[Message]:
+    used = sum(self.count(message) for message in prefix)
+    pinned = self._pinned_indices(history)
+    used += sum(self.count(history[index]) for index in pinned)
+    while pinned and used > self.budget:
+      used -= self.count(history[pinned.pop()])
+
+    floor = pinned[-1] + 1 if pinned else 0
+    if self.policy.max_turns is not None:
+      floor = max(floor, self._turns_floor(history, floor))
+
+    tail: list[Message] = []
+    for index in range(len(history) - 1, floor - 1, -1):
+      tokens = self.count(history[index])
+      if used + tokens > self.budget:
+        break
+      tail.append(history[index])
+      used += tokens
+
+    if not tail and len(history) > floor:
+      truncated = self._truncate(history[-1], self.budget - used)
+      if truncated is not None:
+        tail.append(truncated)
+
+    tail.reverse()
+    return [*prefix, *(history[index] for index in pinned), *tail]
+
+  def _pinned_indices(self, history: Sequence[Message]) -> list[int]:
+    pinned: list[int] = []
+    if self.policy.pin_system:
+      while len(pinned) < len(history) and history[len(pinned)].role == "system":
+        pinned.append(len(pinned))
+    if self.policy.pin_first_user:
+      first_user = self._first_user_index(history, len(pinned))
+      if first_user is not None and first_user < len(history) - 1:
+        pinned.append(first_user)
+    return pinned
+
+  def _first_user_index(self, history: Sequence[Message], start: int) -> Optional[int]:
+    if self._first_user is not None:
+      index, message = self._first_user
+      if index < len(history) and history[index] is message:
+        return index
+    for index in range(start, len(history)):
+      if history[index].role == "user":
+        self._first_user = (index, history[index])
+        return index
+    return None
+
+  def _turns_floor(self, history: Sequence[Message], floor: int) -> int:
+    turns = 0
+    for index in range(len(history) - 1, floor - 1, -1):
+      if history[index].role == "user":
+        turns += 1
+        if turns == self.policy.max_turns:
+          return index
+    return floor
+
+  def _truncate(self, message: Message, available: int) -> Optional[Message]:
+    tokens = self.count(message)
+    content_budget = available - MESSAGE_OVERHEAD_TOKENS
+    if content_budget <= 0:
+      return None
+    keep = int(len(message.content) * content_budget / tokens)
+    while keep > 0:
+      content = message.content[:keep] + TRUNCATION_MARKER
+      if self.tokenizer.count(content) <= content_budget:
+        return Message(role=message.role, content=content)
+      keep = int(keep * 0.9)
+    return None
@@ -0,0 +1,186 @@
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+from typing import Optional
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9_.\-]*[a-z0-9]|[a-z0-9]")
+SUFFIXES = ("ing", "ed", "es", "s")
+EMPTY_DOCS = np.zeros(0, dtype=np.uint32)
+EMPTY_TFS = np.zeros(0, dtype=np.uint16)
+MAX_TF = 0xFFFF
+
+
+def stem(token: str) -> str:
+  if len(token) > 4 and token.isalpha():
+    for suffix in SUFFIXES:
+      if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+        return token[: -len(suffix)]
+  return token
+
+
+def tokenize(text: str) -> list[str]:
+  return [stem(token) for token in TOKEN_PATTERN.findall(text.lower())]
+
+
+class BM25Index:
+  def __init__(self, k1: float = 1.2, b: float = 0.75):
+    self.k1 = k1
+    self.b = b
+    self.doc_ids: list[Optional[str]] = []
+    self.doc_lengths = array("I")
+    self.total_length = 0
+    self.live = 0
+    self.deleted: set[int] = set()
+    self._positions: dict[str, int] = {}
+    self._base_terms: dict[str, tuple[int, int]] = {}
+    self._base_docs = EMPTY_DOCS
+    self._base_tfs = EMPTY_TFS
+    self._fresh: dict[str, tuple[array, array]] = {}
+
+  def __len__(self) -> int:
+    return self.live
+
+  def __contains__(self, chunk_id: str) -> bool:
+    return chunk_id in self._positions
+
+  def add(self, chunk_id: str, text: str):
+    if chunk_id in self._positions:
+      self.remove(chunk_id)
+    position = len(self.doc_ids)
+    terms = Counter(tokenize(text))
+    length = sum(terms.values())
+    for term, tf in terms.items():
+      postings = self._fresh.get(term)
+      if postings is None:
+        postings = (array("I"), array("H"))
+        self._fresh[term] = postings
+      postings[0].append(position)
+      postings[1].append(min(tf, MAX_TF))
+    self.doc_ids.append(chunk_id)
+    self.doc_lengths.append(length)
+    self._positions[chunk_id] = position
+    self.total_length += length
+    self.live += 1
+
+  def remove(self, chunk_id: str) -> bool:
+    position = self._positions.pop(chunk_id, None)
+    if position is None:
+      return False
+    self.doc_ids[position] = None
+    self.deleted.add(position)
+    self.total_length -= self.doc_lengths[position]
+    self.live -= 1
+    return True
+
+  def postings(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+    docs, tfs = EMPTY_DOCS, EMPTY_TFS
+    base = self._base_terms.get(term)
+    if base is not None:
+      offset, length = base
+      docs = self._base_docs[offset : offset + length]
+      tfs = self._base_tfs[offset : offset + length]
+    fresh = self._fresh.get(term)
+    if fresh is not None:
+      fresh_docs = np.frombuffer(fresh[0], dtype=np.uint32)
+      fresh_tfs = np.frombuffer(fresh[1], dtype=np.uint16)
+      docs = np.concatenate((docs, fresh_docs)) if len(docs) else fresh_docs
+      tfs = np.concatenate((tfs, fresh_tfs)) if len(tfs) else fresh_tfs
+    return docs, tfs
+
+  def search(self, query: str, top_k: int = 10) -> list[tuple[str, float]]:
+    if not self.live or top_k <= 0:
+      return []
+    lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+    average_length = self.total_length / self.live
+    all_docs = []
+    all_scores = []
+    for term in set(tokenize(query)):
+      docs, tfs = self.postings(term)
+      if not len(docs):
+        continue
+      # Document frequency counts removed documents until the next compaction.
+      idf = math.log(1.0 + (self.live - len(docs) + 0.5) / (len(docs) + 0.5))
+      tf = tfs.astype(np.float32)
+      norm = self.k1 * (1.0 - self.b + self.b * lengths[docs] / average_length)
+      all_docs.append(docs)
+      all_scores.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+    if not all_docs:
+      return []
+
+    docs, inverse = np.unique(np.concatenate(all_docs), return_inverse=True)
+    scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+    if self.deleted:
+      scores[np.isin(docs, np.fromiter(self.deleted, dtype=np.uint32))] = -np.inf
+    if top_k < len(scores):
+      candidates = np.argpartition(scores, -top_k)[-top_k:]
+    else:
+      candidates = np.arange(len(scores))
+    candidates = candidates[np.argsort(-scores[candidates])]
+    return [
+      (self.doc_ids[docs[index]], float(scores[index]))
+      for index in candidates
+      if np.isfinite(scores[index])
+    ]
+
+  def save(self, directory: str):
+    self._compact()
+    os.makedirs(directory, exist_ok=True)
+    meta = {"k1": self.k1, "b": self.b, "doc_ids": self.doc_ids, "terms": self._base_terms}
+    for name, data in (
+      ("docs.npy", self._base_docs),
+      ("tfs.npy", self._base_tfs),
+      ("lengths.npy", np.frombuffer(self.doc_lengths, dtype=np.uint32)),
+    ):
+      temporary = os.path.join(directory, f"{name}.tmp.npy")
+      np.save(temporary, data)
+      os.replace(temporary, os.path.join(directory, name))
+    temporary = os.path.join(directory, "meta.json.tmp")
+    with open(temporary, "w", encoding="utf-8") as f:
+      json.dump(meta, f)
+    os.replace(temporary, os.path.join(directory, "meta.json"))
+
+  @classmethod
+  def load(cls, directory: str) -> "BM25Index":
+    with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+      meta = json.load(f)
+    index = cls(k1=meta["k1"], b=meta["b"])
+    index.doc_ids = meta["doc_ids"]
+    index.doc_lengths = array("I", np.load(os.path.join(directory, "lengths.npy")).tobytes())
+    index.total_length = sum(index.doc_lengths)
+    index.live = len(index.doc_ids)
+    index._positions = {chunk_id: position for position, chunk_id in enumerate(index.doc_ids)}
+    index._base_terms = {term: (offset, length) for term, (offset, length) in meta["terms"].items()}
+    index._base_docs = np.load(os.path.join(directory, "docs.npy"), mmap_mode="r")
+    index._base_tfs = np.load(os.path.join(directory, "tfs.npy"), mmap_mode="r")
+    return index
+
+  def _compact(self):
+    alive = np.array([chunk_id is not None for chunk_id in self.doc_ids], dtype=bool)
+    remap = np.cumsum(alive, dtype=np.int64) - 1
+    docs_parts, tfs_parts = [], []
+    terms = {}
+    offset = 0
+    for term in self._base_terms.keys() | self._fresh.keys():
+      docs, tfs = self.postings(term)
+      keep = alive[docs]
+      if not keep.any():
+        continue
+      docs = remap[docs[keep]].astype(np.uint32)
+      docs_parts.append(docs)
+      tfs_parts.append(np.asarray(tfs[keep], dtype=np.uint16))
+      terms[term] = (offset, len(docs))
+      offset += len(docs)
+
+    self._base_docs = np.concatenate(docs_parts) if docs_parts else EMPTY_DOCS
+    self._base_tfs = np.concatenate(tfs_parts) if tfs_parts else EMPTY_TFS
+    self._base_terms = terms
+    self._fresh = {}
+    lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)[alive]
+    self.doc_lengths = array("I", lengths.tobytes())
+    self.doc_ids = [chunk_id for chunk_id in self.doc_ids if chunk_id is not None]
+    self.deleted = set()
+    self._positions = {chunk_id: position for position, chunk_id in enumerate(self.doc_ids)}
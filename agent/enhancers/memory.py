@@ -0,0 +1,277 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+import numpy as np
+from agent.background import BackgroundRunner, Pending
+from agent.enhancers.rag import Embedder, HashingEmbedder
+from agent.model import BaseModel, CompletionResponse, Message
+
+EXTRACTION_INSTRUCTIONS = (
+  "Extract durable facts worth remembering about the user from this exchange: preferences, "
+  "personal details, plans, decisions and corrections. Write one short self-contained fact "
+  "per line. Skip anything only relevant to this exchange. Reply NONE if there is nothing."
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memories (
+  id INTEGER PRIMARY KEY,
+  namespace TEXT NOT NULL,
+  text TEXT NOT NULL,
+  embedding BLOB NOT NULL,
+  strength REAL NOT NULL,
+  created_at REAL NOT NULL,
+  last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS memories_namespace ON memories (namespace);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+@dataclass
+class Memory:
+  id: int
+  namespace: str
+  text: str
+  strength: float
+  created_at: float
+  last_access: float
+
+
+@dataclass
+class _Partition:
+  memories: list[Memory] = field(default_factory=list)
+  vectors: Optional[np.ndarray] = None
+
+  def matrix(self) -> np.ndarray:
+    return self.vectors[: len(self.memories)]
+
+
+class MemoryStore:
+  def __init__(
+    self,
+    path: str,
+    embedder: Optional[Embedder] = None,
+    max_memories: int = 1000,
+    half_life_days: float = 30.0,
+    duplicate_threshold: float = 0.85,
+  ):
+    self.embedder = embedder or HashingEmbedder()
+    self.max_memories = max_memories
+    self.half_life = half_life_days * 86400.0
+    self.duplicate_threshold = duplicate_threshold
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    self._db = sqlite3.connect(path, check_same_thread=False)
+    self._db.execute("PRAGMA journal_mode=WAL")
+    self._db.execute("PRAGMA synchronous=NORMAL")
+    self._db.executescript(SCHEMA)
+    self._lock = threading.RLock()
+    self._partitions: dict[str, _Partition] = {}
+    self._touched: dict[int, float] = {}
+    self._migrate_embeddings()
+
+  def add(self, namespace: str, text: str, now: Optional[float] = None) -> Memory:
+    now = time.time() if now is None else now
+    vector = self.embedder.embed([text])[0]
+    with self._lock:
+      partition = self._partition(namespace)
+      match = self._nearest(partition, vector)
+      if match is not None and match[1] >= self.duplicate_threshold:
+        row = match[0]
+        memory = partition.memories[row]
+        memory.text = text
+        memory.strength += 1.0
+        memory.last_access = now
+        partition.vectors[row] = vector
+        self._db.execute(
+          "UPDATE memories SET text = ?, embedding = ?, strength = ?, last_access = ? WHERE id = ?",
+          (text, vector.tobytes(), memory.strength, now, memory.id),
+        )
+      else:
+        cursor = self._db.execute(
+          "INSERT INTO memories (namespace, text, embedding, strength, created_at, last_access) "
+          "VALUES (?, ?, ?, 1.0, ?, ?)",
+          (namespace, text, vector.tobytes(), now, now),
+        )
+        memory = Memory(cursor.lastrowid, namespace, text, 1.0, now, now)
+        self._append(partition, memory, vector)
+        if len(partition.memories) > self.max_memories:
+          self.evict(namespace, now=now)
+      self._flush_touched()
+      self._db.commit()
+      return memory
+
+  def search(
+    self, namespace: str, query: str, top_k: int = 5, min_score: float = 0.0
+  ) -> list[tuple[Memory, float]]:
+    vector = self.embedder.embed([query])[0]
+    now = time.time()
+    with self._lock:
+      partition = self._partition(namespace)
+      if not partition.memories:
+        return []
+      scores = partition.matrix() @ vector
+      if top_k < len(scores):
+        rows = np.argpartition(scores, -top_k)[-top_k:]
+      else:
+        rows = np.arange(len(scores))
+      results = []
+      for row in rows[np.argsort(-scores[rows])]:
+        if scores[row] < min_score:
+          break
+        memory = partition.memories[row]
+        memory.last_access = now
+        self._touched[memory.id] = now
+        results.append((memory, float(scores[row])))
+      return results
+
+  def memories(self, namespace: str) -> list[Memory]:
+    with self._lock:
+      return list(self._partition(namespace).memories)
+
+  def retention(self, memory: Memory, now: Optional[float] = None) -> float:
+    now = time.time() if now is None else now
+    return memory.strength * 0.5 ** ((now - memory.last_access) / self.half_life)
+
+  def evict(self, namespace: str, min_retention: float = 0.0, now: Optional[float] = None) -> int:
+    now = time.time() if now is None else now
+    with self._lock:
+      partition = self._partition(namespace)
+      ranked = sorted(
+        range(len(partition.memories)),
+        key=lambda row: self.retention(partition.memories[row], now),
+        reverse=True,
+      )
+      keep = [
+        row
+        for row in ranked[: self.max_memories]
+        if self.retention(partition.memories[row], now) >= min_retention
+      ]
+      if len(keep) == len(partition.memories):
+        return 0
+      keep.sort()
+      kept_ids = {partition.memories[row].id for row in keep}
+      dropped = [memory.id for memory in partition.memories if memory.id not in kept_ids]
+      self._db.executemany("DELETE FROM memories WHERE id = ?", [(i,) for i in dropped])
+      self._db.commit()
+      partition.memories = [partition.memories[row] for row in keep]
+      partition.vectors = partition.vectors[keep].copy()
+      return len(dropped)
+
+  def forget(self, namespace: str):
+    with self._lock:
+      self._db.execute("DELETE FROM memories WHERE namespace = ?", (namespace,))
+      self._db.commit()
+      self._partitions.pop(namespace, None)
+
+  def close(self):
+    with self._lock:
+      self._flush_touched()
+      self._db.commit()
+      self._db.close()
+
+  def _partition(self, namespace: str) -> _Partition:
+    partition = self._partitions.get(namespace)
+    if partition is not None:
+      return partition
+    rows = self._db.execute(
+      "SELECT id, text, embedding, strength, created_at, last_access FROM memories "
+      "WHERE namespace = ? ORDER BY id",
+      (namespace,),
+    ).fetchall()
+    partition = _Partition(
+      memories=[Memory(row[0], namespace, row[1], row[3], row[4], row[5]) for row in rows],
+      vectors=np.zeros((max(len(rows), 16), self.embedder.dim), dtype=np.float32),
+    )
+    for index, row in enumerate(rows):
+      partition.vectors[index] = np.frombuffer(row[2], dtype=np.float32)
+    self._partitions[namespace] = partition
+    return partition
+
+  def _append(self, partition: _Partition, memory: Memory, vector: np.ndarray):
+    size = len(partition.memories)
+    if size == len(partition.vectors):
+      grown = np.zeros((max(size * 2, 16), self.embedder.dim), dtype=np.float32)
+      grown[:size] = partition.vectors
+      partition.vectors = grown
+    partition.vectors[size] = vector
+    partition.memories.append(memory)
+
+  def _nearest(self, partition: _Partition, vector: np.ndarray) -> Optional[tuple[int, float]]:
+    if not partition.memories:
+      return None
+    scores = partition.matrix() @ vector
+    row = int(np.argmax(scores))
+    return row, float(scores[row])
+
+  def _flush_touched(self):
+    if self._touched:
+      self._db.executemany(
+        "UPDATE memories SET last_access = ? WHERE id = ?",
+        [(now, memory_id) for memory_id, now in self._touched.items()],
+      )
+      self._touched.clear()
+
+  def _migrate_embeddings(self):
+    row = self._db.execute("SELECT value FROM meta WHERE key = 'embedder'").fetchone()
+    if row is not None and row[0] == self.embedder.name:
+      return
+    rows = self._db.execute("SELECT id, text FROM memories").fetchall()
+    if rows:
+      vectors = self.embedder.embed([text for _, text in rows])
+      self._db.executemany(
+        "UPDATE memories SET embedding = ? WHERE id = ?",
+        [(vector.tobytes(), memory_id) for (memory_id, _), vector in zip(rows, vectors)],
+      )
+    self._db.execute(
+      "INSERT OR REPLACE INTO meta (key, value) VALUES ('embedder', ?)", (self.embedder.name,)
+    )
+    self._db.commit()
+
+
+class MemoryExtractor:
+  def __init__(self, model: BaseModel, store: MemoryStore):
+    self.model = model
+    self.store = store
+    self.last_error: Optional[BaseException] = None
+    self._runner = BackgroundRunner()
+
+  def schedule(self, namespace: str, message: Message, response: CompletionResponse) -> Pending:
+    return self._runner.submit(self.extract(namespace, message, response))
+
+  async def extract(
+    self, namespace: str, message: Message, response: CompletionResponse
+  ) -> list[Memory]:
+    prompt = [
+      Message(role="system", content=EXTRACTION_INSTRUCTIONS),
+      Message(role="user", content=f"user: {message.content}\nassistant: {response.content}"),
+    ]
+    try:
+      extraction = await self.model.generate_completion_async(prompt)
+    except Exception as e:
+      self.last_error = e
+      return []
+    facts = self.parse_facts(extraction.content)
+    if not facts:
+      return []
+    # Embedding and SQLite writes would otherwise stall every other session on this loop.
+    return await asyncio.to_thread(self._store, namespace, facts)
+
+  def _store(self, namespace: str, facts: list[str]) -> list[Memory]:
+    return [self.store.add(namespace, fact) for fact in facts]
+
+  def parse_facts(self, content: str) -> list[str]:
+    facts = []
+    for line in content.splitlines():
+      fact = line.strip().lstrip("-*• ").strip()
+      if fact and fact.upper() != "NONE":
+        facts.append(fact)
+    return facts
+
+  def close(self):
+    self._runner.close()
@@ -0,0 +1,349 @@
+import hashlib
+import json
+import math
+import os
+import re
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Optional
+import numpy as np
+from agent.enhancers.lexical import BM25Index, tokenize
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+FENCE_PATTERN = re.compile(r"^\s*(```|~~~)")
+
+
+@dataclass
+class Chunk:
+  id: str
+  source: str
+  heading: str
+  text: str
+
+
+@dataclass
+class SearchResult:
+  chunk: Chunk
+  score: float
+
+
+def chunk_markdown(text: str, source: str, max_chars: int = 1200) -> list[Chunk]:
+  sections: list[tuple[str, list[str]]] = []
+  headings: list[str] = []
+  blocks: list[str] = []
+  lines: list[str] = []
+  in_fence = False
+
+  def end_block():
+    if lines and "".join(lines).strip():
+      blocks.append("\n".join(lines).strip())
+    lines.clear()
+
+  def end_section():
+    end_block()
+    if blocks:
+      sections.append((" > ".join(part for part in headings if part), blocks.copy()))
+    blocks.clear()
+
+  for line in text.splitlines():
+    if FENCE_PATTERN.match(line):
+      if not in_fence:
+        end_block()
+      lines.append(line)
+      in_fence = not in_fence
+      if not in_fence:
+        end_block()
+      continue
+    if in_fence:
+      lines.append(line)
+      continue
+    heading = HEADING_PATTERN.match(line)
+    if heading:
+      end_section()
+      level = len(heading.group(1))
+      del headings[level - 1 :]
+      headings.extend([""] * (level - 1 - len(headings)))
+      headings.append(heading.group(2).strip("*# "))
+      continue
+    if not line.strip():
+      end_block()
+    else:
+      lines.append(line)
+  end_section()
+
+  chunks: list[Chunk] = []
+  for heading, section_blocks in sections:
+    current: list[str] = []
+    size = 0
+    for block in section_blocks:
+      if current and size + len(block) > max_chars:
+        chunks.append(Chunk(f"{source}#{len(chunks)}", source, heading, "\n\n".join(current)))
+        current, size = [], 0
+      current.append(block)
+      size += len(block) + 2
+    if current:
+      chunks.append(Chunk(f"{source}#{len(chunks)}", source, heading, "\n\n".join(current)))
+  return chunks
+
+
+class Embedder(ABC):
+  name: str
+  dim: int
+
+  @abstractmethod
+  def embed(self, texts: list[str]) -> np.ndarray:
+    pass
+
+
+class HashingEmbedder(Embedder):
+  def __init__(self, dim: int = 256):
+    self.dim = dim
+    self.name = f"hashing-{dim}"
+
+  def embed(self, texts: list[str]) -> np.ndarray:
+    vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+      tokens = tokenize(text)
+      features = Counter(tokens)
+      features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+      for feature, count in features.items():
+        hashed = zlib.crc32(feature.encode())
+        sign = 1.0 if hashed & 0x80000000 else -1.0
+        vectors[row, hashed % self.dim] += sign * (1.0 + math.log(count))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+class SentenceTransformerEmbedder(Embedder):
+  def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    from sentence_transformers import SentenceTransformer
+
+    self.model = SentenceTransformer(model_name, local_files_only=True)
+    self.dim = self.model.get_sentence_embedding_dimension()
+    self.name = f"sentence-transformers-{model_name}"
+
+  def embed(self, texts: list[str]) -> np.ndarray:
+    vectors = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+    return vectors.astype(np.float32, copy=False)
+
+
+def default_embedder() -> Embedder:
+  try:
+    return SentenceTransformerEmbedder()
+  except Exception:
+    return HashingEmbedder()
+
+
+class VectorIndex:
+  def __init__(self, vectors: np.ndarray):
+    self.vectors = vectors
+
+  def __len__(self) -> int:
+    return self.vectors.shape[0]
+
+  def search(self, query: np.ndarray, top_k: int) -> list[tuple[int, float]]:
+    if len(self) == 0 or top_k <= 0:
+      return []
+    scores = self.vectors @ query
+    if top_k < len(scores):
+      rows = np.argpartition(scores, -top_k)[-top_k:]
+    else:
+      rows = np.arange(len(scores))
+    rows = rows[np.argsort(-scores[rows])]
+    return [(int(row), float(scores[row])) for row in rows]
+
+  def save(self, path: str):
+    temporary = f"{path}.tmp.npy"
+    np.save(temporary, np.ascontiguousarray(self.vectors, dtype=np.float32))
+    os.replace(temporary, path)
+
+  @classmethod
+  def load(cls, path: str) -> "VectorIndex":
+    return cls(np.load(path, mmap_mode="r"))
+
+
+class Retriever(ABC):
+  @abstractmethod
+  def search(self, query: str, top_k: int) -> list[SearchResult]:
+    pass
+
+
+class KnowledgeStore(Retriever):
+  def __init__(
+    self,
+    root_dir: str,
+    index_dir: str,
+    embedder: Optional[Embedder] = None,
+    max_chunk_chars: int = 1200,
+    lexical: bool = False,
+  ):
+    self.root_dir = root_dir
+    self.index_dir = index_dir
+    self.embedder = embedder or HashingEmbedder()
+    self.max_chunk_chars = max_chunk_chars
+    self.chunks: list[Chunk] = []
+    self.files: dict[str, dict] = {}
+    self.index = VectorIndex(np.zeros((0, self.embedder.dim), dtype=np.float32))
+    self.lexical = BM25Index() if lexical else None
+    self._rows: dict[str, int] = {}
+    self._load()
+
+  @property
+  def manifest_path(self) -> str:
+    return os.path.join(self.index_dir, "manifest.json")
+
+  @property
+  def vectors_path(self) -> str:
+    return os.path.join(self.index_dir, "vectors.npy")
+
+  @property
+  def lexical_dir(self) -> str:
+    return os.path.join(self.index_dir, "lexical")
+
+  def chunk(self, chunk_id: str) -> Optional[Chunk]:
+    row = self._rows.get(chunk_id)
+    return self.chunks[row] if row is not None else None
+
+  def refresh(self) -> int:
+    current = self._scan()
+    lexical_stale = self.lexical is not None and len(self.lexical) != len(self.chunks)
+    if (
+      not lexical_stale
+      and current.keys() == self.files.keys()
+      and all(current[path] == self.files[path]["hash"] for path in current)
+    ):
+      return 0
+    if lexical_stale:
+      self.lexical = BM25Index()
+    elif self.lexical is not None:
+      for path, previous in self.files.items():
+        if current.get(path) != previous["hash"]:
+          for chunk in self.chunks[previous["start"] : previous["start"] + previous["count"]]:
+            self.lexical.remove(chunk.id)
+
+    chunks: list[Chunk] = []
+    files: dict[str, dict] = {}
+    parts: list[np.ndarray] = []
+    embedded = 0
+    for path in sorted(current):
+      previous = self.files.get(path)
+      if previous and previous["hash"] == current[path]:
+        start, count = previous["start"], previous["count"]
+        file_chunks = self.chunks[start : start + count]
+        vectors = np.array(self.index.vectors[start : start + count])
+      else:
+        with open(os.path.join(self.root_dir, path), encoding="utf-8") as f:
+          file_chunks = chunk_markdown(f.read(), path, self.max_chunk_chars)
+        vectors = self.embedder.embed([self._embedding_text(chunk) for chunk in file_chunks])
+        embedded += 1
+        if self.lexical is not None and not lexical_stale:
+          for chunk in file_chunks:
+            self.lexical.add(chunk.id, self._embedding_text(chunk))
+      files[path] = {"hash": current[path], "start": len(chunks), "count": len(file_chunks)}
+      chunks.extend(file_chunks)
+      parts.append(vectors.reshape(-1, self.embedder.dim))
+
+    if lexical_stale:
+      for chunk in chunks:
+        self.lexical.add(chunk.id, self._embedding_text(chunk))
+    self.chunks = chunks
+    self.files = files
+    self._rows = {chunk.id: row for row, chunk in enumerate(chunks)}
+    self.index = VectorIndex(
+      np.concatenate(parts) if parts else np.zeros((0, self.embedder.dim), dtype=np.float32)
+    )
+    self._save()
+    return embedded
+
+  def search(self, query: str, top_k: int = 4) -> list[SearchResult]:
+    query_vector = self.embedder.embed([query])[0]
+    return [
+      SearchResult(self.chunks[row], score) for row, score in self.index.search(query_vector, top_k)
+    ]
+
+  def _embedding_text(self, chunk: Chunk) -> str:
+    return f"{chunk.heading}\n{chunk.text}" if chunk.heading else chunk.text
+
+  def _scan(self) -> dict[str, str]:
+    hashes = {}
+    for directory, _, names in os.walk(self.root_dir):
+      for name in names:
+        if name.endswith(".md"):
+          path = os.path.join(directory, name)
+          with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+          hashes[os.path.relpath(path, self.root_dir)] = digest
+    return hashes
+
+  def _save(self):
+    os.makedirs(self.index_dir, exist_ok=True)
+    self.index.save(self.vectors_path)
+    manifest = {
+      "embedder": self.embedder.name,
+      "dim": self.embedder.dim,
+      "files": self.files,
+      "chunks": [asdict(chunk) for chunk in self.chunks],
+    }
+    temporary = f"{self.manifest_path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+      json.dump(manifest, f)
+    os.replace(temporary, self.manifest_path)
+    self.index = VectorIndex.load(self.vectors_path)
+    if self.lexical is not None:
+      self.lexical.save(self.lexical_dir)
+
+  def _load(self):
+    if not (os.path.exists(self.manifest_path) and os.path.exists(self.vectors_path)):
+      return
+    with open(self.manifest_path, encoding="utf-8") as f:
+      manifest = json.load(f)
+    if manifest["embedder"] != self.embedder.name or manifest["dim"] != self.embedder.dim:
+      return
+    self.chunks = [Chunk(**chunk) for chunk in manifest["chunks"]]
+    self.files = manifest["files"]
+    self._rows = {chunk.id: row for row, chunk in enumerate(self.chunks)}
+    self.index = VectorIndex.load(self.vectors_path)
+    if self.lexical is not None and os.path.exists(os.path.join(self.lexical_dir, "meta.json")):
+      self.lexical = BM25Index.load(self.lexical_dir)
+
+
+class HybridRetriever(Retriever):
+  def __init__(
+    self,
+    store: KnowledgeStore,
+    candidates: int = 20,
+    rrf_k: int = 60,
+    min_similarity: float = 0.25,
+  ):
+    if store.lexical is None:
+      raise ValueError("HybridRetriever needs a KnowledgeStore built with lexical=True")
+    self.store = store
+    self.candidates = candidates
+    self.rrf_k = rrf_k
+    self.min_similarity = min_similarity
+
+  def search(self, query: str, top_k: int = 4) -> list[SearchResult]:
+    scores: dict[str, float] = {}
+    chunks: dict[str, Chunk] = {}
+    # Fused ranks say nothing about relevance, so weak dense matches are dropped before fusing;
+    # BM25 only returns chunks that share a query term.
+    dense = [
+      result
+      for result in self.store.search(query, self.candidates)
+      if result.score >= self.min_similarity
+    ]
+    for rank, result in enumerate(dense):
+      scores[result.chunk.id] = 1.0 / (self.rrf_k + rank + 1)
+      chunks[result.chunk.id] = result.chunk
+    for rank, (chunk_id, _) in enumerate(self.store.lexical.search(query, self.candidates)):
+      scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+      if chunk_id not in chunks:
+        chunks[chunk_id] = self.store.chunk(chunk_id)
+
+    # Scaled so a chunk ranked first by both retrievers scores 1.0.
+    scale = (self.rrf_k + 1) / 2
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [SearchResult(chunks[chunk_id], score * scale) for chunk_id, score in ranked]
@@ -0,0 +1,407 @@
+import asyncio
+import multiprocessing
+import os
+import re
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import Callable, Optional
+import httpx
+from agent.background import BackgroundRunner
+from agent.context import ApproximateTokenizer, Tokenizer
+from agent.enhancers.lexical import BM25Index
+
+logger = logging.getLogger(__name__)
+
+SKIP_TAGS = {
+  "script",
+  "style",
+  "noscript",
+  "template",
+  "svg",
+  "nav",
+  "header",
+  "footer",
+  "aside",
+  "form",
+  "button",
+  "iframe",
+}
+BLOCK_TAGS = {
+  "p",
+  "div",
+  "section",
+  "article",
+  "main",
+  "li",
+  "ul",
+  "ol",
+  "table",
+  "tr",
+  "br",
+  "pre",
+  "blockquote",
+  "h1",
+  "h2",
+  "h3",
+  "h4",
+  "h5",
+  "h6",
+}
+MAIN_TAGS = {"article", "main"}
+VOID_TAGS = {"br", "hr", "img", "input", "meta", "link", "source", "wbr", "area", "col", "embed"}
+SPACE_PATTERN = re.compile(r"[ \t\r\f\v]+")
+
+
+@dataclass
+class WebResult:
+  url: str
+  title: str = ""
+  snippet: str = ""
+
+
+@dataclass
+class WebPassage:
+  url: str
+  title: str
+  text: str
+  score: float
+
+
+@dataclass
+class CachedPage:
+  url: str
+  text: str
+  etag: Optional[str]
+  last_modified: Optional[str]
+  fetched_at: float
+
+
+@dataclass
+class WebStats:
+  searches: int = 0
+  fetched: int = 0
+  cached: int = 0
+  revalidated: int = 0
+  failed: int = 0
+  timed_out: int = 0
+
+
+class _TextExtractor(HTMLParser):
+  def __init__(self):
+    super().__init__(convert_charrefs=True)
+    self.skipping = 0
+    self.main_depth = 0
+    self.blocks: list[str] = []
+    self.main_blocks: list[str] = []
+    self.current: list[str] = []
+
+  def handle_starttag(self, tag: str, attrs):
+    if tag in VOID_TAGS:
+      if tag == "br":
+        self.end_block()
+      return
+    if tag in SKIP_TAGS:
+      self.skipping += 1
+    elif tag in BLOCK_TAGS:
+      self.end_block()
+    if tag in MAIN_TAGS:
+      self.main_depth += 1
+
+  def handle_endtag(self, tag: str):
+    if tag in VOID_TAGS:
+      return
+    if tag in SKIP_TAGS:
+      self.skipping = max(0, self.skipping - 1)
+    elif tag in BLOCK_TAGS:
+      self.end_block()
+    if tag in MAIN_TAGS:
+      self.main_depth = max(0, self.main_depth - 1)
+
+  def handle_data(self, data: str):
+    if not self.skipping:
+      self.current.append(data)
+
+  def end_block(self):
+    text = SPACE_PATTERN.sub(" ", " ".join("".join(self.current).split("\n"))).strip()
+    self.current.clear()
+    if not text:
+      return
+    self.blocks.append(text)
+    if self.main_depth:
+      self.main_blocks.append(text)
+
+
+def extract_text(html: str) -> str:
+  parser = _TextExtractor()
+  parser.feed(html)
+  parser.close()
+  parser.end_block()
+  blocks = parser.main_blocks or parser.blocks
+  return "\n\n".join(block for block in blocks if len(block) > 1)
+
+
+def split_passages(text: str, max_chars: int = 600) -> list[str]:
+  passages: list[str] = []
+  current: list[str] = []
+  size = 0
+  for block in text.split("\n\n"):
+    if current and size + len(block) > max_chars:
+      passages.append("\n\n".join(current))
+      current, size = [], 0
+    while len(block) > max_chars:
+      cut = block.rfind(" ", 0, max_chars)
+      cut = cut if cut > 0 else max_chars
+      passages.append(block[:cut].strip())
+      block = block[cut:].strip()
+    if block:
+      current.append(block)
+      size += len(block) + 2
+  if current:
+    passages.append("\n\n".join(current))
+  return passages
+
+
+def rank_passages(
+  query: str, pages: list[tuple[WebResult, str]], max_chars: int = 600
+) -> list[WebPassage]:
+  index = BM25Index()
+  candidates: list[WebPassage] = []
+  for result, text in pages:
+    for passage in split_passages(text, max_chars):
+      index.add(str(len(candidates)), passage)
+      candidates.append(WebPassage(result.url, result.title, passage, 0.0))
+  ranked = []
+  for passage_id, score in index.search(query, len(candidates)):
+    passage = candidates[int(passage_id)]
+    passage.score = score
+    ranked.append(passage)
+  return ranked
+
+
+class SearchBackend(ABC):
+  @abstractmethod
+  async def search(self, client: httpx.AsyncClient, query: str, limit: int) -> list[WebResult]:
+    pass
+
+
+class SearxngBackend(SearchBackend):
+  def __init__(self, base_url: str):
+    self.base_url = base_url.rstrip("/")
+
+  async def search(self, client: httpx.AsyncClient, query: str, limit: int) -> list[WebResult]:
+    response = await client.get(f"{self.base_url}/search", params={"q": query, "format": "json"})
+    response.raise_for_status()
+    results: list[WebResult] = []
+    seen: set[str] = set()
+    for item in response.json().get("results", []):
+      url = item.get("url")
+      if not url or url in seen:
+        continue
+      seen.add(url)
+      results.append(WebResult(url, item.get("title") or "", item.get("content") or ""))
+      if len(results) >= limit:
+        break
+    return results
+
+
+class PageCache:
+  def __init__(self, path: str):
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    self._db = sqlite3.connect(path, check_same_thread=False)
+    self._db.execute("PRAGMA journal_mode=WAL")
+    self._db.execute("PRAGMA synchronous=NORMAL")
+    self._db.execute(
+      "CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, text TEXT NOT NULL, etag TEXT, "
+      "last_modified TEXT, fetched_at REAL NOT NULL)"
+    )
+    self._lock = threading.Lock()
+
+  def get(self, url: str) -> Optional[CachedPage]:
+    with self._lock:
+      row = self._db.execute(
+        "SELECT url, text, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)
+      ).fetchone()
+    return CachedPage(*row) if row is not None else None
+
+  def put(self, page: CachedPage):
+    with self._lock:
+      self._db.execute(
+        "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+        (page.url, page.text, page.etag, page.last_modified, page.fetched_at),
+      )
+      self._db.commit()
+
+  def touch(self, url: str, fetched_at: float):
+    with self._lock:
+      self._db.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (fetched_at, url))
+      self._db.commit()
+
+  def close(self):
+    with self._lock:
+      self._db.close()
+
+
+class WebSearcher:
+  def __init__(
+    self,
+    backend: SearchBackend,
+    cache: Optional[PageCache] = None,
+    max_results: int = 5,
+    max_tokens: int = 1500,
+    passage_chars: int = 600,
+    deadline: float = 3.0,
+    ttl: float = 3600.0,
+    max_page_chars: int = 2_000_000,
+    extract_workers: int = 2,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+    tokenizer: Optional[Tokenizer] = None,
+    clock: Callable = time.time,
+  ):
+    self.backend = backend
+    self.cache = cache
+    self.max_results = max_results
+    self.max_tokens = max_tokens
+    self.passage_chars = passage_chars
+    self.deadline = deadline
+    self.ttl = ttl
+    self.max_page_chars = max_page_chars
+    self.extract_workers = extract_workers
+    self.transport = transport
+    self.tokenizer = tokenizer or ApproximateTokenizer()
+    self.clock = clock
+    self.stats = WebStats()
+    self._client: Optional[httpx.AsyncClient] = None
+    self._runner = BackgroundRunner(name="web-search")
+    self._pool: Optional[ProcessPoolExecutor] = None
+
+  def search(self, query: str) -> list[WebPassage]:
+    return self._runner.submit_threadsafe(self._search(query)).result()
+
+  async def search_async(self, query: str) -> list[WebPassage]:
+    # The pooled client is bound to one loop, so every caller is funnelled onto it.
+    return await asyncio.wrap_future(self._runner.submit_threadsafe(self._search(query)))
+
+  def close(self):
+    if self._client is not None:
+      self._runner.submit_threadsafe(self._client.aclose()).result()
+      self._client = None
+    self._runner.close()
+    if self._pool is not None:
+      self._pool.shutdown(wait=False, cancel_futures=True)
+      self._pool = None
+    if self.cache is not None:
+      self.cache.close()
+
+  async def _search(self, query: str) -> list[WebPassage]:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + self.deadline
+    self.stats.searches += 1
+    client = self._http()
+    try:
+      results = await asyncio.wait_for(
+        self.backend.search(client, query, self.max_results), self.deadline
+      )
+    except asyncio.TimeoutError:
+      self.stats.timed_out += 1
+      return []
+    except (httpx.HTTPError, ValueError, KeyError, TypeError, AttributeError):
+      # A malformed backend reply costs this turn its web context, not the whole turn.
+      logger.warning("Web search for %r failed", query, exc_info=True)
+      self.stats.failed += 1
+      return []
+
+    tasks = {asyncio.create_task(self._page(client, result)): result for result in results}
+    texts: dict[str, str] = {}
+    if tasks:
+      done, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - loop.time()))
+      for task in pending:
+        task.cancel()
+      self.stats.timed_out += len(pending)
+      for task in done:
+        if task.exception() is not None:
+          self.stats.failed += 1
+        elif task.result():
+          texts[tasks[task].url] = task.result()
+    # Pages that missed the deadline still contribute their search snippets.
+    pages = [(result, texts.get(result.url) or result.snippet) for result in results]
+    return self._select(rank_passages(query, pages, self.passage_chars))
+
+  def _select(self, ranked: list[WebPassage]) -> list[WebPassage]:
+    selected: list[WebPassage] = []
+    used = 0
+    for passage in ranked:
+      tokens = self.tokenizer.count(passage.text)
+      if used + tokens > self.max_tokens:
+        continue
+      selected.append(passage)
+      used += tokens
+    return selected
+
+  async def _page(self, client: httpx.AsyncClient, result: WebResult) -> Optional[str]:
+    now = self.clock()
+    cached = self.cache.get(result.url) if self.cache is not None else None
+    if cached is not None and now - cached.fetched_at < self.ttl:
+      self.stats.cached += 1
+      return cached.text
+
+    headers = {}
+    if cached is not None and cached.etag:
+      headers["If-None-Match"] = cached.etag
+    if cached is not None and cached.last_modified:
+      headers["If-Modified-Since"] = cached.last_modified
+    response = await client.get(result.url, headers=headers)
+    if response.status_code == 304 and cached is not None:
+      self.stats.revalidated += 1
+      self.cache.touch(result.url, now)
+      return cached.text
+    response.raise_for_status()
+    self.stats.fetched += 1
+
+    content_type = response.headers.get("content-type", "text/html")
+    body = response.text[: self.max_page_chars]
+    if "html" in content_type:
+      text = await self._extract(body)
+    elif content_type.startswith("text/"):
+      text = body
+    else:
+      return None
+    if self.cache is not None:
+      self.cache.put(
+        CachedPage(
+          result.url,
+          text,
+          response.headers.get("etag"),
+          response.headers.get("last-modified"),
+          now,
+        )
+      )
+    return text
+
+  async def _extract(self, html: str) -> str:
+    loop = asyncio.get_running_loop()
+    if not self.extract_workers:
+      return await loop.run_in_executor(None, extract_text, html)
+    if self._pool is None:
+      self._pool = ProcessPoolExecutor(
+        max_workers=self.extract_workers, mp_context=multiprocessing.get_context("spawn")
+      )
+    return await loop.run_in_executor(self._pool, extract_text, html)
+
+  def _http(self) -> httpx.AsyncClient:
+    if self._client is None:
+      self._client = httpx.AsyncClient(
+        transport=self.transport,
+        timeout=httpx.Timeout(self.deadline),
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        follow_redirects=True,
+        headers={"User-Agent": "personal-agent"},
+      )
+    return self._client
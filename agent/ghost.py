@@ -1,21 +1,71 @@
-from typing import Optional, Any
-from agent.model import Message, CompletionResponse, BaseModel
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterator, Optional, Sequence, Union
+from agent.model import (
+  Message,
+  CompletionResponse,
+  CompletionChunk,
+  CompletionAccumulator,
+  BaseModel,
+  Tool,
+)
+from agent.context import ContextWindow, PromptLayout
+from agent.history import HistoryView
+from agent.summary import RollingSummarizer
+from agent.telemetry import DISABLED, Telemetry
+from agent.tools import ToolRegistry
+
+if TYPE_CHECKING:
+  from agent.session import SessionLog
 
 
 class Ghost:
-  def __init__(self, model: BaseModel):
+  def __init__(
+    self,
+    model: BaseModel,
+    context_window: Optional[ContextWindow] = None,
+    summarizer: Optional[RollingSummarizer] = None,
+    tools: Optional[ToolRegistry] = None,
+    max_tool_rounds: int = 8,
+    session: Optional["SessionLog"] = None,
+    telemetry: Optional[Telemetry] = None,
+    layout: Optional[PromptLayout] = None,
+  ):
     self.model = model
-    self.conversation_history: list[Message] = []
+    self.context_window = context_window
+    self.summarizer = summarizer
+    self.tools = tools
+    self.max_tool_rounds = max_tool_rounds
+    self.session = session
+    self.telemetry = telemetry or DISABLED
+    self.layout = layout
+    self._head: Optional[Message] = None
+    self.conversation_history: Union[list[Message], "SessionLog"] = (
+      session if session is not None else []
+    )
     self.internal_state: dict[str, Any] = {}
+    if summarizer:
+      summarizer.rebase(len(self.conversation_history))
 
   def add_message(self, message: Message):
     self.conversation_history.append(message)
+    if self.summarizer and message.role == "assistant":
+      self.summarizer.schedule(self.conversation_history)
+
+  def get_conversation_history(self, offset: int = 0, limit: Optional[int] = None) -> list[Message]:
+    return list(self.history_view(offset, limit))
+
+  def history_view(self, offset: int = 0, limit: Optional[int] = None) -> HistoryView:
+    return HistoryView(self.conversation_history, offset, None if limit is None else offset + limit)
 
-  def get_conversation_history(self) -> list[Message]:
-    return self.conversation_history.copy()
+  def iter_history(self, reverse: bool = False) -> Iterator[Message]:
+    history = self.conversation_history
+    return iter(reversed(history) if reverse else history)
 
   def clear_history(self):
     self.conversation_history.clear()
+    if self.context_window:
+      self.context_window.clear()
+    if self.summarizer:
+      self.summarizer.reset()
 
   def update_internal_state(self, key: str, value: Any):
     self.internal_state[key] = value
@@ -24,22 +74,191 @@ class Ghost:
     return self.internal_state.get(key)
 
   def process(self, context: Optional[dict[str, Any]] = None) -> CompletionResponse:
-    messages = self._prepare_messages(context)
-    return self.model.generate_completion(messages)
+    response = self._generate(self._prepare_messages(context), self._tools())
+    for round_index in range(self.max_tool_rounds):
+      if not (self.tools and response.tool_calls):
+        return response
+      self._add_tool_call(response)
+      with self.telemetry.span("tools", calls=len(response.tool_calls)):
+        results = self.tools.run(response.tool_calls)
+      for result in results:
+        self.add_message(result)
+      response = self._generate(self._prepare_messages(context), self._tools(round_index + 1))
+    return response
 
   async def process_async(self, context: Optional[dict[str, Any]] = None) -> CompletionResponse:
-    messages = self._prepare_messages(context)
-    return await self.model.generate_completion_async(messages)
+    response = await self._generate_async(self._prepare_messages(context), self._tools())
+    for round_index in range(self.max_tool_rounds):
+      if not (self.tools and response.tool_calls):
+        return response
+      self._add_tool_call(response)
+      with self.telemetry.span("tools", calls=len(response.tool_calls)):
+        results = await self.tools.execute(response.tool_calls)
+      for result in results:
+        self.add_message(result)
+      response = await self._generate_async(
+        self._prepare_messages(context), self._tools(round_index + 1)
+      )
+    return response
+
+  def process_stream(self, context: Optional[dict[str, Any]] = None) -> Iterator[CompletionChunk]:
+    if self.tools:
+      return self._process_stream_with_tools(context)
+    return self._stream(self._prepare_messages(context))
+
+  def process_stream_async(
+    self, context: Optional[dict[str, Any]] = None
+  ) -> AsyncIterator[CompletionChunk]:
+    if self.tools:
+      return self._process_stream_with_tools_async(context)
+    return self._stream_async(self._prepare_messages(context))
+
+  def _process_stream_with_tools(
+    self, context: Optional[dict[str, Any]] = None
+  ) -> Iterator[CompletionChunk]:
+    for round_index in range(self.max_tool_rounds + 1):
+      accumulator = CompletionAccumulator()
+      for chunk in self._stream(self._prepare_messages(context), self._tools(round_index)):
+        accumulator.add(chunk)
+        chunk = self._visible_chunk(chunk)
+        if chunk is not None:
+          yield chunk
+      response = accumulator.result()
+      if not response.tool_calls:
+        return
+      self._add_tool_call(response)
+      with self.telemetry.span("tools", calls=len(response.tool_calls)):
+        results = self.tools.run(response.tool_calls)
+      for result in results:
+        self.add_message(result)
+
+  async def _process_stream_with_tools_async(
+    self, context: Optional[dict[str, Any]] = None
+  ) -> AsyncIterator[CompletionChunk]:
+    for round_index in range(self.max_tool_rounds + 1):
+      accumulator = CompletionAccumulator()
+      async for chunk in self._stream_async(
+        self._prepare_messages(context), self._tools(round_index)
+      ):
+        accumulator.add(chunk)
+        chunk = self._visible_chunk(chunk)
+        if chunk is not None:
+          yield chunk
+      response = accumulator.result()
+      if not response.tool_calls:
+        return
+      self._add_tool_call(response)
+      with self.telemetry.span("tools", calls=len(response.tool_calls)):
+        results = await self.tools.execute(response.tool_calls)
+      for result in results:
+        self.add_message(result)
+
+  def _generate(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> CompletionResponse:
+    with self.telemetry.span("model", model=self._model_name()) as span:
+      response = self.model.generate_completion(messages, tools)
+      self.telemetry.record_usage(span, response.usage, self._model_name())
+    return response
+
+  async def _generate_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> CompletionResponse:
+    with self.telemetry.span("model", model=self._model_name()) as span:
+      response = await self.model.generate_completion_async(messages, tools)
+      self.telemetry.record_usage(span, response.usage, self._model_name())
+    return response
+
+  def _stream(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> Iterator[CompletionChunk]:
+    chunks = self.model.stream_completion(messages, tools)
+    return self.telemetry.trace_stream(chunks, "model", model=self._model_name())
+
+  def _stream_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> AsyncIterator[CompletionChunk]:
+    chunks = self.model.stream_completion_async(messages, tools)
+    return self.telemetry.trace_stream_async(chunks, "model", model=self._model_name())
+
+  def _model_name(self) -> str:
+    name = getattr(self.model, "model_name", None)
+    return name if isinstance(name, str) else type(self.model).__name__
+
+  def _tools(self, round_index: int = 0) -> Optional[list[Tool]]:
+    # Tools are withheld on the last round so the model has to answer in text.
+    if not self.tools or round_index >= self.max_tool_rounds:
+      return None
+    return self.tools.definitions()
+
+  def _add_tool_call(self, response: CompletionResponse):
+    self.add_message(
+      Message(role="assistant", content=response.content, tool_calls=response.tool_calls)
+    )
+
+  def _visible_chunk(self, chunk: CompletionChunk) -> Optional[CompletionChunk]:
+    if not chunk.tool_calls and chunk.finish_reason != "tool_calls":
+      return chunk
+    if chunk.content:
+      return CompletionChunk(content=chunk.content)
+    return None
 
   def _prepare_messages(self, context: Optional[dict[str, Any]] = None) -> list[Message]:
-    messages = self.conversation_history.copy()
-    if context:
-      context_message = Message(role="system", content=self._format_context(context))
-      messages.insert(0, context_message)
+    with self.telemetry.span("prepare") as span:
+      messages = self._build_messages(context)
+      span.set(messages=len(messages))
     return messages
 
+  def _build_messages(self, context: Optional[dict[str, Any]] = None) -> list[Message]:
+    if self.layout is not None:
+      return self._build_stable_messages(context or {})
+    prefix = []
+    history = self.conversation_history
+    if context:
+      prefix.append(Message(role="system", content=self._format_context(context)))
+    prefix, history = self._summarized(prefix, history)
+    if self.context_window:
+      return self.context_window.fit(history, prefix)
+    return [*prefix, *history]
+
+  def _build_stable_messages(self, context: dict[str, Any]) -> list[Message]:
+    # Only appends may change the bytes before the tail, so the provider can reuse its prefix cache.
+    stable_keys = self.layout.stable_keys
+    stable = {key: value for key, value in context.items() if key in stable_keys}
+    volatile = {key: value for key, value in context.items() if key not in stable_keys}
+    head = self._stable_head(stable)
+    prefix, history = self._summarized([head] if head else [], self.conversation_history)
+    tail = [Message(role="system", content=self._format_context(volatile))] if volatile else []
+    if self.context_window:
+      fitted = self.context_window.fit(history, [*prefix, *tail])
+      return [*prefix, *fitted[len(prefix) + len(tail) :], *tail]
+    return [*prefix, *history, *tail]
+
+  def _stable_head(self, stable: dict[str, Any]) -> Optional[Message]:
+    parts = [self.layout.system_prompt] if self.layout.system_prompt else []
+    if stable:
+      parts.append(self._format_context(stable))
+    if not parts:
+      return None
+    content = "\n\n".join(parts)
+    if self._head is None or self._head.content != content:
+      self._head = Message(role="system", content=content)
+    return self._head
+
+  def _summarized(
+    self, prefix: list[Message], history: Sequence[Message]
+  ) -> tuple[list[Message], Sequence[Message]]:
+    if self.summarizer:
+      checkpoint = self.summarizer.checkpoint
+      summary_message = self.summarizer.summary_message()
+      if summary_message:
+        prefix.append(summary_message)
+        history = HistoryView(history, checkpoint.covered)
+    return prefix, history
+
   def _format_context(self, context: dict[str, Any]) -> str:
     parts = []
-    for key, value in context.items():
+    items = sorted(context.items()) if self.layout is not None else context.items()
+    for key, value in items:
       parts.append(f"{key}: {value}")
     return "\n".join(parts)
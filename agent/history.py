@@ -0,0 +1,66 @@
+from collections.abc import Sequence
+from itertools import islice
+from typing import Iterator, Optional, Union, overload
+from agent.model import Message
+
+
+class HistoryView(Sequence):
+  __slots__ = ("_items", "_start", "_stop")
+
+  def __init__(self, items: Sequence[Message], start: int = 0, stop: Optional[int] = None):
+    if isinstance(items, HistoryView):
+      start, stop = items._bounds(start, stop)
+      items = items._items
+    length = len(items)
+    self._items = items
+    self._start = min(max(start, 0), length)
+    self._stop = self._start if stop is not None and stop < self._start else stop
+    if self._stop is not None:
+      self._stop = min(self._stop, length)
+
+  def __len__(self) -> int:
+    stop = len(self._items) if self._stop is None else self._stop
+    return max(0, stop - self._start)
+
+  @overload
+  def __getitem__(self, index: int) -> Message: ...
+
+  @overload
+  def __getitem__(self, index: slice) -> "HistoryView": ...
+
+  def __getitem__(self, index: Union[int, slice]) -> Union[Message, "HistoryView"]:
+    length = len(self)
+    if isinstance(index, slice):
+      start, stop, step = index.indices(length)
+      if step != 1:
+        raise ValueError("HistoryView slices must be contiguous")
+      return HistoryView(self._items, self._start + start, self._start + max(start, stop))
+    if index < 0:
+      index += length
+    if not 0 <= index < length:
+      raise IndexError("history index out of range")
+    return self._items[self._start + index]
+
+  def __iter__(self) -> Iterator[Message]:
+    stop = len(self._items) if self._stop is None else self._stop
+    if isinstance(self._items, list):
+      return islice(self._items, self._start, stop)
+    return (self._items[index] for index in range(self._start, stop))
+
+  def __reversed__(self) -> Iterator[Message]:
+    stop = len(self._items) if self._stop is None else self._stop
+    return (self._items[index] for index in range(stop - 1, self._start - 1, -1))
+
+  def __eq__(self, other) -> bool:
+    if not isinstance(other, Sequence):
+      return NotImplemented
+    return len(other) == len(self) and all(a == b for a, b in zip(self, other))
+
+  def __repr__(self) -> str:
+    return f"HistoryView(start={self._start}, length={len(self)})"
+
+  def _bounds(self, start: int, stop: Optional[int]) -> tuple[int, Optional[int]]:
+    end = self._stop if stop is None else self._start + stop
+    if self._stop is not None and end is not None:
+      end = min(end, self._stop)
+    return self._start + start, end
@@ -0,0 +1,48 @@
+import weakref
+from collections import OrderedDict
+from operator import is_
+from typing import Any, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Entries die with their owners, so the cap only needs to cover every message a turn touches:
+# a full 200k-token window of one-word messages. A smaller LRU misses on every in-order pass.
+DEFAULT_CAPACITY = 65_536
+
+
+class IdentityCache(Generic[T]):
+  def __init__(self, capacity: int = DEFAULT_CAPACITY):
+    self.capacity = capacity
+    self._entries: OrderedDict[int, tuple[weakref.ref, tuple, T]] = OrderedDict()
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  def get(self, owner: Any, fields: tuple) -> Optional[T]:
+    entry = self._entries.get(id(owner))
+    if entry is None or entry[0]() is not owner or not all(map(is_, entry[1], fields)):
+      return None
+    self._entries.move_to_end(id(owner))
+    return entry[2]
+
+  def put(self, owner: Any, fields: tuple, value: T) -> T:
+    # Weak references let an entry go with its owner, so a dead owner's id is never reused.
+    key = id(owner)
+    self._entries[key] = (weakref.ref(owner, self._forget(key)), fields, value)
+    self._entries.move_to_end(key)
+    while len(self._entries) > self.capacity:
+      self._entries.popitem(last=False)
+    return value
+
+  def clear(self):
+    self._entries.clear()
+
+  def _forget(self, key: int):
+    entries = weakref.ref(self._entries)
+
+    def forget(ref: weakref.ref):
+      current = entries()
+      if current is not None and key in current and current[key][0] is ref:
+        current.pop(key, None)
+
+    return forget
@@ -1,12 +1,7 @@
+import sys
 from abc import ABC, abstractmethod
-from typing import Any, Optional
-from dataclasses import dataclass
-
-
-@dataclass
-class Message:
-  role: str
-  content: str
+from typing import Any, AsyncIterator, Iterator, Optional
+from dataclasses import dataclass, field
 
 
 @dataclass
@@ -16,21 +11,108 @@ class Tool:
   parameters: dict[str, Any]
 
 
-@dataclass
+@dataclass(slots=True)
 class ToolCall:
   id: str
   name: str
   arguments: str
 
 
+@dataclass(slots=True, weakref_slot=True)
+class Message:
+  role: str
+  content: str
+  tool_calls: Optional[list[ToolCall]] = None
+  tool_call_id: Optional[str] = None
+
+  def __post_init__(self):
+    self.role = sys.intern(self.role)
+
+
+@dataclass
+class Usage:
+  prompt_tokens: int = 0
+  completion_tokens: int = 0
+  cached_tokens: int = 0
+
+
 @dataclass
 class CompletionResponse:
   content: str
   tool_calls: list[ToolCall]
   finish_reason: str
+  usage: Optional[Usage] = None
+
+
+@dataclass
+class ToolCallDelta:
+  index: int
+  id: Optional[str] = None
+  name: Optional[str] = None
+  arguments: str = ""
+
+
+@dataclass
+class CompletionChunk:
+  content: str = ""
+  tool_calls: list[ToolCallDelta] = field(default_factory=list)
+  finish_reason: Optional[str] = None
+  usage: Optional[Usage] = None
+
+
+class CompletionAccumulator:
+  def __init__(self):
+    self.content_parts: list[str] = []
+    self.tool_calls: dict[int, ToolCall] = {}
+    self.finish_reason = ""
+    self.usage: Optional[Usage] = None
+
+  def add(self, chunk: CompletionChunk):
+    if chunk.content:
+      self.content_parts.append(chunk.content)
+    for delta in chunk.tool_calls:
+      tool_call = self.tool_calls.get(delta.index)
+      if tool_call is None:
+        tool_call = ToolCall(id="", name="", arguments="")
+        self.tool_calls[delta.index] = tool_call
+      if delta.id:
+        tool_call.id = delta.id
+      if delta.name:
+        tool_call.name += delta.name
+      tool_call.arguments += delta.arguments
+    if chunk.finish_reason:
+      self.finish_reason = chunk.finish_reason
+    if chunk.usage is not None:
+      self.usage = chunk.usage
+
+  def result(self) -> CompletionResponse:
+    return CompletionResponse(
+      content="".join(self.content_parts),
+      tool_calls=[self.tool_calls[index] for index in sorted(self.tool_calls)],
+      finish_reason=self.finish_reason,
+      usage=self.usage,
+    )
+
+
+def chunk_from_response(response: CompletionResponse) -> CompletionChunk:
+  return CompletionChunk(
+    content=response.content,
+    tool_calls=[
+      ToolCallDelta(index=index, id=tc.id, name=tc.name, arguments=tc.arguments)
+      for index, tc in enumerate(response.tool_calls)
+    ],
+    finish_reason=response.finish_reason,
+    usage=response.usage,
+  )
 
 
 class BaseModel(ABC):
+  @property
+  def model_name(self) -> str:
+    # Used as a metric label, so it must stay a short stable string for wrappers too.
+    model = getattr(self, "model", None)
+    return model if isinstance(model, str) and model else type(self).__name__
+
   @abstractmethod
   def generate_completion(
     self, messages: list[Message], tools: Optional[list[Tool]] = None
@@ -42,3 +124,13 @@ class BaseModel(ABC):
     self, messages: list[Message], tools: Optional[list[Tool]] = None
   ) -> CompletionResponse:
     pass
+
+  def stream_completion(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> Iterator[CompletionChunk]:
+    yield chunk_from_response(self.generate_completion(messages, tools))
+
+  async def stream_completion_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> AsyncIterator[CompletionChunk]:
+    yield chunk_from_response(await self.generate_completion_async(messages, tools))
@@ -0,0 +1,108 @@
+import asyncio
+import inspect
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Optional
+
+_loaders: dict[str, Callable[[], Any]] = {}
+_resources: dict[str, Any] = {}
+
+
+def resource(name: str) -> Any:
+  if name not in _resources:
+    _resources[name] = _loaders[name]()
+  return _resources[name]
+
+
+def _warm(loaders: dict[str, Callable[[], Any]]):
+  _loaders.update(loaders)
+  for name in loaders:
+    resource(name)
+
+
+def _ready() -> int:
+  return os.getpid()
+
+
+def check_worker(fn: Callable) -> Callable:
+  # Workers are pickled by name; a bound method or closure would ship its whole object instead.
+  if inspect.ismethod(fn) or "<" in getattr(fn, "__qualname__", "<"):
+    raise TypeError(
+      f"{fn!r} cannot run in a worker process; pass a module-level function and load "
+      "shared state through offload.resource()"
+    )
+  return fn
+
+
+@dataclass
+class Offloaded:
+  fn: Callable[[Any], Any]
+
+  def __post_init__(self):
+    check_worker(self.fn)
+
+  def __call__(self, value: Any) -> Any:
+    return self.fn(value)
+
+
+class ProcessPool:
+  def __init__(
+    self,
+    max_workers: Optional[int] = None,
+    preload: Optional[dict[str, Callable[[], Any]]] = None,
+  ):
+    self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+    self.preload = dict(preload or {})
+    # Inline fallbacks in this process resolve resources lazily from the same loaders.
+    _loaders.update(self.preload)
+    self._executor: Optional[ProcessPoolExecutor] = None
+    self._lock = threading.Lock()
+
+  def start(self) -> list[int]:
+    executor = self._pool()
+    futures = [executor.submit(_ready) for _ in range(self.max_workers)]
+    return [future.result() for future in futures]
+
+  def submit(self, fn: Callable, *args: Any) -> Future:
+    return self._pool().submit(fn, *args)
+
+  def call(self, fn: Callable, *args: Any) -> Any:
+    return self.submit(fn, *args).result()
+
+  async def run(self, fn: Callable, *args: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(self._pool(), partial(fn, *args))
+
+  def close(self):
+    with self._lock:
+      if self._executor is not None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+  def _pool(self) -> ProcessPoolExecutor:
+    with self._lock:
+      if self._executor is None:
+        # Forking a process that already runs threads can deadlock the child.
+        self._executor = ProcessPoolExecutor(
+          max_workers=self.max_workers,
+          mp_context=multiprocessing.get_context("spawn"),
+          initializer=_warm,
+          initargs=(self.preload,),
+        )
+      return self._executor
+
+
+_shared: Optional[ProcessPool] = None
+_shared_lock = threading.Lock()
+
+
+def shared_pool() -> ProcessPool:
+  global _shared
+  with _shared_lock:
+    if _shared is None:
+      _shared = ProcessPool()
+    return _shared
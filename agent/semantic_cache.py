@@ -0,0 +1,124 @@
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+import numpy as np
+from agent.enhancers.rag import Embedder, HashingEmbedder
+from agent.model import CompletionResponse
+from agent.sources.cache import CacheStats, decode_response, encode_response
+
+
+@dataclass
+class SemanticKey:
+  vector: np.ndarray
+  fingerprint: int
+
+
+def context_fingerprint(parts: Iterable[str]) -> int:
+  digest = hashlib.sha256("\x00".join(parts).encode()).digest()
+  return int.from_bytes(digest[:8], "little", signed=True)
+
+
+class SemanticCache:
+  def __init__(
+    self,
+    embedder: Optional[Embedder] = None,
+    threshold: float = 0.9,
+    max_entries: int = 1000,
+    ttl: Optional[float] = None,
+    routes: Optional[Iterable[str]] = None,
+    stateless_routes: Iterable[str] = (),
+    clock: Callable = time.time,
+  ):
+    self.embedder = embedder or HashingEmbedder()
+    self.threshold = threshold
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self.routes = set(routes) if routes is not None else None
+    self.disabled_routes: set[str] = set()
+    self.stateless_routes = set(stateless_routes)
+    self.clock = clock
+    self.stats = CacheStats()
+    self._vectors = np.zeros((max_entries, 2 * self.embedder.dim), dtype=np.float32)
+    self._fingerprints = np.zeros(max_entries, dtype=np.int64)
+    self._last_used = np.full(max_entries, -np.inf)
+    self._expires = np.full(max_entries, np.inf)
+    self._responses: list[Optional[str]] = [None] * max_entries
+    self._size = 0
+    self._lock = threading.Lock()
+
+  def __len__(self) -> int:
+    return self._size
+
+  def enabled(self, route: str) -> bool:
+    if route in self.disabled_routes:
+      return False
+    return self.routes is None or route in self.routes
+
+  def enable(self, route: str):
+    self.disabled_routes.discard(route)
+    if self.routes is not None:
+      self.routes.add(route)
+
+  def disable(self, route: str):
+    self.disabled_routes.add(route)
+
+  def stateless(self, route: str) -> bool:
+    return route in self.stateless_routes
+
+  def key(self, query: str, context: Iterable[str] = (), previous: str = "") -> SemanticKey:
+    # The previous turn is matched by similarity like the query, so paraphrased follow-ups
+    # still hit while a follow-up in an unrelated conversation does not.
+    dim = self.embedder.dim
+    vector = np.zeros(2 * dim, dtype=np.float32)
+    if previous:
+      vector[:dim], vector[dim:] = self.embedder.embed([query, previous])
+    else:
+      vector[:dim] = self.embedder.embed([query])[0]
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+      vector /= norm
+    return SemanticKey(vector, context_fingerprint(context))
+
+  def lookup(self, key: SemanticKey) -> Optional[CompletionResponse]:
+    now = self.clock()
+    with self._lock:
+      if self._size:
+        scores = self._vectors[: self._size] @ key.vector
+        live = (self._fingerprints[: self._size] == key.fingerprint) & (
+          self._expires[: self._size] > now
+        )
+        scores[~live] = -np.inf
+        row = int(np.argmax(scores))
+        if scores[row] >= self.threshold:
+          self._last_used[row] = now
+          self.stats.hits += 1
+          self.stats.memory_hits += 1
+          return decode_response(self._responses[row])
+      self.stats.misses += 1
+      return None
+
+  def store(self, key: SemanticKey, response: CompletionResponse):
+    if response.tool_calls:
+      return
+    now = self.clock()
+    with self._lock:
+      if self._size < self.max_entries:
+        row = self._size
+        self._size += 1
+      else:
+        expired = np.flatnonzero(self._expires <= now)
+        row = int(expired[0]) if len(expired) else int(np.argmin(self._last_used))
+      self._vectors[row] = key.vector
+      self._fingerprints[row] = key.fingerprint
+      self._last_used[row] = now
+      self._expires[row] = now + self.ttl if self.ttl is not None else np.inf
+      self._responses[row] = encode_response(response)
+
+  def clear(self):
+    with self._lock:
+      self._size = 0
+      self._last_used[:] = -np.inf
+      self._expires[:] = np.inf
+      self._responses = [None] * self.max_entries
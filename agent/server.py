@@ -0,0 +1,447 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Optional
+from urllib.parse import parse_qs, urlsplit
+from agent.model import CompletionAccumulator, CompletionChunk, CompletionResponse, Message
+from agent.session import SessionLog, message_to_dict, new_session_id
+from agent.shell import Shell
+from agent.telemetry import PROMETHEUS_CONTENT_TYPE, Telemetry
+
+logger = logging.getLogger(__name__)
+
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+MESSAGES_PATH = re.compile(r"^/sessions/([^/]+)/messages$")
+PREFETCH_PATH = re.compile(r"^/sessions/([^/]+)/prefetch$")
+SESSION_PATH = re.compile(r"^/sessions/([^/]+)$")
+REASONS = {
+  200: "OK",
+  400: "Bad Request",
+  404: "Not Found",
+  405: "Method Not Allowed",
+  408: "Request Timeout",
+  413: "Payload Too Large",
+  429: "Too Many Requests",
+  500: "Internal Server Error",
+}
+
+
+class SessionBusyError(RuntimeError):
+  pass
+
+
+class HTTPError(Exception):
+  def __init__(self, status: int, message: str):
+    super().__init__(message)
+    self.status = status
+
+
+@dataclass
+class AgentSession:
+  id: str
+  shell: Shell
+  log: SessionLog
+  last_used: float
+  lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+  waiting: int = 0
+
+  @property
+  def busy(self) -> bool:
+    return self.waiting > 0 or self.lock.locked()
+
+
+@dataclass
+class ManagerStats:
+  active: int
+  busy: int
+  created: int
+  rehydrated: int
+  evicted: int
+  turns: int
+
+
+class SessionManager:
+  def __init__(
+    self,
+    build: Callable[[SessionLog], Shell],
+    directory: str = ".agent/sessions",
+    max_active: int = 256,
+    idle_timeout: float = 600.0,
+    max_queued: int = 4,
+    max_turns: int = 64,
+    log_cache_size: int = 256,
+    clock: Callable = time.monotonic,
+  ):
+    self.build = build
+    self.directory = directory
+    self.max_active = max_active
+    self.idle_timeout = idle_timeout
+    self.max_queued = max_queued
+    self.log_cache_size = log_cache_size
+    self.clock = clock
+    self.sessions: OrderedDict[str, AgentSession] = OrderedDict()
+    self.created = 0
+    self.rehydrated = 0
+    self.evicted = 0
+    self.turns = 0
+    self._slots = asyncio.Semaphore(max_turns)
+
+  def stats(self) -> ManagerStats:
+    return ManagerStats(
+      active=len(self.sessions),
+      busy=sum(session.busy for session in self.sessions.values()),
+      created=self.created,
+      rehydrated=self.rehydrated,
+      evicted=self.evicted,
+      turns=self.turns,
+    )
+
+  def get(self, session_id: str) -> AgentSession:
+    _check_session_id(session_id)
+    session = self.sessions.get(session_id)
+    if session is not None:
+      self.sessions.move_to_end(session_id)
+      return session
+    # Make room first so the session handed back can never be the one evicted.
+    self._shrink(self.max_active - 1)
+    log = SessionLog(self.directory, session_id, cache_size=self.log_cache_size)
+    if len(log):
+      self.rehydrated += 1
+    else:
+      self.created += 1
+    session = AgentSession(session_id, self.build(log), log, self.clock())
+    self.sessions[session_id] = session
+    return session
+
+  @asynccontextmanager
+  async def turn(self, session_id: str) -> AsyncIterator[AgentSession]:
+    session = self.get(session_id)
+    if session.waiting >= self.max_queued:
+      raise SessionBusyError(f"Session {session_id} already has {session.waiting} queued turns")
+    session.waiting += 1
+    try:
+      await session.lock.acquire()
+    finally:
+      session.waiting -= 1
+    try:
+      async with self._slots:
+        self.turns += 1
+        yield session
+    finally:
+      session.last_used = self.clock()
+      session.lock.release()
+      self._shrink(self.max_active)
+
+  async def complete(self, session_id: str, content: str) -> CompletionResponse:
+    async with self.turn(session_id) as session:
+      return await session.shell.process_input_async(Message(role="user", content=content))
+
+  async def stream(self, session_id: str, content: str) -> AsyncIterator[CompletionChunk]:
+    async with self.turn(session_id) as session:
+      message = Message(role="user", content=content)
+      async for chunk in session.shell.process_input_stream_async(message):
+        yield chunk
+
+  def prefetch(self, session_id: str, content: str) -> int:
+    return self.get(session_id).shell.prefetch(content)
+
+  def history(self, session_id: str, offset: int = 0, limit: Optional[int] = None) -> list[Message]:
+    _check_session_id(session_id)
+    session = self.sessions.get(session_id)
+    if session is not None:
+      return session.shell.ghost.get_conversation_history(offset, limit)
+    # Reads neither create a session nor make one resident; an evicted log is read and closed.
+    if not os.path.exists(os.path.join(self.directory, f"{session_id}.wal")):
+      return []
+    log = SessionLog(self.directory, session_id, cache_size=self.log_cache_size)
+    try:
+      return log[offset : None if limit is None else offset + limit]
+    finally:
+      log.close()
+
+  def clear(self, session_id: str):
+    session = self.get(session_id)
+    if session.busy:
+      raise SessionBusyError(f"Session {session_id} is busy")
+    session.shell.ghost.clear_history()
+
+  def evict(self, session_id: str) -> bool:
+    session = self.sessions.get(session_id)
+    if session is None or session.busy:
+      return False
+    del self.sessions[session_id]
+    session.log.close()
+    self.evicted += 1
+    return True
+
+  def evict_idle(self) -> int:
+    cutoff = self.clock() - self.idle_timeout
+    idle = [s.id for s in self.sessions.values() if s.last_used <= cutoff and not s.busy]
+    return sum(self.evict(session_id) for session_id in idle)
+
+  async def sweep(self, interval: float = 30.0):
+    while True:
+      await asyncio.sleep(interval)
+      self.evict_idle()
+
+  def close(self):
+    for session in self.sessions.values():
+      session.log.close()
+    self.sessions.clear()
+
+  def _shrink(self, limit: int):
+    if len(self.sessions) <= limit:
+      return
+    # Oldest first; sessions with a turn in flight or queued stay resident until they finish.
+    for session_id in list(self.sessions):
+      if len(self.sessions) <= limit:
+        break
+      self.evict(session_id)
+
+
+class AgentServer:
+  def __init__(
+    self,
+    manager: SessionManager,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    max_body: int = 1_000_000,
+    read_timeout: float = 30.0,
+    write_buffer: int = 64 * 1024,
+    sweep_interval: float = 30.0,
+    telemetry: Optional[Telemetry] = None,
+  ):
+    self.manager = manager
+    self.telemetry = telemetry
+    self.host = host
+    self.port = port
+    self.max_body = max_body
+    self.read_timeout = read_timeout
+    self.write_buffer = write_buffer
+    self.sweep_interval = sweep_interval
+    self._server: Optional[asyncio.Server] = None
+    self._sweeper: Optional[asyncio.Task] = None
+
+  @property
+  def address(self) -> tuple[str, int]:
+    return self._server.sockets[0].getsockname()[:2]
+
+  async def start(self):
+    self._server = await asyncio.start_server(self._handle, self.host, self.port)
+    self._sweeper = asyncio.create_task(self.manager.sweep(self.sweep_interval))
+
+  async def serve_forever(self):
+    if self._server is None:
+      await self.start()
+    try:
+      await self._server.serve_forever()
+    finally:
+      await self.stop()
+
+  async def stop(self):
+    if self._sweeper is not None:
+      self._sweeper.cancel()
+      await asyncio.gather(self._sweeper, return_exceptions=True)
+      self._sweeper = None
+    if self._server is not None:
+      self._server.close()
+      await self._server.wait_closed()
+      self._server = None
+    self.manager.close()
+
+  async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    writer.transport.set_write_buffer_limits(high=self.write_buffer)
+    try:
+      method, path, query, headers, body = await asyncio.wait_for(
+        self._read_request(reader), self.read_timeout
+      )
+      await self._route(writer, method, path, query, headers, body)
+    except HTTPError as e:
+      await self._send_json(writer, e.status, {"error": str(e)})
+    except asyncio.TimeoutError:
+      await self._send_json(writer, 408, {"error": "Request timed out"})
+    except (ConnectionError, asyncio.IncompleteReadError):
+      pass
+    except Exception as e:
+      logger.exception("Request failed")
+      await self._send_json(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+    finally:
+      writer.close()
+      try:
+        await writer.wait_closed()
+      except ConnectionError:
+        pass
+
+  async def _read_request(self, reader: asyncio.StreamReader) -> tuple:
+    request_line = (await reader.readline()).decode("latin-1").split()
+    if len(request_line) != 3:
+      raise HTTPError(400, "Malformed request line")
+    method, target, _ = request_line
+    headers: dict[str, str] = {}
+    while True:
+      line = await reader.readline()
+      if line in (b"\r\n", b"\n", b""):
+        break
+      name, _, value = line.decode("latin-1").partition(":")
+      headers[name.strip().lower()] = value.strip()
+    try:
+      length = int(headers.get("content-length") or 0)
+    except ValueError:
+      raise HTTPError(400, "Invalid Content-Length")
+    if length < 0:
+      raise HTTPError(400, "Invalid Content-Length")
+    if length > self.max_body:
+      raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    url = urlsplit(target)
+    return method.upper(), url.path, parse_qs(url.query), headers, body
+
+  async def _route(
+    self,
+    writer: asyncio.StreamWriter,
+    method: str,
+    path: str,
+    query: dict[str, list[str]],
+    headers: dict[str, str],
+    body: bytes,
+  ):
+    if path == "/health" and method == "GET":
+      return await self._send_json(writer, 200, self.manager.stats().__dict__)
+    if path == "/metrics" and method == "GET" and self.telemetry is not None:
+      return await self._send(
+        writer, 200, PROMETHEUS_CONTENT_TYPE, self.telemetry.metrics.render().encode()
+      )
+    if path == "/sessions" and method == "POST":
+      return await self._send_json(writer, 200, {"session_id": new_session_id()})
+
+    match = MESSAGES_PATH.match(path)
+    if match and method == "POST":
+      payload = _json_body(body)
+      content = payload.get("content")
+      if not isinstance(content, str) or not content:
+        raise HTTPError(400, "Body must include a non-empty 'content' string")
+      stream = payload.get("stream", "text/event-stream" in headers.get("accept", ""))
+      return await self._post_message(writer, _session_id(match), content, stream)
+    if match and method == "GET":
+      offset = _int_param(query, "offset", 0)
+      limit = _int_param(query, "limit", 100)
+      messages = self._call(self.manager.history, _session_id(match), offset, limit)
+      return await self._send_json(
+        writer, 200, {"messages": [message_to_dict(message) for message in messages]}
+      )
+
+    match = PREFETCH_PATH.match(path)
+    if match and method == "POST":
+      content = _json_body(body).get("content")
+      if not isinstance(content, str):
+        raise HTTPError(400, "Body must include a 'content' string")
+      started = self._call(self.manager.prefetch, _session_id(match), content)
+      return await self._send_json(writer, 200, {"prefetching": started})
+
+    match = SESSION_PATH.match(path)
+    if match and method == "DELETE":
+      session_id = _session_id(match)
+      self._call(self.manager.clear, session_id)
+      return await self._send_json(writer, 200, {"cleared": session_id})
+    if match or path in ("/health", "/sessions"):
+      raise HTTPError(405, f"{method} not allowed on {path}")
+    raise HTTPError(404, f"No route for {path}")
+
+  async def _post_message(
+    self, writer: asyncio.StreamWriter, session_id: str, content: str, stream: bool
+  ):
+    if not stream:
+      try:
+        response = await self.manager.complete(session_id, content)
+      except SessionBusyError as e:
+        raise HTTPError(429, str(e))
+      return await self._send_json(
+        writer, 200, {"content": response.content, "finish_reason": response.finish_reason}
+      )
+
+    chunks = self.manager.stream(session_id, content)
+    accumulator = CompletionAccumulator()
+    try:
+      # Pull the first chunk before committing to a 200 so admission errors map to statuses.
+      first = await anext(chunks, None)
+    except SessionBusyError as e:
+      raise HTTPError(429, str(e))
+
+    writer.write(
+      b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+      b"Connection: close\r\n\r\n"
+    )
+    try:
+      if first is not None:
+        accumulator.add(first)
+        await _send_event(writer, "chunk", {"content": first.content})
+        async for chunk in chunks:
+          accumulator.add(chunk)
+          if chunk.content:
+            await _send_event(writer, "chunk", {"content": chunk.content})
+      await _send_event(writer, "done", {"finish_reason": accumulator.result().finish_reason})
+    except ConnectionError:
+      raise
+    except Exception as e:
+      logger.exception("Streamed turn failed")
+      await _send_event(writer, "error", {"error": f"{type(e).__name__}: {e}"})
+    finally:
+      await chunks.aclose()
+
+  def _call(self, fn: Callable, *args):
+    try:
+      return fn(*args)
+    except SessionBusyError as e:
+      raise HTTPError(429, str(e))
+
+  async def _send_json(self, writer: asyncio.StreamWriter, status: int, data: dict):
+    await self._send(writer, status, "application/json", json.dumps(data).encode())
+
+  async def _send(self, writer: asyncio.StreamWriter, status: int, content_type: str, body: bytes):
+    writer.write(
+      f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\nContent-Type: {content_type}\r\n"
+      f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+      + body
+    )
+    await writer.drain()
+
+
+async def _send_event(writer: asyncio.StreamWriter, event: str, data: dict):
+  writer.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+  # Waiting for the socket buffer to drain stops pulling tokens for slow clients.
+  await writer.drain()
+
+
+def _check_session_id(session_id: str):
+  if not SESSION_ID_PATTERN.match(session_id):
+    raise ValueError(f"Invalid session id: {session_id!r}")
+
+
+def _session_id(match: re.Match) -> str:
+  session_id = match.group(1)
+  if not SESSION_ID_PATTERN.match(session_id):
+    raise HTTPError(400, f"Invalid session id: {session_id!r}")
+  return session_id
+
+
+def _json_body(body: bytes) -> dict:
+  try:
+    payload = json.loads(body or b"{}")
+  except ValueError:
+    raise HTTPError(400, "Body must be JSON")
+  if not isinstance(payload, dict):
+    raise HTTPError(400, "Body must be a JSON object")
+  return payload
+
+
+def _int_param(query: dict[str, list[str]], name: str, default: int) -> int:
+  try:
+    return max(0, int(query.get(name, [default])[0]))
+  except ValueError:
+    raise HTTPError(400, f"Query parameter {name!r} must be an integer")
@@ -0,0 +1,247 @@
+import json
+import os
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Callable, Iterator, Optional, Union, overload
+from agent.model import Message, ToolCall
+
+OFFSET = struct.Struct("<Q")
+
+
+def message_to_dict(message: Message) -> dict:
+  data = {"role": message.role, "content": message.content}
+  if message.tool_calls:
+    data["tool_calls"] = [
+      {"id": call.id, "name": call.name, "arguments": call.arguments} for call in message.tool_calls
+    ]
+  if message.tool_call_id is not None:
+    data["tool_call_id"] = message.tool_call_id
+  return data
+
+
+def message_from_dict(data: dict) -> Message:
+  tool_calls = data.get("tool_calls")
+  return Message(
+    role=data["role"],
+    content=data["content"],
+    tool_calls=[ToolCall(**call) for call in tool_calls] if tool_calls else None,
+    tool_call_id=data.get("tool_call_id"),
+  )
+
+
+def encode_message(message: Message) -> bytes:
+  encoded = json.dumps(message_to_dict(message), ensure_ascii=False, separators=(",", ":"))
+  return encoded.encode() + b"\n"
+
+
+def decode_message(line: bytes) -> Message:
+  return message_from_dict(json.loads(line))
+
+
+def new_session_id() -> str:
+  return uuid.uuid4().hex[:12]
+
+
+class SessionLog(Sequence):
+  def __init__(
+    self,
+    directory: str,
+    session_id: str,
+    sync_every: int = 32,
+    sync_interval: float = 1.0,
+    snapshot_every: int = 256,
+    cache_size: int = 4096,
+    clock: Callable = time.monotonic,
+  ):
+    self.session_id = session_id
+    self.sync_every = sync_every
+    self.sync_interval = sync_interval
+    self.snapshot_every = snapshot_every
+    self.cache_size = cache_size
+    self.clock = clock
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, session_id)
+    self.log_path = f"{base}.wal"
+    self.index_path = f"{base}.idx"
+    self.snapshot_path = f"{base}.snapshot"
+    self._log = os.open(self.log_path, os.O_RDWR | os.O_CREAT, 0o644)
+    self._index = os.open(self.index_path, os.O_RDWR | os.O_CREAT, 0o644)
+    self._cache: OrderedDict[int, Message] = OrderedDict()
+    self._lock = threading.RLock()
+    self._unsynced = 0
+    self._last_sync = clock()
+    self._since_snapshot = 0
+    self.replayed = self._recover()
+
+  @classmethod
+  def open(cls, directory: str, session_id: Optional[str] = None, **kwargs) -> "SessionLog":
+    return cls(directory, session_id or new_session_id(), **kwargs)
+
+  def __len__(self) -> int:
+    return self._count
+
+  @overload
+  def __getitem__(self, index: int) -> Message: ...
+
+  @overload
+  def __getitem__(self, index: slice) -> list[Message]: ...
+
+  def __getitem__(self, index: Union[int, slice]) -> Union[Message, list[Message]]:
+    with self._lock:
+      if isinstance(index, slice):
+        start, stop, step = index.indices(self._count)
+        if step != 1:
+          return [self[i] for i in range(start, stop, step)]
+        return self._read(start, stop)
+      if index < 0:
+        index += self._count
+      if not 0 <= index < self._count:
+        raise IndexError("session index out of range")
+      message = self._cache.get(index)
+      if message is not None:
+        self._cache.move_to_end(index)
+        return message
+      return self._read(index, index + 1)[0]
+
+  def __iter__(self) -> Iterator[Message]:
+    return self.pages()
+
+  def __reversed__(self) -> Iterator[Message]:
+    return self.pages(reverse=True)
+
+  def pages(self, page_size: int = 256, reverse: bool = False) -> Iterator[Message]:
+    count = self._count
+    starts = range(0, count, page_size)
+    for start in reversed(starts) if reverse else starts:
+      page = self[start : min(start + page_size, count)]
+      yield from reversed(page) if reverse else page
+
+  def copy(self) -> list[Message]:
+    return self[:]
+
+  def append(self, message: Message):
+    with self._lock:
+      record = encode_message(message)
+      os.pwrite(self._index, OFFSET.pack(self._log_size), self._count * OFFSET.size)
+      os.pwrite(self._log, record, self._log_size)
+      self._log_size += len(record)
+      self._remember(self._count, message)
+      self._count += 1
+      self._unsynced += 1
+      self._since_snapshot += 1
+      if self._since_snapshot >= self.snapshot_every:
+        self.snapshot()
+      elif (
+        self._unsynced >= self.sync_every or self.clock() - self._last_sync >= self.sync_interval
+      ):
+        self.sync()
+
+  def extend(self, messages: Sequence[Message]):
+    for message in messages:
+      self.append(message)
+
+  def sync(self):
+    with self._lock:
+      if not self._unsynced:
+        return
+      os.fsync(self._log)
+      os.fsync(self._index)
+      self._unsynced = 0
+      self._last_sync = self.clock()
+
+  def snapshot(self):
+    with self._lock:
+      self._unsynced = max(self._unsynced, 1)
+      self.sync()
+      temporary = f"{self.snapshot_path}.tmp"
+      with open(temporary, "w", encoding="utf-8") as f:
+        json.dump({"count": self._count, "log_size": self._log_size, "created_at": time.time()}, f)
+        f.flush()
+        os.fsync(f.fileno())
+      os.replace(temporary, self.snapshot_path)
+      self._since_snapshot = 0
+
+  def clear(self):
+    with self._lock:
+      os.ftruncate(self._log, 0)
+      os.ftruncate(self._index, 0)
+      self._count = 0
+      self._log_size = 0
+      self._cache.clear()
+      self.snapshot()
+
+  def close(self):
+    with self._lock:
+      if self._log < 0:
+        return
+      self.snapshot()
+      os.close(self._log)
+      os.close(self._index)
+      self._log = self._index = -1
+
+  def _recover(self) -> int:
+    count, log_size = 0, 0
+    if os.path.exists(self.snapshot_path):
+      with open(self.snapshot_path, encoding="utf-8") as f:
+        snapshot = json.load(f)
+      count, log_size = snapshot["count"], snapshot["log_size"]
+    if log_size > os.fstat(self._log).st_size:
+      count, log_size = 0, 0
+    # Only the log written after the snapshot is scanned, so startup cost tracks the tail.
+    tail = os.pread(self._log, os.fstat(self._log).st_size - log_size, log_size)
+    offsets = []
+    position = 0
+    while position < len(tail):
+      end = tail.find(b"\n", position)
+      if end < 0:
+        break
+      try:
+        json.loads(tail[position:end])
+      except ValueError:
+        break
+      offsets.append(log_size + position)
+      position = end + 1
+    self._count = count + len(offsets)
+    self._log_size = log_size + position
+    os.ftruncate(self._log, self._log_size)
+    os.ftruncate(self._index, count * OFFSET.size)
+    if offsets:
+      os.pwrite(
+        self._index, b"".join(OFFSET.pack(offset) for offset in offsets), count * OFFSET.size
+      )
+      self._unsynced = len(offsets)
+      self.snapshot()
+    return len(offsets)
+
+  def _read(self, start: int, stop: int) -> list[Message]:
+    if start >= stop:
+      return []
+    cached = [self._cache.get(position) for position in range(start, stop)]
+    if None not in cached:
+      return cached
+    raw = os.pread(self._index, (stop - start) * OFFSET.size, start * OFFSET.size)
+    offsets = [offset for (offset,) in OFFSET.iter_unpack(raw)]
+    end = self._offset(stop) if stop < self._count else self._log_size
+    data = os.pread(self._log, end - offsets[0], offsets[0])
+    messages = []
+    for position, offset in enumerate(offsets, start):
+      message = cached[position - start]
+      if message is None:
+        line_end = data.index(b"\n", offset - offsets[0])
+        message = decode_message(data[offset - offsets[0] : line_end])
+        self._remember(position, message)
+      messages.append(message)
+    return messages
+
+  def _offset(self, index: int) -> int:
+    return OFFSET.unpack(os.pread(self._index, OFFSET.size, index * OFFSET.size))[0]
+
+  def _remember(self, index: int, message: Message):
+    self._cache[index] = message
+    self._cache.move_to_end(index)
+    if len(self._cache) > self.cache_size:
+      self._cache.popitem(last=False)
@@ -1,6 +1,27 @@
-from typing import Callable
-from agent.model import Message, CompletionResponse
+import asyncio
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from functools import partial
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Iterator, Optional
+from agent.model import (
+  Message,
+  CompletionResponse,
+  CompletionChunk,
+  CompletionAccumulator,
+  chunk_from_response,
+)
+from agent.background import BackgroundRunner, Pending, run_sync
 from agent.ghost import Ghost
+from agent.offload import Offloaded, ProcessPool, check_worker, shared_pool
+from agent.telemetry import Telemetry
+
+if TYPE_CHECKING:
+  from agent.enhancers.memory import MemoryExtractor, MemoryStore
+  from agent.enhancers.rag import Retriever
+  from agent.enhancers.web import WebPassage, WebSearcher
+  from agent.semantic_cache import SemanticCache, SemanticKey
 
 
 class InputPort:
@@ -8,8 +29,8 @@ class InputPort:
     self.name = name
     self.enhancers: list[Callable[[Message], Message]] = []
 
-  def add_enhancer(self, enhancer: Callable[[Message], Message]):
-    self.enhancers.append(enhancer)
+  def add_enhancer(self, enhancer: Callable[[Message], Message], process: bool = False):
+    self.enhancers.append(Offloaded(enhancer) if process else enhancer)
 
   def process(self, message: Message) -> Message:
     for enhancer in self.enhancers:
@@ -21,54 +42,271 @@ class OutputPort:
   def __init__(self, name: str):
     self.name = name
     self.processors: list[Callable[[CompletionResponse], CompletionResponse]] = []
+    self.chunk_processors: list[Callable[[CompletionChunk], CompletionChunk]] = []
+
+  def add_processor(
+    self, processor: Callable[[CompletionResponse], CompletionResponse], process: bool = False
+  ):
+    self.processors.append(Offloaded(processor) if process else processor)
 
-  def add_processor(self, processor: Callable[[CompletionResponse], CompletionResponse]):
-    self.processors.append(processor)
+  def add_chunk_processor(self, processor: Callable[[CompletionChunk], CompletionChunk]):
+    self.chunk_processors.append(processor)
 
   def process(self, response: CompletionResponse) -> CompletionResponse:
     for processor in self.processors:
       response = processor(response)
     return response
 
+  def process_chunk(self, chunk: CompletionChunk) -> CompletionChunk:
+    for processor in self.chunk_processors:
+      chunk = processor(chunk)
+    return chunk
+
+
+@dataclass
+class EnhancerTiming:
+  name: str
+  duration: float
+  status: str
+  error: Optional[str] = None
+
+
+def merge_contribution(message: Message, contribution: Optional[str]) -> Message:
+  if not contribution:
+    return message
+  return Message(role=message.role, content=f"{message.content}\n\n{contribution}")
+
+
+SKIPPED = (None, 0.0, "skipped", None)
+TURN_CONTEXT_KEY = "retrieved"
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def word_coverage(prefetched: str, final: str) -> float:
+  final_words = set(WORD_PATTERN.findall(final.lower()))
+  if not final_words:
+    return 0.0
+  return len(final_words & set(WORD_PATTERN.findall(prefetched.lower()))) / len(final_words)
+
+
+@dataclass
+class PrefetchStats:
+  started: int = 0
+  used: int = 0
+  discarded: int = 0
+  cancelled: int = 0
+  saved: float = 0.0
+
+  @property
+  def hit_rate(self) -> float:
+    decided = self.used + self.discarded
+    return self.used / decided if decided else 0.0
+
+
+class _Prefetch:
+  def __init__(self, text: str, min_similarity: float):
+    self.text = text
+    self.min_similarity = min_similarity
+    self.started = time.perf_counter()
+    self.jobs: dict["ContextEnhancer", Pending] = {}
+    self.finished: dict["ContextEnhancer", float] = {}
+
+  def add(self, enhancer: "ContextEnhancer", pending: Pending):
+    self.jobs[enhancer] = pending
+    pending.add_done_callback(lambda _: self.finished.setdefault(enhancer, time.perf_counter()))
+
+  def saved(self, claimed: float) -> float:
+    # Enhancers run concurrently, so the turn saves the longest head start among them.
+    return max(min(self.finished.get(e, claimed), claimed) - self.started for e in self.jobs)
+
+  def cancel(self):
+    for pending in self.jobs.values():
+      pending.cancel()
+
+  def drop_unfinished_tasks(self):
+    # The sync path cannot await a task on an event loop; it may even be blocking that loop.
+    for enhancer, pending in list(self.jobs.items()):
+      if isinstance(pending, asyncio.Task) and not pending.done():
+        pending.get_loop().call_soon_threadsafe(pending.cancel)
+        del self.jobs[enhancer]
+
+
+async def _await_pending(pending: Pending):
+  if isinstance(pending, Future):
+    return await asyncio.wrap_future(pending)
+  return await pending
+
+
+def _call_enhancer(job: Callable) -> tuple:
+  begun = time.perf_counter()
+  try:
+    result = job()
+  except Exception as e:
+    return None, time.perf_counter() - begun, "error", e
+  return result, time.perf_counter() - begun, "ok", None
+
 
 class ContextEnhancer:
-  def __init__(self, name: str):
+  independent = False
+  # A module-level function(message) -> contribution that replaces contribute() in the shell's
+  # process pool, set with staticmethod(). It must reach its state through offload.resource().
+  worker: Optional[Callable[[Message], Optional[str]]] = None
+
+  def __init__(self, name: str, timeout: Optional[float] = None):
     self.name = name
+    self.timeout = timeout
 
   def enhance(self, message: Message) -> Message:
-    return message
+    return merge_contribution(message, self.contribute(message))
 
+  async def enhance_async(self, message: Message) -> Message:
+    if type(self).enhance is not ContextEnhancer.enhance:
+      return await asyncio.to_thread(self.enhance, message)
+    return merge_contribution(message, await self.contribute_async(message))
 
-class RAGEnhancer(ContextEnhancer):
-  def __init__(self, name: str = "rag"):
-    super().__init__(name)
+  def contribute(self, message: Message) -> Optional[str]:
+    if type(self).contribute_async is ContextEnhancer.contribute_async:
+      return None
+    return run_sync(self.contribute_async(message))
 
-  def enhance(self, message: Message) -> Message:
-    return message
+  async def contribute_async(self, message: Message) -> Optional[str]:
+    return await asyncio.to_thread(self.contribute, message)
 
+  def observe_turn(self, message: Message, response: CompletionResponse):
+    pass
 
-class WebSearchEnhancer(ContextEnhancer):
-  def __init__(self, name: str = "web_search"):
+
+class RAGEnhancer(ContextEnhancer):
+  independent = True
+
+  def __init__(
+    self,
+    name: str = "rag",
+    retriever: Optional["Retriever"] = None,
+    top_k: int = 4,
+    min_score: float = 0.1,
+  ):
     super().__init__(name)
+    self.retriever = retriever
+    self.top_k = top_k
+    self.min_score = min_score
+
+  def contribute(self, message: Message) -> Optional[str]:
+    if self.retriever is None:
+      return None
+    results = [
+      result
+      for result in self.retriever.search(message.content, self.top_k)
+      if result.score >= self.min_score
+    ]
+    if not results:
+      return None
+    passages = "\n\n".join(
+      f"[{result.chunk.source} > {result.chunk.heading}]\n{result.chunk.text}" for result in results
+    )
+    return f"Relevant knowledge:\n{passages}"
 
-  def enhance(self, message: Message) -> Message:
-    return message
+
+class WebSearchEnhancer(ContextEnhancer):
+  independent = True
+
+  def __init__(
+    self,
+    name: str = "web_search",
+    searcher: Optional["WebSearcher"] = None,
+    timeout: Optional[float] = None,
+  ):
+    super().__init__(name, timeout=timeout)
+    self.searcher = searcher
+
+  def contribute(self, message: Message) -> Optional[str]:
+    if self.searcher is None:
+      return None
+    return self._format(self.searcher.search(message.content))
+
+  async def contribute_async(self, message: Message) -> Optional[str]:
+    if self.searcher is None:
+      return None
+    return self._format(await self.searcher.search_async(message.content))
+
+  def _format(self, passages: list["WebPassage"]) -> Optional[str]:
+    if not passages:
+      return None
+    results = "\n\n".join(f"[{p.title or p.url} - {p.url}]\n{p.text}" for p in passages)
+    return f"Web results:\n{results}"
 
 
 class PersistentMemoryEnhancer(ContextEnhancer):
-  def __init__(self, name: str = "persistent_memory"):
+  independent = True
+
+  def __init__(
+    self,
+    name: str = "persistent_memory",
+    store: Optional["MemoryStore"] = None,
+    extractor: Optional["MemoryExtractor"] = None,
+    namespace: str = "default",
+    top_k: int = 5,
+    min_score: float = 0.2,
+  ):
     super().__init__(name)
-
-  def enhance(self, message: Message) -> Message:
-    return message
+    self.store = store
+    self.extractor = extractor
+    self.namespace = namespace
+    self.top_k = top_k
+    self.min_score = min_score
+
+  def contribute(self, message: Message) -> Optional[str]:
+    if self.store is None:
+      return None
+    results = self.store.search(self.namespace, message.content, self.top_k, self.min_score)
+    if not results:
+      return None
+    facts = "\n".join(f"- {memory.text}" for memory, _ in results)
+    return f"Relevant memories:\n{facts}"
+
+  def observe_turn(self, message: Message, response: CompletionResponse):
+    if self.extractor is not None:
+      self.extractor.schedule(self.namespace, message, response)
+
+
+class _TimedOutput:
+  __slots__ = ("port", "duration", "chunks")
+
+  def __init__(self, port: OutputPort):
+    self.port = port
+    self.duration = 0.0
+    self.chunks = 0
+
+  def __call__(self, chunk: CompletionChunk) -> CompletionChunk:
+    begun = time.perf_counter()
+    chunk = self.port.process_chunk(chunk)
+    self.duration += time.perf_counter() - begun
+    self.chunks += 1
+    return chunk
 
 
 class Shell:
-  def __init__(self, ghost: Ghost):
+  def __init__(
+    self,
+    ghost: Ghost,
+    semantic_cache: Optional["SemanticCache"] = None,
+    enhancer_budget: Optional[float] = None,
+    process_pool: Optional[ProcessPool] = None,
+  ):
     self.ghost = ghost
+    self.semantic_cache = semantic_cache
+    self.enhancer_budget = enhancer_budget
+    self.process_pool = process_pool
     self.input_ports: dict[str, InputPort] = {}
     self.output_ports: dict[str, OutputPort] = {}
     self.context_enhancers: list[ContextEnhancer] = []
+    self.enhancer_timings: list[EnhancerTiming] = []
+    self.enhancer_latency: dict[str, float] = {}
+    self._enhancer_pool: Optional[ThreadPoolExecutor] = None
+    self.prefetch_stats = PrefetchStats()
+    self._prefetches: dict[str, _Prefetch] = {}
+    self._prefetched: dict[ContextEnhancer, Pending] = {}
+    self._runner: Optional[BackgroundRunner] = None
 
   def add_input_port(self, port: InputPort):
     self.input_ports[port.name] = port
@@ -77,38 +315,415 @@ class Shell:
     self.output_ports[port.name] = port
 
   def add_context_enhancer(self, enhancer: ContextEnhancer):
+    if enhancer.worker is not None:
+      check_worker(enhancer.worker)
     self.context_enhancers.append(enhancer)
 
-  def process_input(self, message: Message, port_name: str = "default") -> CompletionResponse:
+  def prefetch(self, text: str, port_name: str = "default", min_similarity: float = 0.75) -> int:
+    self.cancel_prefetch(port_name)
+    enhancers = [enhancer for enhancer in self.context_enhancers if enhancer.independent]
+    if not enhancers or not text.strip():
+      return 0
     port = self.input_ports.get(port_name, InputPort("default"))
-    enhanced_message = port.process(message)
-
-    for enhancer in self.context_enhancers:
-      enhanced_message = enhancer.enhance(enhanced_message)
+    message = self._run_steps(port.enhancers, Message(role="user", content=text))
+    if self._runner is None:
+      self._runner = BackgroundRunner()
+    prefetch = _Prefetch(text, min_similarity)
+    for enhancer in enhancers:
+      prefetch.add(enhancer, self._runner.submit(self._contribute_async(enhancer, message)))
+    self._prefetches[port_name] = prefetch
+    self.prefetch_stats.started += 1
+    return len(enhancers)
+
+  def cancel_prefetch(self, port_name: str = "default") -> bool:
+    prefetch = self._prefetches.pop(port_name, None)
+    if prefetch is None:
+      return False
+    prefetch.cancel()
+    self.prefetch_stats.cancelled += 1
+    self._count_prefetch("cancelled")
+    return True
 
-    self.ghost.add_message(enhanced_message)
-    response = self.ghost.process()
-    self.ghost.add_message(Message(role="assistant", content=response.content))
+  def process_input(self, message: Message, port_name: str = "default") -> CompletionResponse:
+    with self.telemetry.span("turn", port=port_name) as turn:
+      key, context, response = self._add_input(message, port_name, turn)
+      if response is None:
+        response = self.ghost.process(context)
+        self._cache_response(key, response)
+      self.ghost.add_message(Message(role="assistant", content=response.content))
+      self._observe_turn(message, response)
 
     return response
 
   async def process_input_async(
     self, message: Message, port_name: str = "default"
   ) -> CompletionResponse:
-    port = self.input_ports.get(port_name, InputPort("default"))
-    enhanced_message = port.process(message)
-
-    for enhancer in self.context_enhancers:
-      enhanced_message = enhancer.enhance(enhanced_message)
-
-    self.ghost.add_message(enhanced_message)
-    response = await self.ghost.process_async()
-    self.ghost.add_message(Message(role="assistant", content=response.content))
+    with self.telemetry.span("turn", port=port_name) as turn:
+      key, context, response = await self._add_input_async(message, port_name, turn)
+      if response is None:
+        response = await self.ghost.process_async(context)
+        self._cache_response(key, response)
+      self.ghost.add_message(Message(role="assistant", content=response.content))
+      self._observe_turn(message, response)
 
     return response
 
+  def process_input_stream(
+    self, message: Message, port_name: str = "default", output_port_name: str = "default"
+  ) -> Iterator[CompletionChunk]:
+    with self.telemetry.span("turn", port=port_name, stream=True) as turn:
+      key, context, response = self._add_input(message, port_name, turn)
+      output_port = self.output_ports.get(output_port_name, OutputPort("default"))
+      output = self._chunk_output(output_port)
+
+      if response is not None:
+        yield output(chunk_from_response(response))
+      else:
+        accumulator = CompletionAccumulator()
+        for chunk in self.ghost.process_stream(context):
+          accumulator.add(chunk)
+          yield output(chunk)
+        response = accumulator.result()
+        self._cache_response(key, response)
+
+      self.ghost.add_message(Message(role="assistant", content=response.content))
+      self._observe_turn(message, response)
+      self._record_output(output)
+
+  async def process_input_stream_async(
+    self, message: Message, port_name: str = "default", output_port_name: str = "default"
+  ) -> AsyncIterator[CompletionChunk]:
+    with self.telemetry.span("turn", port=port_name, stream=True) as turn:
+      key, context, response = await self._add_input_async(message, port_name, turn)
+      output_port = self.output_ports.get(output_port_name, OutputPort("default"))
+      output = self._chunk_output(output_port)
+
+      if response is not None:
+        yield output(chunk_from_response(response))
+      else:
+        accumulator = CompletionAccumulator()
+        async for chunk in self.ghost.process_stream_async(context):
+          accumulator.add(chunk)
+          yield output(chunk)
+        response = accumulator.result()
+        self._cache_response(key, response)
+
+      self.ghost.add_message(Message(role="assistant", content=response.content))
+      self._observe_turn(message, response)
+      self._record_output(output)
+
   def process_output(
     self, response: CompletionResponse, port_name: str = "default"
   ) -> CompletionResponse:
     port = self.output_ports.get(port_name, OutputPort("default"))
-    return port.process(response)
+    with self.telemetry.span("output", port=port_name):
+      return self._run_steps(port.processors, response)
+
+  async def process_output_async(
+    self, response: CompletionResponse, port_name: str = "default"
+  ) -> CompletionResponse:
+    port = self.output_ports.get(port_name, OutputPort("default"))
+    with self.telemetry.span("output", port=port_name):
+      return await self._run_steps_async(port.processors, response)
+
+  @property
+  def telemetry(self) -> Telemetry:
+    return self.ghost.telemetry
+
+  @property
+  def pool(self) -> ProcessPool:
+    return self.process_pool or shared_pool()
+
+  def _run_steps(self, steps: list[Callable], value: Any) -> Any:
+    for step in steps:
+      value = self.pool.call(step.fn, value) if isinstance(step, Offloaded) else step(value)
+    return value
+
+  async def _run_steps_async(self, steps: list[Callable], value: Any) -> Any:
+    for step in steps:
+      if isinstance(step, Offloaded):
+        value = await self.pool.run(step.fn, value)
+      else:
+        value = step(value)
+    return value
+
+  def _chunk_output(self, port: OutputPort) -> Callable[[CompletionChunk], CompletionChunk]:
+    if not port.chunk_processors or not self.telemetry.enabled:
+      return port.process_chunk
+    return _TimedOutput(port)
+
+  def _record_output(self, output: Callable):
+    if isinstance(output, _TimedOutput):
+      self.telemetry.record("output", output.duration, chunks=output.chunks)
+
+  def _process_port(self, port: InputPort, message: Message) -> Message:
+    if not port.enhancers:
+      return message
+    with self.telemetry.span("input", port=port.name):
+      return self._run_steps(port.enhancers, message)
+
+  async def _process_port_async(self, port: InputPort, message: Message) -> Message:
+    if not port.enhancers:
+      return message
+    with self.telemetry.span("input", port=port.name):
+      return await self._run_steps_async(port.enhancers, message)
+
+  def _enhance_input(self, message: Message, port_name: str) -> Message:
+    port = self.input_ports.get(port_name, InputPort("default"))
+    enhanced_message = self._process_port(port, message)
+    started = self._start_enhancers(message, port_name, sync=True)
+
+    for independent, group in self._enhancer_groups():
+      if independent:
+        original = enhanced_message
+        jobs = [(enhancer, self._contribute_job(enhancer, original)) for enhancer in group]
+        for contribution in self._run_enhancers(jobs, started):
+          enhanced_message = merge_contribution(enhanced_message, contribution)
+      else:
+        jobs = [(group[0], partial(self._enhance, group[0], enhanced_message))]
+        enhanced_message = self._run_enhancers(jobs, started)[0] or enhanced_message
+
+    return enhanced_message
+
+  async def _enhance_input_async(self, message: Message, port_name: str) -> Message:
+    port = self.input_ports.get(port_name, InputPort("default"))
+    enhanced_message = await self._process_port_async(port, message)
+    started = self._start_enhancers(message, port_name, sync=False)
+
+    for independent, group in self._enhancer_groups():
+      if independent:
+        original = enhanced_message
+        jobs = [(enhancer, self._contribute_job_async(enhancer, original)) for enhancer in group]
+        for contribution in await self._run_enhancers_async(jobs, started):
+          enhanced_message = merge_contribution(enhanced_message, contribution)
+      else:
+        jobs = [(group[0], partial(self._enhance_async, group[0], enhanced_message))]
+        enhanced_message = (await self._run_enhancers_async(jobs, started))[0] or enhanced_message
+
+    return enhanced_message
+
+  def _start_enhancers(self, message: Message, port_name: str, sync: bool) -> float:
+    self.enhancer_timings = []
+    started = time.perf_counter()
+    self._prefetched = self._claim_prefetch(message, port_name, started, sync)
+    return started
+
+  def _claim_prefetch(
+    self, message: Message, port_name: str, claimed: float, sync: bool
+  ) -> dict[ContextEnhancer, Pending]:
+    prefetch = self._prefetches.pop(port_name, None)
+    if prefetch is None:
+      return {}
+    if sync:
+      prefetch.drop_unfinished_tasks()
+    if not prefetch.jobs or word_coverage(prefetch.text, message.content) < prefetch.min_similarity:
+      prefetch.cancel()
+      self.prefetch_stats.discarded += 1
+      self._count_prefetch("discarded")
+      return {}
+    saved = prefetch.saved(claimed)
+    self.prefetch_stats.used += 1
+    self.prefetch_stats.saved += saved
+    self._count_prefetch("used", saved)
+    return prefetch.jobs
+
+  def _count_prefetch(self, outcome: str, saved: Optional[float] = None):
+    if not self.telemetry.enabled:
+      return
+    self.telemetry.metrics.inc("prefetch_total", outcome=outcome)
+    if saved is not None:
+      self.telemetry.metrics.observe("prefetch_saved_seconds", saved)
+
+  def _contribute_job(self, enhancer: ContextEnhancer, message: Message) -> Callable:
+    pending = self._prefetched.get(enhancer)
+    if pending is not None:
+      return pending.result
+    return lambda: self._contribute(enhancer, message)
+
+  def _contribute_job_async(self, enhancer: ContextEnhancer, message: Message) -> Callable:
+    pending = self._prefetched.get(enhancer)
+    if pending is not None:
+      return lambda: _await_pending(pending)
+    return lambda: self._contribute_async(enhancer, message)
+
+  def _contribute(self, enhancer: ContextEnhancer, message: Message) -> Optional[str]:
+    if enhancer.worker is not None:
+      return self.pool.call(enhancer.worker, message)
+    return enhancer.contribute(message)
+
+  async def _contribute_async(self, enhancer: ContextEnhancer, message: Message) -> Optional[str]:
+    if enhancer.worker is not None:
+      return await self.pool.run(enhancer.worker, message)
+    return await enhancer.contribute_async(message)
+
+  def _enhance(self, enhancer: ContextEnhancer, message: Message) -> Message:
+    if enhancer.worker is not None:
+      return merge_contribution(message, self.pool.call(enhancer.worker, message))
+    return enhancer.enhance(message)
+
+  async def _enhance_async(self, enhancer: ContextEnhancer, message: Message) -> Message:
+    if enhancer.worker is not None:
+      return merge_contribution(message, await self.pool.run(enhancer.worker, message))
+    return await enhancer.enhance_async(message)
+
+  def _enhancer_groups(self) -> list[tuple[bool, list[ContextEnhancer]]]:
+    groups: list[tuple[bool, list[ContextEnhancer]]] = []
+    for enhancer in self.context_enhancers:
+      if enhancer.independent and groups and groups[-1][0]:
+        groups[-1][1].append(enhancer)
+      else:
+        groups.append((enhancer.independent, [enhancer]))
+    return groups
+
+  def _enhancer_limit(
+    self, enhancer: ContextEnhancer, started: float
+  ) -> tuple[bool, Optional[float]]:
+    limit = enhancer.timeout
+    if self.enhancer_budget is None:
+      return True, limit
+    remaining = self.enhancer_budget - (time.perf_counter() - started)
+    if remaining <= 0 or self.enhancer_latency.get(enhancer.name, 0.0) > remaining:
+      return False, None
+    return True, remaining if limit is None else min(limit, remaining)
+
+  def _run_enhancers(self, jobs: list[tuple[ContextEnhancer, Callable]], started: float) -> list:
+    planned = [(enhancer, job, *self._enhancer_limit(enhancer, started)) for enhancer, job in jobs]
+    if len(planned) == 1 and planned[0][3] is None:
+      enhancer, job, allowed, _ = planned[0]
+      outcome = _call_enhancer(job) if allowed else SKIPPED
+      return [self._record(enhancer, outcome)]
+
+    if self._enhancer_pool is None:
+      self._enhancer_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="enhancer")
+    submitted = [
+      (
+        enhancer,
+        self._enhancer_pool.submit(_call_enhancer, job) if allowed else None,
+        limit,
+        time.perf_counter(),
+      )
+      for enhancer, job, allowed, limit in planned
+    ]
+    results = []
+    for enhancer, future, limit, begun in submitted:
+      if future is None:
+        outcome = SKIPPED
+      else:
+        wait = None if limit is None else max(0.0, begun + limit - time.perf_counter())
+        try:
+          outcome = future.result(timeout=wait)
+        except FutureTimeoutError:
+          outcome = (None, limit, "timeout", None)
+      results.append(self._record(enhancer, outcome))
+    return results
+
+  async def _run_enhancers_async(
+    self, jobs: list[tuple[ContextEnhancer, Callable]], started: float
+  ) -> list:
+    async def run(enhancer: ContextEnhancer, job: Callable) -> tuple:
+      allowed, limit = self._enhancer_limit(enhancer, started)
+      if not allowed:
+        return SKIPPED
+      begun = time.perf_counter()
+      try:
+        result = await asyncio.wait_for(job(), limit)
+      except asyncio.TimeoutError:
+        return None, limit, "timeout", None
+      except Exception as e:
+        return None, time.perf_counter() - begun, "error", e
+      return result, time.perf_counter() - begun, "ok", None
+
+    outcomes = await asyncio.gather(*(run(enhancer, job) for enhancer, job in jobs))
+    return [self._record(enhancer, outcome) for (enhancer, _), outcome in zip(jobs, outcomes)]
+
+  def _record(self, enhancer: ContextEnhancer, outcome: tuple):
+    result, duration, status, error = outcome
+    prefetched = enhancer in self._prefetched
+    # Waiting on a prefetch says nothing about how long the enhancer itself takes.
+    if status in ("ok", "timeout") and not prefetched:
+      previous = self.enhancer_latency.get(enhancer.name)
+      self.enhancer_latency[enhancer.name] = (
+        duration if previous is None else 0.7 * previous + 0.3 * duration
+      )
+    description = f"{type(error).__name__}: {error}" if error else None
+    timing_status = "prefetched" if prefetched and status == "ok" else status
+    self.enhancer_timings.append(
+      EnhancerTiming(enhancer.name, duration, timing_status, description)
+    )
+    self.telemetry.record(
+      f"enhancer.{enhancer.name}", duration, status, error=description, prefetched=prefetched
+    )
+    return result
+
+  def _add_input(self, message: Message, port_name: str, turn) -> tuple:
+    key = self._stateless_key(message, port_name)
+    response = self._cached_response(key, turn) if key is not None else None
+    if response is not None:
+      port = self.input_ports.get(port_name, InputPort("default"))
+      self.cancel_prefetch(port_name)
+      self.ghost.add_message(self._process_port(port, message))
+      return key, None, response
+    enhanced_message = self._enhance_input(message, port_name)
+    return self._finish_input(message, enhanced_message, port_name, key, turn)
+
+  async def _add_input_async(self, message: Message, port_name: str, turn) -> tuple:
+    key = self._stateless_key(message, port_name)
+    response = self._cached_response(key, turn) if key is not None else None
+    if response is not None:
+      port = self.input_ports.get(port_name, InputPort("default"))
+      self.cancel_prefetch(port_name)
+      self.ghost.add_message(await self._process_port_async(port, message))
+      return key, None, response
+    enhanced_message = await self._enhance_input_async(message, port_name)
+    return self._finish_input(message, enhanced_message, port_name, key, turn)
+
+  def _finish_input(
+    self,
+    message: Message,
+    enhanced_message: Message,
+    port_name: str,
+    key: Optional["SemanticKey"],
+    turn,
+  ) -> tuple:
+    if key is not None:
+      return key, self._record_input(message, enhanced_message), None
+    cache = self.semantic_cache
+    if cache is not None and cache.enabled(port_name):
+      previous = next(
+        (m.content for m in reversed(self.ghost.conversation_history) if m.role == "user"), ""
+      )
+      contributions = enhanced_message.content.removeprefix(message.content)
+      key = cache.key(message.content, (contributions,), previous)
+    context = self._record_input(message, enhanced_message)
+    return key, context, self._cached_response(key, turn)
+
+  def _stateless_key(self, message: Message, port_name: str) -> Optional["SemanticKey"]:
+    # Stateless routes are keyed on the query alone, so a hit skips the enhancers entirely.
+    cache = self.semantic_cache
+    if cache is None or not cache.enabled(port_name) or not cache.stateless(port_name):
+      return None
+    return cache.key(message.content)
+
+  def _record_input(self, message: Message, enhanced_message: Message) -> Optional[dict[str, Any]]:
+    context = None
+    contributions = enhanced_message.content.removeprefix(message.content)
+    appended = enhanced_message.content.startswith(message.content) and contributions.strip()
+    if self.ghost.layout is not None and appended:
+      # Retrieved text changes every turn; keep it out of history so the prompt prefix stays stable.
+      context = {TURN_CONTEXT_KEY: contributions.strip()}
+      enhanced_message = message
+    self.ghost.add_message(enhanced_message)
+    return context
+
+  def _cached_response(self, key: Optional["SemanticKey"], turn) -> Optional[CompletionResponse]:
+    response = self.semantic_cache.lookup(key) if key is not None else None
+    turn.set(cached=response is not None)
+    return response
+
+  def _cache_response(self, key: Optional["SemanticKey"], response: CompletionResponse):
+    if key is not None:
+      self.semantic_cache.store(key, response)
+
+  def _observe_turn(self, message: Message, response: CompletionResponse):
+    for enhancer in self.context_enhancers:
+      enhancer.observe_turn(message, response)
@@ -0,0 +1,62 @@
+from importlib import import_module
+from typing import TYPE_CHECKING, Callable, Union
+
+if TYPE_CHECKING:
+  from agent.model import BaseModel
+
+ENTRY_POINT_GROUP = "personal_agent.sources"
+
+# Factories are called with api_key= and model= keywords. Optional keywords such as limiter= are
+# only passed to factories that declare them (see accepts).
+SourceFactory = Callable[..., "BaseModel"]
+
+_sources: dict[str, Union[str, SourceFactory]] = {
+  "glm": "agent.sources.glm:GLMModel",
+}
+
+
+def register_source(name: str, factory: Union[str, SourceFactory], replace: bool = False):
+  if name in _sources and not replace:
+    raise ValueError(f"Source already registered: {name}")
+  _sources[name] = factory
+
+
+def available_sources() -> list[str]:
+  return sorted({*_sources, *(entry.name for entry in _entry_points())})
+
+
+def get_source(name: str) -> SourceFactory:
+  factory = _sources.get(name)
+  if factory is None:
+    entry = next((entry for entry in _entry_points() if entry.name == name), None)
+    if entry is None:
+      raise ValueError(f"Unknown source: {name}")
+    factory = entry.value
+  if isinstance(factory, str):
+    module, _, attribute = factory.partition(":")
+    factory = getattr(import_module(module), attribute)
+    _sources[name] = factory
+  return factory
+
+
+def create_source(name: str, **kwargs) -> "BaseModel":
+  return get_source(name)(**kwargs)
+
+
+def accepts(factory: SourceFactory, keyword: str) -> bool:
+  import inspect
+
+  try:
+    parameters = inspect.signature(factory).parameters.values()
+  except (TypeError, ValueError):
+    return False
+  return any(
+    parameter.name == keyword or parameter.kind is parameter.VAR_KEYWORD for parameter in parameters
+  )
+
+
+def _entry_points():
+  # Installed plugins are only scanned on a registry miss; metadata lookup is slow at startup.
+  from importlib.metadata import entry_points
+
+  return entry_points(group=ENTRY_POINT_GROUP)
@@ -0,0 +1,333 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Callable, Iterator, Optional
+from agent.model import (
+  BaseModel,
+  CompletionAccumulator,
+  CompletionChunk,
+  CompletionResponse,
+  Message,
+  Tool,
+  ToolCall,
+  Usage,
+  chunk_from_response,
+)
+
+
+@dataclass
+class CacheStats:
+  hits: int = 0
+  misses: int = 0
+  coalesced: int = 0
+  bypassed: int = 0
+  memory_hits: int = 0
+  disk_hits: int = 0
+
+  @property
+  def hit_rate(self) -> float:
+    lookups = self.hits + self.misses
+    return self.hits / lookups if lookups else 0.0
+
+
+def payload_key(model_name: str, messages: list[Message], tools: Optional[list[Tool]]) -> str:
+  payload = {
+    "model": model_name,
+    "messages": [asdict(message) for message in messages],
+    "tools": [asdict(tool) for tool in tools or []],
+  }
+  encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+  return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def encode_response(response: CompletionResponse) -> str:
+  return json.dumps(asdict(response), separators=(",", ":"))
+
+
+def decode_response(encoded: str) -> CompletionResponse:
+  data = json.loads(encoded)
+  return CompletionResponse(
+    content=data["content"],
+    tool_calls=[ToolCall(**tool_call) for tool_call in data["tool_calls"]],
+    finish_reason=data["finish_reason"],
+    usage=Usage(**data["usage"]) if data.get("usage") else None,
+  )
+
+
+class MemoryCache:
+  def __init__(self, max_entries: int = 256, ttl: float = 3600.0, clock: Callable = time.time):
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self.clock = clock
+    self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key: str) -> Optional[str]:
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      if entry[0] <= self.clock():
+        del self._entries[key]
+        return None
+      self._entries.move_to_end(key)
+      return entry[1]
+
+  def set(self, key: str, value: str):
+    with self._lock:
+      self._entries[key] = (self.clock() + self.ttl, value)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+
+class DiskCache:
+  def __init__(
+    self,
+    path: str,
+    ttl: float = 7 * 86400.0,
+    max_bytes: int = 100_000_000,
+    clock: Callable = time.time,
+  ):
+    self.ttl = ttl
+    self.max_bytes = max_bytes
+    self.clock = clock
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    self._db = sqlite3.connect(path, check_same_thread=False)
+    self._db.execute("PRAGMA journal_mode=WAL")
+    self._db.execute("PRAGMA synchronous=NORMAL")
+    self._db.execute(
+      "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+      "size INTEGER NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+    )
+    self._lock = threading.Lock()
+
+  def get(self, key: str) -> Optional[str]:
+    now = self.clock()
+    with self._lock:
+      row = self._db.execute(
+        "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+      ).fetchone()
+      if row is None:
+        return None
+      if row[1] <= now:
+        self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self._db.commit()
+        return None
+      self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+      self._db.commit()
+      return row[0]
+
+  def set(self, key: str, value: str):
+    now = self.clock()
+    with self._lock:
+      self._db.execute(
+        "INSERT OR REPLACE INTO responses (key, value, size, expires_at, last_access) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (key, value, len(value), now + self.ttl, now),
+      )
+      self._evict(now)
+      self._db.commit()
+
+  def size(self) -> int:
+    with self._lock:
+      return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+  def close(self):
+    with self._lock:
+      self._db.close()
+
+  def _evict(self, now: float):
+    self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+    total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total <= self.max_bytes:
+      return
+    rows = self._db.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall()
+    doomed = []
+    for key, size in rows:
+      if total <= self.max_bytes:
+        break
+      doomed.append((key,))
+      total -= size
+    self._db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+
+class CachedModel(BaseModel):
+  def __init__(
+    self,
+    model: BaseModel,
+    memory: Optional[MemoryCache] = None,
+    disk: Optional[DiskCache] = None,
+  ):
+    self.model = model
+    self.memory = memory or MemoryCache()
+    self.disk = disk
+    self.stats = CacheStats()
+    self._inflight: dict[str, Future] = {}
+    self._lock = threading.Lock()
+
+  @property
+  def model_name(self) -> str:
+    return self.model.model_name
+
+  def generate_completion(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None, use_cache: bool = True
+  ) -> CompletionResponse:
+    if not use_cache:
+      self.stats.bypassed += 1
+      return self.model.generate_completion(messages, tools)
+    key = payload_key(self.model_name, messages, tools)
+    cached = self._lookup(key)
+    if cached is not None:
+      return decode_response(cached)
+
+    future, leader = self._join(key)
+    if not leader:
+      return decode_response(future.result())
+    try:
+      response = self.model.generate_completion(messages, tools)
+    except BaseException as e:
+      self._finish(key, future, error=e)
+      raise
+    self._finish(key, future, encode_response(response))
+    return response
+
+  async def generate_completion_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None, use_cache: bool = True
+  ) -> CompletionResponse:
+    if not use_cache:
+      self.stats.bypassed += 1
+      return await self.model.generate_completion_async(messages, tools)
+    key = payload_key(self.model_name, messages, tools)
+    cached = self._lookup(key)
+    if cached is not None:
+      return decode_response(cached)
+
+    future, leader = self._join(key)
+    if not leader:
+      return decode_response(await asyncio.wrap_future(future))
+    try:
+      response = await self.model.generate_completion_async(messages, tools)
+    except BaseException as e:
+      self._finish(key, future, error=e)
+      raise
+    self._finish(key, future, encode_response(response))
+    return response
+
+  def stream_completion(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None, use_cache: bool = True
+  ) -> Iterator[CompletionChunk]:
+    if not use_cache:
+      self.stats.bypassed += 1
+      yield from self.model.stream_completion(messages, tools)
+      return
+    key = payload_key(self.model_name, messages, tools)
+    cached = self._lookup(key)
+    if cached is not None:
+      yield chunk_from_response(decode_response(cached))
+      return
+
+    future, leader = self._join(key)
+    if not leader:
+      yield chunk_from_response(decode_response(future.result()))
+      return
+    accumulator = CompletionAccumulator()
+    try:
+      for chunk in self.model.stream_completion(messages, tools):
+        accumulator.add(chunk)
+        yield chunk
+    except BaseException as e:
+      self._finish(key, future, error=_stream_error(e))
+      raise
+    self._finish(key, future, encode_response(accumulator.result()))
+
+  async def stream_completion_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None, use_cache: bool = True
+  ) -> AsyncIterator[CompletionChunk]:
+    if not use_cache:
+      self.stats.bypassed += 1
+      async for chunk in self.model.stream_completion_async(messages, tools):
+        yield chunk
+      return
+    key = payload_key(self.model_name, messages, tools)
+    cached = self._lookup(key)
+    if cached is not None:
+      yield chunk_from_response(decode_response(cached))
+      return
+
+    future, leader = self._join(key)
+    if not leader:
+      yield chunk_from_response(decode_response(await asyncio.wrap_future(future)))
+      return
+    accumulator = CompletionAccumulator()
+    try:
+      async for chunk in self.model.stream_completion_async(messages, tools):
+        accumulator.add(chunk)
+        yield chunk
+    except BaseException as e:
+      self._finish(key, future, error=_stream_error(e))
+      raise
+    self._finish(key, future, encode_response(accumulator.result()))
+
+  def _lookup(self, key: str) -> Optional[str]:
+    cached = self.memory.get(key)
+    if cached is not None:
+      self.stats.hits += 1
+      self.stats.memory_hits += 1
+      return cached
+    if self.disk is not None:
+      cached = self.disk.get(key)
+      if cached is not None:
+        self.memory.set(key, cached)
+        self.stats.hits += 1
+        self.stats.disk_hits += 1
+        return cached
+    return None
+
+  def _join(self, key: str) -> tuple[Future, bool]:
+    with self._lock:
+      future = self._inflight.get(key)
+      if future is not None:
+        self.stats.coalesced += 1
+        return future, False
+      self.stats.misses += 1
+      future = Future()
+      self._inflight[key] = future
+      return future, True
+
+  def _finish(
+    self,
+    key: str,
+    future: Future,
+    encoded: Optional[str] = None,
+    error: Optional[BaseException] = None,
+  ):
+    if encoded is not None:
+      self._store(key, encoded)
+    with self._lock:
+      self._inflight.pop(key, None)
+    if error is not None:
+      future.set_exception(error)
+    else:
+      future.set_result(encoded)
+
+  def _store(self, key: str, encoded: str):
+    self.memory.set(key, encoded)
+    if self.disk is not None:
+      self.disk.set(key, encoded)
+
+
+def _stream_error(error: BaseException) -> BaseException:
+  # Followers waiting on a stream the leader's consumer walked away from get a real error.
+  if isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+    return RuntimeError("Coalesced stream was abandoned before it finished")
+  return error
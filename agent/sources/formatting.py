@@ -0,0 +1,54 @@
+from typing import Any, Callable, Optional
+from agent.identity import DEFAULT_CAPACITY, IdentityCache
+from agent.model import Message, Tool
+
+
+def format_message(message: Message) -> dict:
+  formatted = {"role": message.role, "content": message.content}
+  if message.tool_calls:
+    formatted["tool_calls"] = [
+      {"id": tc.id, "type": "function", "function": {"name": tc.name, "arguments": tc.arguments}}
+      for tc in message.tool_calls
+    ]
+  if message.tool_call_id:
+    formatted["tool_call_id"] = message.tool_call_id
+  return formatted
+
+
+def format_tool(tool: Tool) -> dict:
+  return {
+    "type": "function",
+    "function": {
+      "name": tool.name,
+      "description": tool.description,
+      "parameters": tool.parameters,
+    },
+  }
+
+
+class PayloadFormatter:
+  def __init__(
+    self,
+    cache_size: int = DEFAULT_CAPACITY,
+    encode: Optional[Callable[[dict], Any]] = None,
+  ):
+    self.encode = encode
+    self._messages: IdentityCache[Any] = IdentityCache(cache_size)
+    self._tools: IdentityCache[Any] = IdentityCache(256)
+
+  def message(self, message: Message) -> Any:
+    fields = (message.role, message.content, message.tool_calls, message.tool_call_id)
+    cached = self._messages.get(message, fields)
+    if cached is not None:
+      return cached
+    return self._messages.put(message, fields, self._encoded(format_message(message)))
+
+  def tool(self, tool: Tool) -> Any:
+    fields = (tool.name, tool.description, tool.parameters)
+    cached = self._tools.get(tool, fields)
+    if cached is not None:
+      return cached
+    return self._tools.put(tool, fields, self._encoded(format_tool(tool)))
+
+  def _encoded(self, formatted: dict) -> Any:
+    return formatted if self.encode is None else self.encode(formatted)
@@ -1,48 +1,194 @@
-from openai import OpenAI, AsyncOpenAI
-from typing import Optional, Any
-from agent.model import BaseModel, Message, Tool, CompletionResponse, ToolCall
+from functools import cached_property
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional
+from agent.context import MESSAGE_OVERHEAD_TOKENS, ApproximateTokenizer
+from agent.identity import DEFAULT_CAPACITY
+from agent.model import (
+  BaseModel,
+  Message,
+  Tool,
+  CompletionResponse,
+  CompletionChunk,
+  ToolCall,
+  ToolCallDelta,
+  Usage,
+)
+from agent.sources.formatting import PayloadFormatter
+from agent.sources.limits import RateLimiter
+
+DEFAULT_BASE_URL = "https://api.z.ai/api/coding/paas/v4"
 
 
 class GLMModel(BaseModel):
-  def __init__(self, api_key: str, model: str = "glm-4.7-flash"):
+  def __init__(
+    self,
+    api_key: str,
+    model: str = "glm-4.7-flash",
+    base_url: str = DEFAULT_BASE_URL,
+    limiter: Optional[RateLimiter] = None,
+    format_cache_size: int = DEFAULT_CAPACITY,
+    transport: str = "sdk",
+    http2: bool = False,
+  ):
+    if transport not in ("sdk", "fast"):
+      raise ValueError(f"Unknown transport: {transport}")
     self.api_key = api_key
     self.model = model
-    self.client = OpenAI(api_key=api_key, base_url="https://api.z.ai/api/coding/paas/v4")
-    self.async_client = AsyncOpenAI(api_key=api_key, base_url="https://api.z.ai/api/coding/paas/v4")
+    self.base_url = base_url
+    self.limiter = limiter
+    self.tokenizer = ApproximateTokenizer()
+    self.format_cache_size = format_cache_size
+    self.formatter = PayloadFormatter(format_cache_size)
+    # The limiter owns retries; SDK retries would bypass its backoff and accounting.
+    self.max_retries = 0 if limiter else 2
+    self.transport = None
+    if transport == "fast":
+      # httpx is only needed by the fast transport, so the default path never imports it.
+      from agent.sources.transport import FastTransport
+
+      self.transport = FastTransport(base_url, api_key, http2=http2, cache_size=format_cache_size)
+
+  @cached_property
+  def client(self):
+    from openai import OpenAI
+
+    return OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=self.max_retries)
+
+  @cached_property
+  def async_client(self):
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=self.max_retries)
 
   def generate_completion(
     self, messages: list[Message], tools: Optional[list[Tool]] = None
   ) -> CompletionResponse:
+    if self.transport is not None:
+      from agent.sources.transport import parse_completion
+
+      body = self.transport.body(self.model, messages, tools)
+      return parse_completion(self._send(lambda: self.transport.post(body), messages))
     payload = self._prepare_payload(messages, tools)
-    response = self.client.chat.completions.create(**payload)
+    response = self._create(payload)
     return self._parse_response(response)
 
   async def generate_completion_async(
     self, messages: list[Message], tools: Optional[list[Tool]] = None
   ) -> CompletionResponse:
+    if self.transport is not None:
+      from agent.sources.transport import parse_completion
+
+      body = self.transport.body(self.model, messages, tools)
+      return parse_completion(
+        await self._send_async(lambda: self.transport.post_async(body), messages)
+      )
     payload = self._prepare_payload(messages, tools)
-    response = await self.async_client.chat.completions.create(**payload)
+    response = await self._create_async(payload)
     return self._parse_response(response)
 
+  def stream_completion(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> Iterator[CompletionChunk]:
+    if self.transport is not None:
+      from agent.sources.transport import parse_chunk
+
+      body = self.transport.body(self.model, messages, tools, stream=True)
+      response = self._send(lambda: self.transport.open_stream(body), messages, stream=True)
+      events, parse = self.transport.events(response), parse_chunk
+    else:
+      payload = self._prepare_payload(messages, tools)
+      events, parse = self._create(payload, stream=True), self._parse_chunk
+    error = None
+    try:
+      for event in events:
+        chunk = parse(event)
+        if chunk is not None:
+          yield chunk
+    except BaseException as e:
+      error = e
+      raise
+    finally:
+      if self.transport is not None:
+        events.close()
+      if self.limiter:
+        self.limiter.release(error)
+
+  async def stream_completion_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> AsyncIterator[CompletionChunk]:
+    if self.transport is not None:
+      from agent.sources.transport import parse_chunk
+
+      body = self.transport.body(self.model, messages, tools, stream=True)
+      response = await self._send_async(
+        lambda: self.transport.open_stream_async(body), messages, stream=True
+      )
+      events, parse = self.transport.events_async(response), parse_chunk
+    else:
+      payload = self._prepare_payload(messages, tools)
+      events, parse = await self._create_async(payload, stream=True), self._parse_chunk
+    error = None
+    try:
+      async for event in events:
+        chunk = parse(event)
+        if chunk is not None:
+          yield chunk
+    except BaseException as e:
+      error = e
+      raise
+    finally:
+      if self.transport is not None:
+        await events.aclose()
+      if self.limiter:
+        self.limiter.release(error)
+
+  def _send(self, request: Callable[[], Any], messages: list[Message], stream: bool = False) -> Any:
+    if self.limiter is None:
+      return request()
+    return self.limiter.call(request, self._count_tokens(messages), hold=stream)
+
+  async def _send_async(
+    self, request: Callable[[], Awaitable[Any]], messages: list[Message], stream: bool = False
+  ) -> Any:
+    if self.limiter is None:
+      return await request()
+    return await self.limiter.call_async(request, self._count_tokens(messages), hold=stream)
+
+  def _create(self, payload: dict, stream: bool = False) -> Any:
+    def create():
+      return self.client.chat.completions.create(**payload, stream=stream)
+
+    if self.limiter is None:
+      return create()
+    return self.limiter.call(create, self._estimate_tokens(payload), hold=stream)
+
+  async def _create_async(self, payload: dict, stream: bool = False) -> Any:
+    def create():
+      return self.async_client.chat.completions.create(**payload, stream=stream)
+
+    if self.limiter is None:
+      return await create()
+    return await self.limiter.call_async(create, self._estimate_tokens(payload), hold=stream)
+
+  def _estimate_tokens(self, payload: dict) -> int:
+    return sum(
+      self.tokenizer.count(message["content"] or "") + MESSAGE_OVERHEAD_TOKENS
+      for message in payload["messages"]
+    )
+
+  def _count_tokens(self, messages: list[Message]) -> int:
+    return sum(
+      self.tokenizer.count(message.content or "") + MESSAGE_OVERHEAD_TOKENS for message in messages
+    )
+
   def _prepare_payload(self, messages: list[Message], tools: Optional[list[Tool]] = None) -> dict:
     payload = {
       "model": self.model,
-      "messages": [{"role": msg.role, "content": msg.content} for msg in messages],
+      "messages": [self.formatter.message(msg) for msg in messages],
     }
     if tools:
-      payload["tools"] = [self._format_tool(tool) for tool in tools]
+      payload["tools"] = [self.formatter.tool(tool) for tool in tools]
     return payload
 
-  def _format_tool(self, tool: Tool) -> dict:
-    return {
-      "type": "function",
-      "function": {
-        "name": tool.name,
-        "description": tool.description,
-        "parameters": tool.parameters,
-      },
-    }
-
   def _parse_response(self, response: Any) -> CompletionResponse:
     choice = response.choices[0]
     message = choice.message
@@ -56,5 +202,45 @@ class GLMModel(BaseModel):
         )
 
     return CompletionResponse(
-      content=content, tool_calls=tool_calls, finish_reason=choice.finish_reason
+      content=content,
+      tool_calls=tool_calls,
+      finish_reason=choice.finish_reason,
+      usage=self._parse_usage(getattr(response, "usage", None)),
+    )
+
+  def _parse_usage(self, usage: Any) -> Optional[Usage]:
+    if usage is None:
+      return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    return Usage(
+      prompt_tokens=usage.prompt_tokens or 0,
+      completion_tokens=usage.completion_tokens or 0,
+      cached_tokens=getattr(details, "cached_tokens", None) or 0,
+    )
+
+  def _parse_chunk(self, event: Any) -> Optional[CompletionChunk]:
+    usage = self._parse_usage(getattr(event, "usage", None))
+    if not event.choices:
+      return CompletionChunk(usage=usage) if usage is not None else None
+    choice = event.choices[0]
+    delta = choice.delta
+    tool_calls = []
+
+    if getattr(delta, "tool_calls", None):
+      for tc in delta.tool_calls:
+        function = tc.function
+        tool_calls.append(
+          ToolCallDelta(
+            index=tc.index,
+            id=tc.id,
+            name=function.name if function else None,
+            arguments=(function.arguments if function else None) or "",
+          )
+        )
+
+    return CompletionChunk(
+      content=delta.content or "",
+      tool_calls=tool_calls,
+      finish_reason=choice.finish_reason,
+      usage=usage,
     )
@@ -0,0 +1,297 @@
+import asyncio
+import random
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def status_code(error: BaseException) -> Optional[int]:
+  return getattr(error, "status_code", None)
+
+
+def is_rate_limited(error: BaseException) -> bool:
+  return status_code(error) == 429
+
+
+def is_overloaded(error: BaseException) -> bool:
+  return status_code(error) in RETRYABLE_STATUS
+
+
+def is_retryable(error: BaseException) -> bool:
+  return (
+    is_overloaded(error) or isinstance(error, ConnectionError) or is_sdk_connection_error(error)
+  )
+
+
+def is_sdk_connection_error(error: BaseException) -> bool:
+  # An SDK error can only exist once the SDK has been imported by a client.
+  openai = sys.modules.get("openai")
+  return openai is not None and isinstance(error, openai.APIConnectionError)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+  response = getattr(error, "response", None)
+  headers = getattr(response, "headers", None) or {}
+  value = headers.get("retry-after")
+  try:
+    return max(0.0, float(value)) if value is not None else None
+  except ValueError:
+    return None
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+  return random.uniform(0.0, min(cap, base * 2**attempt))
+
+
+class TokenBucket:
+  def __init__(
+    self, per_minute: float, capacity: Optional[float] = None, clock: Callable = time.monotonic
+  ):
+    self.rate = per_minute / 60.0
+    self.capacity = capacity if capacity is not None else per_minute
+    self.clock = clock
+    self.tokens = self.capacity
+    self._updated = clock()
+    self._lock = threading.Lock()
+
+  def reserve(self, amount: float = 1.0) -> float:
+    with self._lock:
+      self._refill()
+      self.tokens -= min(amount, self.capacity)
+      return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+  def available(self) -> float:
+    with self._lock:
+      self._refill()
+      return self.tokens
+
+  def _refill(self):
+    now = self.clock()
+    self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+    self._updated = now
+
+
+class AIMDController:
+  def __init__(
+    self,
+    initial: int = 8,
+    minimum: int = 1,
+    maximum: int = 64,
+    increase: float = 1.0,
+    decrease: float = 0.5,
+    cooldown: float = 1.0,
+    clock: Callable = time.monotonic,
+  ):
+    self.minimum = minimum
+    self.maximum = maximum
+    self.increase = increase
+    self.decrease = decrease
+    self.cooldown = cooldown
+    self.clock = clock
+    self.value = float(initial)
+    self._last_decrease = float("-inf")
+
+  @property
+  def limit(self) -> int:
+    return max(self.minimum, int(self.value))
+
+  def on_success(self):
+    self.value = min(self.maximum, self.value + self.increase / max(self.value, 1.0))
+
+  def on_throttle(self):
+    now = self.clock()
+    if now - self._last_decrease < self.cooldown:
+      return
+    self._last_decrease = now
+    self.value = max(self.minimum, self.value * self.decrease)
+
+
+@dataclass
+class LimiterMetrics:
+  concurrency_limit: int
+  in_flight: int
+  queue_depth: int
+  requests_available: Optional[float]
+  tokens_available: Optional[float]
+  throttled: int
+  retries: int
+
+
+class _Waiter:
+  def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+    self.granted = False
+    self.loop = loop
+    self.event = threading.Event() if loop is None else None
+    self.future = loop.create_future() if loop is not None else None
+
+  def wake(self):
+    self.granted = True
+    if self.loop is None:
+      self.event.set()
+    else:
+      self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future):
+  if not future.done():
+    future.set_result(None)
+
+
+class RateLimiter:
+  def __init__(
+    self,
+    requests_per_minute: Optional[float] = None,
+    tokens_per_minute: Optional[float] = None,
+    controller: Optional[AIMDController] = None,
+    max_retries: int = 4,
+    backoff: float = 0.5,
+    max_backoff: float = 30.0,
+  ):
+    self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+    self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+    self.controller = controller or AIMDController()
+    self.max_retries = max_retries
+    self.backoff = backoff
+    self.max_backoff = max_backoff
+    self.in_flight = 0
+    self.pacing = 0
+    self.throttled = 0
+    self.retries = 0
+    self._waiters: deque[_Waiter] = deque()
+    self._lock = threading.Lock()
+
+  def metrics(self) -> LimiterMetrics:
+    with self._lock:
+      return LimiterMetrics(
+        concurrency_limit=self.controller.limit,
+        in_flight=self.in_flight,
+        queue_depth=len(self._waiters) + self.pacing,
+        requests_available=self.requests.available() if self.requests else None,
+        tokens_available=self.tokens.available() if self.tokens else None,
+        throttled=self.throttled,
+        retries=self.retries,
+      )
+
+  def acquire(self, tokens: int = 0):
+    delay = self._reserve(tokens)
+    if delay:
+      self._pace(1)
+      try:
+        time.sleep(delay)
+      finally:
+        self._pace(-1)
+    waiter = self._enqueue(None)
+    if waiter is not None:
+      waiter.event.wait()
+
+  async def acquire_async(self, tokens: int = 0):
+    delay = self._reserve(tokens)
+    if delay:
+      self._pace(1)
+      try:
+        await asyncio.sleep(delay)
+      finally:
+        self._pace(-1)
+    waiter = self._enqueue(asyncio.get_running_loop())
+    if waiter is None:
+      return
+    try:
+      await waiter.future
+    except asyncio.CancelledError:
+      with self._lock:
+        if waiter.granted:
+          self._release_locked()
+        else:
+          self._waiters.remove(waiter)
+      raise
+
+  def release(self, error: Optional[BaseException] = None):
+    with self._lock:
+      if error is None:
+        self.controller.on_success()
+      elif is_overloaded(error):
+        self.throttled += 1
+        self.controller.on_throttle()
+      self._release_locked()
+
+  def call(self, fn: Callable[[], T], tokens: int = 0, hold: bool = False) -> T:
+    attempt = 0
+    while True:
+      self.acquire(tokens)
+      try:
+        result = fn()
+      except Exception as e:
+        self.release(e)
+        delay = self._retry_delay(e, attempt)
+        if delay is None:
+          raise
+        time.sleep(delay)
+        attempt += 1
+        continue
+      except BaseException as e:
+        self.release(e)
+        raise
+      if not hold:
+        self.release()
+      return result
+
+  async def call_async(
+    self, fn: Callable[[], Awaitable[T]], tokens: int = 0, hold: bool = False
+  ) -> T:
+    attempt = 0
+    while True:
+      await self.acquire_async(tokens)
+      try:
+        result = await fn()
+      except Exception as e:
+        self.release(e)
+        delay = self._retry_delay(e, attempt)
+        if delay is None:
+          raise
+        await asyncio.sleep(delay)
+        attempt += 1
+        continue
+      except BaseException as e:
+        self.release(e)
+        raise
+      if not hold:
+        self.release()
+      return result
+
+  def _retry_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+    if not is_retryable(error) or attempt >= self.max_retries:
+      return None
+    self.retries += 1
+    delay = retry_after(error)
+    return delay if delay is not None else backoff_delay(attempt, self.backoff, self.max_backoff)
+
+  def _reserve(self, tokens: int) -> float:
+    delay = self.requests.reserve(1) if self.requests else 0.0
+    if self.tokens and tokens:
+      delay = max(delay, self.tokens.reserve(tokens))
+    return delay
+
+  def _pace(self, change: int):
+    with self._lock:
+      self.pacing += change
+
+  def _enqueue(self, loop: Any) -> Optional[_Waiter]:
+    with self._lock:
+      if not self._waiters and self.in_flight < self.controller.limit:
+        self.in_flight += 1
+        return None
+      waiter = _Waiter(loop)
+      self._waiters.append(waiter)
+      return waiter
+
+  def _release_locked(self):
+    self.in_flight -= 1
+    while self._waiters and self.in_flight < self.controller.limit:
+      self.in_flight += 1
+      self._waiters.popleft().wake()
@@ -0,0 +1,305 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence, Union
+from agent.model import (
+  BaseModel,
+  CompletionAccumulator,
+  CompletionChunk,
+  CompletionResponse,
+  Message,
+  Tool,
+  ToolCall,
+  ToolCallDelta,
+  Usage,
+)
+
+TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+
+class ReplayMissError(KeyError):
+  pass
+
+
+@dataclass
+class LatencyProfile:
+  ttft: float = 0.3
+  tokens_per_second: float = 50.0
+  jitter: float = 0.0
+
+
+@dataclass
+class Exchange:
+  key: str
+  prompt: str
+  response: CompletionResponse
+  ttft: float = 0.0
+  duration: float = 0.0
+
+  def to_dict(self) -> dict[str, Any]:
+    response = self.response
+    return {
+      "key": self.key,
+      "prompt": self.prompt,
+      "response": {
+        "content": response.content,
+        "tool_calls": [
+          {"id": tc.id, "name": tc.name, "arguments": tc.arguments} for tc in response.tool_calls
+        ],
+        "finish_reason": response.finish_reason,
+        "usage": (
+          {
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": response.usage.completion_tokens,
+            "cached_tokens": response.usage.cached_tokens,
+          }
+          if response.usage
+          else None
+        ),
+      },
+      "ttft": self.ttft,
+      "duration": self.duration,
+    }
+
+  @classmethod
+  def from_dict(cls, data: dict[str, Any]) -> "Exchange":
+    response = data["response"]
+    usage = response.get("usage")
+    return cls(
+      key=data["key"],
+      prompt=data.get("prompt", ""),
+      response=CompletionResponse(
+        content=response["content"],
+        tool_calls=[ToolCall(**tc) for tc in response.get("tool_calls", [])],
+        finish_reason=response.get("finish_reason") or "stop",
+        usage=Usage(**usage) if usage else None,
+      ),
+      ttft=data.get("ttft", 0.0),
+      duration=data.get("duration", 0.0),
+    )
+
+
+def _digest(parts: list[tuple[str, str, str]], tool_names: list[str]) -> str:
+  encoded = json.dumps([parts, sorted(tool_names)], ensure_ascii=False, separators=(",", ":"))
+  return hashlib.sha256(encoded.encode()).hexdigest()[:32]
+
+
+def request_key(messages: Sequence[Message], tools: Optional[list[Tool]] = None) -> str:
+  parts = [(m.role, m.content or "", m.tool_call_id or "") for m in messages]
+  return _digest(parts, [tool.name for tool in tools or ()])
+
+
+def payload_key(payload: dict[str, Any]) -> str:
+  parts = [
+    (m["role"], m.get("content") or "", m.get("tool_call_id") or "")
+    for m in payload.get("messages", [])
+  ]
+  names = [tool["function"]["name"] for tool in payload.get("tools") or ()]
+  return _digest(parts, names)
+
+
+def last_prompt(messages: Sequence[Union[Message, dict]]) -> str:
+  for message in reversed(messages):
+    role = message["role"] if isinstance(message, dict) else message.role
+    if role == "user":
+      return (message.get("content") if isinstance(message, dict) else message.content) or ""
+  return ""
+
+
+def replay_tokens(content: str) -> list[str]:
+  return TOKEN_PATTERN.findall(content) or [""]
+
+
+class Cassette:
+  def __init__(self, path: Optional[str] = None):
+    self.path = path
+    self.exchanges: list[Exchange] = []
+    self._by_key: dict[str, Exchange] = {}
+    self._by_prompt: dict[str, Exchange] = {}
+    self._cursor = 0
+    self._lock = threading.Lock()
+    if path and os.path.exists(path):
+      with open(path, encoding="utf-8") as f:
+        for line in f:
+          if line.strip():
+            self._index(Exchange.from_dict(json.loads(line)))
+
+  def __len__(self) -> int:
+    return len(self.exchanges)
+
+  def add(self, exchange: Exchange):
+    with self._lock:
+      self._index(exchange)
+      if self.path:
+        directory = os.path.dirname(self.path)
+        if directory:
+          os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+          f.write(json.dumps(exchange.to_dict(), ensure_ascii=False) + "\n")
+
+  def find(self, key: str, prompt: str = "", strict: bool = False) -> Exchange:
+    exchange = self._by_key.get(key) or self._by_prompt.get(prompt)
+    if exchange is not None:
+      return exchange
+    if strict or not self.exchanges:
+      raise ReplayMissError(f"No recorded exchange for prompt {prompt[:60]!r}")
+    with self._lock:
+      exchange = self.exchanges[self._cursor % len(self.exchanges)]
+      self._cursor += 1
+    return exchange
+
+  def _index(self, exchange: Exchange):
+    self.exchanges.append(exchange)
+    self._by_key[exchange.key] = exchange
+    self._by_prompt.setdefault(exchange.prompt, exchange)
+
+
+class ReplayModel(BaseModel):
+  def __init__(
+    self,
+    cassette: Cassette,
+    source: Optional[BaseModel] = None,
+    profile: Optional[LatencyProfile] = None,
+    time_scale: float = 1.0,
+    strict: bool = False,
+    seed: int = 0,
+  ):
+    self.cassette = cassette
+    self.source = source
+    self.profile = profile
+    self.time_scale = time_scale
+    self.strict = strict
+    self.model = source.model_name if source is not None else "replay"
+    self._random = random.Random(seed)
+
+  def generate_completion(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> CompletionResponse:
+    if self.source is not None:
+      began = time.perf_counter()
+      response = self.source.generate_completion(messages, tools)
+      elapsed = time.perf_counter() - began
+      self._record(messages, tools, response, elapsed, elapsed)
+      return response
+    exchange = self._find(messages, tools)
+    first, gap = self.delays(exchange)
+    time.sleep(first + gap * (len(replay_tokens(exchange.response.content)) - 1))
+    return _copy(exchange.response)
+
+  async def generate_completion_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> CompletionResponse:
+    if self.source is not None:
+      began = time.perf_counter()
+      response = await self.source.generate_completion_async(messages, tools)
+      elapsed = time.perf_counter() - began
+      self._record(messages, tools, response, elapsed, elapsed)
+      return response
+    exchange = self._find(messages, tools)
+    first, gap = self.delays(exchange)
+    await asyncio.sleep(first + gap * (len(replay_tokens(exchange.response.content)) - 1))
+    return _copy(exchange.response)
+
+  def stream_completion(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> Iterator[CompletionChunk]:
+    if self.source is not None:
+      began = time.perf_counter()
+      ttft = None
+      accumulator = CompletionAccumulator()
+      for chunk in self.source.stream_completion(messages, tools):
+        if ttft is None:
+          ttft = time.perf_counter() - began
+        accumulator.add(chunk)
+        yield chunk
+      elapsed = time.perf_counter() - began
+      self._record(messages, tools, accumulator.result(), ttft or elapsed, elapsed)
+      return
+    exchange = self._find(messages, tools)
+    first, gap = self.delays(exchange)
+    for index, chunk in enumerate(_chunks(exchange.response)):
+      time.sleep(first if index == 0 else gap)
+      yield chunk
+
+  async def stream_completion_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> AsyncIterator[CompletionChunk]:
+    if self.source is not None:
+      began = time.perf_counter()
+      ttft = None
+      accumulator = CompletionAccumulator()
+      async for chunk in self.source.stream_completion_async(messages, tools):
+        if ttft is None:
+          ttft = time.perf_counter() - began
+        accumulator.add(chunk)
+        yield chunk
+      elapsed = time.perf_counter() - began
+      self._record(messages, tools, accumulator.result(), ttft or elapsed, elapsed)
+      return
+    exchange = self._find(messages, tools)
+    first, gap = self.delays(exchange)
+    for index, chunk in enumerate(_chunks(exchange.response)):
+      await asyncio.sleep(first if index == 0 else gap)
+      yield chunk
+
+  def delays(self, exchange: Exchange) -> tuple[float, float]:
+    tokens = len(replay_tokens(exchange.response.content))
+    if self.profile is not None:
+      profile = self.profile
+      spread = 1.0 + self._random.uniform(-profile.jitter, profile.jitter)
+      first, gap = profile.ttft * spread, spread / profile.tokens_per_second
+    else:
+      first = exchange.ttft
+      gap = max(0.0, exchange.duration - exchange.ttft) / max(1, tokens - 1)
+    return first * self.time_scale, gap * self.time_scale
+
+  def _find(self, messages: list[Message], tools: Optional[list[Tool]]) -> Exchange:
+    return self.cassette.find(request_key(messages, tools), last_prompt(messages), self.strict)
+
+  def _record(
+    self,
+    messages: list[Message],
+    tools: Optional[list[Tool]],
+    response: CompletionResponse,
+    ttft: float,
+    duration: float,
+  ):
+    self.cassette.add(
+      Exchange(
+        key=request_key(messages, tools),
+        prompt=last_prompt(messages),
+        response=response,
+        ttft=ttft,
+        duration=duration,
+      )
+    )
+
+
+def _copy(response: CompletionResponse) -> CompletionResponse:
+  return CompletionResponse(
+    content=response.content,
+    tool_calls=[ToolCall(tc.id, tc.name, tc.arguments) for tc in response.tool_calls],
+    finish_reason=response.finish_reason,
+    usage=response.usage,
+  )
+
+
+def _chunks(response: CompletionResponse) -> Iterator[CompletionChunk]:
+  tokens = replay_tokens(response.content)
+  for token in tokens[:-1]:
+    yield CompletionChunk(content=token)
+  yield CompletionChunk(
+    content=tokens[-1],
+    tool_calls=[
+      ToolCallDelta(index=index, id=tc.id, name=tc.name, arguments=tc.arguments)
+      for index, tc in enumerate(response.tool_calls)
+    ],
+    finish_reason=response.finish_reason,
+    usage=response.usage,
+  )
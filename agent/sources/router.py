@@ -0,0 +1,477 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Iterator, Optional
+import numpy as np
+from agent.model import BaseModel, CompletionChunk, CompletionResponse, Message, Tool
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class BackendUnavailableError(RuntimeError):
+  pass
+
+
+class LatencyTracker:
+  def __init__(self, window: int = 200):
+    self.latencies: deque[float] = deque(maxlen=window)
+    self.outcomes: deque[bool] = deque(maxlen=window)
+
+  def record(self, latency: Optional[float], ok: bool):
+    if latency is not None:
+      self.latencies.append(latency)
+    self.outcomes.append(ok)
+
+  def percentile(self, q: float) -> Optional[float]:
+    if not self.latencies:
+      return None
+    return float(np.percentile(np.fromiter(self.latencies, dtype=np.float64), q))
+
+  @property
+  def error_rate(self) -> float:
+    if not self.outcomes:
+      return 0.0
+    return 1.0 - sum(self.outcomes) / len(self.outcomes)
+
+
+class CircuitBreaker:
+  def __init__(
+    self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable = time.monotonic
+  ):
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self.clock = clock
+    self.failures = 0
+    self.opened_at = 0.0
+    self._state = CLOSED
+    self._probing = False
+    self._lock = threading.Lock()
+
+  @property
+  def state(self) -> str:
+    if self._state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+      return HALF_OPEN
+    return self._state
+
+  def available(self) -> bool:
+    state = self.state
+    return state == CLOSED or (state == HALF_OPEN and not self._probing)
+
+  def begin(self):
+    with self._lock:
+      if self.state == HALF_OPEN:
+        self._probing = True
+
+  def release_probe(self):
+    with self._lock:
+      self._probing = False
+
+  def record_success(self):
+    with self._lock:
+      self.failures = 0
+      self._state = CLOSED
+      self._probing = False
+
+  def record_failure(self):
+    with self._lock:
+      self.failures += 1
+      if self._probing or self.failures >= self.failure_threshold:
+        self._state = OPEN
+        self.opened_at = self.clock()
+      self._probing = False
+
+
+@dataclass
+class BackendStats:
+  name: str
+  state: str
+  requests: int
+  error_rate: float
+  p50: Optional[float]
+  p95: Optional[float]
+  p99: Optional[float]
+  ttft_p50: Optional[float]
+  ttft_p95: Optional[float]
+
+
+class Backend:
+  def __init__(self, name: str, model: BaseModel, breaker: CircuitBreaker, window: int = 200):
+    self.name = name
+    self.model = model
+    self.breaker = breaker
+    # Full-response latency and stream time to first chunk are different units; mixing them
+    # would rank and hedge streams on completion times and vice versa.
+    self.tracker = LatencyTracker(window)
+    self.ttft = LatencyTracker(window)
+    self.requests = 0
+
+  @property
+  def error_rate(self) -> float:
+    outcomes = [*self.tracker.outcomes, *self.ttft.outcomes]
+    if not outcomes:
+      return 0.0
+    return 1.0 - sum(outcomes) / len(outcomes)
+
+  def latencies(self, stream: bool = False) -> LatencyTracker:
+    return self.ttft if stream else self.tracker
+
+  def score(self, stream: bool = False) -> float:
+    p50 = self.latencies(stream).percentile(50)
+    # Untried backends sort first so every backend gets latency samples.
+    if p50 is None:
+      return 0.0
+    return p50 / max(1.0 - self.error_rate, 0.05)
+
+  def begin(self):
+    self.requests += 1
+    self.breaker.begin()
+
+  def succeeded(self, latency: Optional[float], stream: bool = False):
+    self.latencies(stream).record(latency, True)
+    self.breaker.record_success()
+
+  def failed(self, stream: bool = False):
+    self.latencies(stream).record(None, False)
+    self.breaker.record_failure()
+
+  def abandoned(self, elapsed: float, stream: bool = False):
+    # A cancelled hedge loser took at least this long in the same unit; dropping it would hide
+    # slow tails.
+    self.latencies(stream).latencies.append(elapsed)
+    self.breaker.release_probe()
+
+  def stats(self) -> BackendStats:
+    return BackendStats(
+      name=self.name,
+      state=self.breaker.state,
+      requests=self.requests,
+      error_rate=self.error_rate,
+      p50=self.tracker.percentile(50),
+      p95=self.tracker.percentile(95),
+      p99=self.tracker.percentile(99),
+      ttft_p50=self.ttft.percentile(50),
+      ttft_p95=self.ttft.percentile(95),
+    )
+
+
+class RouterModel(BaseModel):
+  def __init__(
+    self,
+    backends: dict[str, BaseModel],
+    hedge: bool = False,
+    hedge_quantile: float = 95.0,
+    min_hedge_delay: float = 0.05,
+    default_hedge_delay: float = 1.0,
+    failure_threshold: int = 5,
+    reset_timeout: float = 30.0,
+    window: int = 200,
+    clock: Callable = time.monotonic,
+  ):
+    if not backends:
+      raise ValueError("RouterModel needs at least one backend")
+    self.backends = [
+      Backend(name, model, CircuitBreaker(failure_threshold, reset_timeout, clock), window)
+      for name, model in backends.items()
+    ]
+    self.hedge = hedge
+    self.hedge_quantile = hedge_quantile
+    self.min_hedge_delay = min_hedge_delay
+    self.default_hedge_delay = default_hedge_delay
+    self.clock = clock
+    self._executor: Optional[ThreadPoolExecutor] = None
+
+  @property
+  def model(self) -> str:
+    return "+".join(backend.name for backend in self.backends)
+
+  def stats(self) -> list[BackendStats]:
+    return [backend.stats() for backend in self.backends]
+
+  def candidates(self, stream: bool = False) -> list[Backend]:
+    healthy = [backend for backend in self.backends if backend.breaker.available()]
+    if not healthy:
+      raise BackendUnavailableError("All model backends have open circuit breakers")
+    return sorted(healthy, key=lambda backend: backend.score(stream))
+
+  def hedge_delay(self, backend: Backend, stream: bool = False) -> float:
+    delay = backend.latencies(stream).percentile(self.hedge_quantile)
+    if delay is None:
+      return self.default_hedge_delay
+    return max(self.min_hedge_delay, delay)
+
+  def generate_completion(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None, hedge: Optional[bool] = None
+  ) -> CompletionResponse:
+    candidates = self.candidates()
+    if not (self.hedge if hedge is None else hedge) or len(candidates) < 2:
+      last_error = None
+      for backend in candidates:
+        try:
+          return self._call(backend, messages, tools)
+        except Exception as e:
+          last_error = e
+      raise last_error
+
+    executor = self._pool()
+    pending: dict[Future, Backend] = {}
+    last_error = None
+    hedged = False
+
+    def launch():
+      backend = candidates.pop(0)
+      pending[executor.submit(self._call, backend, messages, tools)] = backend
+
+    launch()
+    while pending:
+      timeout = None
+      if not hedged and candidates:
+        timeout = self.hedge_delay(next(iter(pending.values())))
+      done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+      if not done:
+        hedged = True
+        launch()
+        continue
+      for future in done:
+        pending.pop(future)
+        try:
+          response = future.result()
+        except Exception as e:
+          last_error = e
+          continue
+        # Threads cannot be interrupted: a loser already running finishes and still uses quota.
+        for loser in pending:
+          loser.cancel()
+        return response
+      if not pending and candidates:
+        launch()
+    raise last_error
+
+  async def generate_completion_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None, hedge: Optional[bool] = None
+  ) -> CompletionResponse:
+    candidates = self.candidates()
+    hedge = self.hedge if hedge is None else hedge
+    pending: dict[asyncio.Task, Backend] = {}
+    last_error = None
+    hedged = not hedge
+
+    def launch():
+      backend = candidates.pop(0)
+      pending[asyncio.create_task(self._call_async(backend, messages, tools))] = backend
+
+    launch()
+    try:
+      while pending:
+        timeout = None
+        if not hedged and candidates:
+          timeout = self.hedge_delay(next(iter(pending.values())))
+        done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+          hedged = True
+          launch()
+          continue
+        for task in done:
+          pending.pop(task)
+          try:
+            return task.result()
+          except Exception as e:
+            last_error = e
+        if not pending and candidates:
+          launch()
+      raise last_error
+    finally:
+      for task in pending:
+        task.cancel()
+      if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+  def stream_completion(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None, hedge: Optional[bool] = None
+  ) -> Iterator[CompletionChunk]:
+    candidates = self.candidates(stream=True)
+    last_error = None
+    if not (self.hedge if hedge is None else hedge) or len(candidates) < 2:
+      for backend in candidates:
+        backend.begin()
+        start = self.clock()
+        chunks = iter(backend.model.stream_completion(messages, tools))
+        try:
+          first = next(chunks, None)
+        except Exception as e:
+          backend.failed(stream=True)
+          last_error = e
+          continue
+        yield from self._rest(backend, chunks, first, self.clock() - start)
+        return
+      raise last_error
+
+    executor = self._pool()
+    pending: dict[Future, tuple[Backend, Iterator[CompletionChunk], float]] = {}
+    hedged = False
+
+    def launch():
+      backend = candidates.pop(0)
+      backend.begin()
+      chunks = iter(backend.model.stream_completion(messages, tools))
+      pending[executor.submit(next, chunks, None)] = (backend, chunks, self.clock())
+
+    launch()
+    while pending:
+      timeout = None
+      if not hedged and candidates:
+        timeout = self.hedge_delay(next(iter(pending.values()))[0], stream=True)
+      done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+      if not done:
+        hedged = True
+        launch()
+        continue
+      for future in done:
+        backend, chunks, start = pending.pop(future)
+        try:
+          first = future.result()
+        except Exception as e:
+          backend.failed(stream=True)
+          last_error = e
+          continue
+        for loser, (other, other_chunks, other_start) in pending.items():
+          other.abandoned(self.clock() - other_start, stream=True)
+          # The thread waiting on a first chunk cannot be interrupted; close its stream after.
+          loser.add_done_callback(lambda _, chunks=other_chunks: _close(chunks))
+        yield from self._rest(backend, chunks, first, self.clock() - start)
+        return
+      if not pending and candidates:
+        launch()
+    raise last_error
+
+  async def stream_completion_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None, hedge: Optional[bool] = None
+  ) -> AsyncIterator[CompletionChunk]:
+    candidates = self.candidates(stream=True)
+    pending: dict[asyncio.Task, tuple[Backend, AsyncIterator[CompletionChunk], float]] = {}
+    last_error = None
+    hedged = not (self.hedge if hedge is None else hedge)
+    winner = None
+
+    def launch():
+      backend = candidates.pop(0)
+      backend.begin()
+      chunks = aiter(backend.model.stream_completion_async(messages, tools))
+      pending[asyncio.ensure_future(anext(chunks, None))] = (backend, chunks, self.clock())
+
+    launch()
+    try:
+      while pending and winner is None:
+        timeout = None
+        if not hedged and candidates:
+          timeout = self.hedge_delay(next(iter(pending.values()))[0], stream=True)
+        done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+          hedged = True
+          launch()
+          continue
+        for task in done:
+          backend, chunks, start = pending.pop(task)
+          try:
+            first = task.result()
+          except Exception as e:
+            backend.failed(stream=True)
+            last_error = e
+            continue
+          if winner is None:
+            winner = (backend, chunks, first, self.clock() - start)
+          else:
+            backend.abandoned(self.clock() - start, stream=True)
+            await _aclose(chunks)
+        if winner is None and not pending and candidates:
+          launch()
+    finally:
+      for task in pending:
+        task.cancel()
+      if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+      for backend, chunks, start in pending.values():
+        backend.abandoned(self.clock() - start, stream=True)
+        await _aclose(chunks)
+    if winner is None:
+      raise last_error
+
+    backend, chunks, first, ttft = winner
+    if first is not None:
+      yield first
+    try:
+      async for chunk in chunks:
+        yield chunk
+    except Exception:
+      backend.failed(stream=True)
+      raise
+    backend.succeeded(ttft, stream=True)
+
+  def close(self):
+    if self._executor is not None:
+      self._executor.shutdown(wait=False, cancel_futures=True)
+
+  def _pool(self) -> ThreadPoolExecutor:
+    if self._executor is None:
+      self._executor = ThreadPoolExecutor(
+        max_workers=4 * len(self.backends), thread_name_prefix="router"
+      )
+    return self._executor
+
+  def _rest(
+    self, backend: Backend, chunks: Iterator[CompletionChunk], first, ttft: float
+  ) -> Iterator[CompletionChunk]:
+    # Time to first chunk is the latency streams are ranked and hedged on.
+    if first is not None:
+      yield first
+    try:
+      yield from chunks
+    except Exception:
+      backend.failed(stream=True)
+      raise
+    backend.succeeded(ttft, stream=True)
+
+  def _call(
+    self, backend: Backend, messages: list[Message], tools: Optional[list[Tool]]
+  ) -> CompletionResponse:
+    backend.begin()
+    start = self.clock()
+    try:
+      response = backend.model.generate_completion(messages, tools)
+    except Exception:
+      backend.failed()
+      raise
+    backend.succeeded(self.clock() - start)
+    return response
+
+  async def _call_async(
+    self, backend: Backend, messages: list[Message], tools: Optional[list[Tool]]
+  ) -> CompletionResponse:
+    backend.begin()
+    start = self.clock()
+    try:
+      response = await backend.model.generate_completion_async(messages, tools)
+    except asyncio.CancelledError:
+      backend.abandoned(self.clock() - start)
+      raise
+    except Exception:
+      backend.failed()
+      raise
+    backend.succeeded(self.clock() - start)
+    return response
+
+
+def _close(chunks: Iterator):
+  close = getattr(chunks, "close", None)
+  if close is not None:
+    close()
+
+
+async def _aclose(chunks: AsyncIterator):
+  aclose = getattr(chunks, "aclose", None)
+  if aclose is not None:
+    await aclose()
@@ -0,0 +1,223 @@
+import json
+from functools import cached_property
+from typing import AsyncIterator, Iterator, Optional
+import httpx
+from agent.identity import DEFAULT_CAPACITY
+from agent.model import (
+  CompletionChunk,
+  CompletionResponse,
+  Message,
+  Tool,
+  ToolCall,
+  ToolCallDelta,
+  Usage,
+)
+from agent.sources.formatting import PayloadFormatter
+
+
+class TransportError(Exception):
+  def __init__(self, status_code: int, message: str, response: Optional[httpx.Response] = None):
+    super().__init__(message)
+    self.status_code = status_code
+    self.response = response
+
+
+class TransportConnectionError(ConnectionError):
+  pass
+
+
+def _dumps(value) -> bytes:
+  return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def parse_completion(data: dict) -> CompletionResponse:
+  choice = data["choices"][0]
+  message = choice.get("message") or {}
+  tool_calls = [
+    ToolCall(id=tc["id"], name=tc["function"]["name"], arguments=tc["function"]["arguments"])
+    for tc in message.get("tool_calls") or ()
+  ]
+  return CompletionResponse(
+    content=message.get("content") or "",
+    tool_calls=tool_calls,
+    finish_reason=choice.get("finish_reason"),
+    usage=parse_usage(data.get("usage")),
+  )
+
+
+def parse_usage(data: Optional[dict]) -> Optional[Usage]:
+  if not data:
+    return None
+  return Usage(
+    prompt_tokens=data.get("prompt_tokens") or 0,
+    completion_tokens=data.get("completion_tokens") or 0,
+    cached_tokens=(data.get("prompt_tokens_details") or {}).get("cached_tokens") or 0,
+  )
+
+
+def parse_chunk(data: dict) -> Optional[CompletionChunk]:
+  choices = data.get("choices")
+  if not choices:
+    usage = parse_usage(data.get("usage"))
+    return CompletionChunk(usage=usage) if usage is not None else None
+  choice = choices[0]
+  delta = choice.get("delta") or {}
+  tool_calls = []
+  for tc in delta.get("tool_calls") or ():
+    function = tc.get("function") or {}
+    tool_calls.append(
+      ToolCallDelta(
+        index=tc["index"],
+        id=tc.get("id"),
+        name=function.get("name"),
+        arguments=function.get("arguments") or "",
+      )
+    )
+  return CompletionChunk(
+    content=delta.get("content") or "",
+    tool_calls=tool_calls,
+    finish_reason=choice.get("finish_reason"),
+    usage=parse_usage(data.get("usage")),
+  )
+
+
+def sse_data(line: str) -> Optional[str]:
+  if not line.startswith("data:"):
+    return None
+  return line[5:].strip()
+
+
+class FastTransport:
+  def __init__(
+    self,
+    base_url: str,
+    api_key: str,
+    http2: bool = False,
+    timeout: float = 600.0,
+    max_connections: int = 100,
+    max_keepalive: int = 20,
+    cache_size: int = DEFAULT_CAPACITY,
+    transport: Optional[httpx.BaseTransport] = None,
+    async_transport: Optional[httpx.AsyncBaseTransport] = None,
+  ):
+    self.url = base_url.rstrip("/") + "/chat/completions"
+    self.formatter = PayloadFormatter(cache_size, encode=_dumps)
+    self._transport = transport
+    self._async_transport = async_transport
+    self._options = {
+      "http2": http2,
+      "timeout": httpx.Timeout(timeout, connect=10.0),
+      "limits": httpx.Limits(
+        max_connections=max_connections, max_keepalive_connections=max_keepalive
+      ),
+      "headers": {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+    }
+
+  @cached_property
+  def client(self) -> httpx.Client:
+    return httpx.Client(transport=self._transport, **self._options)
+
+  @cached_property
+  def async_client(self) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=self._async_transport, **self._options)
+
+  def body(
+    self, model: str, messages: list[Message], tools: Optional[list[Tool]] = None, stream=False
+  ) -> bytes:
+    parts = [b'{"model":', _dumps(model), b',"messages":[']
+    parts.append(b",".join([self.formatter.message(message) for message in messages]))
+    parts.append(b"]")
+    if tools:
+      parts.append(b',"tools":[')
+      parts.append(b",".join([self.formatter.tool(tool) for tool in tools]))
+      parts.append(b"]")
+    if stream:
+      parts.append(b',"stream":true')
+    parts.append(b"}")
+    return b"".join(parts)
+
+  def post(self, body: bytes) -> dict:
+    try:
+      response = self.client.post(self.url, content=body)
+    except httpx.TransportError as e:
+      raise TransportConnectionError(str(e)) from e
+    _check(response, response.content)
+    return json.loads(response.content)
+
+  async def post_async(self, body: bytes) -> dict:
+    try:
+      response = await self.async_client.post(self.url, content=body)
+    except httpx.TransportError as e:
+      raise TransportConnectionError(str(e)) from e
+    _check(response, response.content)
+    return json.loads(response.content)
+
+  def open_stream(self, body: bytes) -> httpx.Response:
+    request = self.client.build_request("POST", self.url, content=body)
+    try:
+      response = self.client.send(request, stream=True)
+    except httpx.TransportError as e:
+      raise TransportConnectionError(str(e)) from e
+    if response.status_code >= 400:
+      try:
+        _check(response, response.read())
+      finally:
+        response.close()
+    return response
+
+  async def open_stream_async(self, body: bytes) -> httpx.Response:
+    request = self.async_client.build_request("POST", self.url, content=body)
+    try:
+      response = await self.async_client.send(request, stream=True)
+    except httpx.TransportError as e:
+      raise TransportConnectionError(str(e)) from e
+    if response.status_code >= 400:
+      try:
+        _check(response, await response.aread())
+      finally:
+        await response.aclose()
+    return response
+
+  def events(self, response: httpx.Response) -> Iterator[dict]:
+    try:
+      for line in response.iter_lines():
+        data = sse_data(line)
+        if data == "[DONE]":
+          return
+        if data:
+          yield json.loads(data)
+    finally:
+      response.close()
+
+  async def events_async(self, response: httpx.Response) -> AsyncIterator[dict]:
+    try:
+      async for line in response.aiter_lines():
+        data = sse_data(line)
+        if data == "[DONE]":
+          return
+        if data:
+          yield json.loads(data)
+    finally:
+      await response.aclose()
+
+  def close(self):
+    if "client" in self.__dict__:
+      self.client.close()
+
+  async def aclose(self):
+    self.close()
+    if "async_client" in self.__dict__:
+      await self.async_client.aclose()
+
+
+def _check(response: httpx.Response, content: bytes):
+  if response.status_code < 400:
+    return
+  message = content.decode("utf-8", "replace")
+  try:
+    error = json.loads(content).get("error")
+    if isinstance(error, dict):
+      message = error.get("message") or message
+  except (ValueError, AttributeError):
+    pass
+  raise TransportError(response.status_code, f"HTTP {response.status_code}: {message}", response)
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass
+from typing import Optional, Sequence
+from agent.background import BackgroundRunner, Pending
+from agent.model import BaseModel, Message
+
+SUMMARY_INSTRUCTIONS = (
+  "You maintain a running summary of a conversation between a user and an assistant. "
+  "Rewrite the current summary so it also covers the new turns. Keep names, facts, "
+  "decisions, preferences and open questions; drop small talk. Reply with the summary only."
+)
+
+
+@dataclass
+class SummaryCheckpoint:
+  summary: str = ""
+  covered: int = 0
+  created_at: float = 0.0
+
+
+class SummaryStore:
+  def __init__(self, path: str):
+    self.path = path
+
+  @classmethod
+  def for_session(cls, directory: str, session_id: str) -> "SummaryStore":
+    return cls(os.path.join(directory, f"{session_id}.jsonl"))
+
+  def append(self, checkpoint: SummaryCheckpoint):
+    directory = os.path.dirname(self.path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    with open(self.path, "a", encoding="utf-8") as f:
+      f.write(json.dumps(asdict(checkpoint)) + "\n")
+      f.flush()
+      os.fsync(f.fileno())
+
+  def latest(self) -> Optional[SummaryCheckpoint]:
+    line = self._last_line()
+    if not line:
+      return None
+    return SummaryCheckpoint(**json.loads(line))
+
+  def _last_line(self, block_size: int = 4096) -> str:
+    if not os.path.exists(self.path):
+      return ""
+    with open(self.path, "rb") as f:
+      f.seek(0, os.SEEK_END)
+      position = f.tell()
+      data = b""
+      while position > 0:
+        step = min(block_size, position)
+        position -= step
+        f.seek(position)
+        data = f.read(step) + data
+        lines = data.rstrip(b"\n").split(b"\n")
+        if len(lines) > 1 or position == 0:
+          return lines[-1].decode("utf-8")
+    return ""
+
+
+class RollingSummarizer:
+  def __init__(
+    self,
+    model: BaseModel,
+    keep_recent: int = 20,
+    min_batch: int = 10,
+    store: Optional[SummaryStore] = None,
+  ):
+    self.model = model
+    self.keep_recent = keep_recent
+    self.min_batch = min_batch
+    self.store = store
+    self.checkpoint = (store.latest() if store else None) or SummaryCheckpoint()
+    self.last_error: Optional[BaseException] = None
+    self._pending: Optional[Pending] = None
+    self._lock = threading.Lock()
+    self._runner = BackgroundRunner()
+
+  def summary_message(self) -> Optional[Message]:
+    if not self.checkpoint.summary:
+      return None
+    return Message(
+      role="system", content=f"Summary of the earlier conversation:\n{self.checkpoint.summary}"
+    )
+
+  def rebase(self, history_length: int):
+    # A checkpoint past the end of the history belongs to some other conversation.
+    if self.checkpoint.covered > history_length:
+      self.reset()
+
+  def reset(self):
+    self.checkpoint = SummaryCheckpoint(created_at=time.time())
+    if self.store:
+      self.store.append(self.checkpoint)
+
+  def schedule(self, history: Sequence[Message]) -> Optional[Pending]:
+    with self._lock:
+      if self._pending is not None and not self._pending.done():
+        return None
+      start = self.checkpoint.covered
+      end = len(history) - self.keep_recent
+      if end - start < self.min_batch:
+        return None
+      self._pending = self._runner.submit(self.fold(list(history[start:end]), end))
+      return self._pending
+
+  async def fold(self, turns: list[Message], covered: int) -> SummaryCheckpoint:
+    previous = self.checkpoint
+    transcript = "\n".join(f"{message.role}: {message.content}" for message in turns)
+    messages = [
+      Message(role="system", content=SUMMARY_INSTRUCTIONS),
+      Message(
+        role="user",
+        content=f"Current summary:\n{previous.summary or '(empty)'}\n\nNew turns:\n{transcript}",
+      ),
+    ]
+    try:
+      response = await self.model.generate_completion_async(messages)
+    except Exception as e:
+      self.last_error = e
+      return previous
+    if self.checkpoint is not previous:
+      return self.checkpoint
+
+    checkpoint = SummaryCheckpoint(response.content.strip(), covered, time.time())
+    if self.store:
+      self.store.append(checkpoint)
+    self.checkpoint = checkpoint
+    return checkpoint
+
+  def wait(self, timeout: Optional[float] = None):
+    pending = self._pending
+    if isinstance(pending, Future):
+      pending.result(timeout)
+
+  def close(self):
+    self._runner.close()
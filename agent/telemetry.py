@@ -0,0 +1,360 @@
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterator, Optional, Sequence
+
+if TYPE_CHECKING:
+  from agent.model import CompletionChunk, Usage
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_current: ContextVar[Optional["Span"]] = ContextVar("agent_span", default=None)
+
+
+class Histogram:
+  __slots__ = ("buckets", "counts", "sum", "count")
+
+  def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+    self.buckets = tuple(buckets)
+    self.counts = [0] * (len(self.buckets) + 1)
+    self.sum = 0.0
+    self.count = 0
+
+  def observe(self, value: float):
+    self.counts[bisect_left(self.buckets, value)] += 1
+    self.sum += value
+    self.count += 1
+
+  def quantile(self, q: float) -> float:
+    if not self.count:
+      return 0.0
+    rank = q * self.count
+    seen = 0
+    for bound, count in zip(self.buckets, self.counts):
+      seen += count
+      if seen >= rank:
+        return bound
+    return float("inf")
+
+
+class MetricsRegistry:
+  def __init__(self, namespace: str = "agent", buckets: Sequence[float] = DEFAULT_BUCKETS):
+    self.namespace = namespace
+    self.buckets = tuple(buckets)
+    self._counters: dict[tuple[str, tuple], float] = {}
+    self._histograms: dict[tuple[str, tuple], Histogram] = {}
+    self._lock = threading.Lock()
+
+  def inc(self, name: str, value: float = 1.0, **labels: Any):
+    key = (name, _label_key(labels))
+    with self._lock:
+      self._counters[key] = self._counters.get(key, 0.0) + value
+
+  def observe(self, name: str, value: float, **labels: Any):
+    key = (name, _label_key(labels))
+    with self._lock:
+      histogram = self._histograms.get(key)
+      if histogram is None:
+        histogram = self._histograms[key] = Histogram(self.buckets)
+      histogram.observe(value)
+
+  def counter(self, name: str, **labels: Any) -> float:
+    return self._counters.get((name, _label_key(labels)), 0.0)
+
+  def histogram(self, name: str, **labels: Any) -> Optional[Histogram]:
+    return self._histograms.get((name, _label_key(labels)))
+
+  def render(self) -> str:
+    lines = []
+    with self._lock:
+      counters = sorted(self._counters.items())
+      histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+      typed = set()
+      for (name, labels), value in counters:
+        metric = f"{self.namespace}_{name}"
+        if metric not in typed:
+          typed.add(metric)
+          lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_format_labels(labels)} {_format_value(value)}")
+      for (name, labels), histogram in histograms:
+        metric = f"{self.namespace}_{name}"
+        if metric not in typed:
+          typed.add(metric)
+          lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, count in zip((*histogram.buckets, float("inf")), histogram.counts):
+          cumulative += count
+          le = "+Inf" if bound == float("inf") else _format_value(bound)
+          lines.append(f"{metric}_bucket{_format_labels((*labels, ('le', le)))} {cumulative}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+class Span:
+  __slots__ = (
+    "telemetry",
+    "name",
+    "trace_id",
+    "span_id",
+    "parent_id",
+    "start",
+    "duration",
+    "status",
+    "attributes",
+    "_began",
+    "_previous",
+  )
+
+  def __init__(
+    self,
+    telemetry: "Telemetry",
+    name: str,
+    parent: Optional["Span"],
+    attributes: dict[str, Any],
+  ):
+    self.telemetry = telemetry
+    self.name = name
+    self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+    self.span_id = os.urandom(8).hex()
+    self.parent_id = parent.span_id if parent is not None else None
+    self.start = time.time()
+    self.duration: Optional[float] = None
+    self.status = "ok"
+    self.attributes = attributes
+    self._began = time.perf_counter()
+    self._previous: Optional[Span] = None
+
+  def set(self, **attributes: Any):
+    self.attributes.update(attributes)
+
+  def __enter__(self) -> "Span":
+    self._previous = _current.get()
+    _current.set(self)
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    # Restored by value, not token, so spans held open across generator yields can close anywhere.
+    _current.set(self._previous)
+    if exc is not None and not isinstance(exc, GeneratorExit):
+      self.status = "error"
+      self.attributes["error"] = f"{type(exc).__name__}: {exc}"
+    self.telemetry.finish(self, time.perf_counter() - self._began)
+
+  def to_dict(self) -> dict[str, Any]:
+    return {
+      "name": self.name,
+      "trace_id": self.trace_id,
+      "span_id": self.span_id,
+      "parent_id": self.parent_id,
+      "start": self.start,
+      "duration": self.duration,
+      "status": self.status,
+      "attributes": self.attributes,
+    }
+
+
+class NullSpan:
+  __slots__ = ()
+
+  def set(self, **attributes: Any):
+    pass
+
+  def __enter__(self) -> "NullSpan":
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class SpanExporter(ABC):
+  @abstractmethod
+  def export(self, span: Span):
+    pass
+
+  def close(self):
+    pass
+
+
+class InMemoryExporter(SpanExporter):
+  def __init__(self):
+    self.spans: list[Span] = []
+
+  def export(self, span: Span):
+    self.spans.append(span)
+
+  def named(self, name: str) -> list[Span]:
+    return [span for span in self.spans if span.name == name]
+
+
+class JsonlExporter(SpanExporter):
+  def __init__(self, path: str, flush_every: int = 64):
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    self.path = path
+    self.flush_every = flush_every
+    self._file = open(path, "a", encoding="utf-8")
+    self._pending = 0
+    self._lock = threading.Lock()
+
+  def export(self, span: Span):
+    line = json.dumps(span.to_dict(), default=str, separators=(",", ":"))
+    with self._lock:
+      self._file.write(line + "\n")
+      self._pending += 1
+      if span.parent_id is None or self._pending >= self.flush_every:
+        self._file.flush()
+        self._pending = 0
+
+  def close(self):
+    with self._lock:
+      if not self._file.closed:
+        self._file.close()
+
+
+class Telemetry:
+  def __init__(
+    self,
+    exporters: Sequence[SpanExporter] = (),
+    metrics: Optional[MetricsRegistry] = None,
+    enabled: bool = True,
+  ):
+    self.exporters = list(exporters)
+    self.metrics = metrics if metrics is not None else MetricsRegistry()
+    self.enabled = enabled
+
+  def span(self, name: str, **attributes: Any):
+    if not self.enabled:
+      return NULL_SPAN
+    return Span(self, name, _current.get(), attributes)
+
+  def current(self) -> Optional[Span]:
+    return _current.get() if self.enabled else None
+
+  def record(self, name: str, duration: float, status: str = "ok", **attributes: Any):
+    if not self.enabled:
+      return
+    span = Span(self, name, _current.get(), attributes)
+    span.start -= duration
+    span.status = status
+    self.finish(span, duration)
+
+  def finish(self, span: Span, duration: float):
+    span.duration = duration
+    self.metrics.observe("span_seconds", duration, span=span.name)
+    if span.status != "ok":
+      self.metrics.inc("span_errors_total", span=span.name, status=span.status)
+    for exporter in self.exporters:
+      exporter.export(span)
+
+  def record_usage(self, span, usage: Optional["Usage"], model: str = ""):
+    if usage is None or not self.enabled:
+      return
+    span.set(
+      prompt_tokens=usage.prompt_tokens,
+      completion_tokens=usage.completion_tokens,
+      cached_tokens=usage.cached_tokens,
+    )
+    self.metrics.inc("tokens_total", usage.prompt_tokens, kind="prompt", model=model)
+    self.metrics.inc("tokens_total", usage.completion_tokens, kind="completion", model=model)
+    self.metrics.inc("tokens_total", usage.cached_tokens, kind="cached", model=model)
+
+  def trace_stream(
+    self, chunks: Iterator["CompletionChunk"], name: str = "model", **attributes: Any
+  ) -> Iterator["CompletionChunk"]:
+    if not self.enabled:
+      return chunks
+    return self._trace_stream(chunks, name, attributes)
+
+  def trace_stream_async(
+    self, chunks: AsyncIterator["CompletionChunk"], name: str = "model", **attributes: Any
+  ) -> AsyncIterator["CompletionChunk"]:
+    if not self.enabled:
+      return chunks
+    return self._trace_stream_async(chunks, name, attributes)
+
+  def close(self):
+    for exporter in self.exporters:
+      exporter.close()
+
+  def _trace_stream(
+    self, chunks: Iterator["CompletionChunk"], name: str, attributes: dict[str, Any]
+  ) -> Iterator["CompletionChunk"]:
+    with self.span(name, **attributes) as span:
+      first = True
+      for chunk in chunks:
+        if first:
+          first = False
+          self._first_token(span)
+        self.record_usage(span, chunk.usage, attributes.get("model", ""))
+        yield chunk
+
+  async def _trace_stream_async(
+    self, chunks: AsyncIterator["CompletionChunk"], name: str, attributes: dict[str, Any]
+  ) -> AsyncIterator["CompletionChunk"]:
+    with self.span(name, **attributes) as span:
+      first = True
+      async for chunk in chunks:
+        if first:
+          first = False
+          self._first_token(span)
+        self.record_usage(span, chunk.usage, attributes.get("model", ""))
+        yield chunk
+
+  def _first_token(self, span: Span):
+    ttft = time.perf_counter() - span._began
+    span.set(ttft=ttft)
+    self.metrics.observe("ttft_seconds", ttft, model=span.attributes.get("model", ""))
+
+
+DISABLED = Telemetry(enabled=False)
+
+
+def serve_metrics(metrics: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464):
+  from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+  class Handler(BaseHTTPRequestHandler):
+    def log_message(self, format: str, *args: Any):
+      pass
+
+    def do_GET(self):
+      if self.path.split("?")[0] != "/metrics":
+        self.send_error(404)
+        return
+      body = metrics.render().encode()
+      self.send_response(200)
+      self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+      self.send_header("Content-Length", str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+  server = ThreadingHTTPServer((host, port), Handler)
+  threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+  return server
+
+
+def _label_key(labels: dict[str, Any]) -> tuple:
+  return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: tuple) -> str:
+  if not labels:
+    return ""
+  return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _escape(value: str) -> str:
+  return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+  return str(int(value)) if float(value).is_integer() else repr(float(value))
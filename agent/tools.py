@@ -0,0 +1,144 @@
+import asyncio
+import inspect
+import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Optional
+from agent.background import run_sync
+from agent.model import Message, Tool, ToolCall
+from agent.offload import ProcessPool
+
+
+@dataclass
+class FunctionTool:
+  name: str
+  description: str
+  parameters: dict[str, Any]
+  fn: Callable[..., Any]
+  timeout: Optional[float] = None
+  pure: bool = False
+  process: bool = False
+
+  @property
+  def is_async(self) -> bool:
+    return inspect.iscoroutinefunction(self.fn)
+
+  def definition(self) -> Tool:
+    return Tool(name=self.name, description=self.description, parameters=self.parameters)
+
+
+def format_result(result: Any) -> str:
+  if isinstance(result, str):
+    return result
+  return json.dumps(result, ensure_ascii=False, default=str)
+
+
+class ToolRegistry:
+  def __init__(
+    self, default_timeout: Optional[float] = 30.0, max_workers: int = 8, memo_size: int = 1024
+  ):
+    self.default_timeout = default_timeout
+    self.max_workers = max_workers
+    self.memo_size = memo_size
+    self.tools: dict[str, FunctionTool] = {}
+    self._memo: OrderedDict[tuple[str, str], str] = OrderedDict()
+    self._threads: Optional[ThreadPoolExecutor] = None
+    self._processes: Optional[ProcessPool] = None
+
+  def __len__(self) -> int:
+    return len(self.tools)
+
+  def register(self, tool: FunctionTool) -> FunctionTool:
+    self.tools[tool.name] = tool
+    return tool
+
+  def tool(
+    self,
+    name: Optional[str] = None,
+    description: str = "",
+    parameters: Optional[dict[str, Any]] = None,
+    timeout: Optional[float] = None,
+    pure: bool = False,
+    process: bool = False,
+  ) -> Callable:
+    def decorator(fn: Callable) -> Callable:
+      self.register(
+        FunctionTool(
+          name=name or fn.__name__,
+          description=description or inspect.getdoc(fn) or "",
+          parameters=parameters or {"type": "object", "properties": {}},
+          fn=fn,
+          timeout=timeout,
+          pure=pure,
+          process=process,
+        )
+      )
+      return fn
+
+    return decorator
+
+  def definitions(self) -> list[Tool]:
+    return [tool.definition() for tool in self.tools.values()]
+
+  async def execute(self, calls: list[ToolCall]) -> list[Message]:
+    results = await asyncio.gather(*(self._execute_one(call) for call in calls))
+    return [
+      Message(role="tool", content=result, tool_call_id=call.id)
+      for call, result in zip(calls, results)
+    ]
+
+  def run(self, calls: list[ToolCall]) -> list[Message]:
+    return run_sync(self.execute(calls))
+
+  def close(self):
+    if self._threads is not None:
+      self._threads.shutdown(wait=False, cancel_futures=True)
+    if self._processes is not None:
+      self._processes.close()
+
+  async def _execute_one(self, call: ToolCall) -> str:
+    tool = self.tools.get(call.name)
+    if tool is None:
+      return f"Error: unknown tool {call.name!r}"
+    try:
+      arguments = json.loads(call.arguments) if call.arguments.strip() else {}
+    except json.JSONDecodeError as e:
+      return f"Error: invalid JSON arguments for {call.name}: {e}"
+    if not isinstance(arguments, dict):
+      return f"Error: arguments for {call.name} must be a JSON object"
+
+    key = (tool.name, json.dumps(arguments, sort_keys=True, default=str))
+    if tool.pure and key in self._memo:
+      self._memo.move_to_end(key)
+      return self._memo[key]
+
+    timeout = tool.timeout if tool.timeout is not None else self.default_timeout
+    try:
+      result = format_result(await asyncio.wait_for(self._invoke(tool, arguments), timeout))
+    except asyncio.TimeoutError:
+      return f"Error: {call.name} timed out after {timeout}s"
+    except Exception as e:
+      return f"Error: {call.name} failed: {type(e).__name__}: {e}"
+
+    if tool.pure:
+      self._memo[key] = result
+      if len(self._memo) > self.memo_size:
+        self._memo.popitem(last=False)
+    return result
+
+  async def _invoke(self, tool: FunctionTool, arguments: dict[str, Any]) -> Any:
+    if tool.is_async:
+      return await tool.fn(**arguments)
+    if tool.process:
+      if self._processes is None:
+        self._processes = ProcessPool(self.max_workers)
+      return await self._processes.run(partial(tool.fn, **arguments))
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(self._executor(), partial(tool.fn, **arguments))
+
+  def _executor(self) -> ThreadPoolExecutor:
+    if self._threads is None:
+      self._threads = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+    return self._threads
@@ -0,0 +1,38 @@
+import argparse
+import asyncio
+import time
+from agent.batch import BatchRunner
+from agent.sources.glm import GLMModel
+from benchmarks.fake_server import FakeOpenAIServer
+
+
+async def run(model: GLMModel, prompts: list[str], concurrency: int) -> tuple[float, int]:
+  runner = BatchRunner(model, concurrency=concurrency)
+  start = time.perf_counter()
+  results = [result async for result in runner.run(prompts)]
+  errors = sum(1 for result in results if result.error)
+  return time.perf_counter() - start, errors
+
+
+async def sweep(model: GLMModel, prompts: list[str], levels: list[int]):
+  print(f"{'concurrency':>11} {'seconds':>8} {'req/s':>8} {'errors':>7}")
+  for concurrency in levels:
+    elapsed, errors = await run(model, prompts, concurrency)
+    print(f"{concurrency:>11} {elapsed:>8.2f} {len(prompts) / elapsed:>8.1f} {errors:>7}")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Batch throughput by concurrency limit")
+  parser.add_argument("--prompts", type=int, default=200)
+  parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+  parser.add_argument("--latency", type=float, default=0.05)
+  args = parser.parse_args()
+
+  prompts = [f"prompt {i}" for i in range(args.prompts)]
+  with FakeOpenAIServer(first_token_delay=args.latency) as server:
+    model = GLMModel(api_key="fake-key", model="fake-model", base_url=server.base_url)
+    asyncio.run(sweep(model, prompts, args.concurrency))
+
+
+if __name__ == "__main__":
+  main()
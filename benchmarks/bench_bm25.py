@@ -0,0 +1,58 @@
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import numpy as np
+from agent.enhancers.lexical import BM25Index
+
+
+def synthetic_corpus(size: int, vocabulary: int = 50_000, length: int = 60, seed: int = 0):
+  rng = np.random.default_rng(seed)
+  words = np.array([f"term{i}" for i in range(vocabulary)])
+  for start in range(0, size, 10_000):
+    count = min(10_000, size - start)
+    ids = np.minimum(rng.zipf(1.2, size=(count, length)), vocabulary) - 1
+    for offset, row in enumerate(ids):
+      yield f"doc.md#{start + offset}", " ".join(words[row])
+
+
+def directory_size(path: str) -> int:
+  return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def main():
+  parser = argparse.ArgumentParser(description="BM25 query latency and index size by corpus size")
+  parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+  parser.add_argument("--queries", type=int, default=200)
+  args = parser.parse_args()
+
+  rng = np.random.default_rng(1)
+  queries = [
+    " ".join(f"term{i}" for i in rng.integers(0, 5_000, size=3)) for _ in range(args.queries)
+  ]
+  print(f"{'chunks':>9} {'build (s)':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'size (MB)':>10}")
+  for size in args.sizes:
+    index = BM25Index()
+    start = time.perf_counter()
+    for chunk_id, text in synthetic_corpus(size):
+      index.add(chunk_id, text)
+    build = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as directory:
+      index.save(directory)
+      loaded = BM25Index.load(directory)
+      timings = []
+      for query in queries:
+        start = time.perf_counter()
+        loaded.search(query, top_k=10)
+        timings.append((time.perf_counter() - start) * 1000)
+      timings.sort()
+      p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+      megabytes = directory_size(directory) / 1e6
+      print(
+        f"{size:>9} {build:>10.1f} {statistics.median(timings):>9.2f} {p99:>9.2f} {megabytes:>10.1f}"
+      )
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,75 @@
+import argparse
+import json
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Optional
+from agent.context import ContextWindow
+from agent.ghost import Ghost
+from agent.model import Message
+from agent.sources.glm import GLMModel
+
+
+@dataclass
+class DictMessage:
+  role: str
+  content: str
+  tool_calls: Optional[list] = None
+  tool_call_id: Optional[str] = None
+
+
+def build(cls, count: int) -> list:
+  # Roles decoded from JSON are fresh strings, as they are when loaded from a session log.
+  return [
+    cls(role=json.loads('"user"' if i % 2 == 0 else '"assistant"'), content=f"message {i}")
+    for i in range(count)
+  ]
+
+
+def traced(fn) -> tuple[object, float]:
+  tracemalloc.start()
+  result = fn()
+  size, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return result, size / 2**20
+
+
+def per_turn(ghost: Ghost, model: GLMModel, repeats: int) -> tuple[float, float]:
+  start = time.perf_counter()
+  model._prepare_payload(ghost._prepare_messages())
+  cold = time.perf_counter() - start
+  start = time.perf_counter()
+  for _ in range(repeats):
+    model._prepare_payload(ghost._prepare_messages())
+  return cold, (time.perf_counter() - start) / repeats
+
+
+def main():
+  parser = argparse.ArgumentParser(description="History memory and per-turn payload overhead")
+  parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+  parser.add_argument("--repeats", type=int, default=5)
+  parser.add_argument("--window", type=int, default=32_000, help="Context window tokens")
+  args = parser.parse_args()
+
+  print(
+    f"{'messages':>9} {'dict MiB':>9} {'slot MiB':>9} {'window':>7} "
+    f"{'cold ms':>8} {'warm ms':>8} {'sent':>7}"
+  )
+  for size in args.sizes:
+    legacy, legacy_mib = traced(lambda: build(DictMessage, size))
+    del legacy
+    messages, slotted_mib = traced(lambda: build(Message, size))
+    model = GLMModel(api_key="bench-key")
+    for window in (None, ContextWindow(max_tokens=args.window)):
+      ghost = Ghost(model, context_window=window)
+      ghost.conversation_history = messages
+      cold, warm = per_turn(ghost, model, args.repeats)
+      sent = len(ghost._prepare_messages())
+      print(
+        f"{size:>9} {legacy_mib:>9.1f} {slotted_mib:>9.1f} {'yes' if window else 'no':>7} "
+        f"{cold * 1000:>8.2f} {warm * 1000:>8.2f} {sent:>7}"
+      )
+
+
+if __name__ == "__main__":
+  main()
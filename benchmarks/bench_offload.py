@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import re
+import time
+from agent.ghost import Ghost
+from agent.model import CompletionResponse, Message
+from agent.offload import ProcessPool, resource
+from agent.shell import InputPort, OutputPort, Shell
+from benchmarks.loadgen import percentile
+from benchmarks.fake_models import ScriptedModel
+
+PAYLOAD = " ".join(
+  f"call alice{index}@example.com or +1 555 010 {index:04d} about card 4111 1111 1111 {index:04d}"
+  for index in range(500)
+)
+
+
+def pii_patterns() -> list[re.Pattern]:
+  names = [f"employee{index}" for index in range(100)]
+  return [
+    re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+"),
+    re.compile(r"\+?\d[\d ]{8,}\d"),
+    re.compile(r"\b(?:\d{4} ){3}\d{4}\b"),
+    *(re.compile(rf"\b{name}\b", re.IGNORECASE) for name in names),
+  ]
+
+
+def redact(text: str) -> str:
+  for pattern in resource("pii"):
+    text = pattern.sub("[redacted]", text)
+  return text
+
+
+def redact_input(message: Message) -> Message:
+  redact(f"{message.content} {PAYLOAD}")
+  return message
+
+
+def redact_output(response: CompletionResponse) -> CompletionResponse:
+  redact(f"{response.content} {PAYLOAD}")
+  return response
+
+
+def heavy_shell(pool: ProcessPool, process: bool) -> Shell:
+  shell = Shell(Ghost(ScriptedModel("heavy")), process_pool=pool)
+  port = InputPort("default")
+  port.add_enhancer(redact_input, process=process)
+  shell.add_input_port(port)
+  output = OutputPort("default")
+  output.add_processor(redact_output, process=process)
+  shell.add_output_port(output)
+  return shell
+
+
+async def light_session(shell: Shell, turns: int, latencies: list[float]):
+  for index in range(turns):
+    began = time.perf_counter()
+    await shell.process_input_async(Message(role="user", content=f"quick question {index}"))
+    latencies.append(time.perf_counter() - began)
+    shell.ghost.clear_history()
+
+
+async def heavy_session(shell: Shell, stop: asyncio.Event) -> int:
+  turns = 0
+  while not stop.is_set():
+    response = await shell.process_input_async(Message(role="user", content="redact this"))
+    await shell.process_output_async(response)
+    shell.ghost.clear_history()
+    turns += 1
+  return turns
+
+
+async def run(mode: str, pool: ProcessPool, args) -> tuple[list[float], int]:
+  latencies: list[float] = []
+  stop = asyncio.Event()
+  heavy = None
+  if mode != "none":
+    heavy = asyncio.create_task(heavy_session(heavy_shell(pool, mode == "pool"), stop))
+  model = ScriptedModel("light", latency=args.model_ms / 1000)
+  await asyncio.gather(
+    *(light_session(Shell(Ghost(model)), args.turns, latencies) for _ in range(args.sessions))
+  )
+  stop.set()
+  return latencies, await heavy if heavy is not None else 0
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Other sessions' async turn latency while one session runs a heavy processor"
+  )
+  parser.add_argument("--sessions", type=int, default=20)
+  parser.add_argument("--turns", type=int, default=20)
+  parser.add_argument("--model-ms", type=float, default=20.0)
+  parser.add_argument("--workers", type=int, default=2)
+  args = parser.parse_args()
+
+  pool = ProcessPool(max_workers=args.workers, preload={"pii": pii_patterns})
+  began = time.perf_counter()
+  pool.start()
+  print(f"warmed {args.workers} workers in {time.perf_counter() - began:.2f}s\n")
+
+  print(f"{'heavy':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'heavy turns':>12}")
+  try:
+    for mode in ("none", "inline", "pool"):
+      latencies, heavy_turns = asyncio.run(run(mode, pool, args))
+      print(
+        f"{mode:>7} {percentile(latencies, 50) * 1000:>8.1f} "
+        f"{percentile(latencies, 99) * 1000:>8.1f} {max(latencies) * 1000:>8.1f} "
+        f"{heavy_turns:>12}"
+      )
+  finally:
+    pool.close()
+
+
+if __name__ == "__main__":
+  main()
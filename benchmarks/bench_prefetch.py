@@ -0,0 +1,64 @@
+import argparse
+import time
+from typing import Optional
+from agent.ghost import Ghost
+from agent.model import Message
+from agent.shell import ContextEnhancer, Shell
+from benchmarks.loadgen import percentile
+from benchmarks.fake_models import ScriptedModel
+
+
+class SlowEnhancer(ContextEnhancer):
+  independent = True
+
+  def __init__(self, name: str, delay: float):
+    super().__init__(name)
+    self.delay = delay
+
+  def contribute(self, message: Message) -> Optional[str]:
+    time.sleep(self.delay)
+    return f"{self.name} results for {message.content}"
+
+
+def run(prompts: list[str], prefetch: bool, args) -> tuple[list[float], Shell]:
+  shell = Shell(Ghost(ScriptedModel("fake")))
+  shell.add_context_enhancer(SlowEnhancer("rag", args.rag_ms / 1000))
+  shell.add_context_enhancer(SlowEnhancer("web", args.web_ms / 1000))
+  latencies = []
+  for index, prompt in enumerate(prompts):
+    if prefetch:
+      words = prompt.split()
+      draft = " ".join(words[: max(1, int(len(words) * args.typed))])
+      # Every fourth draft is abandoned and rewritten before sending.
+      shell.prefetch(draft if index % 4 else "a draft about something else entirely")
+    time.sleep(args.think)
+    began = time.perf_counter()
+    shell.process_input(Message(role="user", content=prompt))
+    latencies.append(time.perf_counter() - began)
+  return latencies, shell
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Turn latency with speculative enhancer prefetch")
+  parser.add_argument("--turns", type=int, default=10)
+  parser.add_argument("--think", type=float, default=0.5, help="Seconds between prefetch and send")
+  parser.add_argument("--typed", type=float, default=0.9, help="Share of words typed at prefetch")
+  parser.add_argument("--rag-ms", type=float, default=150.0)
+  parser.add_argument("--web-ms", type=float, default=400.0)
+  args = parser.parse_args()
+
+  prompts = [
+    f"what changed in release {index} of the billing service and why" for index in range(args.turns)
+  ]
+  print(f"{'prefetch':>8} {'p50 ms':>8} {'p95 ms':>8} {'hit rate':>9} {'saved s':>8}")
+  for prefetch in (False, True):
+    latencies, shell = run(prompts, prefetch, args)
+    stats = shell.prefetch_stats
+    print(
+      f"{'on' if prefetch else 'off':>8} {percentile(latencies, 50) * 1000:>8.1f} "
+      f"{percentile(latencies, 95) * 1000:>8.1f} {stats.hit_rate:>9.0%} {stats.saved:>8.2f}"
+    )
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,44 @@
+import argparse
+import statistics
+import tempfile
+import time
+import numpy as np
+from agent.enhancers.rag import Chunk, HashingEmbedder, KnowledgeStore, VectorIndex
+
+
+def synthetic_store(size: int, index_dir: str) -> KnowledgeStore:
+  embedder = HashingEmbedder()
+  store = KnowledgeStore(index_dir, index_dir, embedder=embedder)
+  rng = np.random.default_rng(0)
+  vectors = rng.standard_normal((size, embedder.dim)).astype(np.float32)
+  vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+  VectorIndex(vectors).save(store.vectors_path)
+  store.chunks = [Chunk(f"synthetic.md#{i}", "synthetic.md", "", f"chunk {i}") for i in range(size)]
+  store.index = VectorIndex.load(store.vectors_path)
+  return store
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Knowledge store top-k search latency")
+  parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+  parser.add_argument("--queries", type=int, default=200)
+  parser.add_argument("--top-k", type=int, default=4)
+  args = parser.parse_args()
+
+  print(f"{'chunks':>8} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+  for size in args.sizes:
+    with tempfile.TemporaryDirectory() as index_dir:
+      store = synthetic_store(size, index_dir)
+      store.search("warm up the memory map", args.top_k)
+      timings = []
+      for i in range(args.queries):
+        start = time.perf_counter()
+        store.search(f"how do I stream responses {i}", args.top_k)
+        timings.append((time.perf_counter() - start) * 1000)
+      timings.sort()
+      p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+      print(f"{size:>8} {statistics.median(timings):>9.2f} {p99:>9.2f}")
+
+
+if __name__ == "__main__":
+  main()
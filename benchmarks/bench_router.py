@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+import statistics
+import time
+from agent.model import Message
+from agent.sources.router import RouterModel
+from benchmarks.fake_models import ScriptedModel, lognormal
+
+
+def backends(seed: int) -> dict[str, ScriptedModel]:
+  return {
+    "primary": ScriptedModel("primary", latency=lognormal(0.02, 0.9), seed=seed),
+    "secondary": ScriptedModel("secondary", latency=lognormal(0.03, 0.6), seed=seed + 1),
+  }
+
+
+async def run(router: RouterModel, requests: int, concurrency: int) -> list[float]:
+  messages = [Message(role="user", content="hi")]
+  semaphore = asyncio.Semaphore(concurrency)
+  timings = []
+
+  async def one():
+    async with semaphore:
+      start = time.perf_counter()
+      await router.generate_completion_async(messages)
+      timings.append((time.perf_counter() - start) * 1000)
+
+  await asyncio.gather(*(one() for _ in range(requests)))
+  return sorted(timings)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Router tail latency with and without hedging")
+  parser.add_argument("--requests", type=int, default=1_000)
+  parser.add_argument("--concurrency", type=int, default=20)
+  args = parser.parse_args()
+
+  print(f"{'mode':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'extra calls':>12}")
+  for hedge in (False, True):
+    models = backends(seed=0)
+    router = RouterModel(models, hedge=hedge, min_hedge_delay=0.01)
+    timings = asyncio.run(run(router, args.requests, args.concurrency))
+    extra = sum(model.calls for model in models.values()) - args.requests
+    p95 = timings[int(len(timings) * 0.95)]
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    mode = "hedged" if hedge else "single"
+    print(
+      f"{mode:>10} {statistics.median(timings):>9.1f} {p95:>9.1f} {p99:>9.1f} "
+      f"{extra / args.requests:>12.1%}"
+    )
+
+
+if __name__ == "__main__":
+  main()
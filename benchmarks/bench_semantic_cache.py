@@ -0,0 +1,82 @@
+import argparse
+import json
+import statistics
+import time
+import numpy as np
+from agent.model import CompletionResponse
+from agent.semantic_cache import SemanticCache
+
+TOPICS = [
+  "reset my password",
+  "change the billing address on my account",
+  "export my chat history",
+  "connect the calendar integration",
+  "cancel my subscription",
+  "enable two factor authentication",
+  "speed up long conversations",
+  "add documents to the knowledge base",
+  "delete a stored memory",
+  "switch to a cheaper model",
+]
+TEMPLATES = [
+  "How do I {}?",
+  "how can I {}",
+  "How do I {} please?",
+  "What's the way to {}?",
+  "can you tell me how to {}",
+  "I want to {}, how?",
+]
+
+
+def synthetic_log(turns: int, seed: int = 0) -> list[tuple[str, str]]:
+  rng = np.random.default_rng(seed)
+  topics = np.minimum(rng.zipf(1.3, size=turns), len(TOPICS)) - 1
+  templates = rng.integers(0, len(TEMPLATES), size=turns)
+  return [
+    (TEMPLATES[template].format(TOPICS[topic]), TOPICS[topic])
+    for topic, template in zip(topics, templates)
+  ]
+
+
+def load_log(path: str) -> list[tuple[str, str]]:
+  with open(path, encoding="utf-8") as f:
+    turns = [json.loads(line) for line in f if line.strip()]
+  return [(turn["content"], turn.get("intent", turn["content"])) for turn in turns]
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Semantic cache hit rate and lookup latency")
+  parser.add_argument("--log", type=str, help='JSONL of {"content", "intent"} user turns')
+  parser.add_argument("--turns", type=int, default=2_000)
+  parser.add_argument("--thresholds", type=float, nargs="+", default=[0.95, 0.9, 0.8, 0.7, 0.6])
+  parser.add_argument("--max-entries", type=int, default=1_000)
+  args = parser.parse_args()
+
+  log = load_log(args.log) if args.log else synthetic_log(args.turns)
+  print(
+    f"{'threshold':>9} {'hit rate':>9} {'wrong':>7} {'p50 (ms)':>9} {'p99 (ms)':>9} {'entries':>8}"
+  )
+  for threshold in args.thresholds:
+    cache = SemanticCache(threshold=threshold, max_entries=args.max_entries)
+    timings = []
+    wrong = 0
+    for content, intent in log:
+      start = time.perf_counter()
+      key = cache.key(content)
+      cached = cache.lookup(key)
+      timings.append((time.perf_counter() - start) * 1000)
+      if cached is None:
+        cache.store(key, CompletionResponse(content=intent, tool_calls=[], finish_reason="stop"))
+      elif cached.content != intent:
+        wrong += 1
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    hits = cache.stats.hits
+    print(
+      f"{threshold:>9.2f} {cache.stats.hit_rate:>9.1%} {wrong / max(hits, 1):>7.1%} "
+      f"{statistics.median(timings):>9.3f} {p99:>9.3f} {len(cache):>8}"
+    )
+
+
+if __name__ == "__main__":
+  main()
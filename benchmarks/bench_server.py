@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+import tempfile
+import time
+import tracemalloc
+from agent.ghost import Ghost
+from agent.server import SessionManager
+from agent.shell import Shell
+from benchmarks.fake_models import ScriptedModel
+
+
+async def run(manager: SessionManager, sessions: int, turns: int, concurrency: int) -> float:
+  semaphore = asyncio.Semaphore(concurrency)
+
+  async def converse(session_id: str):
+    async with semaphore:
+      for turn in range(turns):
+        await manager.complete(session_id, f"turn {turn}")
+
+  start = time.perf_counter()
+  await asyncio.gather(*(converse(f"s{i}") for i in range(sessions)))
+  return time.perf_counter() - start
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Session manager memory and throughput")
+  parser.add_argument("--sessions", type=int, default=5000)
+  parser.add_argument("--turns", type=int, default=3)
+  parser.add_argument("--concurrency", type=int, default=200)
+  parser.add_argument("--max-active", type=int, nargs="+", default=[256, 100_000])
+  args = parser.parse_args()
+
+  model = ScriptedModel("fake", latency=0.001)
+  print(f"{'max_active':>10} {'seconds':>8} {'turns/s':>8} {'resident':>9} {'peak MiB':>9}")
+  for max_active in args.max_active:
+    with tempfile.TemporaryDirectory() as directory:
+      manager = SessionManager(
+        lambda log: Shell(Ghost(model, session=log)),
+        directory=directory,
+        max_active=max_active,
+        max_turns=args.concurrency,
+      )
+      tracemalloc.start()
+      elapsed = asyncio.run(run(manager, args.sessions, args.turns, args.concurrency))
+      _, peak = tracemalloc.get_traced_memory()
+      tracemalloc.stop()
+      resident = len(manager.sessions)
+      manager.close()
+    total = args.sessions * args.turns
+    print(
+      f"{max_active:>10} {elapsed:>8.2f} {total / elapsed:>8.0f} {resident:>9} {peak / 2**20:>9.1f}"
+    )
+
+
+if __name__ == "__main__":
+  main()
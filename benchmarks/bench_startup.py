@@ -0,0 +1,46 @@
+import argparse
+import statistics
+import subprocess
+import sys
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+  result = subprocess.run(
+    [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+    capture_output=True,
+    text=True,
+    check=True,
+  )
+  times = {}
+  for line in result.stderr.splitlines():
+    own, cumulative, name = line.removeprefix("import time:").split("|")
+    if own.strip().isdigit():
+      times[name.strip()] = (int(own), int(cumulative))
+  return times
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Import time of CLI entry points (-X importtime)")
+  parser.add_argument(
+    "--modules", nargs="+", default=["agent", "main", "server", "agent.sources.glm"]
+  )
+  parser.add_argument("--runs", type=int, default=5)
+  parser.add_argument("--top", type=int, default=8, help="Slowest modules to list by self time")
+  args = parser.parse_args()
+
+  print(f"{'module':>20} {'median ms':>10} {'min ms':>8}")
+  slowest = {}
+  for module in args.modules:
+    runs = [import_times(module) for _ in range(args.runs)]
+    totals = [times[module][1] / 1000 for times in runs]
+    print(f"{module:>20} {statistics.median(totals):>10.1f} {min(totals):>8.1f}")
+    for name, (own, _) in runs[-1].items():
+      slowest[name] = max(slowest.get(name, 0), own)
+
+  print(f"\n{'slowest imports':>40} {'self ms':>8}")
+  for name, own in sorted(slowest.items(), key=lambda item: -item[1])[: args.top]:
+    print(f"{name:>40} {own / 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,49 @@
+import argparse
+import os
+import tempfile
+import time
+from agent.ghost import Ghost
+from agent.model import Message
+from agent.shell import Shell
+from agent.telemetry import JsonlExporter, Telemetry
+from benchmarks.fake_models import ScriptedModel
+
+
+def per_turn(shell: Shell, turns: int, stream: bool) -> float:
+  message = Message(role="user", content="hello")
+  start = time.perf_counter()
+  for _ in range(turns):
+    if stream:
+      for _ in shell.process_input_stream(message):
+        pass
+    else:
+      shell.process_input(message)
+    shell.ghost.clear_history()
+  return (time.perf_counter() - start) / turns
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Per-turn overhead of tracing and metrics")
+  parser.add_argument("--turns", type=int, default=20_000)
+  args = parser.parse_args()
+
+  model = ScriptedModel("fake")
+  with tempfile.TemporaryDirectory() as directory:
+    exporter = JsonlExporter(os.path.join(directory, "spans.jsonl"))
+    configs = [
+      ("none", None),
+      ("disabled", Telemetry(enabled=False)),
+      ("metrics", Telemetry()),
+      ("jsonl", Telemetry(exporters=[exporter])),
+    ]
+    print(f"{'telemetry':>10} {'turn us':>8} {'stream us':>10}")
+    for name, telemetry in configs:
+      shell = Shell(Ghost(model, telemetry=telemetry))
+      turn = per_turn(shell, args.turns, stream=False)
+      streamed = per_turn(shell, args.turns, stream=True)
+      print(f"{name:>10} {turn * 1e6:>8.1f} {streamed * 1e6:>10.1f}")
+    exporter.close()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import json
+import time
+from agent.ghost import Ghost
+from agent.model import BaseModel, CompletionResponse, Message, ToolCall
+from agent.tools import ToolRegistry
+
+
+class ToolCallingModel(BaseModel):
+  def __init__(self, calls: list[ToolCall]):
+    self.calls = calls
+
+  def generate_completion(self, messages, tools=None):
+    raise NotImplementedError
+
+  async def generate_completion_async(self, messages, tools=None):
+    if messages[-1].role == "tool":
+      return CompletionResponse(content="done", tool_calls=[], finish_reason="stop")
+    return CompletionResponse(content="", tool_calls=self.calls, finish_reason="tool_calls")
+
+
+def synthetic_registry(delay: float) -> ToolRegistry:
+  registry = ToolRegistry()
+
+  @registry.tool(description="Blocking I/O stand-in")
+  def blocking_lookup(key: str) -> str:
+    time.sleep(delay)
+    return key
+
+  @registry.tool(description="Async I/O stand-in")
+  async def async_lookup(key: str) -> str:
+    await asyncio.sleep(delay)
+    return key
+
+  return registry
+
+
+async def sequential(registry: ToolRegistry, calls: list[ToolCall]) -> float:
+  start = time.perf_counter()
+  for tool_call in calls:
+    await registry.execute([tool_call])
+  return time.perf_counter() - start
+
+
+async def agentic_round(registry: ToolRegistry, calls: list[ToolCall]) -> float:
+  ghost = Ghost(ToolCallingModel(calls), tools=registry)
+  ghost.add_message(Message(role="user", content="look everything up"))
+  start = time.perf_counter()
+  await ghost.process_async()
+  return time.perf_counter() - start
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Tool round wall time: sequential vs parallel")
+  parser.add_argument("--calls", type=int, nargs="+", default=[1, 4, 8])
+  parser.add_argument("--delay", type=float, default=0.1)
+  args = parser.parse_args()
+
+  registry = synthetic_registry(args.delay)
+  print(f"{'calls':>6} {'sequential (s)':>15} {'parallel (s)':>13} {'slowest (s)':>12}")
+  for count in args.calls:
+    calls = [
+      ToolCall(
+        id=f"call_{i}",
+        name="blocking_lookup" if i % 2 else "async_lookup",
+        arguments=json.dumps({"key": f"k{i}"}),
+      )
+      for i in range(count)
+    ]
+    serial = asyncio.run(sequential(registry, calls))
+    parallel = asyncio.run(agentic_round(registry, calls))
+    print(f"{count:>6} {serial:>15.3f} {parallel:>13.3f} {args.delay:>12.3f}")
+  registry.close()
+
+
+if __name__ == "__main__":
+  main()
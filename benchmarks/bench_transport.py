@@ -0,0 +1,87 @@
+import argparse
+import json
+import time
+import httpx
+from openai import OpenAI
+from agent.model import Message, Tool
+from agent.sources.glm import GLMModel
+from agent.sources.transport import FastTransport
+
+
+def reply(request: httpx.Request) -> httpx.Response:
+  return httpx.Response(
+    200,
+    json={
+      "id": "chatcmpl-bench",
+      "object": "chat.completion",
+      "created": 0,
+      "model": "glm-4.7-flash",
+      "choices": [
+        {
+          "index": 0,
+          "message": {"role": "assistant", "content": "ok"},
+          "finish_reason": "stop",
+        }
+      ],
+    },
+  )
+
+
+def build(turns: int, size: int) -> list[Message]:
+  messages = [Message(role="system", content="You are helpful. " * 20)]
+  for i in range(turns):
+    role = "user" if i % 2 == 0 else "assistant"
+    messages.append(Message(role=role, content=f"turn {i} " + "lorem ipsum " * (size // 12)))
+  return messages
+
+
+def timed(fn, repeats: int) -> float:
+  fn()
+  start = time.perf_counter()
+  for _ in range(repeats):
+    fn()
+  return (time.perf_counter() - start) / repeats
+
+
+def main():
+  parser = argparse.ArgumentParser(description="SDK vs pre-serialized request overhead")
+  parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000])
+  parser.add_argument("--size", type=int, default=400, help="Characters per message")
+  parser.add_argument("--repeats", type=int, default=50)
+  args = parser.parse_args()
+
+  tools = [
+    Tool(
+      name="search",
+      description="Search the web",
+      parameters={"type": "object", "properties": {"query": {"type": "string"}}},
+    )
+  ]
+  sdk = GLMModel(api_key="bench-key")
+  sdk.client = OpenAI(
+    api_key="bench-key",
+    base_url=sdk.base_url,
+    http_client=httpx.Client(transport=httpx.MockTransport(reply)),
+  )
+  fast = GLMModel(api_key="bench-key", transport="fast")
+  fast.transport = FastTransport(fast.base_url, "bench-key", transport=httpx.MockTransport(reply))
+
+  print(
+    f"{'turns':>6} {'KiB':>7} {'dumps ms':>9} {'body ms':>8} "
+    f"{'sdk call ms':>12} {'fast call ms':>13}"
+  )
+  for turns in args.turns:
+    messages = build(turns, args.size)
+    body = fast.transport.body(fast.model, messages, tools)
+    dumps = timed(lambda: json.dumps(sdk._prepare_payload(messages, tools)).encode(), args.repeats)
+    encode = timed(lambda: fast.transport.body(fast.model, messages, tools), args.repeats)
+    sdk_call = timed(lambda: sdk.generate_completion(messages, tools), args.repeats)
+    fast_call = timed(lambda: fast.generate_completion(messages, tools), args.repeats)
+    print(
+      f"{turns:>6} {len(body) / 1024:>7.0f} {dumps * 1000:>9.3f} {encode * 1000:>8.3f} "
+      f"{sdk_call * 1000:>12.3f} {fast_call * 1000:>13.3f}"
+    )
+
+
+if __name__ == "__main__":
+  main()
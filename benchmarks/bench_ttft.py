@@ -0,0 +1,50 @@
+import argparse
+import statistics
+import time
+from agent.model import Message
+from agent.sources.glm import GLMModel
+from benchmarks.fake_server import FakeOpenAIServer
+
+
+def measure_blocking(model: GLMModel, messages: list[Message]) -> tuple[float, float]:
+  start = time.perf_counter()
+  model.generate_completion(messages)
+  elapsed = time.perf_counter() - start
+  return elapsed, elapsed
+
+
+def measure_streaming(model: GLMModel, messages: list[Message]) -> tuple[float, float]:
+  start = time.perf_counter()
+  first_token = None
+  for chunk in model.stream_completion(messages):
+    if first_token is None and chunk.content:
+      first_token = time.perf_counter() - start
+  total = time.perf_counter() - start
+  return first_token if first_token is not None else total, total
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Time-to-first-token: streaming vs blocking")
+  parser.add_argument("--tokens", type=int, default=200)
+  parser.add_argument("--first-token-delay", type=float, default=0.05)
+  parser.add_argument("--token-delay", type=float, default=0.005)
+  parser.add_argument("--runs", type=int, default=5)
+  args = parser.parse_args()
+
+  reply = " ".join(f"token{i}" for i in range(args.tokens))
+  messages = [Message(role="user", content="Tell me something long")]
+
+  with FakeOpenAIServer(
+    reply=reply, first_token_delay=args.first_token_delay, token_delay=args.token_delay
+  ) as server:
+    model = GLMModel(api_key="fake-key", model="fake-model", base_url=server.base_url)
+    print(f"{'mode':<10} {'ttft p50 (ms)':>14} {'total p50 (ms)':>15}")
+    for name, measure in (("blocking", measure_blocking), ("streaming", measure_streaming)):
+      runs = [measure(model, messages) for _ in range(args.runs)]
+      ttft = statistics.median(run[0] for run in runs) * 1000
+      total = statistics.median(run[1] for run in runs) * 1000
+      print(f"{name:<10} {ttft:>14.1f} {total:>15.1f}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,72 @@
+import asyncio
+import random
+import time
+from typing import Callable, Optional, Sequence, Union
+from agent.model import BaseModel, CompletionResponse, Message, Tool
+
+Latency = Union[float, Sequence[float], Callable[[random.Random], float]]
+
+
+class BackendError(Exception):
+  status_code = 503
+
+
+class ScriptedModel(BaseModel):
+  def __init__(
+    self,
+    name: str,
+    latency: Latency = 0.0,
+    error_rate: float = 0.0,
+    fail: Optional[Sequence[bool]] = None,
+    seed: int = 0,
+  ):
+    self.model = name
+    self.latency = latency
+    self.error_rate = error_rate
+    self.fail = list(fail or [])
+    self.random = random.Random(seed)
+    self.calls = 0
+    self.cancelled = 0
+
+  def next_latency(self) -> float:
+    if callable(self.latency):
+      return self.latency(self.random)
+    if isinstance(self.latency, (int, float)):
+      return float(self.latency)
+    return self.latency[self.calls % len(self.latency)]
+
+  def next_failure(self) -> bool:
+    if self.fail:
+      return self.fail.pop(0)
+    return self.random.random() < self.error_rate
+
+  def generate_completion(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> CompletionResponse:
+    latency, failure = self.next_latency(), self.next_failure()
+    self.calls += 1
+    time.sleep(latency)
+    return self._respond(failure)
+
+  async def generate_completion_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> CompletionResponse:
+    latency, failure = self.next_latency(), self.next_failure()
+    self.calls += 1
+    try:
+      await asyncio.sleep(latency)
+    except asyncio.CancelledError:
+      self.cancelled += 1
+      raise
+    return self._respond(failure)
+
+  def _respond(self, failure: bool) -> CompletionResponse:
+    if failure:
+      raise BackendError(f"{self.model} failed")
+    return CompletionResponse(content=f"from {self.model}", tool_calls=[], finish_reason="stop")
+
+
+def lognormal(median: float, sigma: float) -> Callable[[random.Random], float]:
+  import math
+
+  return lambda rng: rng.lognormvariate(math.log(median), sigma)
@@ -0,0 +1,264 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from agent.sources.replay import Cassette, LatencyProfile, ReplayModel, last_prompt, payload_key
+
+
+@dataclass
+class Script:
+  content: str
+  first_delay: float
+  token_delay: float
+  tool_calls: list[dict[str, Any]] = field(default_factory=list)
+  finish_reason: str = "stop"
+  usage: Optional[dict[str, Any]] = None
+  cached_tokens: int = 0
+
+  def tokens(self) -> list[str]:
+    return re.findall(r"\S+\s*", self.content)
+
+
+class _Server(ThreadingHTTPServer):
+  daemon_threads = True
+  request_queue_size = 256
+
+
+class FakeOpenAIServer:
+  def __init__(
+    self,
+    reply: str = "Hello from the fake server.",
+    first_token_delay: float = 0.0,
+    token_delay: float = 0.0,
+    model: str = "fake-model",
+    throttle_first: int = 0,
+    max_concurrent: Optional[int] = None,
+    retry_after: Optional[float] = None,
+    cassette: Optional[Cassette] = None,
+    profile: Optional[LatencyProfile] = None,
+    time_scale: float = 1.0,
+  ):
+    self.reply = reply
+    self.first_token_delay = first_token_delay
+    self.token_delay = token_delay
+    self.model = model
+    self.throttle_first = throttle_first
+    self.max_concurrent = max_concurrent
+    self.retry_after = retry_after
+    self.replayer = (
+      ReplayModel(cassette, profile=profile, time_scale=time_scale)
+      if cassette is not None
+      else None
+    )
+    self.requests: list[dict[str, Any]] = []
+    self.bodies: list[bytes] = []
+    self.throttled = 0
+    self.active = 0
+    self.peak = 0
+    self._prefixes: set[str] = set()
+    self._lock = threading.Lock()
+    self._server = _Server(("127.0.0.1", 0), self._handler_class())
+    self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+  @property
+  def base_url(self) -> str:
+    host, port = self._server.server_address[:2]
+    return f"http://{host}:{port}/v1"
+
+  def tokens(self) -> list[str]:
+    return re.findall(r"\S+\s*", self.reply)
+
+  def start(self):
+    self._thread.start()
+
+  def stop(self):
+    self._server.shutdown()
+    self._server.server_close()
+    self._thread.join()
+
+  def __enter__(self) -> "FakeOpenAIServer":
+    self.start()
+    return self
+
+  def __exit__(self, *exc_info):
+    self.stop()
+
+  def _admit(self) -> bool:
+    with self._lock:
+      over_limit = self.max_concurrent is not None and self.active >= self.max_concurrent
+      if self.throttle_first > 0 or over_limit:
+        self.throttle_first = max(0, self.throttle_first - 1)
+        self.throttled += 1
+        return False
+      self.active += 1
+      self.peak = max(self.peak, self.active)
+      return True
+
+  def _leave(self):
+    with self._lock:
+      self.active -= 1
+
+  def _cached_tokens(self, messages: list[dict[str, Any]]) -> int:
+    # Mimics a provider prefix cache: leading messages already seen in a request are free.
+    digest = hashlib.sha256()
+    prefixes = []
+    cached, reused = 0, True
+    for message in messages:
+      digest.update(json.dumps(message, sort_keys=True).encode())
+      prefixes.append(digest.hexdigest())
+      reused = reused and prefixes[-1] in self._prefixes
+      if reused:
+        cached += len(str(message.get("content") or "").split())
+    with self._lock:
+      self._prefixes.update(prefixes)
+    return cached
+
+  def _script(self, body: dict[str, Any]) -> Script:
+    cached = self._cached_tokens(body.get("messages", []))
+    if self.replayer is None:
+      return Script(self.reply, self.first_token_delay, self.token_delay, cached_tokens=cached)
+    exchange = self.replayer.cassette.find(payload_key(body), last_prompt(body.get("messages", [])))
+    response = exchange.response
+    first, gap = self.replayer.delays(exchange)
+    return Script(
+      content=response.content,
+      first_delay=first,
+      token_delay=gap,
+      tool_calls=[
+        {"id": tc.id, "type": "function", "function": {"name": tc.name, "arguments": tc.arguments}}
+        for tc in response.tool_calls
+      ],
+      finish_reason=response.finish_reason,
+      usage=(
+        {
+          "prompt_tokens": response.usage.prompt_tokens,
+          "completion_tokens": response.usage.completion_tokens,
+          "total_tokens": response.usage.prompt_tokens + response.usage.completion_tokens,
+          "prompt_tokens_details": {"cached_tokens": response.usage.cached_tokens},
+        }
+        if response.usage
+        else None
+      ),
+    )
+
+  def _completion(self, body: dict[str, Any], script: Script) -> dict[str, Any]:
+    message: dict[str, Any] = {"role": "assistant", "content": script.content}
+    if script.tool_calls:
+      message["tool_calls"] = script.tool_calls
+    return {
+      "id": "chatcmpl-fake",
+      "object": "chat.completion",
+      "created": int(time.time()),
+      "model": body.get("model", self.model),
+      "choices": [
+        {
+          "index": 0,
+          "message": message,
+          "finish_reason": script.finish_reason,
+        }
+      ],
+      "usage": self._usage(body, script),
+    }
+
+  def _usage(self, body: dict[str, Any], script: Script) -> dict[str, int]:
+    if script.usage is not None:
+      return script.usage
+    prompt = sum(len(str(m.get("content") or "").split()) for m in body.get("messages", []))
+    completion = len(script.tokens())
+    return {
+      "prompt_tokens": prompt,
+      "completion_tokens": completion,
+      "total_tokens": prompt + completion,
+      "prompt_tokens_details": {"cached_tokens": script.cached_tokens},
+    }
+
+  def _chunk(
+    self, body: dict[str, Any], script: Script, delta: dict[str, Any], finish_reason=None
+  ) -> bytes:
+    event = {
+      "id": "chatcmpl-fake",
+      "object": "chat.completion.chunk",
+      "created": int(time.time()),
+      "model": body.get("model", self.model),
+      "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    if finish_reason is not None:
+      event["usage"] = self._usage(body, script)
+    return f"data: {json.dumps(event)}\n\n".encode()
+
+  def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+    fake = self
+
+    class Handler(BaseHTTPRequestHandler):
+      def log_message(self, format: str, *args: Any):
+        pass
+
+      def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        body = json.loads(raw or b"{}")
+        fake.bodies.append(raw)
+        fake.requests.append(body)
+
+        if not self.path.endswith("/chat/completions"):
+          self.send_error(404)
+          return
+
+        if not fake._admit():
+          self._send_throttled()
+          return
+        try:
+          script = fake._script(body)
+          time.sleep(script.first_delay)
+          if body.get("stream"):
+            self._stream(body, script)
+          else:
+            for _ in script.tokens()[1:]:
+              time.sleep(script.token_delay)
+            self._send_json(fake._completion(body, script))
+        finally:
+          fake._leave()
+
+      def _send_throttled(self):
+        encoded = json.dumps(
+          {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}
+        ).encode()
+        self.send_response(429)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        if fake.retry_after is not None:
+          self.send_header("Retry-After", str(fake.retry_after))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+      def _send_json(self, data: dict[str, Any]):
+        encoded = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+      def _stream(self, body: dict[str, Any], script: Script):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for index, token in enumerate(script.tokens()):
+          if index:
+            time.sleep(script.token_delay)
+          delta = {"role": "assistant", "content": token} if index == 0 else {"content": token}
+          self.wfile.write(fake._chunk(body, script, delta))
+          self.wfile.flush()
+        if script.tool_calls:
+          delta = {"tool_calls": [{"index": i, **tc} for i, tc in enumerate(script.tool_calls)]}
+          self.wfile.write(fake._chunk(body, script, delta))
+        self.wfile.write(fake._chunk(body, script, {}, finish_reason=script.finish_reason))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    return Handler
@@ -0,0 +1,263 @@
+import gc
+import json
+import math
+import os
+import platform
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+BASELINE_VERSION = 1
+MAX_ITERATIONS = 1_000_000
+
+
+@dataclass
+class Case:
+  name: str
+  group: str
+  setup: Callable[[], Callable[[], Any]]
+
+
+@dataclass
+class Result:
+  name: str
+  group: str
+  iterations: int
+  samples: list[float]
+
+  @property
+  def median(self) -> float:
+    return statistics.median(self.samples)
+
+  @property
+  def mean(self) -> float:
+    return statistics.fmean(self.samples)
+
+  @property
+  def stddev(self) -> float:
+    return statistics.stdev(self.samples) if len(self.samples) > 1 else 0.0
+
+  @property
+  def iqr(self) -> float:
+    if len(self.samples) < 2:
+      return 0.0
+    low, _, high = statistics.quantiles(self.samples, n=4)
+    return high - low
+
+  def to_dict(self) -> dict[str, Any]:
+    return {
+      "group": self.group,
+      "iterations": self.iterations,
+      "median": self.median,
+      "mean": self.mean,
+      "stddev": self.stddev,
+      "iqr": self.iqr,
+      "min": min(self.samples),
+      "samples": self.samples,
+    }
+
+  @classmethod
+  def from_dict(cls, name: str, data: dict[str, Any]) -> "Result":
+    return cls(name, data.get("group", ""), data.get("iterations", 1), list(data["samples"]))
+
+
+@dataclass
+class Comparison:
+  name: str
+  baseline: Optional[Result]
+  current: Optional[Result]
+  p_value: float = 1.0
+  status: str = "same"
+
+  @property
+  def change(self) -> Optional[float]:
+    if self.baseline is None or self.current is None:
+      return None
+    return self.current.median / self.baseline.median - 1.0
+
+
+def _time(fn: Callable[[], Any], iterations: int) -> float:
+  began = time.perf_counter()
+  for _ in range(iterations):
+    fn()
+  return time.perf_counter() - began
+
+
+def measure(
+  fn: Callable[[], Any], rounds: int = 10, min_time: float = 0.02, warmup: int = 1
+) -> tuple[int, list[float]]:
+  for _ in range(warmup):
+    fn()
+  iterations = 1
+  while True:
+    elapsed = _time(fn, iterations)
+    if elapsed >= min_time or iterations >= MAX_ITERATIONS:
+      break
+    scaled = int(iterations * min_time / max(elapsed, 1e-9) * 1.2)
+    iterations = min(MAX_ITERATIONS, max(iterations * 2, scaled))
+  return iterations, [_time(fn, iterations) / iterations for _ in range(rounds)]
+
+
+def run(
+  cases: list[Case],
+  rounds: int = 10,
+  min_time: float = 0.02,
+  report: Optional[Callable[[Result], None]] = None,
+) -> dict[str, Result]:
+  results = {}
+  for case in cases:
+    fn = case.setup()
+    gc.collect()
+    iterations, samples = measure(fn, rounds, min_time)
+    result = Result(case.name, case.group, iterations, samples)
+    results[case.name] = result
+    if report is not None:
+      report(result)
+  return results
+
+
+def mann_whitney(a: list[float], b: list[float]) -> float:
+  # Two-sided Mann-Whitney U with the normal approximation and tie correction.
+  n1, n2 = len(a), len(b)
+  if n1 < 2 or n2 < 2:
+    return 1.0
+  ranked = sorted([(value, 0) for value in a] + [(value, 1) for value in b])
+  rank_sum = 0.0
+  ties = 0.0
+  start = 0
+  while start < len(ranked):
+    end = start
+    while end + 1 < len(ranked) and ranked[end + 1][0] == ranked[start][0]:
+      end += 1
+    rank = (start + end) / 2 + 1
+    rank_sum += rank * sum(1 for index in range(start, end + 1) if ranked[index][1] == 0)
+    count = end - start + 1
+    ties += count**3 - count
+    start = end + 1
+  n = n1 + n2
+  u = rank_sum - n1 * (n1 + 1) / 2
+  variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+  if variance <= 0:
+    return 1.0
+  z = max(0.0, abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+  return math.erfc(z / math.sqrt(2))
+
+
+def compare(
+  baseline: dict[str, Result],
+  current: dict[str, Result],
+  threshold: float = 0.10,
+  alpha: float = 0.05,
+) -> list[Comparison]:
+  comparisons = []
+  for name in [*baseline, *(name for name in current if name not in baseline)]:
+    before, after = baseline.get(name), current.get(name)
+    if before is None or after is None:
+      status = "new" if before is None else "missing"
+      comparisons.append(Comparison(name, before, after, status=status))
+      continue
+    comparison = Comparison(name, before, after, mann_whitney(before.samples, after.samples))
+    # Both gates must trip: a large but noisy shift, or a tiny but consistent one, is not flagged.
+    if comparison.p_value < alpha and abs(comparison.change) > threshold:
+      comparison.status = "slower" if comparison.change > 0 else "faster"
+    comparisons.append(comparison)
+  return comparisons
+
+
+def regressions(comparisons: list[Comparison]) -> list[Comparison]:
+  return [comparison for comparison in comparisons if comparison.status == "slower"]
+
+
+def machine() -> dict[str, Any]:
+  return {
+    "python": platform.python_version(),
+    "implementation": platform.python_implementation(),
+    "platform": platform.platform(),
+    "processor": platform.machine(),
+    "cpus": os.cpu_count(),
+  }
+
+
+def machine_id() -> str:
+  return (
+    f"{platform.system().lower()}-{platform.machine().lower()}-"
+    f"{platform.python_implementation().lower()}{''.join(platform.python_version_tuple()[:2])}"
+  )
+
+
+def save(path: str, results: dict[str, Result]):
+  directory = os.path.dirname(path)
+  if directory:
+    os.makedirs(directory, exist_ok=True)
+  data = {
+    "version": BASELINE_VERSION,
+    "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    "machine": machine(),
+    "results": {name: result.to_dict() for name, result in results.items()},
+  }
+  with open(path, "w", encoding="utf-8") as f:
+    json.dump(data, f, indent=2)
+    f.write("\n")
+
+
+def load(path: str) -> dict[str, Result]:
+  with open(path, encoding="utf-8") as f:
+    data = json.load(f)
+  if data.get("version") != BASELINE_VERSION:
+    raise ValueError(f"Unsupported baseline version in {path}: {data.get('version')}")
+  return {name: Result.from_dict(name, result) for name, result in data["results"].items()}
+
+
+def format_time(seconds: Optional[float]) -> str:
+  if seconds is None:
+    return "-"
+  for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+    if seconds >= scale:
+      return f"{seconds / scale:.2f} {unit}"
+  return f"{seconds / 1e-9:.0f} ns"
+
+
+def results_table(results: dict[str, Result]) -> str:
+  rows = [("benchmark", "group", "iterations", "median", "iqr", "stddev")]
+  for result in results.values():
+    rows.append(
+      (
+        result.name,
+        result.group,
+        str(result.iterations),
+        format_time(result.median),
+        format_time(result.iqr),
+        f"{result.stddev / result.mean:.1%}" if result.mean else "-",
+      )
+    )
+  return _table(rows)
+
+
+def diff_table(comparisons: list[Comparison]) -> str:
+  rows = [("benchmark", "baseline", "current", "change", "p", "status")]
+  for comparison in comparisons:
+    change = comparison.change
+    rows.append(
+      (
+        comparison.name,
+        format_time(comparison.baseline.median if comparison.baseline else None),
+        format_time(comparison.current.median if comparison.current else None),
+        "-" if change is None else f"{change:+.1%}",
+        "-" if change is None else f"{comparison.p_value:.3f}",
+        comparison.status,
+      )
+    )
+  return _table(rows)
+
+
+def _table(rows: list[tuple[str, ...]]) -> str:
+  widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+  lines = []
+  for row in rows:
+    cells = [
+      cell.ljust(width) if column == 0 else cell.rjust(width)
+      for column, (cell, width) in enumerate(zip(row, widths))
+    ]
+    lines.append("  ".join(cells).rstrip())
+  return "\n".join(lines)
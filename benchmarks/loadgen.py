@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+from agent.ghost import Ghost
+from agent.model import BaseModel, CompletionResponse, Message, Usage
+from agent.shell import Shell
+from agent.sources.replay import Cassette, Exchange, LatencyProfile, ReplayModel, request_key
+
+
+@dataclass
+class LoadReport:
+  sessions: int
+  elapsed: float = 0.0
+  latencies: list[float] = field(default_factory=list)
+  ttfts: list[float] = field(default_factory=list)
+  errors: list[str] = field(default_factory=list)
+
+  @property
+  def turns(self) -> int:
+    return len(self.latencies)
+
+  @property
+  def throughput(self) -> float:
+    return self.turns / self.elapsed if self.elapsed else 0.0
+
+  def summary(self) -> dict[str, float]:
+    summary = {
+      "sessions": self.sessions,
+      "turns": self.turns,
+      "errors": len(self.errors),
+      "seconds": round(self.elapsed, 3),
+      "turns_per_second": round(self.throughput, 1),
+    }
+    for name, values in (("latency", self.latencies), ("ttft", self.ttfts)):
+      if values:
+        for p in (50, 95, 99):
+          summary[f"{name}_p{p}_ms"] = round(percentile(values, p) * 1000, 2)
+    return summary
+
+
+def percentile(values: list[float], p: float) -> float:
+  ordered = sorted(values)
+  return ordered[min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))]
+
+
+async def run_load(
+  build: Callable[[int], Shell],
+  conversations: list[list[str]],
+  sessions: int,
+  concurrency: int,
+  stream: bool = False,
+) -> LoadReport:
+  report = LoadReport(sessions=sessions)
+  semaphore = asyncio.Semaphore(concurrency)
+
+  async def turn(shell: Shell, prompt: str):
+    message = Message(role="user", content=prompt)
+    began = time.perf_counter()
+    if stream:
+      first = None
+      async for chunk in shell.process_input_stream_async(message):
+        if first is None and chunk.content:
+          first = time.perf_counter() - began
+      if first is not None:
+        report.ttfts.append(first)
+    else:
+      await shell.process_input_async(message)
+    report.latencies.append(time.perf_counter() - began)
+
+  async def session(index: int):
+    async with semaphore:
+      shell = build(index)
+      for prompt in conversations[index % len(conversations)]:
+        try:
+          await turn(shell, prompt)
+        except Exception as e:
+          report.errors.append(f"{type(e).__name__}: {e}")
+
+  started = time.perf_counter()
+  await asyncio.gather(*(session(index) for index in range(sessions)))
+  report.elapsed = time.perf_counter() - started
+  return report
+
+
+def synthetic_cassette(turns: int, reply_words: int, profile: LatencyProfile) -> Cassette:
+  cassette = Cassette()
+  reply = " ".join(f"word{i}" for i in range(reply_words))
+  for index in range(turns):
+    prompt = f"question {index}"
+    cassette.add(
+      Exchange(
+        key=request_key([Message(role="user", content=prompt)]),
+        prompt=prompt,
+        response=CompletionResponse(
+          content=reply,
+          tool_calls=[],
+          finish_reason="stop",
+          usage=Usage(prompt_tokens=2 * (index + 1), completion_tokens=reply_words),
+        ),
+        ttft=profile.ttft,
+        duration=profile.ttft + (reply_words - 1) / profile.tokens_per_second,
+      )
+    )
+  return cassette
+
+
+def conversations_from(cassette: Cassette, turns: int) -> list[list[str]]:
+  prompts = [exchange.prompt for exchange in cassette.exchanges if exchange.prompt]
+  return [prompts[start : start + turns] for start in range(0, len(prompts), turns)] or [[""]]
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Concurrent sessions through Shell on replayed models"
+  )
+  parser.add_argument("--cassette", type=str, help="Recorded exchanges (synthetic if omitted)")
+  parser.add_argument("--sessions", type=int, default=200)
+  parser.add_argument("--concurrency", type=int, default=50)
+  parser.add_argument("--turns", type=int, default=3)
+  parser.add_argument("--stream", action="store_true", help="Stream turns and report TTFT")
+  parser.add_argument("--ttft", type=float, help="Override recorded time to first token")
+  parser.add_argument("--tps", type=float, default=80.0, help="Tokens per second with --ttft")
+  parser.add_argument("--jitter", type=float, default=0.2, help="Relative latency jitter")
+  parser.add_argument("--reply-words", type=int, default=60, help="Synthetic reply length")
+  parser.add_argument("--time-scale", type=float, default=1.0, help="Multiplier on all delays")
+  parser.add_argument(
+    "--via-server",
+    action="store_true",
+    help="Serve the cassette over HTTP and drive GLMModel instead of ReplayModel",
+  )
+  parser.add_argument("--transport", choices=["sdk", "fast"], default="sdk")
+  parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+  args = parser.parse_args()
+
+  profile = None
+  if args.ttft is not None:
+    profile = LatencyProfile(args.ttft, args.tps, args.jitter)
+  if args.cassette:
+    cassette = Cassette(args.cassette)
+  else:
+    synthetic = LatencyProfile(0.2, args.tps)
+    cassette = synthetic_cassette(args.turns, args.reply_words, synthetic)
+    profile = profile or LatencyProfile(synthetic.ttft, args.tps, args.jitter)
+  conversations = conversations_from(cassette, args.turns)
+
+  server = None
+  if args.via_server:
+    from agent.sources.glm import GLMModel
+    from benchmarks.fake_server import FakeOpenAIServer
+
+    server = FakeOpenAIServer(cassette=cassette, profile=profile, time_scale=args.time_scale)
+    server.start()
+    model: BaseModel = GLMModel(
+      api_key="load-test", base_url=server.base_url, transport=args.transport
+    )
+  else:
+    model = ReplayModel(cassette, profile=profile, time_scale=args.time_scale)
+
+  def build(index: int) -> Shell:
+    return Shell(Ghost(model))
+
+  try:
+    report = asyncio.run(
+      run_load(build, conversations, args.sessions, args.concurrency, stream=args.stream)
+    )
+  finally:
+    if server is not None:
+      server.stop()
+
+  summary = report.summary()
+  if args.json:
+    print(json.dumps(summary))
+  else:
+    for name, value in summary.items():
+      print(f"{name:>18} {value}")
+  for error in report.errors[:5]:
+    print(f"error: {error}")
+
+
+if __name__ == "__main__":
+  main()
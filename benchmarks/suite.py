@@ -0,0 +1,378 @@
+import argparse
+import json
+import os
+import sys
+from typing import Any, Callable, Iterator, Optional
+import httpx
+from agent.context import ContextWindow
+from agent.ghost import Ghost
+from agent.model import BaseModel, CompletionChunk, CompletionResponse, Message, Tool, Usage
+from agent.shell import ContextEnhancer, OutputPort, Shell
+from agent.sources.glm import GLMModel
+from agent.sources.transport import FastTransport, parse_completion
+from benchmarks.harness import (
+  Case,
+  compare,
+  diff_table,
+  load,
+  machine_id,
+  regressions,
+  results_table,
+  run,
+  save,
+)
+from benchmarks.fake_models import ScriptedModel
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+DEFAULT_BASELINE = os.path.join(BASELINES, f"{machine_id()}.json")
+
+CASES: list[Case] = []
+
+
+def bench(group: str) -> Callable:
+  def register(setup: Callable[[], Callable[[], Any]]) -> Callable[[], Callable[[], Any]]:
+    CASES.append(Case(setup.__name__, group, setup))
+    return setup
+
+  return register
+
+
+def history(turns: int, words: int = 40) -> list[Message]:
+  messages = []
+  for index in range(turns):
+    text = " ".join(f"w{index}_{word}" for word in range(words))
+    messages.append(Message(role="user", content=f"question {index}: {text}"))
+    messages.append(Message(role="assistant", content=f"answer {index}: {text}"))
+  return messages
+
+
+def tool_schemas(count: int, properties: int) -> list[Tool]:
+  return [
+    Tool(
+      name=f"tool_{index}",
+      description=f"Tool number {index} " + "with a long description " * 8,
+      parameters={
+        "type": "object",
+        "properties": {
+          f"field_{field}": {
+            "type": "string",
+            "description": f"Field {field} of tool {index}",
+            "enum": [f"option_{option}" for option in range(4)],
+          }
+          for field in range(properties)
+        },
+        "required": [f"field_{field}" for field in range(0, properties, 3)],
+      },
+    )
+    for index in range(count)
+  ]
+
+
+def completion(content: str, tool_calls: int = 0) -> dict[str, Any]:
+  message: dict[str, Any] = {"role": "assistant", "content": content}
+  if tool_calls:
+    message["tool_calls"] = [
+      {
+        "id": f"call_{index}",
+        "type": "function",
+        "function": {"name": f"tool_{index}", "arguments": json.dumps({"query": content[:64]})},
+      }
+      for index in range(tool_calls)
+    ]
+  return {
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "glm-4.7-flash",
+    "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150},
+  }
+
+
+def words(count: int) -> str:
+  return " ".join(f"token{index}" for index in range(count))
+
+
+class OfflineGLM(GLMModel):
+  def __init__(self, data: dict[str, Any], transport: str = "sdk"):
+    super().__init__(api_key="bench", base_url="http://bench.invalid/v1")
+    self.raw = json.dumps(data).encode()
+    if transport == "fast":
+      self.transport = FastTransport(
+        self.base_url,
+        self.api_key,
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, content=self.raw)),
+      )
+
+  def _create(self, payload: dict, stream: bool = False) -> Any:
+    from openai.types.chat import ChatCompletion
+
+    return ChatCompletion.model_validate_json(self.raw)
+
+
+class ChunkedModel(BaseModel):
+  model = "chunked"
+
+  def __init__(self, chunks: int):
+    self.chunks = [CompletionChunk(content=f"token{index} ") for index in range(chunks - 1)]
+    self.chunks.append(
+      CompletionChunk(
+        content="end", finish_reason="stop", usage=Usage(prompt_tokens=10, completion_tokens=chunks)
+      )
+    )
+
+  def generate_completion(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> CompletionResponse:
+    content = "".join(chunk.content for chunk in self.chunks)
+    return CompletionResponse(content=content, tool_calls=[], finish_reason="stop")
+
+  async def generate_completion_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> CompletionResponse:
+    return self.generate_completion(messages, tools)
+
+  def stream_completion(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> Iterator[CompletionChunk]:
+    return iter(self.chunks)
+
+
+class NoteEnhancer(ContextEnhancer):
+  independent = True
+
+  def contribute(self, message: Message) -> Optional[str]:
+    return f"{self.name}: relevant note for {message.content[:32]}"
+
+
+class TagEnhancer(ContextEnhancer):
+  def enhance(self, message: Message) -> Message:
+    return Message(role=message.role, content=f"[{self.name}] {message.content}")
+
+
+def enhanced_shell(model: BaseModel, dependent: int, independent: int) -> Shell:
+  shell = Shell(Ghost(model))
+  for index in range(dependent):
+    shell.add_context_enhancer(TagEnhancer(f"tag{index}"))
+  for index in range(independent):
+    shell.add_context_enhancer(NoteEnhancer(f"note{index}"))
+  return shell
+
+
+def turn(shell: Shell, content: str = "hello there") -> Callable[[], Any]:
+  message = Message(role="user", content=content)
+  conversation = shell.ghost.conversation_history
+  size = len(conversation)
+
+  def call():
+    shell.process_input(message)
+    del conversation[size:]
+
+  return call
+
+
+@bench("micro")
+def prepare_messages_1k() -> Callable[[], Any]:
+  ghost = Ghost(ScriptedModel("bench"))
+  ghost.conversation_history.extend(history(500))
+  context = {"time": "2026-01-01T00:00:00", "user": "bench", "location": "offline"}
+  return lambda: ghost._prepare_messages(context)
+
+
+@bench("micro")
+def prepare_messages_window_10k() -> Callable[[], Any]:
+  ghost = Ghost(ScriptedModel("bench"), context_window=ContextWindow(max_tokens=32_000))
+  ghost.conversation_history.extend(history(5_000))
+  return ghost._prepare_messages
+
+
+@bench("micro")
+def format_context_32() -> Callable[[], Any]:
+  ghost = Ghost(ScriptedModel("bench"))
+  context = {f"key_{index}": words(30) for index in range(32)}
+  return lambda: ghost._format_context(context)
+
+
+@bench("micro")
+def glm_prepare_payload_1k() -> Callable[[], Any]:
+  model = GLMModel(api_key="bench")
+  messages = history(500)
+  return lambda: model._prepare_payload(messages)
+
+
+@bench("micro")
+def glm_prepare_payload_uncached_1k() -> Callable[[], Any]:
+  model = GLMModel(api_key="bench", format_cache_size=1)
+  messages = history(500)
+  return lambda: model._prepare_payload(messages)
+
+
+@bench("micro")
+def glm_parse_response() -> Callable[[], Any]:
+  from openai.types.chat import ChatCompletion
+
+  model = GLMModel(api_key="bench")
+  response = ChatCompletion.model_validate(completion(words(400), tool_calls=4))
+  return lambda: model._parse_response(response)
+
+
+@bench("micro")
+def transport_body_1k() -> Callable[[], Any]:
+  transport = FastTransport("http://bench.invalid/v1", "bench")
+  messages = history(500)
+  return lambda: transport.body("glm-4.7-flash", messages)
+
+
+@bench("micro")
+def transport_parse_completion() -> Callable[[], Any]:
+  data = completion(words(400), tool_calls=4)
+  return lambda: parse_completion(data)
+
+
+@bench("micro")
+def enhancer_loop_8() -> Callable[[], Any]:
+  shell = enhanced_shell(ScriptedModel("bench"), dependent=4, independent=4)
+  message = Message(role="user", content="what changed in the last release?")
+  return lambda: shell._enhance_input(message, "default")
+
+
+@bench("micro")
+def shell_turn() -> Callable[[], Any]:
+  return turn(Shell(Ghost(ScriptedModel("bench"))))
+
+
+@bench("macro")
+def long_history_turn() -> Callable[[], Any]:
+  model = OfflineGLM(completion(words(200)))
+  shell = Shell(Ghost(model, context_window=ContextWindow(max_tokens=128_000)))
+  shell.ghost.conversation_history.extend(history(10_000))
+  return turn(shell)
+
+
+@bench("macro")
+def long_history_turn_fast() -> Callable[[], Any]:
+  model = OfflineGLM(completion(words(200)), transport="fast")
+  shell = Shell(Ghost(model, context_window=ContextWindow(max_tokens=128_000)))
+  shell.ghost.conversation_history.extend(history(10_000))
+  return turn(shell)
+
+
+@bench("macro")
+def many_enhancers_turn() -> Callable[[], Any]:
+  return turn(enhanced_shell(ScriptedModel("bench"), dependent=16, independent=32))
+
+
+@bench("macro")
+def big_tool_schemas() -> Callable[[], Any]:
+  model = OfflineGLM(completion("calling tools", tool_calls=8))
+  messages, tools = history(20), tool_schemas(64, 40)
+  return lambda: model.generate_completion(messages, tools)
+
+
+@bench("macro")
+def big_tool_schemas_fast() -> Callable[[], Any]:
+  model = OfflineGLM(completion("calling tools", tool_calls=8), transport="fast")
+  messages, tools = history(20), tool_schemas(64, 40)
+  return lambda: model.generate_completion(messages, tools)
+
+
+@bench("macro")
+def large_response() -> Callable[[], Any]:
+  model = OfflineGLM(completion(words(40_000)))
+  return turn(Shell(Ghost(model)))
+
+
+@bench("macro")
+def large_response_fast() -> Callable[[], Any]:
+  model = OfflineGLM(completion(words(40_000)), transport="fast")
+  return turn(Shell(Ghost(model)))
+
+
+@bench("macro")
+def large_stream() -> Callable[[], Any]:
+  shell = Shell(Ghost(ChunkedModel(4_000)))
+  output = OutputPort("default")
+  output.add_chunk_processor(lambda chunk: chunk)
+  shell.add_output_port(output)
+  message = Message(role="user", content="write a long answer")
+  conversation = shell.ghost.conversation_history
+
+  def call():
+    for _ in shell.process_input_stream(message):
+      pass
+    conversation.clear()
+
+  return call
+
+
+def select(patterns: Optional[list[str]] = None, group: Optional[str] = None) -> list[Case]:
+  return [
+    case
+    for case in CASES
+    if (group is None or case.group == group)
+    and (not patterns or any(pattern in case.name for pattern in patterns))
+  ]
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+  parser = argparse.ArgumentParser(
+    description="Offline micro and macro benchmarks with JSON baselines"
+  )
+  parser.add_argument("-k", dest="patterns", nargs="*", help="Run cases whose name contains one")
+  parser.add_argument("--group", choices=["micro", "macro"])
+  parser.add_argument("--rounds", type=int, default=10, help="Timed rounds per case")
+  parser.add_argument("--min-time", type=float, default=0.05, help="Seconds per round")
+  parser.add_argument(
+    "--save", nargs="?", const=DEFAULT_BASELINE, help="Write results as a JSON baseline"
+  )
+  parser.add_argument(
+    "--compare", nargs="?", const=DEFAULT_BASELINE, help="Diff results against a baseline"
+  )
+  parser.add_argument(
+    "--diff", nargs=2, metavar=("BASELINE", "CURRENT"), help="Diff two saved result files"
+  )
+  parser.add_argument("--threshold", type=float, default=0.10, help="Relative change to flag")
+  parser.add_argument("--alpha", type=float, default=0.05, help="Significance level")
+  parser.add_argument("--list", action="store_true", help="List cases and exit")
+  args = parser.parse_args(argv)
+
+  if args.list:
+    for case in select(args.patterns, args.group):
+      print(f"{case.group:>6} {case.name}")
+    return 0
+
+  if args.diff:
+    baseline, results = load(args.diff[0]), load(args.diff[1])
+  else:
+    if args.compare and not os.path.exists(args.compare):
+      parser.error(f"no baseline at {args.compare}; record one on this machine with --save")
+    baseline = load(args.compare) if args.compare else None
+    cases = select(args.patterns, args.group)
+    if not cases:
+      parser.error("no benchmark matches the selection")
+    results = run(
+      cases,
+      args.rounds,
+      args.min_time,
+      report=lambda result: print(f"{result.name}: {result.median * 1e6:.1f} us", file=sys.stderr),
+    )
+    print(results_table(results))
+    if args.save:
+      save(args.save, results)
+      print(f"\nsaved {len(results)} results to {args.save}")
+    if baseline is None:
+      return 0
+    baseline = {name: result for name, result in baseline.items() if name in results}
+
+  comparisons = compare(baseline, results, args.threshold, args.alpha)
+  print()
+  print(diff_table(comparisons))
+  slower = regressions(comparisons)
+  if slower:
+    print(f"\n{len(slower)} regression(s) beyond {args.threshold:.0%} at p < {args.alpha}")
+    return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
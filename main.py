@@ -1,13 +1,53 @@
 import argparse
 import os
-from agent import Ghost, Shell, Message, GLMModel
+from typing import Optional
+from agent import ContextWindow, Ghost, PromptLayout, Shell, Message
+from agent.shell import PersistentMemoryEnhancer, RAGEnhancer, WebSearchEnhancer
+from agent.sources import accepts, create_source, get_source
+from agent.sources.limits import AIMDController, RateLimiter
+from agent.summary import RollingSummarizer, SummaryStore
 
 
-def create_model(source: str, api_key: str, model: str = "glm-4.7-flash"):
-  if source == "glm":
-    return GLMModel(api_key=api_key, model=model)
-  else:
-    raise ValueError(f"Unknown source: {source}")
+def create_model(source: str, api_key: str, model: str = "glm-4.7-flash", limiter=None, **options):
+  if limiter is not None and accepts(get_source(source), "limiter"):
+    options["limiter"] = limiter
+  return create_source(source, api_key=api_key, model=model, **options)
+
+
+def transport_options(args) -> dict:
+  if args.transport == "sdk" and not args.http2:
+    return {}
+  return {"transport": args.transport, "http2": args.http2}
+
+
+def create_telemetry(trace: Optional[str] = None, metrics: bool = False):
+  if not (trace or metrics):
+    return None
+  from agent.telemetry import JsonlExporter, Telemetry
+
+  return Telemetry(exporters=[JsonlExporter(trace)] if trace else [])
+
+
+def create_layout(system_prompt: Optional[str] = None, stable_prefix: bool = False):
+  if not (system_prompt or stable_prefix):
+    return None
+  return PromptLayout(system_prompt=system_prompt)
+
+
+def run_batch(model, args):
+  import asyncio
+  import json
+  from agent.batch import BatchInput, BatchRunner
+
+  with open(args.batch, encoding="utf-8") as f:
+    inputs = [
+      BatchInput.from_dict(json.loads(line), index) for index, line in enumerate(f) if line.strip()
+    ]
+  runner = BatchRunner(
+    model, concurrency=args.concurrency, timeout=args.timeout, ordered=args.ordered
+  )
+  count = asyncio.run(runner.run_to_jsonl(inputs, args.batch_output))
+  print(f"Wrote {count} results to {args.batch_output}")
 
 
 def main():
@@ -20,20 +60,233 @@ def main():
     default="glm-4.7-flash",
     help="Model name (e.g., glm-4.7-flash, glm-4.7)",
   )
+  parser.add_argument(
+    "--summary-model",
+    type=str,
+    help="Cheaper model used to summarize older turns in the background (disabled if unset)",
+  )
+  parser.add_argument(
+    "--summary-store",
+    type=str,
+    default=".agent/summaries",
+    help="Directory where each session's summary checkpoints are kept across restarts",
+  )
+  parser.add_argument(
+    "--knowledge-dir",
+    type=str,
+    default="knowledge",
+    help="Markdown knowledge base used for retrieval (skipped if missing)",
+  )
+  parser.add_argument(
+    "--index-dir",
+    type=str,
+    default=".agent/index",
+    help="Where the knowledge vector index is persisted",
+  )
+  parser.add_argument(
+    "--memory-model",
+    type=str,
+    help="Cheaper model used to extract long-term memories (disabled if unset)",
+  )
+  parser.add_argument(
+    "--memory-db", type=str, default=".agent/memory.db", help="SQLite file for long-term memories"
+  )
+  parser.add_argument("--user", type=str, default="default", help="User whose memories are used")
+  parser.add_argument(
+    "--cache-db",
+    type=str,
+    help="SQLite file for caching identical model requests across restarts (implies --cache)",
+  )
+  parser.add_argument(
+    "--cache",
+    action="store_true",
+    help="Reuse earlier completions for identical requests instead of sampling a new one",
+  )
+  parser.add_argument(
+    "--semantic-cache",
+    type=float,
+    metavar="THRESHOLD",
+    help="Answer near-duplicate questions from earlier replies above this similarity",
+  )
+  parser.add_argument(
+    "--semantic-cache-stateless",
+    action="store_true",
+    help="Key the semantic cache on the question alone and check it before context enhancers",
+  )
+  parser.add_argument("--batch", type=str, help="JSONL of prompts to run as independent sessions")
+  parser.add_argument(
+    "--batch-output", type=str, default=".agent/batch.jsonl", help="Where batch results go"
+  )
+  parser.add_argument("--concurrency", type=int, default=8, help="Parallel batch requests")
+  parser.add_argument("--timeout", type=float, help="Per-prompt timeout in seconds for batches")
+  parser.add_argument("--ordered", action="store_true", help="Write batch results in input order")
+  parser.add_argument("--rpm", type=float, help="Client-side requests per minute limit")
+  parser.add_argument("--tpm", type=float, help="Client-side prompt tokens per minute limit")
+  parser.add_argument(
+    "--max-concurrency", type=int, default=16, help="Upper bound for adaptive request concurrency"
+  )
+  parser.add_argument(
+    "--route",
+    type=str,
+    nargs="+",
+    metavar="SOURCE:MODEL",
+    help="Route across several backends, fastest healthy first (e.g. glm:glm-4.7 glm:glm-4.5)",
+  )
+  parser.add_argument(
+    "--hedge",
+    action="store_true",
+    help="Send a backup request when a routed call is slow to its first chunk; the slower "
+    "request is abandoned but may still be billed",
+  )
+  parser.add_argument("--searxng", type=str, help="SearXNG base URL used for web search context")
+  parser.add_argument(
+    "--web-cache", type=str, default=".agent/web.db", help="SQLite cache for fetched web pages"
+  )
+  parser.add_argument(
+    "--session", type=str, help="Persist the conversation under this ID and resume it if it exists"
+  )
+  parser.add_argument(
+    "--sessions-dir", type=str, default=".agent/sessions", help="Where session logs are stored"
+  )
+  parser.add_argument(
+    "--transport",
+    choices=["sdk", "fast"],
+    default="sdk",
+    help="HTTP client for model calls; fast sends pre-serialized request bodies",
+  )
+  parser.add_argument(
+    "--http2", action="store_true", help="Use HTTP/2 with the fast transport (requires h2)"
+  )
+  parser.add_argument("--trace", type=str, help="Append per-stage spans to this JSONL file")
+  parser.add_argument(
+    "--metrics-port", type=int, help="Serve Prometheus metrics on this port at /metrics"
+  )
+  parser.add_argument(
+    "--enhancer-budget", type=float, help="Seconds context enhancers may add to each turn"
+  )
+  parser.add_argument("--system-prompt", type=str, help="Fixed system prompt sent first")
+  parser.add_argument(
+    "--stable-prefix",
+    action="store_true",
+    help="Keep the prompt prefix byte-stable and send retrieved context after the history",
+  )
+  parser.add_argument(
+    "--prefetch",
+    action="store_true",
+    help="Start context lookups from each reply while the next message is typed",
+  )
+  parser.add_argument(
+    "--prefetch-similarity",
+    type=float,
+    default=0.5,
+    help="Share of the next message's words the prefetch must cover to be reused",
+  )
+  parser.add_argument("--record", type=str, help="Record model exchanges to this cassette file")
+  parser.add_argument(
+    "--replay", type=str, help="Answer from a recorded cassette instead of calling the provider"
+  )
   args = parser.parse_args()
 
   api_key = args.api_key or os.environ.get("MODEL_API_KEY")
-  if not api_key:
+  if not api_key and not args.replay:
     print("Error: API key required. Provide via --api-key or MODEL_API_KEY environment variable")
     return
 
   try:
-    model = create_model(args.source, api_key, args.model)
-    ghost = Ghost(model=model)
-    shell = Shell(ghost=ghost)
+    limiter = RateLimiter(
+      requests_per_minute=args.rpm,
+      tokens_per_minute=args.tpm,
+      controller=AIMDController(initial=args.max_concurrency, maximum=args.max_concurrency),
+    )
+    model = create_model(args.source, api_key, args.model, limiter, **transport_options(args))
+    if args.route:
+      from agent.sources.router import RouterModel
+
+      backends = {}
+      for route in args.route:
+        source, _, name = route.partition(":")
+        backends[route] = create_model(
+          source, api_key, name or args.model, limiter, **transport_options(args)
+        )
+      model = RouterModel(backends, hedge=args.hedge)
+    if args.record or args.replay:
+      from agent.sources.replay import Cassette, ReplayModel
+
+      if args.replay:
+        model = ReplayModel(Cassette(args.replay))
+      else:
+        model = ReplayModel(Cassette(args.record), source=model)
+    if args.cache or args.cache_db:
+      from agent.sources.cache import CachedModel, DiskCache
+
+      model = CachedModel(model, disk=DiskCache(args.cache_db) if args.cache_db else None)
+    if args.batch:
+      run_batch(model, args)
+      return
+    session = None
+    if args.session:
+      from agent.session import SessionLog
+
+      session = SessionLog.open(args.sessions_dir, args.session)
+    summarizer = None
+    if args.summary_model:
+      summarizer = RollingSummarizer(
+        create_model(args.source, api_key, args.summary_model, limiter, **transport_options(args)),
+        store=SummaryStore.for_session(args.summary_store, session.session_id) if session else None,
+      )
+    telemetry = create_telemetry(args.trace, args.metrics_port is not None)
+    if args.metrics_port is not None:
+      from agent.telemetry import serve_metrics
+
+      serve_metrics(telemetry.metrics, port=args.metrics_port)
+    ghost = Ghost(
+      model=model,
+      context_window=ContextWindow.for_model(args.model),
+      summarizer=summarizer,
+      session=session,
+      telemetry=telemetry,
+      layout=create_layout(args.system_prompt, args.stable_prefix),
+    )
+    semantic_cache = None
+    if args.semantic_cache is not None:
+      from agent.enhancers.rag import default_embedder
+      from agent.semantic_cache import SemanticCache
+
+      semantic_cache = SemanticCache(
+        default_embedder(),
+        threshold=args.semantic_cache,
+        stateless_routes=["default"] if args.semantic_cache_stateless else (),
+      )
+    shell = Shell(ghost=ghost, semantic_cache=semantic_cache, enhancer_budget=args.enhancer_budget)
+    if os.path.isdir(args.knowledge_dir):
+      from agent.enhancers.rag import HybridRetriever, KnowledgeStore
+
+      store = KnowledgeStore(args.knowledge_dir, args.index_dir, lexical=True)
+      store.refresh()
+      shell.add_context_enhancer(RAGEnhancer(retriever=HybridRetriever(store)))
+    if args.memory_model:
+      from agent.enhancers.memory import MemoryExtractor, MemoryStore
+
+      memory_store = MemoryStore(args.memory_db)
+      extractor = MemoryExtractor(
+        create_model(args.source, api_key, args.memory_model, limiter, **transport_options(args)),
+        memory_store,
+      )
+      shell.add_context_enhancer(
+        PersistentMemoryEnhancer(
+          store=memory_store, extractor=extractor, namespace=f"user:{args.user}"
+        )
+      )
+    if args.searxng:
+      from agent.enhancers.web import PageCache, SearxngBackend, WebSearcher
+
+      searcher = WebSearcher(SearxngBackend(args.searxng), cache=PageCache(args.web_cache))
+      shell.add_context_enhancer(WebSearchEnhancer(searcher=searcher))
 
     print(f"Personal Agent initialized with {args.source} model: {args.model}")
     print("Type your message and press Enter to send. Type 'quit' to exit.")
+    if session is not None:
+      print(f"Session {session.session_id}: {len(session)} messages restored")
     print("-" * 50)
 
     while True:
@@ -46,14 +299,28 @@ def main():
           break
 
         message = Message(role="user", content=user_input)
-        response = shell.process_input(message)
-
-        print(f"\nAssistant: {response.content}")
+        print("\nAssistant: ", end="", flush=True)
+        reply = []
+        for chunk in shell.process_input_stream(message):
+          print(chunk.content, end="", flush=True)
+          reply.append(chunk.content)
+        print()
+        if args.prefetch:
+          shell.prefetch("".join(reply), min_similarity=args.prefetch_similarity)
       except KeyboardInterrupt:
         print("\nGoodbye!")
         break
       except Exception as e:
         print(f"\nError: {e}")
+    if args.prefetch:
+      stats = shell.prefetch_stats
+      print(
+        f"Prefetch reused {stats.used}/{stats.used + stats.discarded}, saved {stats.saved:.2f}s"
+      )
+    if session is not None:
+      session.close()
+    if telemetry is not None:
+      telemetry.close()
 
   except Exception as e:
     print(f"Error initializing agent: {e}")
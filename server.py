@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import os
+from agent import ContextWindow, Ghost, Shell
+from agent.server import AgentServer, SessionManager
+from agent.shell import RAGEnhancer
+from agent.sources.limits import AIMDController, RateLimiter
+from main import create_layout, create_model, create_telemetry, transport_options
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Personal Agent HTTP server")
+  parser.add_argument("--source", type=str, default="glm", help="Model source to use (e.g., glm)")
+  parser.add_argument("--api-key", type=str, help="API key for the model provider")
+  parser.add_argument("--model", type=str, default="glm-4.7-flash", help="Model name to use")
+  parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to listen on")
+  parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+  parser.add_argument(
+    "--sessions-dir", type=str, default=".agent/sessions", help="Where session logs are stored"
+  )
+  parser.add_argument(
+    "--max-sessions", type=int, default=256, help="Sessions kept in memory before eviction"
+  )
+  parser.add_argument(
+    "--idle-timeout", type=float, default=600.0, help="Seconds before an idle session is evicted"
+  )
+  parser.add_argument(
+    "--max-turns", type=int, default=64, help="Turns running at once across all sessions"
+  )
+  parser.add_argument(
+    "--max-concurrency", type=int, default=16, help="Upper bound for adaptive request concurrency"
+  )
+  parser.add_argument(
+    "--transport",
+    choices=["sdk", "fast"],
+    default="sdk",
+    help="HTTP client for model calls; fast sends pre-serialized request bodies",
+  )
+  parser.add_argument(
+    "--http2", action="store_true", help="Use HTTP/2 with the fast transport (requires h2)"
+  )
+  parser.add_argument("--trace", type=str, help="Append per-stage spans to this JSONL file")
+  parser.add_argument(
+    "--metrics", action="store_true", help="Record stage metrics and serve them at /metrics"
+  )
+  parser.add_argument("--system-prompt", type=str, help="Fixed system prompt sent first")
+  parser.add_argument(
+    "--stable-prefix",
+    action="store_true",
+    help="Keep the prompt prefix byte-stable and send retrieved context after the history",
+  )
+  parser.add_argument(
+    "--knowledge-dir",
+    type=str,
+    default="knowledge",
+    help="Markdown knowledge base used for retrieval (skipped if missing)",
+  )
+  parser.add_argument(
+    "--index-dir", type=str, default=".agent/index", help="Where the knowledge index is persisted"
+  )
+  args = parser.parse_args()
+
+  api_key = args.api_key or os.environ.get("MODEL_API_KEY")
+  if not api_key:
+    print("Error: API key required. Provide via --api-key or MODEL_API_KEY environment variable")
+    return
+
+  limiter = RateLimiter(
+    controller=AIMDController(initial=args.max_concurrency, maximum=args.max_concurrency)
+  )
+  model = create_model(args.source, api_key, args.model, limiter, **transport_options(args))
+  telemetry = create_telemetry(args.trace, args.metrics)
+  layout = create_layout(args.system_prompt, args.stable_prefix)
+  enhancers = []
+  if os.path.isdir(args.knowledge_dir):
+    from agent.enhancers.rag import HybridRetriever, KnowledgeStore
+
+    store = KnowledgeStore(args.knowledge_dir, args.index_dir, lexical=True)
+    store.refresh()
+    enhancers.append(RAGEnhancer(retriever=HybridRetriever(store)))
+
+  def build(log):
+    ghost = Ghost(
+      model=model,
+      context_window=ContextWindow.for_model(args.model),
+      session=log,
+      telemetry=telemetry,
+      layout=layout,
+    )
+    shell = Shell(ghost=ghost)
+    for enhancer in enhancers:
+      shell.add_context_enhancer(enhancer)
+    return shell
+
+  manager = SessionManager(
+    build,
+    directory=args.sessions_dir,
+    max_active=args.max_sessions,
+    idle_timeout=args.idle_timeout,
+    max_turns=args.max_turns,
+  )
+  server = AgentServer(manager, args.host, args.port, telemetry=telemetry)
+  print(f"Personal Agent server listening on http://{args.host}:{args.port}")
+  try:
+    asyncio.run(server.serve_forever())
+  except KeyboardInterrupt:
+    print("\nShutting down")
+  finally:
+    if telemetry is not None:
+      telemetry.close()
+
+
+if __name__ == "__main__":
+  main()
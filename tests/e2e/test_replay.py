@@ -0,0 +1,32 @@
+import pytest
+from agent.ghost import Ghost
+from agent.model import Message
+from agent.shell import Shell
+from agent.sources.glm import GLMModel
+from agent.sources.replay import Cassette, ReplayModel
+from benchmarks.fake_server import FakeOpenAIServer
+
+
+@pytest.mark.e2e
+@pytest.mark.parametrize("transport", ["sdk", "fast"])
+def test_e2e_recorded_session_replays_over_http(tmp_path, transport):
+  path = str(tmp_path / "cassette.jsonl")
+  with FakeOpenAIServer(reply="Nice to meet you, Alice.") as live:
+    recorder = ReplayModel(Cassette(path), source=GLMModel(api_key="k", base_url=live.base_url))
+    shell = Shell(Ghost(model=recorder))
+    shell.process_input(Message(role="user", content="My name is Alice"))
+    recorded = [c.content for c in shell.process_input_stream(Message(role="user", content="Hi"))]
+
+  with FakeOpenAIServer(cassette=Cassette(path), time_scale=0) as replay:
+    model = GLMModel(api_key="k", base_url=replay.base_url, transport=transport)
+    shell = Shell(Ghost(model=model))
+    first = shell.process_input(Message(role="user", content="My name is Alice"))
+    chunks = list(shell.process_input_stream(Message(role="user", content="Hi")))
+
+  assert first.content == "Nice to meet you, Alice."
+  assert "".join(chunk.content for chunk in chunks) == "".join(recorded)
+  assert chunks[-1].usage.completion_tokens == 5
+  assert replay.requests[1]["messages"][1] == {
+    "role": "assistant",
+    "content": "Nice to meet you, Alice.",
+  }
@@ -1,7 +1,12 @@
 import pytest
 from agent.sources.glm import GLMModel
+from agent.context import PromptLayout
+from agent.ghost import Ghost
 from agent.model import Message
+from agent.shell import ContextEnhancer, Shell
+from agent.telemetry import Telemetry
 from tests.config import get_source_config, has_source_api_key
+from benchmarks.fake_server import FakeOpenAIServer
 
 
 @pytest.mark.integration
@@ -65,8 +70,225 @@ def test_glm_tool_formatting():
 
   model = GLMModel(api_key="test-key")
   tool = Tool(name="test_tool", description="A test tool", parameters={"type": "object"})
-  formatted = model._format_tool(tool)
+  formatted = model.formatter.tool(tool)
   assert formatted["type"] == "function"
   assert formatted["function"]["name"] == "test_tool"
   assert formatted["function"]["description"] == "A test tool"
   assert formatted["function"]["parameters"] == {"type": "object"}
+
+
+@pytest.mark.integration
+def test_glm_stream_completion_against_fake_server():
+  with FakeOpenAIServer(reply="one two three") as server:
+    model = GLMModel(api_key="test-key", base_url=server.base_url)
+    chunks = list(model.stream_completion([Message(role="user", content="Count")]))
+  assert [chunk.content for chunk in chunks if chunk.content] == ["one ", "two ", "three"]
+  assert chunks[-1].finish_reason == "stop"
+  assert server.requests[0]["stream"] is True
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_glm_stream_completion_async_against_fake_server():
+  with FakeOpenAIServer(reply="one two three") as server:
+    model = GLMModel(api_key="test-key", base_url=server.base_url)
+    content = ""
+    async for chunk in model.stream_completion_async([Message(role="user", content="Count")]):
+      content += chunk.content
+  assert content == "one two three"
+
+
+@pytest.mark.integration
+def test_glm_limiter_retries_throttled_requests_against_fake_server():
+  from agent.sources.limits import RateLimiter
+
+  with FakeOpenAIServer(reply="done", throttle_first=2, retry_after=0) as server:
+    limiter = RateLimiter(backoff=0.0)
+    model = GLMModel(api_key="test-key", base_url=server.base_url, limiter=limiter)
+    response = model.generate_completion([Message(role="user", content="Hi")])
+  assert response.content == "done"
+  assert server.throttled == 2
+  assert len(server.requests) == 3
+  assert limiter.metrics().retries == 2
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_glm_limiter_adapts_concurrency_against_fake_server():
+  import asyncio
+  from agent.sources.limits import AIMDController, RateLimiter
+
+  with FakeOpenAIServer(
+    reply="done", first_token_delay=0.05, max_concurrent=3, retry_after=0.05
+  ) as server:
+    limiter = RateLimiter(controller=AIMDController(initial=16, cooldown=0.0), max_retries=20)
+    model = GLMModel(api_key="test-key", base_url=server.base_url, limiter=limiter)
+    messages = [Message(role="user", content="Hi")]
+    responses = await asyncio.gather(
+      *(model.generate_completion_async(messages) for _ in range(20))
+    )
+    content = ""
+    async for chunk in model.stream_completion_async(messages):
+      content += chunk.content
+  assert [response.content for response in responses] == ["done"] * 20
+  assert content == "done"
+  assert server.peak <= 3
+  assert limiter.metrics().concurrency_limit < 16
+  assert limiter.metrics().in_flight == 0
+
+
+@pytest.mark.integration
+def test_glm_payload_includes_tool_turns():
+  from agent.model import ToolCall
+
+  model = GLMModel(api_key="test-key")
+  messages = [
+    Message(
+      role="assistant",
+      content="",
+      tool_calls=[ToolCall(id="call_1", name="lookup", arguments='{"q": "x"}')],
+    ),
+    Message(role="tool", content="result", tool_call_id="call_1"),
+  ]
+  payload = model._prepare_payload(messages)
+  assert payload["messages"][0]["tool_calls"][0]["function"]["name"] == "lookup"
+  assert payload["messages"][1]["tool_call_id"] == "call_1"
+  assert "tool_call_id" not in payload["messages"][0]
+
+
+@pytest.mark.integration
+def test_glm_payload_reuses_formatted_messages():
+  model = GLMModel(api_key="test-key", format_cache_size=2)
+  first, second = Message(role="user", content="a"), Message(role="assistant", content="b")
+  formatted = model._prepare_payload([first, second])["messages"]
+  again = model._prepare_payload([first, second])["messages"]
+  assert again[0] is formatted[0] and again[1] is formatted[1]
+
+  first.content = "changed"
+  assert model._prepare_payload([first])["messages"][0] == {"role": "user", "content": "changed"}
+
+  model._prepare_payload([Message(role="user", content="c"), Message(role="user", content="d")])
+  assert len(model.formatter._messages) <= 2
+
+  kept = model._prepare_payload([second])["messages"][0]
+  for content in ("e", "f", "g"):
+    model._prepare_payload([second, Message(role="user", content=content)])
+  assert model._prepare_payload([second])["messages"][0] is kept
+
+
+@pytest.mark.integration
+def test_glm_fast_transport_against_fake_server():
+  with FakeOpenAIServer(reply="one two three") as server:
+    model = GLMModel(api_key="test-key", base_url=server.base_url, transport="fast")
+    messages = [Message(role="user", content="Count")]
+    response = model.generate_completion(messages)
+    chunks = list(model.stream_completion(messages))
+  assert response.content == "one two three"
+  assert [chunk.content for chunk in chunks if chunk.content] == ["one ", "two ", "three"]
+  assert chunks[-1].finish_reason == "stop"
+  assert server.requests[0] == {
+    "model": "glm-4.7-flash",
+    "messages": [{"role": "user", "content": "Count"}],
+  }
+  assert server.requests[1]["stream"] is True
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_glm_fast_transport_async_against_fake_server():
+  with FakeOpenAIServer(reply="one two three") as server:
+    model = GLMModel(api_key="test-key", base_url=server.base_url, transport="fast")
+    messages = [Message(role="user", content="Count")]
+    response = await model.generate_completion_async(messages)
+    content = ""
+    async for chunk in model.stream_completion_async(messages):
+      content += chunk.content
+    await model.transport.aclose()
+  assert response.content == "one two three"
+  assert content == "one two three"
+
+
+@pytest.mark.integration
+def test_glm_fast_transport_retries_throttled_requests():
+  from agent.sources.limits import RateLimiter
+
+  with FakeOpenAIServer(reply="done", throttle_first=2, retry_after=0) as server:
+    limiter = RateLimiter(backoff=0.0)
+    model = GLMModel(
+      api_key="test-key", base_url=server.base_url, limiter=limiter, transport="fast"
+    )
+    chunks = list(model.stream_completion([Message(role="user", content="Hi")]))
+  assert "".join(chunk.content for chunk in chunks) == "done"
+  assert server.throttled == 2
+  assert limiter.metrics().retries == 2
+
+
+@pytest.mark.integration
+def test_glm_rejects_unknown_transport():
+  with pytest.raises(ValueError):
+    GLMModel(api_key="test-key", transport="carrier-pigeon")
+
+
+@pytest.mark.integration
+@pytest.mark.parametrize("transport", ["sdk", "fast"])
+def test_glm_reports_token_usage(transport):
+  with FakeOpenAIServer(reply="one two three") as server:
+    model = GLMModel(api_key="test-key", base_url=server.base_url, transport=transport)
+    messages = [Message(role="user", content="Count to three")]
+    response = model.generate_completion(messages)
+    chunks = list(model.stream_completion(messages))
+  assert (response.usage.prompt_tokens, response.usage.completion_tokens) == (3, 3)
+  assert chunks[-1].usage.completion_tokens == 3
+
+
+def stable_prefix(bodies: list[bytes]) -> bool:
+  # Everything before the previous request's last message must be resent byte for byte.
+  for previous, current in zip(bodies, bodies[1:]):
+    tail = previous.rindex(b'"role"')
+    if current[:tail] != previous[:tail]:
+      return False
+  return True
+
+
+class ClockEnhancer(ContextEnhancer):
+  independent = True
+
+  def __init__(self):
+    super().__init__("clock")
+    self.ticks = 0
+
+  def contribute(self, message):
+    self.ticks += 1
+    return f"tick {self.ticks}"
+
+
+@pytest.mark.integration
+@pytest.mark.parametrize("transport", ["sdk", "fast"])
+def test_glm_stable_prefix_is_byte_identical_across_turns(transport):
+  telemetry = Telemetry()
+  with FakeOpenAIServer(reply="noted") as server:
+    model = GLMModel(api_key="test-key", base_url=server.base_url, transport=transport)
+    layout = PromptLayout(system_prompt="You are terse.", stable_keys=("user",))
+    shell = Shell(Ghost(model, layout=layout, telemetry=telemetry))
+    shell.add_context_enhancer(ClockEnhancer())
+    for prompt in ["first question", "second question", "third question"]:
+      shell.process_input(Message(role="user", content=prompt))
+
+  assert stable_prefix(server.bodies)
+  assert server.requests[2]["messages"][-1] == {"role": "system", "content": "retrieved: tick 3"}
+  assert server.requests[2]["messages"][1]["content"] == "first question"
+  prompt = telemetry.metrics.counter("tokens_total", kind="prompt", model=model.model)
+  cached = telemetry.metrics.counter("tokens_total", kind="cached", model=model.model)
+  assert 0 < cached < prompt
+
+
+@pytest.mark.integration
+@pytest.mark.parametrize("layout", [None, PromptLayout(stable_keys=("user",))])
+def test_glm_volatile_context_only_breaks_the_legacy_prefix(layout):
+  with FakeOpenAIServer(reply="noted") as server:
+    ghost = Ghost(GLMModel(api_key="test-key", base_url=server.base_url), layout=layout)
+    for minute in range(3):
+      ghost.add_message(Message(role="user", content=f"question {minute}"))
+      response = ghost.process(context={"time": f"12:0{minute}", "user": "ada"})
+      ghost.add_message(Message(role="assistant", content=response.content))
+  assert stable_prefix(server.bodies) is (layout is not None)
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import pytest
+from agent.batch import BatchInput, BatchRunner
+from agent.model import BaseModel, CompletionResponse, Message
+
+
+class RateLimitError(Exception):
+  status_code = 429
+
+  def __init__(self, retry_after: str = "0"):
+    super().__init__("rate limited")
+    self.response = type("Response", (), {"headers": {"retry-after": retry_after}})()
+
+
+class SlowModel(BaseModel):
+  def __init__(self, delays: dict[str, float] = None, throttle: int = 0):
+    self.delays = delays or {}
+    self.throttle = throttle
+    self.active = 0
+    self.peak = 0
+    self.calls = 0
+
+  def generate_completion(self, messages, tools=None):
+    raise NotImplementedError
+
+  async def generate_completion_async(self, messages, tools=None):
+    self.calls += 1
+    if self.throttle:
+      self.throttle -= 1
+      raise RateLimitError()
+    self.active += 1
+    self.peak = max(self.peak, self.active)
+    content = messages[-1].content
+    await asyncio.sleep(self.delays.get(content, 0.01))
+    self.active -= 1
+    return CompletionResponse(content=f"echo {content}", tool_calls=[], finish_reason="stop")
+
+
+async def collect(runner, inputs):
+  return [result async for result in runner.run(inputs)]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_batch_runner_bounds_concurrency_and_isolates_sessions():
+  model = SlowModel()
+  runner = BatchRunner(model, concurrency=3)
+  results = await collect(runner, [f"prompt {i}" for i in range(12)])
+  assert sorted(result.response.content for result in results) == sorted(
+    f"echo prompt {i}" for i in range(12)
+  )
+  assert model.peak == 3
+  assert all(result.attempts == 1 and result.error is None for result in results)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_batch_runner_streams_in_completion_or_input_order():
+  delays = {"slow": 0.1, "fast": 0.0}
+  unordered = await collect(BatchRunner(SlowModel(delays), concurrency=2), ["slow", "fast"])
+  assert [result.id for result in unordered] == ["1", "0"]
+  ordered = await collect(
+    BatchRunner(SlowModel(delays), concurrency=2, ordered=True), ["slow", "fast"]
+  )
+  assert [result.id for result in ordered] == ["0", "1"]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_batch_runner_accepts_async_inputs_with_history():
+  async def inputs():
+    yield BatchInput(
+      id="a",
+      messages=[
+        Message(role="user", content="hi"),
+        Message(role="assistant", content="hello"),
+        Message(role="user", content="again"),
+      ],
+    )
+
+  results = await collect(BatchRunner(SlowModel()), inputs())
+  assert results[0].id == "a"
+  assert results[0].response.content == "echo again"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_batch_runner_reports_timeouts_without_failing_batch():
+  runner = BatchRunner(SlowModel({"stuck": 1.0}), concurrency=2, timeout=0.05)
+  results = {result.id: result for result in await collect(runner, ["stuck", "ok"])}
+  assert results["0"].response is None
+  assert results["0"].error.startswith("TimeoutError")
+  assert results["1"].response.content == "echo ok"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_batch_runner_backs_off_on_rate_limits():
+  model = SlowModel(throttle=2)
+  runner = BatchRunner(model, concurrency=4, backoff=0.0)
+  results = await collect(runner, ["only"])
+  assert results[0].response.content == "echo only"
+  assert results[0].attempts == 3
+  assert runner.limit.controller.limit < 4
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_batch_runner_gives_up_after_max_retries():
+  runner = BatchRunner(SlowModel(throttle=10), max_retries=1, backoff=0.0)
+  results = await collect(runner, ["only"])
+  assert results[0].attempts == 2
+  assert results[0].error == "RateLimitError: rate limited"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_batch_runner_writes_jsonl(tmp_path):
+  path = tmp_path / "out" / "results.jsonl"
+  count = await BatchRunner(SlowModel(), ordered=True).run_to_jsonl(
+    [BatchInput.from_dict({"id": "x", "content": "one"}), "two"], str(path)
+  )
+  rows = [json.loads(line) for line in path.read_text().splitlines()]
+  assert count == 2
+  assert [(row["id"], row["content"]) for row in rows] == [("x", "echo one"), ("1", "echo two")]
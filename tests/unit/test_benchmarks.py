@@ -0,0 +1,92 @@
+import json
+import pytest
+from benchmarks.harness import Result, compare, diff_table, load, mann_whitney, measure, save
+from benchmarks.suite import CASES, main
+
+
+def result(name: str, samples: list[float]) -> Result:
+  return Result(name, "micro", 1, samples)
+
+
+@pytest.mark.unit
+def test_mann_whitney_separates_shifted_samples():
+  base = [1.0, 1.1, 0.9, 1.05, 0.95, 1.02, 0.98, 1.01, 0.99, 1.03]
+  assert mann_whitney(base, base) > 0.9
+  assert mann_whitney(base, [value * 1.5 for value in base]) < 0.001
+  assert mann_whitney([1.0], [2.0]) == 1.0
+
+
+@pytest.mark.unit
+def test_compare_needs_both_threshold_and_significance():
+  base = [1.0, 1.1, 0.9, 1.05, 0.95, 1.02, 0.98, 1.01, 0.99, 1.03]
+  noisy = [0.5, 3.0, 0.6, 2.8, 0.7, 2.9, 0.8, 2.7, 1.0, 2.6]
+  baseline = {
+    "slow": result("slow", base),
+    "fast": result("fast", base),
+    "tiny": result("tiny", base),
+    "noisy": result("noisy", base),
+    "gone": result("gone", base),
+  }
+  current = {
+    "slow": result("slow", [value * 1.3 for value in base]),
+    "fast": result("fast", [value * 0.5 for value in base]),
+    "tiny": result("tiny", [value * 1.05 for value in base]),
+    "noisy": result("noisy", noisy),
+    "added": result("added", base),
+  }
+  comparisons = {c.name: c for c in compare(baseline, current, threshold=0.1, alpha=0.05)}
+  assert {name: c.status for name, c in comparisons.items()} == {
+    "slow": "slower",
+    "fast": "faster",
+    "tiny": "same",
+    "noisy": "same",
+    "gone": "missing",
+    "added": "new",
+  }
+  assert comparisons["slow"].change == pytest.approx(0.3)
+
+  lines = diff_table(list(comparisons.values())).splitlines()
+  assert lines[0].split() == ["benchmark", "baseline", "current", "change", "p", "status"]
+  assert "+30.0%" in next(line for line in lines if line.startswith("slow"))
+
+
+@pytest.mark.unit
+def test_baselines_round_trip(tmp_path):
+  path = str(tmp_path / "baselines" / "main.json")
+  save(path, {"case": result("case", [1e-6, 2e-6, 3e-6])})
+  loaded = load(path)["case"]
+  assert loaded.samples == [1e-6, 2e-6, 3e-6] and loaded.median == 2e-6
+
+  data = json.loads(open(path).read())
+  assert data["machine"]["python"] and data["results"]["case"]["iterations"] == 1
+  data["version"] = 0
+  with open(path, "w") as f:
+    json.dump(data, f)
+  with pytest.raises(ValueError):
+    load(path)
+
+
+@pytest.mark.unit
+def test_measure_calibrates_iterations():
+  calls = []
+  iterations, samples = measure(lambda: calls.append(1), rounds=3, min_time=0.001)
+  assert iterations > 1 and len(samples) == 3
+  assert len(calls) >= 3 * iterations
+
+
+@pytest.mark.unit
+def test_every_case_runs_offline():
+  assert {case.group for case in CASES} == {"micro", "macro"}
+  for case in CASES:
+    case.setup()()
+
+
+@pytest.mark.unit
+def test_cli_saves_and_diffs(tmp_path, capsys):
+  path = str(tmp_path / "baseline.json")
+  options = ["-k", "format_context", "--rounds", "3", "--min-time", "0.001"]
+  assert main([*options, "--save", path]) == 0
+  assert main([*options, "--compare", path]) == 0
+  assert main(["--diff", path, path]) == 0
+  output = capsys.readouterr().out
+  assert "format_context_32" in output and "status" in output
@@ -0,0 +1,206 @@
+import asyncio
+import threading
+import time
+import pytest
+from agent.model import BaseModel, CompletionResponse, Message, Tool
+from agent.sources.cache import CachedModel, DiskCache, MemoryCache, payload_key
+
+
+class CountingModel(BaseModel):
+  def __init__(self, delay: float = 0.0):
+    self.model = "counting"
+    self.delay = delay
+    self.calls = 0
+    self.lock = threading.Lock()
+
+  def generate_completion(self, messages, tools=None):
+    with self.lock:
+      self.calls += 1
+    time.sleep(self.delay)
+    return CompletionResponse(content=f"reply {self.calls}", tool_calls=[], finish_reason="stop")
+
+  async def generate_completion_async(self, messages, tools=None):
+    self.calls += 1
+    await asyncio.sleep(self.delay)
+    return CompletionResponse(content=f"reply {self.calls}", tool_calls=[], finish_reason="stop")
+
+
+class Clock:
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self) -> float:
+    return self.now
+
+
+MESSAGES = [Message(role="user", content="hello")]
+
+
+@pytest.mark.unit
+def test_payload_key_is_stable_and_sensitive():
+  tool = Tool(name="t", description="d", parameters={"b": 1, "a": 2})
+  same_tool = Tool(name="t", description="d", parameters={"a": 2, "b": 1})
+  assert payload_key("m", MESSAGES, [tool]) == payload_key("m", MESSAGES, [same_tool])
+  assert payload_key("m", MESSAGES, None) != payload_key("other", MESSAGES, None)
+  assert payload_key("m", MESSAGES, None) != payload_key(
+    "m", [Message(role="user", content="hello!")], None
+  )
+
+
+@pytest.mark.unit
+def test_cached_model_serves_repeat_requests_from_memory():
+  inner = CountingModel()
+  model = CachedModel(inner)
+  first = model.generate_completion(MESSAGES)
+  first.content = "mutated by a processor"
+  second = model.generate_completion(MESSAGES)
+  assert inner.calls == 1
+  assert second.content == "reply 1"
+  assert model.stats.hits == 1 and model.stats.misses == 1
+  assert model.stats.hit_rate == 0.5
+
+
+@pytest.mark.unit
+def test_cached_model_opt_out_bypasses_cache():
+  inner = CountingModel()
+  model = CachedModel(inner)
+  model.generate_completion(MESSAGES)
+  assert model.generate_completion(MESSAGES, use_cache=False).content == "reply 2"
+  assert model.stats.bypassed == 1
+
+
+@pytest.mark.unit
+def test_cached_model_disk_tier_survives_restart(tmp_path):
+  path = str(tmp_path / "cache.db")
+  CachedModel(CountingModel(), disk=DiskCache(path)).generate_completion(MESSAGES)
+  inner = CountingModel()
+  model = CachedModel(inner, disk=DiskCache(path))
+  assert model.generate_completion(MESSAGES).content == "reply 1"
+  assert inner.calls == 0
+  assert model.stats.disk_hits == 1
+
+
+@pytest.mark.unit
+def test_memory_cache_expires_and_evicts_lru():
+  clock = Clock()
+  cache = MemoryCache(max_entries=2, ttl=10.0, clock=clock)
+  cache.set("a", "1")
+  cache.set("b", "2")
+  cache.get("a")
+  cache.set("c", "3")
+  assert cache.get("b") is None
+  assert cache.get("a") == "1"
+  clock.now += 11
+  assert cache.get("a") is None
+
+
+@pytest.mark.unit
+def test_disk_cache_expires_and_bounds_size(tmp_path):
+  clock = Clock()
+  cache = DiskCache(str(tmp_path / "cache.db"), ttl=10.0, max_bytes=10, clock=clock)
+  cache.set("a", "xxxx")
+  clock.now += 1
+  cache.set("b", "yyyy")
+  clock.now += 1
+  cache.get("a")
+  cache.set("c", "zzzz")
+  assert cache.get("b") is None
+  assert cache.get("a") == "xxxx"
+  assert cache.size() <= 10
+  clock.now += 20
+  assert cache.get("c") is None
+
+
+@pytest.mark.unit
+def test_cached_model_coalesces_concurrent_identical_requests():
+  inner = CountingModel(delay=0.1)
+  model = CachedModel(inner)
+  results = []
+  threads = [
+    threading.Thread(target=lambda: results.append(model.generate_completion(MESSAGES)))
+    for _ in range(5)
+  ]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert inner.calls == 1
+  assert {result.content for result in results} == {"reply 1"}
+  assert model.stats.coalesced + model.stats.hits == 4
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_cached_model_coalesces_concurrent_async_requests():
+  inner = CountingModel(delay=0.05)
+  model = CachedModel(inner)
+  results = await asyncio.gather(*(model.generate_completion_async(MESSAGES) for _ in range(5)))
+  assert inner.calls == 1
+  assert [result.content for result in results] == ["reply 1"] * 5
+  assert model.stats.coalesced == 4
+
+
+@pytest.mark.unit
+def test_cached_model_propagates_errors_to_waiters():
+  class FailingModel(CountingModel):
+    def generate_completion(self, messages, tools=None):
+      time.sleep(0.05)
+      raise RuntimeError("upstream down")
+
+  model = CachedModel(FailingModel())
+  errors = []
+
+  def call():
+    try:
+      model.generate_completion(MESSAGES)
+    except RuntimeError as e:
+      errors.append(e)
+
+  threads = [threading.Thread(target=call) for _ in range(3)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert len(errors) == 3
+
+
+@pytest.mark.unit
+def test_cached_model_caches_streamed_responses():
+  inner = CountingModel()
+  model = CachedModel(inner)
+  streamed = "".join(chunk.content for chunk in model.stream_completion(MESSAGES))
+  replayed = "".join(chunk.content for chunk in model.stream_completion(MESSAGES))
+  assert streamed == replayed == "reply 1"
+  assert inner.calls == 1
+  assert (model.stats.hits, model.stats.misses) == (1, 1)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_cached_model_coalesces_concurrent_streams():
+  inner = CountingModel(delay=0.05)
+  model = CachedModel(inner)
+
+  async def stream() -> str:
+    return "".join([chunk.content async for chunk in model.stream_completion_async(MESSAGES)])
+
+  assert await asyncio.gather(*(stream() for _ in range(4))) == ["reply 1"] * 4
+  assert inner.calls == 1
+  assert (model.stats.misses, model.stats.coalesced) == (1, 3)
+
+
+@pytest.mark.unit
+def test_cached_model_hits_keep_usage():
+  from agent.model import Usage
+
+  class MeteredModel(CountingModel):
+    def generate_completion(self, messages, tools=None):
+      response = super().generate_completion(messages, tools)
+      response.usage = Usage(prompt_tokens=12, completion_tokens=3)
+      return response
+
+  model = CachedModel(MeteredModel())
+  model.generate_completion(MESSAGES)
+  assert model.generate_completion(MESSAGES).usage == Usage(prompt_tokens=12, completion_tokens=3)
+  chunks = list(model.stream_completion(MESSAGES))
+  assert chunks[-1].usage == Usage(prompt_tokens=12, completion_tokens=3)
@@ -0,0 +1,141 @@
+import pytest
+from agent.context import (
+  ApproximateTokenizer,
+  ContextPolicy,
+  ContextWindow,
+  MESSAGE_OVERHEAD_TOKENS,
+  Tokenizer,
+)
+from agent.model import Message
+
+
+class WordTokenizer(Tokenizer):
+  def __init__(self):
+    self.calls = 0
+
+  def count(self, text: str) -> int:
+    self.calls += 1
+    return len(text.split())
+
+
+def conversation(turns: int) -> list[Message]:
+  history = [Message(role="system", content="be brief")]
+  for turn in range(turns):
+    history.append(Message(role="user", content=f"question {turn}"))
+    history.append(Message(role="assistant", content=f"answer {turn}"))
+  return history
+
+
+@pytest.mark.unit
+def test_approximate_tokenizer_counts_chars():
+  assert ApproximateTokenizer().count("abcdefgh") == 2
+  assert ApproximateTokenizer().count("abcdefghi") == 3
+  assert ApproximateTokenizer().count("") == 0
+
+
+@pytest.mark.unit
+def test_context_window_caches_counts_per_message():
+  tokenizer = WordTokenizer()
+  window = ContextWindow(max_tokens=1000, tokenizer=tokenizer)
+  message = Message(role="user", content="one two three")
+  assert window.count(message) == 3 + MESSAGE_OVERHEAD_TOKENS
+  window.count(message)
+  assert tokenizer.calls == 1
+  message.content = "one"
+  assert window.count(message) == 1 + MESSAGE_OVERHEAD_TOKENS
+  assert tokenizer.calls == 2
+
+
+@pytest.mark.unit
+def test_context_window_keeps_everything_under_budget():
+  history = conversation(3)
+  window = ContextWindow(max_tokens=1000, tokenizer=WordTokenizer())
+  assert window.fit(history) == history
+
+
+@pytest.mark.unit
+def test_context_window_drops_oldest_turns_and_pins_system():
+  history = conversation(10)
+  window = ContextWindow(max_tokens=6 * 4, tokenizer=WordTokenizer())
+  fitted = window.fit(history)
+  assert fitted[0] == history[0]
+  assert fitted[1:] == history[-3:]
+
+
+@pytest.mark.unit
+def test_context_window_last_turns_policy():
+  history = conversation(10)
+  window = ContextWindow(max_tokens=1000, policy=ContextPolicy(max_turns=2))
+  fitted = window.fit(history)
+  assert [message.content for message in fitted] == [
+    "be brief",
+    "question 8",
+    "answer 8",
+    "question 9",
+    "answer 9",
+  ]
+
+
+@pytest.mark.unit
+def test_context_window_pins_first_user_turn():
+  history = conversation(10)
+  window = ContextWindow(max_tokens=1000, policy=ContextPolicy(max_turns=1, pin_first_user=True))
+  fitted = window.fit(history)
+  assert [message.content for message in fitted] == [
+    "be brief",
+    "question 0",
+    "question 9",
+    "answer 9",
+  ]
+
+
+@pytest.mark.unit
+def test_context_window_includes_prefix_in_budget():
+  history = conversation(2)
+  prefix = [Message(role="system", content="context " * 10)]
+  window = ContextWindow(max_tokens=14 + 6 + 6 * 2, tokenizer=WordTokenizer())
+  fitted = window.fit(history, prefix)
+  assert fitted[0] is prefix[0]
+  assert fitted[1:] == [history[0], *history[-2:]]
+
+
+@pytest.mark.unit
+def test_context_window_truncates_oversized_latest_message():
+  history = [Message(role="user", content="x" * 4000)]
+  window = ContextWindow(max_tokens=100)
+  fitted = window.fit(history)
+  assert len(fitted) == 1
+  assert fitted[0].content.endswith("[truncated]")
+  assert window.count(fitted[0]) <= 100
+  assert history[0].content == "x" * 4000
+
+
+@pytest.mark.unit
+def test_context_window_drops_pins_before_latest_message():
+  history = [
+    Message(role="system", content="s " * 50),
+    Message(role="user", content="hello"),
+  ]
+  window = ContextWindow(max_tokens=20, tokenizer=WordTokenizer())
+  assert window.fit(history) == [history[1]]
+
+
+@pytest.mark.unit
+def test_context_window_for_model_uses_known_budget():
+  window = ContextWindow.for_model("glm-4.5", reserve_tokens=1000)
+  assert window.max_tokens == 128_000
+  assert window.budget == 127_000
+
+
+@pytest.mark.unit
+def test_context_window_count_cache_is_bounded_and_drops_dead_messages():
+  window = ContextWindow(max_tokens=1000, count_cache_size=4)
+  history = conversation(5)
+  window.fit(history)
+  assert len(window._counts) == 4
+  assert window.count(history[-1]) == window.count(Message(role="x", content="answer 4"))
+
+  window.clear()
+  window.count(history[0])
+  del history
+  assert len(window._counts) == 0
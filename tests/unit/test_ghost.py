@@ -1,7 +1,8 @@
 import pytest
 from unittest.mock import MagicMock
-from agent.model import Message, CompletionResponse
+from agent.model import Message, CompletionResponse, CompletionChunk
 from agent.ghost import Ghost
+from agent.context import ContextPolicy, ContextWindow, PromptLayout
 
 
 @pytest.fixture
@@ -111,3 +112,66 @@ def test_ghost_process_with_multiple_messages(mock_model):
   assert call_args[0].role == "user"
   assert call_args[1].role == "assistant"
   assert call_args[2].role == "user"
+
+
+@pytest.mark.unit
+def test_ghost_process_stream_passes_prepared_messages(mock_model):
+  mock_model.stream_completion.return_value = iter([CompletionChunk(content="Mock")])
+  ghost = Ghost(model=mock_model)
+  ghost.add_message(Message(role="user", content="test"))
+  chunks = list(ghost.process_stream(context={"mode": "stream"}))
+  call_args = mock_model.stream_completion.call_args[0][0]
+  assert call_args[0].role == "system"
+  assert call_args[1].content == "test"
+  assert chunks == [CompletionChunk(content="Mock")]
+
+
+@pytest.mark.unit
+def test_ghost_process_fits_messages_into_context_window(mock_model):
+  ghost = Ghost(
+    model=mock_model,
+    context_window=ContextWindow(max_tokens=1000, policy=ContextPolicy(max_turns=1)),
+  )
+  ghost.add_message(Message(role="user", content="old question"))
+  ghost.add_message(Message(role="assistant", content="old answer"))
+  ghost.add_message(Message(role="user", content="new question"))
+  ghost.process(context={"context_key": "context_value"})
+  call_args = mock_model.generate_completion.call_args[0][0]
+  assert [message.content for message in call_args] == [
+    "context_key: context_value",
+    "new question",
+  ]
+
+
+@pytest.mark.unit
+def test_ghost_stable_layout_moves_volatile_context_to_tail(mock_model):
+  ghost = Ghost(
+    model=mock_model,
+    layout=PromptLayout(system_prompt="Be brief.", stable_keys=("user", "locale")),
+    context_window=ContextWindow(max_tokens=1000, policy=ContextPolicy(max_turns=1)),
+  )
+  ghost.add_message(Message(role="user", content="old question"))
+  ghost.add_message(Message(role="assistant", content="old answer"))
+  ghost.add_message(Message(role="user", content="new question"))
+  ghost.process(context={"time": "12:00", "user": "ada", "locale": "en", "clock": "tick"})
+  first = mock_model.generate_completion.call_args[0][0]
+  assert [(message.role, message.content) for message in first] == [
+    ("system", "Be brief.\n\nlocale: en\nuser: ada"),
+    ("user", "new question"),
+    ("system", "clock: tick\ntime: 12:00"),
+  ]
+
+  ghost.process(context={"user": "ada", "locale": "en", "time": "12:01"})
+  second = mock_model.generate_completion.call_args[0][0]
+  assert second[0] is first[0] and second[-1].content == "time: 12:01"
+
+
+@pytest.mark.unit
+def test_ghost_history_view_pages_without_copying(mock_model):
+  ghost = Ghost(model=mock_model)
+  for i in range(5):
+    ghost.add_message(Message(role="user", content=str(i)))
+  view = ghost.history_view(offset=1, limit=2)
+  assert [m.content for m in view] == ["1", "2"]
+  assert view[0] is ghost.conversation_history[1]
+  assert [m.content for m in ghost.get_conversation_history(offset=3)] == ["3", "4"]
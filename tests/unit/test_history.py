@@ -0,0 +1,43 @@
+import pytest
+from agent.history import HistoryView
+from agent.model import Message
+
+
+def history(count: int) -> list[Message]:
+  return [Message(role="user", content=str(i)) for i in range(count)]
+
+
+@pytest.mark.unit
+def test_history_view_reads_without_copying():
+  messages = history(10)
+  view = HistoryView(messages, 3, 7)
+  assert len(view) == 4
+  assert view[0] is messages[3]
+  assert view[-1] is messages[6]
+  assert [m.content for m in view] == ["3", "4", "5", "6"]
+  assert [m.content for m in reversed(view)] == ["6", "5", "4", "3"]
+  assert view == messages[3:7]
+  with pytest.raises(IndexError):
+    view[4]
+
+
+@pytest.mark.unit
+def test_history_view_slices_are_views():
+  messages = history(10)
+  view = HistoryView(messages, 2)
+  inner = view[1:4]
+  assert isinstance(inner, HistoryView)
+  assert [m.content for m in inner] == ["3", "4", "5"]
+  assert [m.content for m in HistoryView(inner, 1)] == ["4", "5"]
+  assert len(view[8:]) == 0
+  with pytest.raises(ValueError):
+    view[::2]
+
+
+@pytest.mark.unit
+def test_open_ended_history_view_tracks_appends():
+  messages = history(3)
+  view = HistoryView(messages, 1)
+  messages.append(Message(role="assistant", content="3"))
+  assert [m.content for m in view] == ["1", "2", "3"]
+  assert len(HistoryView(messages, 10)) == 0
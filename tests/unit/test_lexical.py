@@ -0,0 +1,59 @@
+import os
+import pytest
+from agent.enhancers.lexical import BM25Index, tokenize
+
+
+@pytest.fixture
+def index():
+  index = BM25Index()
+  index.add("guide.md#0", "Set stream=True on glm-4.7-flash to receive deltas")
+  index.add("guide.md#1", "Tools are passed as JSON schema functions")
+  index.add("memory.md#0", "Mem0 extracts salient facts and cuts tokens")
+  return index
+
+
+@pytest.mark.unit
+def test_tokenize_keeps_identifiers_and_stems_words():
+  assert tokenize("Streaming glm-4.7-flash max_tokens") == ["stream", "glm-4.7-flash", "max_tokens"]
+
+
+@pytest.mark.unit
+def test_bm25_matches_exact_identifiers(index):
+  assert [chunk_id for chunk_id, _ in index.search("glm-4.7-flash", top_k=5)] == ["guide.md#0"]
+  assert index.search("max_tokens", top_k=5) == []
+
+
+@pytest.mark.unit
+def test_bm25_ranks_by_term_weight(index):
+  index.add("guide.md#2", "Tools tools tools: JSON schema")
+  results = index.search("tools schema", top_k=2)
+  assert [chunk_id for chunk_id, _ in results] == ["guide.md#2", "guide.md#1"]
+  assert results[0][1] > results[1][1] > 0
+
+
+@pytest.mark.unit
+def test_bm25_remove_and_replace_documents(index):
+  assert index.remove("memory.md#0")
+  assert not index.remove("memory.md#0")
+  assert index.search("salient facts", top_k=5) == []
+  index.add("guide.md#1", "Replaced text about salient facts")
+  assert [chunk_id for chunk_id, _ in index.search("facts", top_k=5)] == ["guide.md#1"]
+  assert index.search("schema", top_k=5) == []
+  assert len(index) == 2
+
+
+@pytest.mark.unit
+def test_bm25_save_and_load_round_trip(index, tmp_path):
+  index.remove("guide.md#1")
+  before = index.search("deltas facts", top_k=5)
+  directory = str(tmp_path / "lexical")
+  index.save(directory)
+  assert os.path.exists(os.path.join(directory, "docs.npy"))
+
+  loaded = BM25Index.load(directory)
+  assert loaded.search("deltas facts", top_k=5) == before
+  loaded.add("notes.md#0", "fresh deltas added after loading")
+  loaded.remove("guide.md#0")
+  assert [chunk_id for chunk_id, _ in loaded.search("deltas", top_k=5)] == ["notes.md#0"]
+  loaded.save(directory)
+  assert len(BM25Index.load(directory)) == 2
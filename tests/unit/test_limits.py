@@ -0,0 +1,178 @@
+import asyncio
+import threading
+import time
+import pytest
+from agent.sources.limits import (
+  AIMDController,
+  RateLimiter,
+  TokenBucket,
+  backoff_delay,
+  retry_after,
+)
+
+
+class Clock:
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self) -> float:
+    return self.now
+
+
+class StatusError(Exception):
+  def __init__(self, status_code: int, retry_after: str = None):
+    super().__init__(f"status {status_code}")
+    self.status_code = status_code
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    self.response = type("Response", (), {"headers": headers})()
+
+
+@pytest.mark.unit
+def test_token_bucket_reserves_and_reports_wait():
+  clock = Clock()
+  bucket = TokenBucket(per_minute=60, capacity=2, clock=clock)
+  assert bucket.reserve() == 0.0
+  assert bucket.reserve() == 0.0
+  assert bucket.reserve() == pytest.approx(1.0)
+  assert bucket.reserve() == pytest.approx(2.0)
+  clock.now += 2.0
+  assert bucket.available() == pytest.approx(0.0)
+
+
+@pytest.mark.unit
+def test_aimd_controller_halves_on_throttle_and_grows_additively():
+  clock = Clock()
+  controller = AIMDController(initial=8, maximum=10, cooldown=1.0, clock=clock)
+  controller.on_throttle()
+  controller.on_throttle()
+  assert controller.limit == 4
+  clock.now += 2.0
+  controller.on_throttle()
+  assert controller.limit == 2
+  for _ in range(10):
+    controller.on_success()
+  assert 4 <= controller.limit <= 10
+  for _ in range(1000):
+    controller.on_success()
+  assert controller.limit == 10
+
+
+@pytest.mark.unit
+def test_retry_after_and_backoff():
+  assert retry_after(StatusError(429, "2.5")) == 2.5
+  assert retry_after(StatusError(429, "soon")) is None
+  assert retry_after(ValueError()) is None
+  assert all(0.0 <= backoff_delay(attempt, 0.5, 4.0) <= 4.0 for attempt in range(10))
+
+
+@pytest.mark.unit
+def test_rate_limiter_bounds_threads_and_reports_queue_depth():
+  limiter = RateLimiter(controller=AIMDController(initial=2, maximum=2))
+  active = 0
+  peak = 0
+  lock = threading.Lock()
+  depths = []
+
+  def work():
+    nonlocal active, peak
+    with lock:
+      active += 1
+      peak = max(peak, active)
+    time.sleep(0.05)
+    depths.append(limiter.metrics().queue_depth)
+    with lock:
+      active -= 1
+    return "ok"
+
+  threads = [threading.Thread(target=limiter.call, args=(work,)) for _ in range(6)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert peak == 2
+  assert max(depths) > 0
+  metrics = limiter.metrics()
+  assert metrics.in_flight == 0 and metrics.queue_depth == 0
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_rate_limiter_bounds_async_callers():
+  limiter = RateLimiter(controller=AIMDController(initial=3, maximum=3))
+  active = 0
+  peak = 0
+
+  async def work():
+    nonlocal active, peak
+    active += 1
+    peak = max(peak, active)
+    await asyncio.sleep(0.02)
+    active -= 1
+    return "ok"
+
+  results = await asyncio.gather(*(limiter.call_async(work) for _ in range(10)))
+  assert results == ["ok"] * 10
+  assert peak == 3
+
+
+@pytest.mark.unit
+def test_rate_limiter_retries_throttled_calls_and_shrinks():
+  limiter = RateLimiter(controller=AIMDController(initial=8, cooldown=0.0), backoff=0.0)
+  failures = [StatusError(429, "0"), StatusError(503)]
+
+  def flaky():
+    if failures:
+      raise failures.pop(0)
+    return "ok"
+
+  assert limiter.call(flaky) == "ok"
+  metrics = limiter.metrics()
+  assert metrics.retries == 2 and metrics.throttled == 2
+  assert metrics.concurrency_limit == 2
+
+
+@pytest.mark.unit
+def test_rate_limiter_does_not_retry_client_errors_or_exhausted_budget():
+  limiter = RateLimiter(max_retries=1, backoff=0.0)
+  calls = []
+
+  def bad_request():
+    calls.append(1)
+    raise StatusError(400)
+
+  with pytest.raises(StatusError):
+    limiter.call(bad_request)
+  assert len(calls) == 1
+
+  def always_throttled():
+    calls.append(1)
+    raise StatusError(429, "0")
+
+  with pytest.raises(StatusError):
+    limiter.call(always_throttled)
+  assert len(calls) == 3
+  assert limiter.metrics().in_flight == 0
+
+
+@pytest.mark.unit
+def test_rate_limiter_paces_requests_per_minute():
+  limiter = RateLimiter(requests_per_minute=600)
+  limiter.requests.tokens = 0
+  start = time.perf_counter()
+  limiter.call(lambda: None)
+  assert time.perf_counter() - start >= 0.09
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_rate_limiter_cancelled_waiter_frees_its_place():
+  limiter = RateLimiter(controller=AIMDController(initial=1, maximum=1))
+  await limiter.acquire_async()
+  waiter = asyncio.create_task(limiter.acquire_async())
+  await asyncio.sleep(0.01)
+  assert limiter.metrics().queue_depth == 1
+  waiter.cancel()
+  with pytest.raises(asyncio.CancelledError):
+    await waiter
+  limiter.release()
+  assert limiter.metrics().in_flight == 0 and limiter.metrics().queue_depth == 0
@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import pytest
+from unittest.mock import MagicMock
+from agent.enhancers.memory import MemoryExtractor, MemoryStore
+from agent.ghost import Ghost
+from agent.model import BaseModel, CompletionResponse, Message
+from agent.shell import PersistentMemoryEnhancer, Shell
+
+DAY = 86400.0
+
+
+class FactModel(BaseModel):
+  def __init__(self, content: str):
+    self.content = content
+
+  def generate_completion(self, messages, tools=None):
+    raise AssertionError("extraction must use the async path")
+
+  async def generate_completion_async(self, messages, tools=None):
+    return CompletionResponse(content=self.content, tool_calls=[], finish_reason="stop")
+
+
+@pytest.fixture
+def store(tmp_path):
+  store = MemoryStore(str(tmp_path / "memory.db"))
+  yield store
+  store.close()
+
+
+@pytest.mark.unit
+def test_memory_store_returns_relevant_memories(store):
+  store.add("user:alice", "Alice prefers Python over JavaScript")
+  store.add("user:alice", "Alice lives in Lyon")
+  results = store.search("user:alice", "which city does Alice live in", top_k=1)
+  assert [memory.text for memory, _ in results] == ["Alice lives in Lyon"]
+
+
+@pytest.mark.unit
+def test_memory_store_partitions_by_namespace(store):
+  store.add("user:alice", "Alice lives in Lyon")
+  store.add("session:42", "This session is about invoices")
+  assert store.search("user:bob", "Lyon") == []
+  assert [memory.text for memory in store.memories("session:42")] == [
+    "This session is about invoices"
+  ]
+
+
+@pytest.mark.unit
+def test_memory_store_consolidates_near_duplicates(store):
+  first = store.add("user:alice", "Alice lives in Lyon, France")
+  second = store.add("user:alice", "Alice lives in Lyon France")
+  assert second.id == first.id
+  assert second.strength == 2.0
+  assert [memory.text for memory in store.memories("user:alice")] == ["Alice lives in Lyon France"]
+
+
+@pytest.mark.unit
+def test_memory_store_evicts_weakest_memories(tmp_path):
+  store = MemoryStore(str(tmp_path / "memory.db"), max_memories=2, half_life_days=1.0)
+  store.add("user:alice", "likes tea", now=0.0)
+  store.add("user:alice", "owns a bicycle", now=5 * DAY)
+  store.add("user:alice", "works on compilers", now=6 * DAY)
+  assert sorted(memory.text for memory in store.memories("user:alice")) == [
+    "owns a bicycle",
+    "works on compilers",
+  ]
+  assert store.evict("user:alice", min_retention=0.5, now=7 * DAY) == 1
+  assert [memory.text for memory in store.memories("user:alice")] == ["works on compilers"]
+  store.close()
+
+
+@pytest.mark.unit
+def test_memory_store_accepts_memories_after_full_eviction(store):
+  store.add("user:alice", "likes tea", now=0.0)
+  assert store.evict("user:alice", min_retention=10.0, now=0.0) == 1
+  store.add("user:alice", "owns a bicycle")
+  assert [memory.text for memory in store.memories("user:alice")] == ["owns a bicycle"]
+  assert store.search("user:alice", "bicycle", top_k=1)[0][0].text == "owns a bicycle"
+
+
+@pytest.mark.unit
+def test_memory_store_persists_across_reopen(tmp_path):
+  path = str(tmp_path / "memory.db")
+  store = MemoryStore(path)
+  store.add("user:alice", "Alice lives in Lyon")
+  store.close()
+  reopened = MemoryStore(path)
+  assert reopened.search("user:alice", "Lyon", top_k=1)[0][0].text == "Alice lives in Lyon"
+  reopened.close()
+
+
+@pytest.mark.unit
+def test_memory_extractor_stores_parsed_facts(store):
+  extractor = MemoryExtractor(FactModel("- Alice lives in Lyon\n- Alice has a cat\n"), store)
+  future = extractor.schedule(
+    "user:alice",
+    Message(role="user", content="I live in Lyon with my cat"),
+    CompletionResponse(content="Nice!", tool_calls=[], finish_reason="stop"),
+  )
+  future.result(timeout=5)
+  extractor.close()
+  assert sorted(memory.text for memory in store.memories("user:alice")) == [
+    "Alice has a cat",
+    "Alice lives in Lyon",
+  ]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_memory_extractor_stores_off_the_event_loop(store):
+  threads = []
+  add = store.add
+
+  def tracked_add(namespace, text, now=None):
+    threads.append(threading.get_ident())
+    return add(namespace, text, now)
+
+  store.add = tracked_add
+  extractor = MemoryExtractor(FactModel("- Alice lives in Lyon"), store)
+  pending = extractor.schedule(
+    "user:alice",
+    Message(role="user", content="I live in Lyon"),
+    CompletionResponse(content="Nice!", tool_calls=[], finish_reason="stop"),
+  )
+  assert isinstance(pending, asyncio.Task)
+  assert [memory.text for memory in await pending] == ["Alice lives in Lyon"]
+  assert threads and threading.get_ident() not in threads
+
+
+@pytest.mark.unit
+def test_memory_extractor_ignores_none(store):
+  extractor = MemoryExtractor(FactModel("NONE"), store)
+  assert extractor.parse_facts("NONE") == []
+
+
+@pytest.mark.unit
+def test_persistent_memory_enhancer_injects_and_records(store):
+  store.add("user:alice", "Alice lives in Lyon")
+  extractor = MagicMock()
+  enhancer = PersistentMemoryEnhancer(store=store, extractor=extractor, namespace="user:alice")
+  model = MagicMock()
+  model.generate_completion.return_value = CompletionResponse(
+    content="You live in Lyon", tool_calls=[], finish_reason="stop"
+  )
+  shell = Shell(ghost=Ghost(model=model))
+  shell.add_context_enhancer(enhancer)
+
+  message = Message(role="user", content="Where does Alice live?")
+  response = shell.process_input(message)
+
+  sent = model.generate_completion.call_args[0][0][-1].content
+  assert "Relevant memories:\n- Alice lives in Lyon" in sent
+  extractor.schedule.assert_called_once_with("user:alice", message, response)
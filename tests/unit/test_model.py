@@ -1,5 +1,14 @@
 import pytest
-from agent.model import Message, Tool, ToolCall, CompletionResponse
+from agent.model import (
+  BaseModel,
+  Message,
+  Tool,
+  ToolCall,
+  ToolCallDelta,
+  CompletionResponse,
+  CompletionChunk,
+  CompletionAccumulator,
+)
 
 
 @pytest.mark.unit
@@ -39,3 +48,57 @@ def test_completion_response_with_tool_calls():
   response = CompletionResponse(content="", tool_calls=[tool_call], finish_reason="tool_calls")
   assert len(response.tool_calls) == 1
   assert response.tool_calls[0].id == "call_123"
+
+
+@pytest.mark.unit
+def test_completion_accumulator_merges_chunks():
+  accumulator = CompletionAccumulator()
+  accumulator.add(CompletionChunk(content="Hel"))
+  accumulator.add(
+    CompletionChunk(
+      content="lo",
+      tool_calls=[ToolCallDelta(index=0, id="call_1", name="lookup", arguments='{"q"')],
+    )
+  )
+  accumulator.add(CompletionChunk(tool_calls=[ToolCallDelta(index=0, arguments=': "x"}')]))
+  accumulator.add(CompletionChunk(finish_reason="tool_calls"))
+  response = accumulator.result()
+  assert response.content == "Hello"
+  assert response.tool_calls == [ToolCall(id="call_1", name="lookup", arguments='{"q": "x"}')]
+  assert response.finish_reason == "tool_calls"
+
+
+class StaticModel(BaseModel):
+  def generate_completion(self, messages, tools=None):
+    return CompletionResponse(content="static", tool_calls=[], finish_reason="stop")
+
+  async def generate_completion_async(self, messages, tools=None):
+    return self.generate_completion(messages, tools)
+
+
+@pytest.mark.unit
+def test_base_model_stream_falls_back_to_single_chunk():
+  chunks = list(StaticModel().stream_completion([Message(role="user", content="hi")]))
+  assert chunks == [CompletionChunk(content="static", finish_reason="stop")]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_base_model_stream_async_falls_back_to_single_chunk():
+  chunks = [
+    chunk
+    async for chunk in StaticModel().stream_completion_async([Message(role="user", content="hi")])
+  ]
+  assert chunks == [CompletionChunk(content="static", finish_reason="stop")]
+
+
+@pytest.mark.unit
+def test_message_is_slotted_with_interned_role():
+  import json
+  import sys
+
+  message = Message(role=json.loads('"assistant"'), content="hi")
+  assert message.role is sys.intern("assistant")
+  assert not hasattr(message, "__dict__")
+  with pytest.raises(AttributeError):
+    message.extra = 1
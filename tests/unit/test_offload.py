@@ -0,0 +1,125 @@
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Optional
+import pytest
+from agent.ghost import Ghost
+from agent.model import CompletionResponse, Message
+from agent.offload import ProcessPool, resource
+from agent.shell import ContextEnhancer, InputPort, OutputPort, Shell
+from benchmarks.fake_models import ScriptedModel
+
+
+def load_index() -> dict[str, str]:
+  return {"pid": str(os.getpid()), "billing": "invoices are sent monthly"}
+
+
+def tag_pid(message: Message) -> Message:
+  return Message(role=message.role, content=f"{message.content} [pid {os.getpid()}]")
+
+
+def redact(response: CompletionResponse) -> CompletionResponse:
+  return CompletionResponse(
+    content=response.content.replace("Scripted", "[redacted]") + f" [pid {os.getpid()}]",
+    tool_calls=response.tool_calls,
+    finish_reason=response.finish_reason,
+  )
+
+
+def spin(message: Message) -> Message:
+  deadline = time.perf_counter() + 0.3
+  while time.perf_counter() < deadline:
+    pass
+  return message
+
+
+def answer_from_index(message: Message) -> Optional[str]:
+  index = resource("index")
+  return f"{index['billing']} (loaded in {index['pid']}, ran in {os.getpid()})"
+
+
+class IndexEnhancer(ContextEnhancer):
+  independent = True
+  worker = staticmethod(answer_from_index)
+
+  def __init__(self, name: str):
+    super().__init__(name)
+    self.connection = sqlite3.connect(":memory:")
+
+
+@pytest.fixture(scope="module")
+def pool():
+  pool = ProcessPool(max_workers=2, preload={"index": load_index})
+  pool.start()
+  yield pool
+  pool.close()
+
+
+@pytest.mark.unit
+def test_offloaded_ports_run_in_worker_processes(pool):
+  shell = Shell(Ghost(ScriptedModel("Scripted")), process_pool=pool)
+  port = InputPort("default")
+  port.add_enhancer(tag_pid, process=True)
+  shell.add_input_port(port)
+  output = OutputPort("default")
+  output.add_processor(redact, process=True)
+  shell.add_output_port(output)
+
+  response = shell.process_input(Message(role="user", content="hi"))
+  sent = shell.ghost.conversation_history[0].content
+  assert sent.startswith("hi [pid ") and str(os.getpid()) not in sent
+
+  processed = shell.process_output(response)
+  assert "[redacted]" in processed.content and str(os.getpid()) not in processed.content
+  # Inline calls still work in this process, e.g. for tests and the CLI.
+  assert port.process(Message(role="user", content="hi")).content.endswith(f"[pid {os.getpid()}]")
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_process_enhancers_use_warm_worker_resources(pool):
+  workers = set(pool.start())
+  shell = Shell(Ghost(ScriptedModel("Scripted")), process_pool=pool)
+  shell.add_context_enhancer(IndexEnhancer("index"))
+
+  await shell.process_input_async(Message(role="user", content="when are invoices sent?"))
+  sent = shell.ghost.conversation_history[0].content
+  assert "invoices are sent monthly" in sent
+  loaded, ran = sent.split("loaded in ")[1].rstrip(")").split(", ran in ")
+  assert int(ran) in workers and int(loaded) in workers
+  assert shell.enhancer_timings[0].status == "ok"
+
+
+@pytest.mark.unit
+def test_offloaded_steps_must_be_module_level_functions():
+  class Local(ContextEnhancer):
+    worker = staticmethod(lambda message: None)
+
+  shell = Shell(Ghost(ScriptedModel("Scripted")))
+  with pytest.raises(TypeError, match="resource"):
+    shell.add_context_enhancer(Local("local"))
+  with pytest.raises(TypeError):
+    InputPort("default").add_enhancer(IndexEnhancer("index").enhance, process=True)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_offloaded_processor_keeps_event_loop_free(pool):
+  shell = Shell(Ghost(ScriptedModel("Scripted")), process_pool=pool)
+  port = InputPort("default")
+  port.add_enhancer(spin, process=True)
+  shell.add_input_port(port)
+
+  ticks = []
+
+  async def ticker():
+    while True:
+      ticks.append(time.perf_counter())
+      await asyncio.sleep(0.01)
+
+  task = asyncio.create_task(ticker())
+  await shell.process_input_async(Message(role="user", content="heavy"))
+  task.cancel()
+  gaps = [later - earlier for earlier, later in zip(ticks, ticks[1:])]
+  assert len(ticks) > 10 and max(gaps) < 0.15
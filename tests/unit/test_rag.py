@@ -0,0 +1,178 @@
+import numpy as np
+import pytest
+from agent.enhancers.rag import (
+  HashingEmbedder,
+  HybridRetriever,
+  KnowledgeStore,
+  VectorIndex,
+  chunk_markdown,
+)
+from agent.model import Message
+from agent.shell import RAGEnhancer
+
+DOCUMENT = """# Guide
+
+Intro paragraph.
+
+## Streaming
+
+Set stream=True to receive deltas.
+
+```python
+# not a heading
+client.chat.completions.create(stream=True)
+```
+
+### Details
+
+Chunks end with [DONE].
+
+## Tools
+
+Pass a tools list with function schemas.
+"""
+
+
+class CountingEmbedder(HashingEmbedder):
+  def __init__(self):
+    super().__init__()
+    self.texts: list[str] = []
+
+  def embed(self, texts):
+    self.texts.extend(texts)
+    return super().embed(texts)
+
+
+@pytest.fixture
+def knowledge_dir(tmp_path):
+  root = tmp_path / "knowledge"
+  root.mkdir()
+  (root / "guide.md").write_text(DOCUMENT)
+  (root / "memory.md").write_text("# Memory\n\nMem0 extracts salient facts to cut tokens.\n")
+  return root
+
+
+@pytest.mark.unit
+def test_chunk_markdown_tracks_heading_path_and_keeps_fences():
+  chunks = chunk_markdown(DOCUMENT, "guide.md")
+  headings = [chunk.heading for chunk in chunks]
+  assert headings == ["Guide", "Guide > Streaming", "Guide > Streaming > Details", "Guide > Tools"]
+  assert "# not a heading" in chunks[1].text
+  assert [chunk.id for chunk in chunks] == [f"guide.md#{index}" for index in range(4)]
+
+
+@pytest.mark.unit
+def test_chunk_markdown_splits_long_sections():
+  text = "# Long\n\n" + "\n\n".join("word " * 50 for _ in range(10))
+  chunks = chunk_markdown(text, "long.md", max_chars=600)
+  assert len(chunks) > 1
+  assert all(len(chunk.text) <= 600 for chunk in chunks)
+
+
+@pytest.mark.unit
+def test_hashing_embedder_is_normalized_and_deterministic():
+  embedder = HashingEmbedder(dim=32)
+  vectors = embedder.embed(["streaming responses", "streaming responses", ""])
+  assert vectors.shape == (3, 32)
+  assert np.isclose(np.linalg.norm(vectors[0]), 1.0)
+  assert np.array_equal(vectors[0], vectors[1])
+  assert not vectors[2].any()
+
+
+@pytest.mark.unit
+def test_vector_index_returns_top_k_by_cosine():
+  index = VectorIndex(np.eye(4, dtype=np.float32))
+  query = np.array([0.1, 0.9, 0.5, 0.0], dtype=np.float32)
+  assert [row for row, _ in index.search(query, 2)] == [1, 2]
+
+
+@pytest.mark.unit
+def test_knowledge_store_finds_relevant_chunk(knowledge_dir, tmp_path):
+  store = KnowledgeStore(str(knowledge_dir), str(tmp_path / "index"))
+  store.refresh()
+  results = store.search("how do I stream deltas", top_k=1)
+  assert results[0].chunk.heading == "Guide > Streaming"
+
+
+@pytest.mark.unit
+def test_knowledge_store_reloads_memory_mapped_index(knowledge_dir, tmp_path):
+  index_dir = str(tmp_path / "index")
+  KnowledgeStore(str(knowledge_dir), index_dir).refresh()
+  embedder = CountingEmbedder()
+  restored = KnowledgeStore(str(knowledge_dir), index_dir, embedder=embedder)
+  assert isinstance(restored.index.vectors, np.memmap)
+  assert restored.refresh() == 0
+  assert embedder.texts == []
+  assert restored.search("Mem0 salient facts", top_k=1)[0].chunk.source == "memory.md"
+
+
+@pytest.mark.unit
+def test_knowledge_store_reembeds_only_changed_files(knowledge_dir, tmp_path):
+  embedder = CountingEmbedder()
+  store = KnowledgeStore(str(knowledge_dir), str(tmp_path / "index"), embedder=embedder)
+  assert store.refresh() == 2
+  embedder.texts.clear()
+
+  (knowledge_dir / "memory.md").write_text("# Memory\n\nFacts decay over time.\n")
+  assert store.refresh() == 1
+  assert embedder.texts == ["Memory\nFacts decay over time."]
+  assert store.search("facts decay", top_k=1)[0].chunk.text == "Facts decay over time."
+
+  (knowledge_dir / "guide.md").unlink()
+  assert store.refresh() == 0
+  assert {chunk.source for chunk in store.chunks} == {"memory.md"}
+
+
+@pytest.mark.unit
+def test_rag_enhancer_appends_retrieved_passages(knowledge_dir, tmp_path):
+  store = KnowledgeStore(str(knowledge_dir), str(tmp_path / "index"))
+  store.refresh()
+  enhancer = RAGEnhancer(retriever=store, top_k=1)
+  message = Message(role="user", content="what does Mem0 extract?")
+  result = enhancer.enhance(message)
+  assert result.content.startswith("what does Mem0 extract?\n\nRelevant knowledge:\n")
+  assert "[memory.md > Memory]" in result.content
+  assert message.content == "what does Mem0 extract?"
+
+
+@pytest.mark.unit
+def test_knowledge_store_keeps_lexical_index_in_sync(knowledge_dir, tmp_path):
+  index_dir = str(tmp_path / "index")
+  store = KnowledgeStore(str(knowledge_dir), index_dir, lexical=True)
+  store.refresh()
+  assert len(store.lexical) == len(store.chunks)
+
+  (knowledge_dir / "memory.md").write_text("# Memory\n\nFacts decay over time.\n")
+  store.refresh()
+  assert store.lexical.search("salient", top_k=5) == []
+  assert store.lexical.search("decay", top_k=5)[0][0] == "memory.md#0"
+
+  restored = KnowledgeStore(str(knowledge_dir), index_dir, lexical=True)
+  assert restored.refresh() == 0
+  assert restored.lexical.search("decay", top_k=5)[0][0] == "memory.md#0"
+
+
+@pytest.mark.unit
+def test_hybrid_retriever_fuses_dense_and_lexical_rankings(knowledge_dir, tmp_path):
+  store = KnowledgeStore(str(knowledge_dir), str(tmp_path / "index"), lexical=True)
+  store.refresh()
+  results = HybridRetriever(store).search("stream", top_k=2)
+  assert results[0].chunk.heading == "Guide > Streaming"
+  assert 0 < results[1].score < results[0].score <= 1.0
+
+
+@pytest.mark.unit
+def test_hybrid_retriever_injects_nothing_for_off_topic_queries(knowledge_dir, tmp_path):
+  store = KnowledgeStore(str(knowledge_dir), str(tmp_path / "index"), lexical=True)
+  store.refresh()
+  enhancer = RAGEnhancer(retriever=HybridRetriever(store))
+  for query in ("hi", "thanks!", "ok"):
+    assert enhancer.contribute(Message(role="user", content=query)) is None
+  assert "[DONE]" in enhancer.contribute(Message(role="user", content="when do chunks end?"))
+
+
+@pytest.mark.unit
+def test_hybrid_retriever_requires_lexical_index(knowledge_dir, tmp_path):
+  store = KnowledgeStore(str(knowledge_dir), str(tmp_path / "index"))
+  with pytest.raises(ValueError):
+    HybridRetriever(store)
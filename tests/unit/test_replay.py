@@ -0,0 +1,112 @@
+import time
+import pytest
+from agent.ghost import Ghost
+from agent.model import Message, ToolCall
+from agent.shell import Shell
+from agent.sources.replay import (
+  Cassette,
+  LatencyProfile,
+  ReplayMissError,
+  ReplayModel,
+  payload_key,
+  request_key,
+)
+from benchmarks.loadgen import run_load, synthetic_cassette
+from benchmarks.fake_models import ScriptedModel
+
+
+def record(tmp_path, prompts: list[str]) -> str:
+  path = str(tmp_path / "cassettes" / "session.jsonl")
+  recorder = ReplayModel(Cassette(path), source=ScriptedModel("scripted"))
+  shell = Shell(Ghost(recorder))
+  for prompt in prompts:
+    shell.process_input(Message(role="user", content=prompt))
+  return path
+
+
+@pytest.mark.unit
+def test_recorded_conversation_replays_exactly(tmp_path):
+  path = record(tmp_path, ["hello", "again"])
+  cassette = Cassette(path)
+  assert len(cassette) == 2
+  assert cassette.exchanges[0].duration >= cassette.exchanges[0].ttft >= 0
+
+  shell = Shell(Ghost(ReplayModel(cassette, strict=True, time_scale=0)))
+  first = shell.process_input(Message(role="user", content="hello"))
+  second = shell.process_input(Message(role="user", content="again"))
+  assert [first.content, second.content] == [e.response.content for e in cassette.exchanges]
+
+  with pytest.raises(ReplayMissError):
+    shell.process_input(Message(role="user", content="never recorded"))
+
+
+@pytest.mark.unit
+def test_replay_falls_back_to_prompt_then_sequence():
+  cassette = synthetic_cassette(2, reply_words=3, profile=LatencyProfile(0.0, 1000.0))
+  model = ReplayModel(cassette, time_scale=0)
+  history = [Message(role="assistant", content="other"), Message(role="user", content="question 1")]
+  assert model.generate_completion(history).usage.prompt_tokens == 4
+  assert (
+    model.generate_completion([Message(role="user", content="?")]).content == "word0 word1 word2"
+  )
+  with pytest.raises(ReplayMissError):
+    ReplayModel(Cassette()).generate_completion([Message(role="user", content="?")])
+
+
+@pytest.mark.unit
+def test_replay_streams_with_latency_profile():
+  cassette = synthetic_cassette(1, reply_words=5, profile=LatencyProfile(0.0, 1000.0))
+  model = ReplayModel(cassette, profile=LatencyProfile(ttft=0.05, tokens_per_second=100.0))
+  began = time.perf_counter()
+  chunks = []
+  for chunk in model.stream_completion([Message(role="user", content="question 0")]):
+    chunks.append((chunk, time.perf_counter() - began))
+  assert "".join(chunk.content for chunk, _ in chunks) == "word0 word1 word2 word3 word4"
+  assert chunks[0][1] >= 0.05
+  assert chunks[-1][1] >= 0.05 + 4 * 0.01
+  assert chunks[-1][0].finish_reason == "stop" and chunks[-1][0].usage.completion_tokens == 5
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_replay_records_streams_and_tool_calls(tmp_path):
+  cassette = Cassette(str(tmp_path / "tools.jsonl"))
+  inner = ReplayModel(synthetic_cassette(1, 2, LatencyProfile(0.0, 1000.0)), time_scale=0)
+  inner.cassette.exchanges[0].response.tool_calls = [ToolCall("c1", "lookup", "{}")]
+  recorder = ReplayModel(cassette, source=inner)
+  messages = [Message(role="user", content="question 0")]
+  chunks = [chunk async for chunk in recorder.stream_completion_async(messages)]
+  assert chunks[-1].tool_calls[0].name == "lookup"
+
+  replayed = await ReplayModel(Cassette(cassette.path), time_scale=0).generate_completion_async(
+    messages
+  )
+  assert replayed.content == "word0 word1"
+  assert replayed.tool_calls == [ToolCall("c1", "lookup", "{}")]
+
+
+@pytest.mark.unit
+def test_request_key_matches_wire_payload():
+  from agent.sources.glm import GLMModel
+
+  messages = [
+    Message(role="user", content="hi"),
+    Message(role="tool", content="42", tool_call_id="c1"),
+  ]
+  payload = GLMModel(api_key="k")._prepare_payload(messages)
+  assert payload_key(payload) == request_key(messages)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_load_generator_reports_percentiles():
+  cassette = synthetic_cassette(2, reply_words=4, profile=LatencyProfile(0.01, 400.0))
+  model = ReplayModel(cassette)
+  conversations = [["question 0", "question 1"]]
+  report = await run_load(lambda _: Shell(Ghost(model)), conversations, 20, 10, stream=True)
+  summary = report.summary()
+  assert summary["turns"] == 40 and summary["errors"] == 0
+  assert summary["ttft_p50_ms"] >= 10
+  assert summary["latency_p99_ms"] >= summary["latency_p50_ms"] >= summary["ttft_p50_ms"]
+  # Two waves of ten sessions, each running two turns with a 10 ms first token.
+  assert report.elapsed >= 2 * 2 * 0.01
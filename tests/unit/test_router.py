@@ -0,0 +1,183 @@
+import time
+import pytest
+from agent.model import Message
+from agent.sources.router import (
+  CLOSED,
+  HALF_OPEN,
+  OPEN,
+  BackendUnavailableError,
+  CircuitBreaker,
+  RouterModel,
+)
+from benchmarks.fake_models import BackendError, ScriptedModel
+
+MESSAGES = [Message(role="user", content="hi")]
+
+
+class Clock:
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self) -> float:
+    return self.now
+
+
+@pytest.mark.unit
+def test_circuit_breaker_opens_probes_and_closes():
+  clock = Clock()
+  breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0, clock=clock)
+  breaker.record_failure()
+  assert breaker.state == CLOSED
+  breaker.record_failure()
+  assert breaker.state == OPEN and not breaker.available()
+  clock.now += 10.0
+  assert breaker.state == HALF_OPEN and breaker.available()
+  breaker.begin()
+  assert not breaker.available()
+  breaker.record_failure()
+  assert breaker.state == OPEN
+  clock.now += 10.0
+  breaker.begin()
+  breaker.record_success()
+  assert breaker.state == CLOSED and breaker.available()
+
+
+@pytest.mark.unit
+def test_router_prefers_fastest_backend_after_exploring():
+  slow = ScriptedModel("slow", latency=0.03)
+  fast = ScriptedModel("fast", latency=0.0)
+  router = RouterModel({"slow": slow, "fast": fast})
+  for _ in range(5):
+    router.generate_completion(MESSAGES)
+  assert slow.calls == 1
+  assert fast.calls == 4
+  stats = {stat.name: stat for stat in router.stats()}
+  assert stats["fast"].p50 < stats["slow"].p50
+
+
+@pytest.mark.unit
+def test_router_fails_over_and_opens_breaker():
+  broken = ScriptedModel("broken", fail=[True] * 10)
+  healthy = ScriptedModel("healthy", latency=0.01)
+  router = RouterModel({"broken": broken, "healthy": healthy}, failure_threshold=2)
+  for _ in range(4):
+    assert router.generate_completion(MESSAGES).content == "from healthy"
+  stats = {stat.name: stat for stat in router.stats()}
+  assert stats["broken"].state == OPEN
+  assert stats["broken"].error_rate == 1.0
+  assert broken.calls <= 2
+
+
+@pytest.mark.unit
+def test_router_raises_when_every_backend_is_open():
+  router = RouterModel({"only": ScriptedModel("only", fail=[True] * 5)}, failure_threshold=1)
+  with pytest.raises(BackendError):
+    router.generate_completion(MESSAGES)
+  with pytest.raises(BackendUnavailableError):
+    router.generate_completion(MESSAGES)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_router_hedges_slow_primary_and_cancels_loser():
+  primary = ScriptedModel("primary", latency=[0.0, 1.0])
+  backup = ScriptedModel("backup", latency=0.01)
+  router = RouterModel({"primary": primary, "backup": backup}, hedge=True, min_hedge_delay=0.02)
+  router.backends[0].tracker.record(0.0, True)
+  router.backends[1].tracker.record(0.5, True)
+
+  await router.generate_completion_async(MESSAGES)
+  start = time.perf_counter()
+  response = await router.generate_completion_async(MESSAGES)
+  assert response.content == "from backup"
+  assert time.perf_counter() - start < 0.5
+  assert primary.cancelled == 1
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_router_async_without_hedge_fails_over():
+  router = RouterModel(
+    {"a": ScriptedModel("a", fail=[True]), "b": ScriptedModel("b")}, failure_threshold=3
+  )
+  assert (await router.generate_completion_async(MESSAGES, hedge=False)).content == "from b"
+
+
+@pytest.mark.unit
+def test_router_sync_hedge_returns_first_result():
+  primary = ScriptedModel("primary", latency=[0.0, 1.0])
+  backup = ScriptedModel("backup", latency=0.01)
+  router = RouterModel({"primary": primary, "backup": backup}, min_hedge_delay=0.02)
+  router.backends[1].tracker.record(0.5, True)
+  router.generate_completion(MESSAGES)
+  start = time.perf_counter()
+  assert router.generate_completion(MESSAGES, hedge=True).content == "from backup"
+  assert time.perf_counter() - start < 0.5
+  router.close()
+
+
+@pytest.mark.unit
+def test_router_stream_fails_over_before_first_chunk():
+  router = RouterModel({"a": ScriptedModel("a", fail=[True]), "b": ScriptedModel("b")})
+  assert [chunk.content for chunk in router.stream_completion(MESSAGES)] == ["from b"]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_router_stream_async_uses_healthy_backend():
+  router = RouterModel({"a": ScriptedModel("a")})
+  chunks = [chunk async for chunk in router.stream_completion_async(MESSAGES)]
+  assert chunks[0].content == "from a"
+
+
+@pytest.mark.unit
+def test_router_stream_records_time_to_first_chunk():
+  router = RouterModel({"a": ScriptedModel("a", latency=0.02)})
+  assert [chunk.content for chunk in router.stream_completion(MESSAGES)] == ["from a"]
+  assert router.stats()[0].ttft_p50 >= 0.02
+  assert router.stats()[0].p50 is None
+
+
+@pytest.mark.unit
+def test_router_ranks_streams_on_first_chunk_and_calls_on_full_latency():
+  router = RouterModel({"a": ScriptedModel("a"), "b": ScriptedModel("b")})
+  a, b = router.backends
+  a.tracker.record(2.0, True)
+  a.ttft.record(0.1, True)
+  b.tracker.record(1.0, True)
+  b.ttft.record(0.5, True)
+  assert router.candidates() == [b, a]
+  assert router.candidates(stream=True) == [a, b]
+  assert router.hedge_delay(a) == 2.0 and router.hedge_delay(a, stream=True) == 0.1
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_router_stream_async_hedges_on_first_chunk():
+  primary = ScriptedModel("primary", latency=1.0)
+  backup = ScriptedModel("backup", latency=0.01)
+  router = RouterModel({"primary": primary, "backup": backup}, hedge=True, min_hedge_delay=0.02)
+  router.backends[0].ttft.record(0.0, True)
+  router.backends[1].ttft.record(0.5, True)
+
+  start = time.perf_counter()
+  chunks = [chunk async for chunk in router.stream_completion_async(MESSAGES)]
+  assert [chunk.content for chunk in chunks] == ["from backup"]
+  assert time.perf_counter() - start < 0.5
+  assert primary.cancelled == 1
+  primary_latencies, backup_latencies = (b.ttft.latencies for b in router.backends)
+  assert len(primary_latencies) == 2 and primary_latencies[-1] >= 0.02
+  assert len(backup_latencies) == 2 and backup_latencies[-1] < 0.5
+
+
+@pytest.mark.unit
+def test_router_sync_stream_hedges_on_first_chunk():
+  primary = ScriptedModel("primary", latency=0.5)
+  backup = ScriptedModel("backup", latency=0.01)
+  router = RouterModel({"primary": primary, "backup": backup}, hedge=True, min_hedge_delay=0.02)
+  router.backends[0].ttft.record(0.0, True)
+  router.backends[1].ttft.record(0.4, True)
+  start = time.perf_counter()
+  assert [chunk.content for chunk in router.stream_completion(MESSAGES)] == ["from backup"]
+  assert time.perf_counter() - start < 0.4
+  router.close()
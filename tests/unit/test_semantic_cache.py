@@ -0,0 +1,180 @@
+import pytest
+from unittest.mock import MagicMock
+from agent.ghost import Ghost
+from agent.model import CompletionResponse, Message, ToolCall
+from agent.semantic_cache import SemanticCache
+from agent.shell import ContextEnhancer, Shell
+
+
+class Clock:
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self) -> float:
+    return self.now
+
+
+class StaticEnhancer(ContextEnhancer):
+  def __init__(self, text: str):
+    super().__init__("static")
+    self.text = text
+
+  def contribute(self, message):
+    return self.text
+
+
+def response(content: str) -> CompletionResponse:
+  return CompletionResponse(content=content, tool_calls=[], finish_reason="stop")
+
+
+@pytest.fixture
+def model():
+  model = MagicMock()
+  model.generate_completion.side_effect = [response(f"answer {i}") for i in range(10)]
+  return model
+
+
+@pytest.mark.unit
+def test_semantic_cache_matches_near_duplicates_only():
+  cache = SemanticCache(threshold=0.7)
+  cache.store(cache.key("How do I reset my password?"), response("use the reset link"))
+  assert cache.lookup(cache.key("how can I reset my password")).content == "use the reset link"
+  assert cache.lookup(cache.key("What time is it in Paris?")) is None
+  assert cache.stats.hits == 1 and cache.stats.misses == 1
+
+
+@pytest.mark.unit
+def test_semantic_cache_separates_contexts():
+  cache = SemanticCache()
+  cache.store(cache.key("what should I eat", ["vegetarian"]), response("lentils"))
+  assert cache.lookup(cache.key("what should I eat", ["vegan"])) is None
+  assert cache.lookup(cache.key("what should I eat", ["vegetarian"])).content == "lentils"
+
+
+@pytest.mark.unit
+def test_semantic_cache_returns_copies_and_skips_tool_calls():
+  cache = SemanticCache()
+  key = cache.key("hello")
+  cache.store(key, response("hi"))
+  cache.lookup(key).content = "mutated"
+  assert cache.lookup(key).content == "hi"
+
+  tool_key = cache.key("weather in Paris")
+  cache.store(
+    tool_key,
+    CompletionResponse(
+      content="", tool_calls=[ToolCall(id="1", name="weather", arguments="{}")], finish_reason=None
+    ),
+  )
+  assert cache.lookup(tool_key) is None
+
+
+@pytest.mark.unit
+def test_semantic_cache_is_bounded_with_lru_eviction():
+  clock = Clock()
+  cache = SemanticCache(max_entries=2, clock=clock)
+  first, second, third = cache.key("first question"), cache.key("second one"), cache.key("third")
+  cache.store(first, response("1"))
+  clock.now += 1
+  cache.store(second, response("2"))
+  clock.now += 1
+  cache.lookup(first)
+  clock.now += 1
+  cache.store(third, response("3"))
+  assert len(cache) == 2
+  assert cache.lookup(second) is None
+  assert cache.lookup(first).content == "1"
+  assert cache.lookup(third).content == "3"
+
+
+@pytest.mark.unit
+def test_semantic_cache_expires_entries():
+  clock = Clock()
+  cache = SemanticCache(ttl=10.0, clock=clock)
+  key = cache.key("hello")
+  cache.store(key, response("hi"))
+  clock.now += 11
+  assert cache.lookup(key) is None
+
+
+@pytest.mark.unit
+def test_semantic_cache_routes():
+  cache = SemanticCache(routes=["chat"])
+  assert cache.enabled("chat") and not cache.enabled("api")
+  cache.enable("api")
+  cache.disable("chat")
+  assert cache.enabled("api") and not cache.enabled("chat")
+
+
+@pytest.mark.unit
+def test_shell_answers_repeated_question_from_semantic_cache(model):
+  shell = Shell(Ghost(model), semantic_cache=SemanticCache())
+  first = shell.process_input(Message(role="user", content="What is BM25?"))
+  shell.ghost.clear_history()
+  second = shell.process_input(Message(role="user", content="what is bm25"))
+  assert second.content == first.content == "answer 0"
+  assert model.generate_completion.call_count == 1
+  assert shell.ghost.conversation_history[-1].content == "answer 0"
+
+
+@pytest.mark.unit
+def test_shell_semantic_cache_respects_context_and_routes(model):
+  shell = Shell(Ghost(model), semantic_cache=SemanticCache())
+  enhancer = StaticEnhancer("Relevant memories:\n- likes tea")
+  shell.add_context_enhancer(enhancer)
+  shell.process_input(Message(role="user", content="what should I drink"))
+  shell.ghost.clear_history()
+  enhancer.text = "Relevant memories:\n- likes coffee"
+  assert shell.process_input(Message(role="user", content="what should I drink")).content == (
+    "answer 1"
+  )
+
+  shell.ghost.clear_history()
+  shell.semantic_cache.disable("default")
+  assert shell.process_input(Message(role="user", content="what should I drink")).content == (
+    "answer 2"
+  )
+
+
+@pytest.mark.unit
+def test_shell_semantic_cache_keys_on_previous_turn(model):
+  shell = Shell(Ghost(model), semantic_cache=SemanticCache())
+  shell.process_input(Message(role="user", content="tell me more"))
+  assert shell.process_input(Message(role="user", content="tell me more")).content == "answer 1"
+
+
+@pytest.mark.unit
+def test_shell_semantic_cache_hits_paraphrased_follow_ups_across_conversations(model):
+  shell = Shell(Ghost(model), semantic_cache=SemanticCache())
+  shell.process_input(Message(role="user", content="What is BM25?"))
+  shell.process_input(Message(role="user", content="How is it scored?"))
+  shell.ghost.clear_history()
+  shell.semantic_cache.disable("default")
+  shell.process_input(Message(role="user", content="What is BM25, briefly?"))
+  shell.semantic_cache.enable("default")
+  assert shell.process_input(Message(role="user", content="how is it scored")).content == "answer 1"
+  assert model.generate_completion.call_count == 3
+
+
+@pytest.mark.unit
+def test_shell_stateless_route_checks_cache_before_enhancers(model):
+  shell = Shell(Ghost(model), semantic_cache=SemanticCache(stateless_routes=["default"]))
+  enhancer = StaticEnhancer("Relevant memories:\n- likes tea")
+  enhancer.contribute = MagicMock(return_value="Relevant memories:\n- likes tea")
+  shell.add_context_enhancer(enhancer)
+  shell.process_input(Message(role="user", content="What is BM25?"))
+  shell.process_input(Message(role="user", content="tell me more"))
+  shell.ghost.clear_history()
+  assert shell.process_input(Message(role="user", content="what is bm25")).content == "answer 0"
+  assert enhancer.contribute.call_count == 2
+  assert shell.ghost.conversation_history[0].content == "what is bm25"
+
+
+@pytest.mark.unit
+def test_shell_stream_replays_semantic_cache_hit(model):
+  shell = Shell(Ghost(model), semantic_cache=SemanticCache())
+  shell.process_input(Message(role="user", content="What is BM25?"))
+  shell.ghost.clear_history()
+  chunks = list(shell.process_input_stream(Message(role="user", content="What is BM25?")))
+  assert [chunk.content for chunk in chunks] == ["answer 0"]
+  model.stream_completion.assert_not_called()
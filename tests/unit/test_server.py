@@ -0,0 +1,350 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Optional
+import httpx
+import pytest
+from agent.ghost import Ghost
+from agent.model import BaseModel, CompletionChunk, CompletionResponse, Message, Tool
+from agent.server import AgentServer, SessionBusyError, SessionManager
+from agent.shell import ContextEnhancer, Shell
+
+
+class EchoModel(BaseModel):
+  def __init__(self, delay: float = 0.0):
+    self.model = "echo"
+    self.delay = delay
+    self.active = 0
+    self.peak = 0
+
+  def generate_completion(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> CompletionResponse:
+    time.sleep(self.delay)
+    return self.reply(messages)
+
+  async def generate_completion_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> CompletionResponse:
+    self.active += 1
+    self.peak = max(self.peak, self.active)
+    try:
+      await asyncio.sleep(self.delay)
+    finally:
+      self.active -= 1
+    return self.reply(messages)
+
+  def reply(self, messages: list[Message]) -> CompletionResponse:
+    turns = sum(message.role == "user" for message in messages)
+    return CompletionResponse(
+      content=f"echo {turns}: {messages[-1].content}", tool_calls=[], finish_reason="stop"
+    )
+
+  async def stream_completion_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> AsyncIterator[CompletionChunk]:
+    response = await self.generate_completion_async(messages, tools)
+    words = response.content.split(" ")
+    for index, word in enumerate(words):
+      last = index == len(words) - 1
+      yield CompletionChunk(
+        content=word if last else f"{word} ", finish_reason="stop" if last else None
+      )
+
+
+class BrokenModel(EchoModel):
+  async def generate_completion_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> CompletionResponse:
+    raise ValueError("provider returned garbage")
+
+
+def make_manager(tmp_path, model: EchoModel, **kwargs) -> SessionManager:
+  def build(log):
+    return Shell(Ghost(model, session=log))
+
+  return SessionManager(build, directory=str(tmp_path), **kwargs)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_sessions_have_isolated_history(tmp_path):
+  manager = make_manager(tmp_path, EchoModel())
+  assert (await manager.complete("alice", "hi")).content == "echo 1: hi"
+  assert (await manager.complete("bob", "yo")).content == "echo 1: yo"
+  assert (await manager.complete("alice", "again")).content == "echo 2: again"
+  assert [m.content for m in manager.history("bob")] == ["yo", "echo 1: yo"]
+  assert manager.stats().created == 2
+  manager.close()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_turns_within_a_session_are_serialized(tmp_path):
+  model = EchoModel(delay=0.02)
+  manager = make_manager(tmp_path, model)
+  await asyncio.gather(*(manager.complete("s", f"q{i}") for i in range(4)))
+  history = [m.content for m in manager.history("s")]
+  assert history == [
+    "q0",
+    "echo 1: q0",
+    "q1",
+    "echo 2: q1",
+    "q2",
+    "echo 3: q2",
+    "q3",
+    "echo 4: q3",
+  ]
+  assert model.peak == 1
+
+  model.peak = 0
+  await asyncio.gather(*(manager.complete(f"other{i}", "q") for i in range(4)))
+  assert model.peak == 4
+  manager.close()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_session_queue_limit_rejects_excess_turns(tmp_path):
+  manager = make_manager(tmp_path, EchoModel(delay=0.05), max_queued=1)
+  first = asyncio.create_task(manager.complete("s", "one"))
+  await asyncio.sleep(0)
+  second = asyncio.create_task(manager.complete("s", "two"))
+  await asyncio.sleep(0)
+  with pytest.raises(SessionBusyError):
+    await manager.complete("s", "three")
+  await asyncio.gather(first, second)
+  manager.close()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_sessions_are_evicted_and_rehydrated(tmp_path):
+  manager = make_manager(tmp_path, EchoModel(), max_active=2)
+  for session_id in ("a", "b", "c"):
+    await manager.complete(session_id, f"hello {session_id}")
+  assert list(manager.sessions) == ["b", "c"]
+  assert manager.stats().evicted == 1
+
+  assert (await manager.complete("a", "back")).content == "echo 2: back"
+  assert manager.stats().rehydrated == 1
+  assert "a" in manager.sessions and "b" not in manager.sessions
+  manager.close()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_eviction_never_closes_a_session_in_use(tmp_path):
+  manager = make_manager(tmp_path, EchoModel(delay=0.05), max_active=1)
+  busy = asyncio.create_task(manager.complete("a", "slow"))
+  await asyncio.sleep(0.01)
+  replies = await asyncio.gather(
+    manager.complete("b", "one"), manager.complete("c", "two"), manager.complete("b", "three")
+  )
+  assert [reply.content for reply in replies] == ["echo 1: one", "echo 1: two", "echo 2: three"]
+  assert (await busy).content == "echo 1: slow"
+  assert len(manager.sessions) == 1
+  assert (await manager.complete("a", "back")).content == "echo 2: back"
+  manager.close()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_history_reads_do_not_create_sessions(tmp_path):
+  manager = make_manager(tmp_path, EchoModel(), max_active=1)
+  assert manager.history("ghost") == []
+  assert "ghost" not in manager.sessions and manager.stats().created == 0
+  assert not (tmp_path / "ghost.wal").exists()
+
+  await manager.complete("a", "hi")
+  await manager.complete("b", "hi")
+  assert [m.content for m in manager.history("a", 1)] == ["echo 1: hi"]
+  assert list(manager.sessions) == ["b"]
+  assert manager.stats().rehydrated == 0 and manager.stats().created == 2
+  manager.close()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_idle_sessions_are_swept(tmp_path):
+  now = [0.0]
+  manager = make_manager(tmp_path, EchoModel(), idle_timeout=10, clock=lambda: now[0])
+  await manager.complete("a", "hi")
+  now[0] = 5.0
+  await manager.complete("b", "hi")
+  now[0] = 12.0
+  assert manager.evict_idle() == 1
+  assert list(manager.sessions) == ["b"]
+  manager.close()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_session_ids_are_validated(tmp_path):
+  manager = make_manager(tmp_path, EchoModel())
+  with pytest.raises(ValueError):
+    manager.get("../escape")
+
+
+async def sse_events(response: httpx.Response) -> list[tuple[str, dict]]:
+  events = []
+  async for block in response.aiter_text():
+    for raw in block.split("\n\n"):
+      if not raw.strip():
+        continue
+      lines = dict(line.split(": ", 1) for line in raw.splitlines())
+      events.append((lines["event"], json.loads(lines["data"])))
+  return events
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_server_streams_turns_over_sse(tmp_path):
+  server = AgentServer(make_manager(tmp_path, EchoModel()), port=0)
+  await server.start()
+  host, port = server.address
+  try:
+    async with httpx.AsyncClient(base_url=f"http://{host}:{port}") as client:
+      async with client.stream(
+        "POST", "/sessions/s1/messages", json={"content": "hello there", "stream": True}
+      ) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "text/event-stream"
+        events = await sse_events(response)
+      assert [event for event, _ in events] == ["chunk"] * 4 + ["done"]
+      assert "".join(data["content"] for event, data in events if event == "chunk") == (
+        "echo 1: hello there"
+      )
+      assert events[-1][1] == {"finish_reason": "stop"}
+
+      reply = await client.post("/sessions/s1/messages", json={"content": "plain"})
+      assert reply.json() == {"content": "echo 2: plain", "finish_reason": "stop"}
+
+      history = await client.get("/sessions/s1/messages", params={"offset": 1, "limit": 2})
+      assert history.json()["messages"] == [
+        {"role": "assistant", "content": "echo 1: hello there"},
+        {"role": "user", "content": "plain"},
+      ]
+
+      health = (await client.get("/health")).json()
+      assert health["active"] == 1 and health["turns"] == 2
+
+      assert (await client.delete("/sessions/s1")).status_code == 200
+      assert (await client.get("/sessions/s1/messages")).json() == {"messages": []}
+  finally:
+    await server.stop()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_server_rejects_bad_requests(tmp_path):
+  server = AgentServer(make_manager(tmp_path, EchoModel()), port=0)
+  await server.start()
+  host, port = server.address
+  try:
+    async with httpx.AsyncClient(base_url=f"http://{host}:{port}") as client:
+      assert (await client.get("/nowhere")).status_code == 404
+      assert (await client.post("/sessions/s1/messages", content=b"nope")).status_code == 400
+      assert (await client.post("/sessions/s1/messages", json={"content": ""})).status_code == 400
+      invalid = await client.post("/sessions/bad.id/messages", json={"content": "x"})
+      assert invalid.status_code == 400
+      assert (await client.get("/sessions/bad.id/messages")).status_code == 400
+      assert (await client.put("/sessions/s1")).status_code == 405
+      created = (await client.post("/sessions")).json()["session_id"]
+      assert len(created) == 12
+  finally:
+    await server.stop()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+@pytest.mark.parametrize("length", [b"abc", b"-5"])
+async def test_server_rejects_invalid_content_length(tmp_path, length):
+  server = AgentServer(make_manager(tmp_path, EchoModel()), port=0)
+  await server.start()
+  host, port = server.address
+  try:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b"POST /sessions/s1/messages HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n")
+    await writer.drain()
+    assert (await reader.readline()).startswith(b"HTTP/1.1 400")
+    writer.close()
+  finally:
+    await server.stop()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_server_reports_model_errors_as_500(tmp_path):
+  server = AgentServer(make_manager(tmp_path, BrokenModel()), port=0)
+  await server.start()
+  host, port = server.address
+  try:
+    async with httpx.AsyncClient(base_url=f"http://{host}:{port}") as client:
+      for stream in (False, True):
+        reply = await client.post("/sessions/s1/messages", json={"content": "hi", "stream": stream})
+        assert reply.status_code == 500
+        assert reply.json() == {"error": "ValueError: provider returned garbage"}
+      assert (await client.get("/health")).json()["busy"] == 0
+  finally:
+    await server.stop()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_server_exposes_prometheus_metrics(tmp_path):
+  from agent.telemetry import Telemetry
+
+  telemetry = Telemetry()
+  model = EchoModel()
+  manager = SessionManager(
+    lambda log: Shell(Ghost(model, session=log, telemetry=telemetry)), directory=str(tmp_path)
+  )
+  server = AgentServer(manager, port=0, telemetry=telemetry)
+  await server.start()
+  host, port = server.address
+  try:
+    async with httpx.AsyncClient(base_url=f"http://{host}:{port}") as client:
+      await client.post("/sessions/s1/messages", json={"content": "hi"})
+      metrics = await client.get("/metrics")
+      assert metrics.headers["content-type"].startswith("text/plain")
+      assert 'agent_span_seconds_count{span="turn"} 1' in metrics.text
+      assert 'agent_span_seconds_count{span="model"} 1' in metrics.text
+  finally:
+    await server.stop()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_server_prefetches_context_while_typing(tmp_path):
+  from agent.telemetry import Telemetry
+
+  class NoteEnhancer(ContextEnhancer):
+    independent = True
+
+    def contribute(self, message):
+      return f"note on {message.content}"
+
+  telemetry = Telemetry()
+  model = EchoModel()
+
+  def build(log):
+    shell = Shell(Ghost(model, session=log, telemetry=telemetry))
+    shell.add_context_enhancer(NoteEnhancer("notes"))
+    return shell
+
+  server = AgentServer(SessionManager(build, directory=str(tmp_path)), port=0, telemetry=telemetry)
+  await server.start()
+  host, port = server.address
+  try:
+    async with httpx.AsyncClient(base_url=f"http://{host}:{port}") as client:
+      started = await client.post("/sessions/s1/prefetch", json={"content": "release notes for"})
+      assert started.json() == {"prefetching": 1}
+      await client.post("/sessions/s1/messages", json={"content": "release notes for v2"})
+      history = (await client.get("/sessions/s1/messages")).json()["messages"]
+      assert history[0]["content"] == "release notes for v2\n\nnote on release notes for"
+      assert (await client.post("/sessions/s1/prefetch", json={})).status_code == 400
+      metrics = (await client.get("/metrics")).text
+      assert 'agent_prefetch_total{outcome="used"} 1' in metrics
+  finally:
+    await server.stop()
@@ -0,0 +1,161 @@
+import os
+import pytest
+from unittest.mock import MagicMock
+from agent.context import ContextWindow
+from agent.ghost import Ghost
+from agent.model import CompletionResponse, Message, ToolCall
+from agent.session import SessionLog, decode_message, encode_message
+from benchmarks.fake_models import ScriptedModel
+
+
+def messages(count: int, start: int = 0) -> list[Message]:
+  return [
+    Message(role="user" if i % 2 == 0 else "assistant", content=f"message {i}")
+    for i in range(start, start + count)
+  ]
+
+
+@pytest.mark.unit
+def test_message_encoding_round_trips_tool_fields():
+  message = Message(
+    role="assistant",
+    content="",
+    tool_calls=[ToolCall(id="call_1", name="lookup", arguments='{"q": "é"}')],
+  )
+  result = Message(role="tool", content="42", tool_call_id="call_1")
+  assert decode_message(encode_message(message)) == message
+  assert decode_message(encode_message(result)) == result
+  assert encode_message(Message(role="user", content="hi")) == b'{"role":"user","content":"hi"}\n'
+
+
+@pytest.mark.unit
+def test_session_log_appends_and_reads(tmp_path):
+  log = SessionLog(str(tmp_path), "s1")
+  log.extend(messages(10))
+  assert len(log) == 10
+  assert log[0].content == "message 0"
+  assert log[-1].content == "message 9"
+  assert [m.content for m in log[3:6]] == ["message 3", "message 4", "message 5"]
+  assert [m.content for m in log[::4]] == ["message 0", "message 4", "message 8"]
+  assert [m.content for m in reversed(log)][:2] == ["message 9", "message 8"]
+  with pytest.raises(IndexError):
+    log[10]
+  log.close()
+
+
+@pytest.mark.unit
+def test_session_log_resumes_after_reopen(tmp_path):
+  log = SessionLog(str(tmp_path), "s1", snapshot_every=4)
+  log.extend(messages(10))
+  log.close()
+
+  resumed = SessionLog(str(tmp_path), "s1", cache_size=2)
+  assert len(resumed) == 10
+  assert resumed.replayed == 0
+  assert list(resumed) == messages(10)
+  resumed.append(Message(role="user", content="after"))
+  assert resumed[10].content == "after"
+  resumed.close()
+
+
+@pytest.mark.unit
+def test_session_log_replays_only_tail_after_crash(tmp_path):
+  log = SessionLog(str(tmp_path), "s1", snapshot_every=8)
+  log.extend(messages(11))
+  # Simulate a crash: no close(), and a torn record at the end of the log.
+  with open(log.log_path, "ab") as f:
+    f.write(b'{"role":"user","cont')
+
+  recovered = SessionLog(str(tmp_path), "s1")
+  assert recovered.replayed == 3
+  assert len(recovered) == 11
+  assert list(recovered) == messages(11)
+  assert os.path.getsize(recovered.log_path) == sum(len(encode_message(m)) for m in messages(11))
+  recovered.append(Message(role="user", content="next"))
+  recovered.close()
+  assert SessionLog(str(tmp_path), "s1")[11].content == "next"
+
+
+@pytest.mark.unit
+def test_session_log_rebuilds_index_from_log(tmp_path):
+  log = SessionLog(str(tmp_path), "s1")
+  log.extend(messages(5))
+  log.sync()
+  os.remove(log.index_path)
+  assert not os.path.exists(log.snapshot_path)
+
+  recovered = SessionLog(str(tmp_path), "s1")
+  assert recovered.replayed == 5
+  assert recovered[2].content == "message 2"
+
+
+@pytest.mark.unit
+def test_session_log_batches_fsync(tmp_path, monkeypatch):
+  synced = []
+  real_fsync = os.fsync
+  monkeypatch.setattr(os, "fsync", lambda fd: (synced.append(fd), real_fsync(fd)))
+  log = SessionLog(str(tmp_path), "s1", sync_every=5, sync_interval=3600, snapshot_every=1000)
+  synced.clear()
+  log.extend(messages(9))
+  assert len(synced) == 2
+  log.sync()
+  assert len(synced) == 4
+  log.sync()
+  assert len(synced) == 4
+
+
+@pytest.mark.unit
+def test_session_log_clear(tmp_path):
+  log = SessionLog(str(tmp_path), "s1")
+  log.extend(messages(4))
+  log.clear()
+  assert len(log) == 0
+  log.append(Message(role="user", content="fresh"))
+  log.close()
+  assert list(SessionLog(str(tmp_path), "s1")) == [Message(role="user", content="fresh")]
+
+
+@pytest.mark.unit
+def test_session_log_open_generates_id(tmp_path):
+  log = SessionLog.open(str(tmp_path))
+  assert len(log.session_id) == 12
+  assert os.path.exists(log.log_path)
+
+
+@pytest.mark.unit
+def test_ghost_resumes_session(tmp_path):
+  model = MagicMock()
+  model.generate_completion.return_value = CompletionResponse(
+    content="reply", tool_calls=[], finish_reason="stop"
+  )
+  ghost = Ghost(model, session=SessionLog(str(tmp_path), "chat"))
+  ghost.add_message(Message(role="user", content="hello"))
+  ghost.add_message(Message(role="assistant", content=ghost.process().content))
+  ghost.session.close()
+
+  resumed = Ghost(
+    model, context_window=ContextWindow(max_tokens=1000), session=SessionLog(str(tmp_path), "chat")
+  )
+  resumed.add_message(Message(role="user", content="again"))
+  resumed.process()
+  sent = model.generate_completion.call_args[0][0]
+  assert [m.content for m in sent] == ["hello", "reply", "again"]
+  assert [m.content for m in resumed.get_conversation_history(offset=1, limit=1)] == ["reply"]
+  assert [m.content for m in resumed.iter_history(reverse=True)] == ["again", "reply", "hello"]
+
+
+@pytest.mark.unit
+def test_context_window_over_session_log_stays_bounded(tmp_path):
+  window = ContextWindow(max_tokens=1_000_000)
+  ghost = Ghost(
+    ScriptedModel("reply"),
+    context_window=window,
+    session=SessionLog(str(tmp_path), "chat", cache_size=16),
+  )
+  sizes = []
+  for turn in range(200):
+    ghost.add_message(Message(role="user", content=f"turn {turn}"))
+    ghost.add_message(Message(role="assistant", content=ghost.process().content))
+    sizes.append(len(window._counts))
+  assert max(sizes) < 64
+  assert sizes[-1] <= sizes[49]
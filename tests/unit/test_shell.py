@@ -1,6 +1,12 @@
+import asyncio
+import time
 import pytest
-from agent.model import Message, CompletionResponse
+from unittest.mock import MagicMock
+from agent.model import Message, CompletionResponse, CompletionChunk
+from agent.ghost import Ghost
+from agent.context import PromptLayout
 from agent.shell import (
+  Shell,
   InputPort,
   OutputPort,
   ContextEnhancer,
@@ -172,3 +178,263 @@ def test_persistent_memory_enhancer_initialization():
 def test_persistent_memory_enhancer_custom_name():
   enhancer = PersistentMemoryEnhancer("custom_memory")
   assert enhancer.name == "custom_memory"
+
+
+@pytest.fixture
+def streaming_shell():
+  model = MagicMock()
+  model.stream_completion.return_value = iter(
+    [CompletionChunk(content="Hello"), CompletionChunk(content=" there", finish_reason="stop")]
+  )
+  return Shell(ghost=Ghost(model=model))
+
+
+@pytest.mark.unit
+def test_output_port_processes_chunk():
+  port = OutputPort("test_port")
+
+  def uppercase_processor(chunk: CompletionChunk) -> CompletionChunk:
+    chunk.content = chunk.content.upper()
+    return chunk
+
+  port.add_chunk_processor(uppercase_processor)
+  assert port.process_chunk(CompletionChunk(content="abc")).content == "ABC"
+
+
+@pytest.mark.unit
+def test_shell_process_input_stream_yields_processed_chunks(streaming_shell, sample_message):
+  port = OutputPort("default")
+
+  def bracket_processor(chunk: CompletionChunk) -> CompletionChunk:
+    chunk.content = f"[{chunk.content}]"
+    return chunk
+
+  port.add_chunk_processor(bracket_processor)
+  streaming_shell.add_output_port(port)
+  chunks = list(streaming_shell.process_input_stream(sample_message))
+  assert [chunk.content for chunk in chunks] == ["[Hello]", "[ there]"]
+
+
+@pytest.mark.unit
+def test_shell_process_input_stream_records_assistant_once(streaming_shell, sample_message):
+  stream = streaming_shell.process_input_stream(sample_message)
+  next(stream)
+  assert len(streaming_shell.ghost.conversation_history) == 1
+  list(stream)
+  history = streaming_shell.ghost.conversation_history
+  assert len(history) == 2
+  assert history[1] == Message(role="assistant", content="Hello there")
+
+
+class SleepyEnhancer(ContextEnhancer):
+  independent = True
+
+  def __init__(self, name: str, delay: float, timeout=None):
+    super().__init__(name, timeout=timeout)
+    self.delay = delay
+    self.seen = []
+
+  def contribute(self, message):
+    self.seen.append(message.content)
+    time.sleep(self.delay)
+    return f"[{self.name}]"
+
+
+class AsyncSleepyEnhancer(ContextEnhancer):
+  independent = True
+
+  def __init__(self, name: str, delay: float):
+    super().__init__(name)
+    self.delay = delay
+
+  async def contribute_async(self, message):
+    await asyncio.sleep(self.delay)
+    return f"[{self.name}]"
+
+
+class SuffixEnhancer(ContextEnhancer):
+  def enhance(self, message):
+    return Message(role=message.role, content=f"{message.content} +{self.name}")
+
+
+@pytest.fixture
+def echo_ghost():
+  model = MagicMock()
+  model.generate_completion.return_value = CompletionResponse(
+    content="ok", tool_calls=[], finish_reason="stop"
+  )
+
+  async def complete(messages, tools=None):
+    return CompletionResponse(content="ok", tool_calls=[], finish_reason="stop")
+
+  model.generate_completion_async.side_effect = complete
+  return Ghost(model)
+
+
+@pytest.mark.unit
+def test_shell_runs_independent_enhancers_concurrently(echo_ghost):
+  shell = Shell(echo_ghost)
+  first, second = SleepyEnhancer("a", 0.1), SleepyEnhancer("b", 0.1)
+  shell.add_context_enhancer(first)
+  shell.add_context_enhancer(second)
+  start = time.perf_counter()
+  shell.process_input(Message(role="user", content="q"))
+  assert time.perf_counter() - start < 0.18
+  assert echo_ghost.conversation_history[0].content == "q\n\n[a]\n\n[b]"
+  assert first.seen == second.seen == ["q"]
+  assert [timing.name for timing in shell.enhancer_timings] == ["a", "b"]
+  assert all(timing.status == "ok" for timing in shell.enhancer_timings)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_only_enhancer_works_from_sync_path_inside_a_loop(echo_ghost):
+  shell = Shell(echo_ghost)
+  shell.add_context_enhancer(AsyncSleepyEnhancer("a", 0.0))
+  shell.process_input(Message(role="user", content="q"))
+  assert echo_ghost.conversation_history[0].content == "q\n\n[a]"
+  assert shell.enhancer_timings[0].status == "ok"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_shell_runs_async_enhancers_concurrently(echo_ghost):
+  shell = Shell(echo_ghost)
+  shell.add_context_enhancer(AsyncSleepyEnhancer("a", 0.1))
+  shell.add_context_enhancer(SleepyEnhancer("b", 0.1))
+  shell.add_context_enhancer(AsyncSleepyEnhancer("c", 0.1))
+  start = time.perf_counter()
+  await shell.process_input_async(Message(role="user", content="q"))
+  assert time.perf_counter() - start < 0.18
+  assert echo_ghost.conversation_history[0].content == "q\n\n[a]\n\n[b]\n\n[c]"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_shell_keeps_dependent_enhancers_in_order(echo_ghost):
+  shell = Shell(echo_ghost)
+  independent = SleepyEnhancer("a", 0.0)
+  shell.add_context_enhancer(SuffixEnhancer("first"))
+  shell.add_context_enhancer(independent)
+  shell.add_context_enhancer(SuffixEnhancer("last"))
+  await shell.process_input_async(Message(role="user", content="q"))
+  shell.process_input(Message(role="user", content="q"))
+  expected = "q +first\n\n[a] +last"
+  assert [message.content for message in echo_ghost.conversation_history[::2]] == [expected] * 2
+  assert independent.seen == ["q +first", "q +first"]
+
+
+@pytest.mark.unit
+def test_shell_times_out_and_skips_slow_enhancers(echo_ghost):
+  shell = Shell(echo_ghost, enhancer_budget=0.2)
+  shell.add_context_enhancer(SleepyEnhancer("slow", 0.3, timeout=0.05))
+  shell.add_context_enhancer(SleepyEnhancer("fast", 0.0))
+  shell.process_input(Message(role="user", content="q"))
+  assert echo_ghost.conversation_history[0].content == "q\n\n[fast]"
+  assert {t.name: t.status for t in shell.enhancer_timings} == {"slow": "timeout", "fast": "ok"}
+
+  shell.enhancer_latency["slow"] = 0.5
+  shell.process_input(Message(role="user", content="again"))
+  assert {t.name: t.status for t in shell.enhancer_timings} == {"slow": "skipped", "fast": "ok"}
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_shell_async_enhancer_timeout_and_errors(echo_ghost):
+  class BrokenEnhancer(ContextEnhancer):
+    independent = True
+
+    def contribute(self, message):
+      raise RuntimeError("index missing")
+
+  shell = Shell(echo_ghost)
+  slow = AsyncSleepyEnhancer("slow", 1.0)
+  slow.timeout = 0.05
+  shell.add_context_enhancer(slow)
+  shell.add_context_enhancer(BrokenEnhancer("broken"))
+  await shell.process_input_async(Message(role="user", content="q"))
+  assert echo_ghost.conversation_history[0].content == "q"
+  timings = {timing.name: timing for timing in shell.enhancer_timings}
+  assert timings["slow"].status == "timeout"
+  assert timings["broken"].status == "error"
+  assert timings["broken"].error == "RuntimeError: index missing"
+
+
+@pytest.mark.unit
+def test_shell_stable_layout_keeps_contributions_out_of_history(echo_ghost):
+  echo_ghost.layout = PromptLayout(system_prompt="Be brief.")
+  shell = Shell(echo_ghost)
+  shell.add_context_enhancer(SleepyEnhancer("notes", 0.0))
+  shell.process_input(Message(role="user", content="q"))
+  sent = echo_ghost.model.generate_completion.call_args[0][0]
+  assert [message.content for message in sent] == ["Be brief.", "q", "retrieved: [notes]"]
+  assert [message.content for message in echo_ghost.conversation_history] == ["q", "ok"]
+
+
+@pytest.mark.unit
+def test_shell_prefetch_hides_enhancer_latency(echo_ghost):
+  shell = Shell(echo_ghost)
+  slow = SleepyEnhancer("rag", 0.2)
+  shell.add_context_enhancer(slow)
+  assert shell.prefetch("what is the capital of") == 1
+  time.sleep(0.25)
+
+  began = time.perf_counter()
+  shell.process_input(Message(role="user", content="What is the capital of France?"))
+  assert time.perf_counter() - began < 0.15
+  assert slow.seen == ["what is the capital of"]
+  assert echo_ghost.conversation_history[0].content == "What is the capital of France?\n\n[rag]"
+  assert [timing.status for timing in shell.enhancer_timings] == ["prefetched"]
+  assert shell.prefetch_stats.used == 1 and shell.prefetch_stats.saved >= 0.15
+  assert "rag" not in shell.enhancer_latency
+
+
+@pytest.mark.unit
+def test_shell_prefetch_discards_unrelated_input(echo_ghost):
+  shell = Shell(echo_ghost)
+  slow = SleepyEnhancer("rag", 0.0)
+  shell.add_context_enhancer(slow)
+  shell.prefetch("weather tomorrow")
+  shell.prefetch("weather tomorrow in Paris")
+  shell.process_input(Message(role="user", content="capital of France"))
+  assert "capital of France" in slow.seen
+  assert [timing.status for timing in shell.enhancer_timings] == ["ok"]
+  stats = shell.prefetch_stats
+  assert (stats.started, stats.used, stats.discarded, stats.cancelled) == (2, 0, 1, 1)
+  assert stats.hit_rate == 0.0
+  assert shell.prefetch("   ") == 0 and not shell.cancel_prefetch()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_shell_prefetch_in_event_loop(echo_ghost):
+  shell = Shell(echo_ghost)
+  shell.add_context_enhancer(AsyncSleepyEnhancer("web", 0.2))
+  shell.add_context_enhancer(SuffixEnhancer("tag"))
+  shell.prefetch("latest release notes")
+  await asyncio.sleep(0.1)
+
+  began = time.perf_counter()
+  await shell.process_input_async(Message(role="user", content="latest release notes"))
+  elapsed = time.perf_counter() - began
+  assert 0.05 < elapsed < 0.18
+  assert echo_ghost.conversation_history[0].content == "latest release notes\n\n[web] +tag"
+  assert shell.prefetch_stats.hit_rate == 1.0
+  assert 0.05 < shell.prefetch_stats.saved < 0.18
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_shell_sync_turn_cancels_unfinished_loop_prefetch(echo_ghost):
+  shell = Shell(echo_ghost)
+  shell.add_context_enhancer(AsyncSleepyEnhancer("web", 0.05))
+  shell.prefetch("latest release notes")
+  task = next(iter(shell._prefetches["default"].jobs.values()))
+
+  shell.process_input(Message(role="user", content="latest release notes"))
+  assert [timing.status for timing in shell.enhancer_timings] == ["ok"]
+  assert "web" in shell.enhancer_latency
+  stats = shell.prefetch_stats
+  assert (stats.used, stats.discarded, stats.saved) == (0, 1, 0.0)
+  await asyncio.gather(task, return_exceptions=True)
+  assert task.cancelled()
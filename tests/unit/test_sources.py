@@ -0,0 +1,111 @@
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+import agent
+from agent.sources import available_sources, create_source, get_source, register_source
+from agent.sources import _sources
+
+ROOT = Path(__file__).resolve().parents[2]
+IMPORT_BUDGET_MS = 400
+HEAVY_MODULES = ("openai", "httpx", "numpy", "pydantic")
+
+
+def import_times(module: str) -> dict[str, int]:
+  result = subprocess.run(
+    [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+    cwd=ROOT,
+    capture_output=True,
+    text=True,
+    check=True,
+  )
+  times = {}
+  for line in result.stderr.splitlines():
+    if not line.startswith("import time:") or "|" not in line:
+      continue
+    _, cumulative, name = line.split("|")
+    if cumulative.strip().isdigit():
+      times[name.strip()] = int(cumulative)
+  return times
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("module", ["agent", "main"])
+def test_startup_skips_provider_sdks(module):
+  times = import_times(module)
+  assert not [name for name in times if name.split(".")[0] in HEAVY_MODULES]
+  assert times[module] / 1000 < IMPORT_BUDGET_MS
+
+
+@pytest.mark.unit
+def test_sdk_transport_glm_does_not_load_httpx():
+  script = (
+    "import sys\n"
+    "from agent.sources.glm import GLMModel\n"
+    "GLMModel(api_key='k')\n"
+    "print(sorted(name for name in sys.modules if name.split('.')[0] in ('httpx', 'openai')))"
+  )
+  result = subprocess.run(
+    [sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True
+  )
+  assert result.stdout.strip() == "[]"
+
+
+@pytest.mark.unit
+def test_package_exports_load_on_first_access():
+  from agent.sources.glm import GLMModel
+
+  assert agent.GLMModel is GLMModel
+  assert "GLMModel" in dir(agent)
+  with pytest.raises(AttributeError):
+    agent.Missing
+
+
+@pytest.mark.unit
+def test_registry_resolves_and_registers_sources():
+  def stub(**options):
+    return options
+
+  register_source("stub", stub)
+  try:
+    assert create_source("stub", api_key="k", model="m") == {"api_key": "k", "model": "m"}
+    assert "stub" in available_sources() and "glm" in available_sources()
+    with pytest.raises(ValueError):
+      register_source("stub", stub)
+    register_source("stub", "agent.sources.glm:GLMModel", replace=True)
+    assert get_source("stub") is get_source("glm")
+  finally:
+    _sources.pop("stub", None)
+  with pytest.raises(ValueError, match="Unknown source"):
+    get_source("nowhere")
+
+
+@pytest.mark.unit
+def test_create_model_passes_limiter_only_to_sources_that_take_it():
+  from main import create_model
+  from agent.sources.limits import RateLimiter
+
+  def plain(api_key, model):
+    return {"api_key": api_key, "model": model}
+
+  def limited(api_key, model, limiter=None):
+    return {"limiter": limiter}
+
+  limiter = RateLimiter()
+  register_source("plain", plain)
+  register_source("limited", limited)
+  try:
+    assert create_model("plain", "k", "m", limiter) == {"api_key": "k", "model": "m"}
+    assert create_model("limited", "k", "m", limiter) == {"limiter": limiter}
+    assert create_model("glm", "k", limiter=limiter).limiter is limiter
+  finally:
+    _sources.pop("plain", None)
+    _sources.pop("limited", None)
+
+
+@pytest.mark.unit
+def test_glm_clients_are_built_on_first_use():
+  model = create_source("glm", api_key="test-key")
+  assert "client" not in vars(model) and "async_client" not in vars(model)
+  assert model.client is model.client
+  assert "async_client" not in vars(model)
@@ -0,0 +1,133 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+from agent.ghost import Ghost
+from agent.model import BaseModel, CompletionResponse, Message
+from agent.session import SessionLog
+from agent.summary import RollingSummarizer, SummaryCheckpoint, SummaryStore
+
+
+class RecordingModel(BaseModel):
+  def __init__(self):
+    self.prompts: list[list[Message]] = []
+
+  def generate_completion(self, messages, tools=None):
+    raise AssertionError("summaries must use the async path")
+
+  async def generate_completion_async(self, messages, tools=None):
+    self.prompts.append(messages)
+    return CompletionResponse(
+      content=f"summary {len(self.prompts)}", tool_calls=[], finish_reason="stop"
+    )
+
+
+def turns(start: int, count: int) -> list[Message]:
+  history = []
+  for index in range(start, start + count):
+    history.append(Message(role="user", content=f"q{index}"))
+    history.append(Message(role="assistant", content=f"a{index}"))
+  return history
+
+
+@pytest.mark.unit
+def test_summary_store_returns_latest_checkpoint(tmp_path):
+  store = SummaryStore(str(tmp_path / "summary.jsonl"))
+  assert store.latest() is None
+  store.append(SummaryCheckpoint("first", 4, 1.0))
+  store.append(SummaryCheckpoint("second " * 2000, 8, 2.0))
+  assert store.latest() == SummaryCheckpoint("second " * 2000, 8, 2.0)
+
+
+@pytest.mark.unit
+def test_summarizer_folds_only_new_turns_into_previous_summary():
+  model = RecordingModel()
+  summarizer = RollingSummarizer(model, keep_recent=2, min_batch=2)
+  history = turns(0, 3)
+  summarizer.schedule(history).result(timeout=5)
+  assert summarizer.checkpoint.summary == "summary 1"
+  assert summarizer.checkpoint.covered == 4
+
+  history += turns(3, 2)
+  summarizer.schedule(history).result(timeout=5)
+  prompt = model.prompts[1][1].content
+  assert "summary 1" in prompt
+  assert "q0" not in prompt
+  assert "q2" in prompt and "a3" in prompt
+  assert "q4" not in prompt
+  assert summarizer.checkpoint.covered == 8
+  summarizer.close()
+
+
+@pytest.mark.unit
+def test_summarizer_waits_for_enough_turns():
+  summarizer = RollingSummarizer(RecordingModel(), keep_recent=4, min_batch=4)
+  assert summarizer.schedule(turns(0, 3)) is None
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_summarizer_runs_as_task_on_running_loop():
+  summarizer = RollingSummarizer(RecordingModel(), keep_recent=0, min_batch=2)
+  task = summarizer.schedule(turns(0, 1))
+  assert isinstance(task, asyncio.Task)
+  await task
+  assert summarizer.checkpoint.covered == 2
+
+
+@pytest.mark.unit
+def test_summarizer_checkpoints_survive_restart(tmp_path):
+  log = SessionLog(str(tmp_path / "sessions"), "chat")
+  for message in turns(0, 2):
+    log.append(message)
+  store = SummaryStore.for_session(str(tmp_path / "summaries"), "chat")
+  summarizer = RollingSummarizer(RecordingModel(), keep_recent=0, min_batch=2, store=store)
+  summarizer.schedule(log).result(timeout=5)
+  summarizer.close()
+  log.close()
+
+  restored = RollingSummarizer(RecordingModel(), store=SummaryStore(store.path))
+  ghost = Ghost(
+    model=MagicMock(), summarizer=restored, session=SessionLog(str(tmp_path / "sessions"), "chat")
+  )
+  assert restored.checkpoint.covered == 4
+  ghost.add_message(Message(role="user", content="new question"))
+  ghost.process()
+  messages = ghost.model.generate_completion.call_args[0][0]
+  assert messages[0].content.endswith("summary 1")
+  assert messages[1].content == "new question"
+
+
+@pytest.mark.unit
+def test_summary_checkpoints_are_kept_per_session(tmp_path):
+  first = SummaryStore.for_session(str(tmp_path), "alice")
+  first.append(SummaryCheckpoint("alice is planning a trip", 4, 1.0))
+  assert SummaryStore.for_session(str(tmp_path), "bob").latest() is None
+  assert SummaryStore.for_session(str(tmp_path), "alice").latest().summary.startswith("alice")
+
+
+@pytest.mark.unit
+def test_summary_past_the_history_is_dropped(tmp_path):
+  store = SummaryStore(str(tmp_path / "summary.jsonl"))
+  store.append(SummaryCheckpoint("alice is planning a trip", 4, 1.0))
+  summarizer = RollingSummarizer(RecordingModel(), store=store)
+  ghost = Ghost(model=MagicMock(), summarizer=summarizer)
+  assert summarizer.checkpoint.summary == "" and summarizer.checkpoint.covered == 0
+  assert store.latest().summary == ""
+  ghost.add_message(Message(role="user", content="hello, I'm Bob"))
+  ghost.process()
+  messages = ghost.model.generate_completion.call_args[0][0]
+  assert [message.content for message in messages] == ["hello, I'm Bob"]
+
+
+@pytest.mark.unit
+def test_ghost_replaces_folded_turns_with_summary():
+  summarizer = RollingSummarizer(RecordingModel(), keep_recent=2, min_batch=4)
+  ghost = Ghost(model=MagicMock(), summarizer=summarizer)
+  for message in turns(0, 3):
+    ghost.add_message(message)
+  summarizer.wait(timeout=5)
+  ghost.process()
+  messages = ghost.model.generate_completion.call_args[0][0]
+  assert [message.content for message in messages[1:]] == ["q2", "a2"]
+  assert messages[0].role == "system"
+  summarizer.close()
@@ -0,0 +1,207 @@
+import json
+from typing import AsyncIterator, Iterator, Optional
+import pytest
+from agent.ghost import Ghost
+from agent.model import (
+  BaseModel,
+  CompletionChunk,
+  CompletionResponse,
+  Message,
+  Tool,
+  Usage,
+)
+from agent.shell import ContextEnhancer, InputPort, OutputPort, Shell
+from agent.telemetry import (
+  DISABLED,
+  NULL_SPAN,
+  InMemoryExporter,
+  JsonlExporter,
+  MetricsRegistry,
+  Telemetry,
+)
+
+
+class CountingModel(BaseModel):
+  model = "counting"
+
+  def generate_completion(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> CompletionResponse:
+    return CompletionResponse(
+      content="hello world",
+      tool_calls=[],
+      finish_reason="stop",
+      usage=Usage(prompt_tokens=len(messages) * 10, completion_tokens=2),
+    )
+
+  async def generate_completion_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> CompletionResponse:
+    return self.generate_completion(messages, tools)
+
+  def stream_completion(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> Iterator[CompletionChunk]:
+    yield CompletionChunk(content="hello ")
+    yield CompletionChunk(
+      content="world", finish_reason="stop", usage=Usage(prompt_tokens=7, completion_tokens=2)
+    )
+
+  async def stream_completion_async(
+    self, messages: list[Message], tools: Optional[list[Tool]] = None
+  ) -> AsyncIterator[CompletionChunk]:
+    for chunk in self.stream_completion(messages, tools):
+      yield chunk
+
+
+class NoteEnhancer(ContextEnhancer):
+  independent = True
+
+  def contribute(self, message: Message) -> Optional[str]:
+    return "note"
+
+
+def traced_shell() -> tuple[Shell, InMemoryExporter]:
+  exporter = InMemoryExporter()
+  shell = Shell(Ghost(CountingModel(), telemetry=Telemetry(exporters=[exporter])))
+  port = InputPort("default")
+  port.add_enhancer(lambda message: message)
+  shell.add_input_port(port)
+  shell.add_context_enhancer(NoteEnhancer("note"))
+  return shell, exporter
+
+
+@pytest.mark.unit
+def test_disabled_telemetry_is_a_no_op():
+  chunks = iter([CompletionChunk(content="x")])
+  assert DISABLED.span("turn") is NULL_SPAN
+  assert DISABLED.trace_stream(chunks) is chunks
+  DISABLED.record("enhancer.x", 1.0)
+  assert DISABLED.metrics.render() == "\n"
+
+  ghost = Ghost(CountingModel())
+  assert ghost.telemetry is DISABLED
+  assert Shell(ghost).process_input(Message(role="user", content="hi")).content == "hello world"
+
+
+@pytest.mark.unit
+def test_turn_spans_cover_each_stage():
+  shell, exporter = traced_shell()
+  shell.process_input(Message(role="user", content="hi"))
+
+  names = [span.name for span in exporter.spans]
+  assert names == ["input", "enhancer.note", "prepare", "model", "turn"]
+  turn = exporter.named("turn")[0]
+  assert turn.parent_id is None and turn.attributes["cached"] is False
+  assert all(span.parent_id == turn.span_id for span in exporter.spans[:-1])
+  assert {span.trace_id for span in exporter.spans} == {turn.trace_id}
+  model = exporter.named("model")[0]
+  assert model.attributes == {
+    "model": "counting",
+    "prompt_tokens": 10,
+    "completion_tokens": 2,
+    "cached_tokens": 0,
+  }
+  assert all(span.duration >= 0 for span in exporter.spans)
+
+  metrics = shell.telemetry.metrics
+  assert metrics.counter("tokens_total", kind="prompt", model="counting") == 10
+  assert metrics.histogram("span_seconds", span="turn").count == 1
+
+
+@pytest.mark.unit
+def test_model_label_stays_a_name_through_wrappers():
+  from agent.sources.cache import CachedModel
+  from agent.sources.router import RouterModel
+
+  for model, name in (
+    (CachedModel(CountingModel()), "counting"),
+    (RouterModel({"a": CountingModel(), "b": CountingModel()}), "a+b"),
+    (CachedModel(RouterModel({"a": CountingModel()})), "a"),
+  ):
+    exporter = InMemoryExporter()
+    ghost = Ghost(model, telemetry=Telemetry(exporters=[exporter]))
+    Shell(ghost).process_input(Message(role="user", content="hi"))
+    assert exporter.named("model")[0].attributes["model"] == name
+    assert ghost.telemetry.metrics.counter("tokens_total", kind="prompt", model=name) == 10
+
+
+@pytest.mark.unit
+def test_stream_records_ttft_usage_and_output_time():
+  shell, exporter = traced_shell()
+  output = OutputPort("default")
+  output.add_chunk_processor(lambda chunk: chunk)
+  shell.add_output_port(output)
+
+  chunks = list(shell.process_input_stream(Message(role="user", content="hi")))
+  assert "".join(chunk.content for chunk in chunks) == "hello world"
+
+  model = exporter.named("model")[0]
+  assert model.attributes["ttft"] <= model.duration
+  assert model.attributes["completion_tokens"] == 2
+  assert exporter.named("output")[0].attributes == {"chunks": 2}
+  assert exporter.spans[-1].name == "turn"
+  assert shell.telemetry.metrics.histogram("ttft_seconds", model="counting").count == 1
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_turns_nest_spans_per_task():
+  import asyncio
+
+  shell, exporter = traced_shell()
+  other, _ = traced_shell()
+  other.ghost.telemetry = shell.telemetry
+
+  async def stream(target: Shell):
+    return [c async for c in target.process_input_stream_async(Message(role="user", content="q"))]
+
+  await asyncio.gather(shell.process_input_async(Message(role="user", content="a")), stream(other))
+  turns = exporter.named("turn")
+  assert len(turns) == 2 and len({turn.trace_id for turn in turns}) == 2
+  for span in exporter.spans:
+    if span.name != "turn":
+      parent = next(turn for turn in turns if turn.trace_id == span.trace_id)
+      assert span.parent_id == parent.span_id
+
+
+@pytest.mark.unit
+def test_failed_spans_record_errors():
+  telemetry = Telemetry()
+  with pytest.raises(RuntimeError):
+    with telemetry.span("model"):
+      raise RuntimeError("boom")
+  assert telemetry.metrics.counter("span_errors_total", span="model", status="error") == 1
+
+
+@pytest.mark.unit
+def test_prometheus_rendering():
+  metrics = MetricsRegistry(buckets=(0.1, 1.0))
+  metrics.inc("tokens_total", 5, kind="prompt", model='g"1')
+  metrics.observe("span_seconds", 0.05, span="model")
+  metrics.observe("span_seconds", 3.0, span="model")
+  assert metrics.render().splitlines() == [
+    "# TYPE agent_tokens_total counter",
+    'agent_tokens_total{kind="prompt",model="g\\"1"} 5',
+    "# TYPE agent_span_seconds histogram",
+    'agent_span_seconds_bucket{span="model",le="0.1"} 1',
+    'agent_span_seconds_bucket{span="model",le="1"} 1',
+    'agent_span_seconds_bucket{span="model",le="+Inf"} 2',
+    'agent_span_seconds_sum{span="model"} 3.05',
+    'agent_span_seconds_count{span="model"} 2',
+  ]
+  assert metrics.histogram("span_seconds", span="model").quantile(0.5) == 0.1
+
+
+@pytest.mark.unit
+def test_jsonl_exporter_writes_one_span_per_line(tmp_path):
+  path = tmp_path / "traces" / "spans.jsonl"
+  telemetry = Telemetry(exporters=[JsonlExporter(str(path))])
+  with telemetry.span("turn", port="default"):
+    telemetry.record("enhancer.rag", 0.25, "timeout")
+  records = [json.loads(line) for line in path.read_text().splitlines()]
+  telemetry.close()
+  assert [record["name"] for record in records] == ["enhancer.rag", "turn"]
+  assert records[0]["status"] == "timeout" and records[0]["duration"] == 0.25
+  assert records[0]["parent_id"] == records[1]["span_id"]
+  assert records[1]["attributes"] == {"port": "default"}
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import time
+import pytest
+from unittest.mock import MagicMock
+from agent.ghost import Ghost
+from agent.model import CompletionChunk, CompletionResponse, Message, ToolCall, ToolCallDelta
+from agent.tools import ToolRegistry
+
+
+def square(x: int) -> int:
+  return x * x
+
+
+def call(name: str, arguments: dict, call_id: str = "1") -> ToolCall:
+  return ToolCall(id=call_id, name=name, arguments=json.dumps(arguments))
+
+
+@pytest.fixture
+def registry():
+  registry = ToolRegistry(default_timeout=1.0)
+
+  @registry.tool(description="Sleep in a thread")
+  def slow_blocking(seconds: float) -> str:
+    time.sleep(seconds)
+    return f"slept {seconds}"
+
+  @registry.tool(description="Sleep on the event loop")
+  async def slow_async(seconds: float) -> dict:
+    await asyncio.sleep(seconds)
+    return {"slept": seconds}
+
+  @registry.tool(timeout=0.05)
+  async def stuck() -> str:
+    await asyncio.sleep(10)
+
+  @registry.tool()
+  def broken() -> str:
+    raise ValueError("bad input")
+
+  yield registry
+  registry.close()
+
+
+@pytest.mark.unit
+def test_registry_exposes_definitions(registry):
+  definitions = {tool.name: tool for tool in registry.definitions()}
+  assert definitions["slow_blocking"].description == "Sleep in a thread"
+  assert definitions["stuck"].parameters == {"type": "object", "properties": {}}
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_registry_runs_calls_concurrently(registry):
+  calls = [
+    call("slow_blocking", {"seconds": 0.2}, "a"),
+    call("slow_blocking", {"seconds": 0.2}, "b"),
+    call("slow_async", {"seconds": 0.2}, "c"),
+  ]
+  start = time.perf_counter()
+  results = await registry.execute(calls)
+  assert time.perf_counter() - start < 0.35
+  assert [result.tool_call_id for result in results] == ["a", "b", "c"]
+  assert results[0].role == "tool"
+  assert results[2].content == '{"slept": 0.2}'
+
+
+@pytest.mark.unit
+def test_registry_reports_errors_as_results(registry):
+  results = registry.run(
+    [
+      call("stuck", {}),
+      call("broken", {}),
+      call("missing", {}),
+      ToolCall(id="4", name="slow_async", arguments="{not json"),
+    ]
+  )
+  contents = [result.content for result in results]
+  assert contents[0] == "Error: stuck timed out after 0.05s"
+  assert contents[1] == "Error: broken failed: ValueError: bad input"
+  assert contents[2] == "Error: unknown tool 'missing'"
+  assert contents[3].startswith("Error: invalid JSON arguments for slow_async")
+
+
+@pytest.mark.unit
+def test_registry_memoizes_pure_tools():
+  registry = ToolRegistry()
+  calls = []
+
+  @registry.tool(pure=True)
+  def lookup(key: str) -> str:
+    calls.append(key)
+    return key.upper()
+
+  registry.run([call("lookup", {"key": "a"})])
+  results = registry.run([call("lookup", {"key": "a"}), call("lookup", {"key": "b"})])
+  assert [result.content for result in results] == ["A", "B"]
+  assert calls == ["a", "b"]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_registry_runs_process_tools():
+  registry = ToolRegistry()
+  registry.tool(process=True)(square)
+  results = await registry.execute([call("square", {"x": 7})])
+  registry.close()
+  assert results[0].content == "49"
+
+
+@pytest.mark.unit
+def test_ghost_runs_tool_rounds_until_text_answer(registry):
+  model = MagicMock()
+  model.generate_completion.side_effect = [
+    CompletionResponse(
+      content="",
+      tool_calls=[call("slow_async", {"seconds": 0}, "a"), call("broken", {}, "b")],
+      finish_reason="tool_calls",
+    ),
+    CompletionResponse(content="done", tool_calls=[], finish_reason="stop"),
+  ]
+  ghost = Ghost(model, tools=registry)
+  ghost.add_message(Message(role="user", content="go"))
+  response = ghost.process()
+  assert response.content == "done"
+  roles = [message.role for message in ghost.conversation_history]
+  assert roles == ["user", "assistant", "tool", "tool"]
+  assert ghost.conversation_history[1].tool_calls[0].id == "a"
+  second_messages, second_tools = model.generate_completion.call_args_list[1].args
+  assert second_messages[-1].tool_call_id == "b"
+  assert {tool.name for tool in second_tools} >= {"slow_async", "broken"}
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_ghost_caps_tool_rounds(registry):
+  model = MagicMock()
+
+  async def always_tools(messages, tools=None):
+    if tools is None:
+      return CompletionResponse(content="gave up", tool_calls=[], finish_reason="stop")
+    return CompletionResponse(
+      content="", tool_calls=[call("slow_async", {"seconds": 0})], finish_reason="tool_calls"
+    )
+
+  model.generate_completion_async.side_effect = always_tools
+  ghost = Ghost(model, tools=registry, max_tool_rounds=2)
+  ghost.add_message(Message(role="user", content="loop"))
+  assert (await ghost.process_async()).content == "gave up"
+  assert model.generate_completion_async.call_count == 3
+
+
+@pytest.mark.unit
+def test_ghost_streams_through_tool_rounds(registry):
+  model = MagicMock()
+  model.stream_completion.side_effect = [
+    iter(
+      [
+        CompletionChunk(
+          tool_calls=[ToolCallDelta(index=0, id="a", name="slow_async", arguments="")]
+        ),
+        CompletionChunk(tool_calls=[ToolCallDelta(index=0, arguments='{"seconds": 0}')]),
+        CompletionChunk(finish_reason="tool_calls"),
+      ]
+    ),
+    iter([CompletionChunk(content="answer"), CompletionChunk(finish_reason="stop")]),
+  ]
+  ghost = Ghost(model, tools=registry)
+  ghost.add_message(Message(role="user", content="go"))
+  chunks = list(ghost.process_stream())
+  assert [chunk.content for chunk in chunks] == ["answer", ""]
+  assert all(not chunk.tool_calls for chunk in chunks)
+  assert ghost.conversation_history[-1].content == '{"slept": 0}'
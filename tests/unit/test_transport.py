@@ -0,0 +1,141 @@
+import json
+import httpx
+import pytest
+from agent.model import Message, Tool, ToolCall
+from agent.sources.transport import (
+  FastTransport,
+  TransportError,
+  parse_chunk,
+  parse_completion,
+)
+
+
+def completion(content: str = "hi") -> dict:
+  return {
+    "choices": [
+      {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+    ]
+  }
+
+
+@pytest.mark.unit
+def test_body_matches_json_payload():
+  transport = FastTransport("http://test/v1", "key")
+  tool = Tool(name="echo", description="Echo", parameters={"type": "object", "properties": {}})
+  messages = [
+    Message(role="system", content="Be brief ✓"),
+    Message(role="assistant", content="", tool_calls=[ToolCall("c1", "echo", '{"x": 1}')]),
+    Message(role="tool", content="1", tool_call_id="c1"),
+  ]
+  body = json.loads(transport.body("glm", messages, [tool], stream=True))
+  assert body == {
+    "model": "glm",
+    "messages": [
+      {"role": "system", "content": "Be brief ✓"},
+      {
+        "role": "assistant",
+        "content": "",
+        "tool_calls": [
+          {"id": "c1", "type": "function", "function": {"name": "echo", "arguments": '{"x": 1}'}}
+        ],
+      },
+      {"role": "tool", "content": "1", "tool_call_id": "c1"},
+    ],
+    "tools": [
+      {
+        "type": "function",
+        "function": {
+          "name": "echo",
+          "description": "Echo",
+          "parameters": {"type": "object", "properties": {}},
+        },
+      }
+    ],
+    "stream": True,
+  }
+  assert json.loads(transport.body("glm", messages[:1])) == {
+    "model": "glm",
+    "messages": [{"role": "system", "content": "Be brief ✓"}],
+  }
+
+
+@pytest.mark.unit
+def test_formatter_reuses_bytes_until_message_changes():
+  formatter = FastTransport("http://test", "key", cache_size=2).formatter
+  message = Message(role="user", content="hello")
+  first = formatter.message(message)
+  assert formatter.message(message) is first
+  message.content = "changed"
+  assert json.loads(formatter.message(message))["content"] == "changed"
+  for i in range(3):
+    formatter.message(Message(role="user", content=str(i)))
+  assert len(formatter._messages) <= 2
+
+
+@pytest.mark.unit
+def test_parse_completion_and_chunks():
+  data = completion("done")
+  data["choices"][0]["message"]["tool_calls"] = [
+    {"id": "c1", "type": "function", "function": {"name": "echo", "arguments": "{}"}}
+  ]
+  response = parse_completion(data)
+  assert response.content == "done"
+  assert response.tool_calls[0].name == "echo"
+  assert response.finish_reason == "stop"
+
+  chunk = parse_chunk(
+    {
+      "choices": [
+        {
+          "delta": {
+            "content": None,
+            "tool_calls": [{"index": 0, "id": "c1", "function": {"name": "echo"}}],
+          },
+          "finish_reason": None,
+        }
+      ]
+    }
+  )
+  assert chunk.content == ""
+  assert chunk.tool_calls[0].id == "c1" and chunk.tool_calls[0].arguments == ""
+  assert parse_chunk({"choices": []}) is None
+
+
+@pytest.mark.unit
+def test_post_sends_body_and_maps_errors():
+  seen = []
+
+  def handler(request: httpx.Request) -> httpx.Response:
+    seen.append(request)
+    if len(seen) == 1:
+      return httpx.Response(200, json=completion())
+    return httpx.Response(429, json={"error": {"message": "slow down"}})
+
+  transport = FastTransport("http://test/v1/", "key", transport=httpx.MockTransport(handler))
+  body = transport.body("glm", [Message(role="user", content="hi")])
+  assert parse_completion(transport.post(body)).content == "hi"
+  assert seen[0].url == "http://test/v1/chat/completions"
+  assert seen[0].headers["authorization"] == "Bearer key"
+  assert seen[0].content == body
+
+  with pytest.raises(TransportError) as error:
+    transport.post(body)
+  assert error.value.status_code == 429
+  assert "slow down" in str(error.value)
+  transport.close()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_stream_yields_events_until_done():
+  def handler(request: httpx.Request) -> httpx.Response:
+    events = [{"choices": [{"delta": {"content": word}}]} for word in ("a", "b")]
+    lines = [f"data: {json.dumps(event)}\n\n" for event in events] + ["data: [DONE]\n\n"]
+    return httpx.Response(200, content="".join(lines).encode())
+
+  transport = FastTransport("http://test/v1", "key", async_transport=httpx.MockTransport(handler))
+  response = await transport.open_stream_async(b"{}")
+  chunks = [parse_chunk(event) async for event in transport.events_async(response)]
+  assert [chunk.content for chunk in chunks] == ["a", "b"]
+  assert response.is_closed
+  await transport.aclose()
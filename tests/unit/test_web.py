@@ -0,0 +1,238 @@
+import asyncio
+import time
+import httpx
+import pytest
+from agent.enhancers.web import (
+  PageCache,
+  SearxngBackend,
+  WebResult,
+  WebSearcher,
+  extract_text,
+  rank_passages,
+  split_passages,
+)
+from agent.model import Message
+from agent.shell import WebSearchEnhancer
+
+ARTICLE = """
+<html><head><title>Tides</title><style>body { color: red }</style></head>
+<body>
+  <nav>Home | About | Contact</nav>
+  <article>
+    <h1>How tides work</h1>
+    <p>Tides are caused by the gravitational pull of the moon &amp; the sun.</p>
+    <p>Spring tides happen when the sun and moon align.</p>
+    <script>track()</script>
+  </article>
+  <footer>Copyright</footer>
+</body></html>
+"""
+
+
+class FakeWeb:
+  def __init__(self, pages: dict[str, str], delays: dict[str, float] = None):
+    self.pages = pages
+    self.delays = delays or {}
+    self.requests: list[httpx.Request] = []
+
+  async def __call__(self, request: httpx.Request) -> httpx.Response:
+    self.requests.append(request)
+    url = str(request.url)
+    if request.url.path == "/search":
+      results = [
+        {"url": page, "title": page.rsplit("/", 1)[-1], "content": f"snippet about tides {page}"}
+        for page in self.pages
+      ]
+      return httpx.Response(200, json={"results": results})
+    await asyncio.sleep(self.delays.get(url, 0.0))
+    if request.headers.get("if-none-match") == '"v1"':
+      return httpx.Response(304)
+    return httpx.Response(
+      200, text=self.pages[url], headers={"content-type": "text/html", "etag": '"v1"'}
+    )
+
+  def fetches(self, url: str) -> list[httpx.Request]:
+    return [request for request in self.requests if str(request.url) == url]
+
+
+def make_searcher(web: FakeWeb, **kwargs) -> WebSearcher:
+  kwargs.setdefault("extract_workers", 0)
+  return WebSearcher(
+    SearxngBackend("http://searx.local"), transport=httpx.MockTransport(web), **kwargs
+  )
+
+
+@pytest.mark.unit
+def test_extract_text_prefers_main_content():
+  text = extract_text(ARTICLE)
+  assert text.startswith("How tides work")
+  assert "moon & the sun" in text
+  assert "Home" not in text
+  assert "track()" not in text
+  assert "Copyright" not in text
+
+
+@pytest.mark.unit
+def test_split_passages_respects_max_chars():
+  text = "\n\n".join(["alpha " * 20, "beta " * 20, "gamma " * 200])
+  passages = split_passages(text, max_chars=300)
+  assert all(len(passage) <= 300 for passage in passages)
+  assert passages[0].startswith("alpha")
+  assert "gamma" in passages[-1]
+
+
+@pytest.mark.unit
+def test_rank_passages_orders_by_relevance():
+  pages = [
+    (WebResult("http://a", "A"), "Bread recipes.\n\nSourdough needs a starter."),
+    (WebResult("http://b", "B"), "Tides follow the moon."),
+  ]
+  ranked = rank_passages("moon tides", pages, max_chars=20)
+  assert ranked[0].url == "http://b"
+  assert all(passage.url != "http://a" for passage in ranked)
+
+
+@pytest.mark.unit
+def test_web_searcher_fetches_and_ranks_pages():
+  web = FakeWeb({"http://site.local/tides": ARTICLE, "http://site.local/bread": "<p>Bread</p>"})
+  searcher = make_searcher(web)
+  try:
+    passages = searcher.search("why do tides happen")
+  finally:
+    searcher.close()
+  assert passages[0].url == "http://site.local/tides"
+  assert "gravitational pull" in passages[0].text
+  assert searcher.stats.fetched == 2
+
+
+@pytest.mark.unit
+def test_web_searcher_fetches_pages_concurrently():
+  pages = {f"http://site.local/{i}": ARTICLE for i in range(5)}
+  web = FakeWeb(pages, delays={url: 0.1 for url in pages})
+  searcher = make_searcher(web, deadline=2.0)
+  try:
+    start = time.perf_counter()
+    searcher.search("tides")
+    elapsed = time.perf_counter() - start
+  finally:
+    searcher.close()
+  assert elapsed < 0.3
+  assert searcher.stats.fetched == 5
+
+
+@pytest.mark.unit
+def test_web_searcher_deadline_returns_partial_results():
+  web = FakeWeb(
+    {"http://site.local/fast": ARTICLE, "http://site.local/slow": ARTICLE},
+    delays={"http://site.local/slow": 5.0},
+  )
+  searcher = make_searcher(web, deadline=0.2)
+  try:
+    start = time.perf_counter()
+    passages = searcher.search("tides moon")
+    elapsed = time.perf_counter() - start
+  finally:
+    searcher.close()
+  assert elapsed < 0.5
+  assert searcher.stats.timed_out == 1
+  urls = {passage.url for passage in passages}
+  assert urls == {"http://site.local/fast", "http://site.local/slow"}
+  slow = [passage for passage in passages if passage.url == "http://site.local/slow"]
+  assert slow[0].text == "snippet about tides http://site.local/slow"
+
+
+@pytest.mark.unit
+def test_web_searcher_respects_token_budget():
+  web = FakeWeb({f"http://site.local/{i}": ARTICLE for i in range(4)})
+  searcher = make_searcher(web, max_tokens=40)
+  try:
+    passages = searcher.search("tides")
+  finally:
+    searcher.close()
+  assert passages
+  assert sum(searcher.tokenizer.count(passage.text) for passage in passages) <= 40
+
+
+@pytest.mark.unit
+def test_web_searcher_page_cache_ttl_and_etag(tmp_path):
+  now = [1000.0]
+  url = "http://site.local/tides"
+  web = FakeWeb({url: ARTICLE})
+  searcher = make_searcher(
+    web, cache=PageCache(str(tmp_path / "web.db")), ttl=60, clock=lambda: now[0]
+  )
+  try:
+    first = searcher.search("tides")
+    searcher.search("tides")
+    assert len(web.fetches(url)) == 1
+    assert searcher.stats.cached == 1
+
+    now[0] += 120
+    revalidated = searcher.search("tides")
+    requests = web.fetches(url)
+    assert len(requests) == 2
+    assert requests[-1].headers["if-none-match"] == '"v1"'
+    assert searcher.stats.revalidated == 1
+    assert revalidated == first
+    assert searcher.cache.get(url).fetched_at == 1120.0
+  finally:
+    searcher.close()
+
+
+@pytest.mark.unit
+def test_web_searcher_extracts_in_process_pool():
+  web = FakeWeb({"http://site.local/tides": ARTICLE})
+  searcher = make_searcher(web, extract_workers=1, deadline=30.0)
+  try:
+    passages = searcher.search("tides")
+  finally:
+    searcher.close()
+  assert "gravitational pull" in passages[0].text
+
+
+@pytest.mark.unit
+def test_web_searcher_backend_failure_returns_nothing():
+  def handler(request):
+    return httpx.Response(500)
+
+  searcher = WebSearcher(
+    SearxngBackend("http://searx.local"), transport=httpx.MockTransport(handler)
+  )
+  try:
+    assert searcher.search("tides") == []
+  finally:
+    searcher.close()
+  assert searcher.stats.failed == 1
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+  "reply",
+  [httpx.Response(200, text="<html>not json</html>"), httpx.Response(200, json=["no", "results"])],
+)
+def test_web_searcher_malformed_backend_reply_returns_nothing(reply):
+  searcher = WebSearcher(
+    SearxngBackend("http://searx.local"), transport=httpx.MockTransport(lambda request: reply)
+  )
+  try:
+    assert searcher.search("tides") == []
+  finally:
+    searcher.close()
+  assert searcher.stats.failed == 1
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_web_search_enhancer_injects_passages():
+  web = FakeWeb({"http://site.local/tides": ARTICLE})
+  searcher = make_searcher(web)
+  enhancer = WebSearchEnhancer(searcher=searcher)
+  message = Message(role="user", content="what causes tides")
+  try:
+    enhanced = await enhancer.enhance_async(message)
+    sync_enhanced = enhancer.enhance(message)
+  finally:
+    searcher.close()
+  assert enhanced.content.startswith("what causes tides\n\nWeb results:\n[tides - ")
+  assert "gravitational pull" in enhanced.content
+  assert sync_enhanced == enhanced